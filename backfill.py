@@ -1,116 +1,312 @@
 #!/usr/bin/env python3
 """
-Historical data backfill script using Stooq API
+Historical data backfill script using Stooq API (or another stox_common.providers provider)
 Run this once to populate historical data before daily ingestion starts
 """
 
-import requests
+import argparse
 import boto3
+import json
 import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import time
 
-def backfill_stock_data(ticker, start_date, end_date, bucket_name):
-    """Backfill historical data for a ticker"""
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layers', 'common', 'python'))
+
+from stox_common.cache import write_watermark
+from stox_common.compaction import read_rows
+from stox_common.indicators import materialize, series_tickers
+from stox_common.layout import LAYOUTS, MONTHLY, PRICES_PREFIX, date_of_daily_key, group_rows, is_daily_key
+from stox_common.partitions import GlueCatalog, partitions_of_keys
+from stox_common.providers import get_provider
+from stox_common.ratelimit import TokenBucket
+from stox_common.s3io import ParallelUploader, delete_keys, list_keys
+from stox_common.series import update_series
+from stox_common.stats import summarize_latencies
+from stox_common.writers import FORMATS, get_writer
+
+def fetch_rows(ticker, start_date, end_date, provider):
+    """Download the daily history of a ticker and keep rows in the date range"""
     
-    s3_client = boto3.client('s3')
+    return provider.fetch([ticker], start_date, end_date).get(ticker, [])
+
+def write_rows(ticker, rows, uploader, layout=MONTHLY, writer=None):
+    """Upload rows as one object per layout group; returns {key: future}"""
+    
+    writer = writer or get_writer()
+    return {
+        key: uploader.put(key, writer.serialize(group), writer.content_type)
+        for key, group in group_rows(ticker, rows, layout, writer.filename).items()
+    }
+
+def remove_superseded_daily_objects(ticker, rows, client, bucket_name):
+    """Delete per-day objects whose rows are now part of a monthly object
+    
+    A catch-up object from ingest sits at the daily key of its first day but
+    holds later days too, so each candidate is read and deleted only when
+    every date in it was written.
+    """
+    
+    written = {row['date'] for row in rows}
+    candidates = [
+        key for key in list_keys(client, bucket_name, f"{PRICES_PREFIX}/ticker={ticker}/")
+        if is_daily_key(key) and date_of_daily_key(key).isoformat() in written
+    ]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        contents = pool.map(lambda key: read_rows(client, bucket_name, key), candidates)
+        stale = [key for key, held in zip(candidates, contents) if all(row['date'] in written for row in held)]
+    delete_keys(client, bucket_name, stale)
+    return len(stale)
+
+class Checkpoint:
+    """Local JSON record of the dates already written per ticker
+
+    A rerun downloads each ticker again but only uploads the days that are
+    missing; tickers whose whole requested range was completed before are
+    skipped without a download.
+    """
     
-    # Convert dates to Stooq format
-    start_str = start_date.strftime('%Y%m%d')
-    end_str = end_date.strftime('%Y%m%d')
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {'tickers': {}}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._data = json.load(f)
+    
+    def _entry(self, ticker):
+        return self._data['tickers'].setdefault(ticker, {'covered': None, 'dates': {}})
+    
+    def written(self, ticker):
+        """Set of ISO dates already uploaded for a ticker"""
+        with self._lock:
+            months = self._data['tickers'].get(ticker, {}).get('dates', {})
+            return {f"{month}-{day:02d}" for month, days in months.items() for day in days}
+    
+    def covers(self, ticker, start_date, end_date):
+        with self._lock:
+            covered = self._data['tickers'].get(ticker, {}).get('covered')
+        return bool(covered) and covered[0] <= start_date.strftime('%Y-%m-%d') and end_date.strftime('%Y-%m-%d') <= covered[1]
+    
+    def record(self, ticker, dates, start_date=None, end_date=None):
+        """Add uploaded dates; pass the range once the whole ticker succeeded"""
+        with self._lock:
+            entry = self._entry(ticker)
+            for date_str in dates:
+                days = entry['dates'].setdefault(date_str[:7], [])
+                day = int(date_str[8:10])
+                if day not in days:
+                    days.append(day)
+            if start_date and end_date:
+                entry['covered'] = [start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')]
+    
+    def save(self):
+        if not self.path:
+            return
+        # Saves run on the worker threads: write and replace under the lock, so the file
+        # only moves forward, from a temporary file no other writer touches
+        with self._lock:
+            payload = json.dumps(self._data, separators=(',', ':'), sort_keys=True)
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+
+def rows_to_upload(rows, written, layout):
+    """Rows needed to fill the gaps: missing days, or whole months that have a missing day"""
+    
+    missing = [row for row in rows if row['date'] not in written]
+    if layout != MONTHLY or not missing:
+        return missing
+    months = {row['date'][:7] for row in missing}
+    return [row for row in rows if row['date'][:7] in months]
+
+def backfill_stock_data(ticker, start_date, end_date, bucket_name, layout=MONTHLY, uploader=None,
+                        checkpoint=None, limiter=None, writer=None, provider=None):
+    """Backfill historical data for a ticker; returns a per-ticker result dict"""
     
-    # Stooq API URL
-    url = f"https://stooq.com/q/d/l/?s={ticker}&i=d&f=csv"
+    checkpoint = checkpoint or Checkpoint(None)
+    provider = provider or get_provider('stooq')
+    if checkpoint.covers(ticker, start_date, end_date):
+        return {'status': 'skipped', 'rows': 0, 'puts': 0}
     
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
+        if limiter:
+            limiter.acquire()
+        rows = fetch_rows(ticker, start_date, end_date, provider)
+        pending = rows_to_upload(rows, checkpoint.written(ticker), layout)
         
-        lines = response.text.strip().split('\n')
-        header = lines[0]
+        if uploader is None:
+            with ParallelUploader(bucket_name) as own_uploader:
+                result = _store_rows(ticker, pending, bucket_name, layout, own_uploader, writer)
+        else:
+            result = _store_rows(ticker, pending, bucket_name, layout, uploader, writer)
         
-        # Process each day's data
-        for line in lines[1:]:
-            if not line.strip():
-                continue
-                
-            parts = line.split(',')
-            if len(parts) < 6:
-                continue
-                
-            date_str = parts[0]
-            try:
-                date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-            except ValueError:
-                continue
-                
-            # Skip if outside date range
-            if date_obj < start_date or date_obj > end_date:
-                continue
-                
-            # Skip weekends (optional)
-            if date_obj.weekday() >= 5:
-                continue
-                
-            open_price = float(parts[1]) if parts[1] else 0
-            high_price = float(parts[2]) if parts[2] else 0
-            low_price = float(parts[3]) if parts[3] else 0
-            close_price = float(parts[4]) if parts[4] else 0
-            volume = int(float(parts[5])) if parts[5] else 0
-            
-            # Create CSV content
-            csv_content = f"date,open,high,low,close,volume,adj_close\n"
-            csv_content += f"{date_str},{open_price},{high_price},{low_price},{close_price},{volume},{close_price}\n"
-            
-            # S3 key with partitioning
-            s3_key = f"prices/ticker={ticker}/year={date_obj.year}/month={date_obj.month:02d}/day={date_obj.day:02d}/data.csv"
-            
-            # Upload to S3
-            s3_client.put_object(
-                Bucket=bucket_name,
-                Key=s3_key,
-                Body=csv_content,
-                ContentType='text/csv'
-            )
-            
-            print(f"Uploaded {ticker} data for {date_str}")
-            
-        return True
+        if result['status'] == 'success':
+            checkpoint.record(ticker, [row['date'] for row in pending], start_date, end_date)
+            checkpoint.save()
+            if rows:
+                update_ticker_series(ticker, rows, bucket_name, (uploader or own_uploader).client)
+        return result
         
     except Exception as e:
         print(f"Error backfilling {ticker}: {str(e)}")
-        return False
+        return {'status': 'error', 'error': str(e), 'rows': 0, 'puts': 0}
 
-def main():
+def update_ticker_series(ticker, rows, bucket_name, client):
+    """Merge the rows into the ticker's compact series used by the agent's local engine"""
+    
+    try:
+        update_series(client, bucket_name, ticker, rows)
+    except Exception as e:
+        # The prices objects are stored; the series catches up on the next write
+        print(f"{ticker}: could not update series: {str(e)}")
+
+def _store_rows(ticker, rows, bucket_name, layout, uploader, writer=None):
+    if not rows:
+        print(f"{ticker}: up to date")
+        return {'status': 'success', 'rows': 0, 'puts': 0}
+    
+    futures = write_rows(ticker, rows, uploader, layout, writer)
+    failed = [key for key, future in futures.items() if future.exception() is not None]
+    if failed:
+        print(f"Error backfilling {ticker}: {len(failed)} of {len(futures)} uploads failed")
+        return {'status': 'error', 'error': f"{len(failed)} uploads failed", 'rows': 0, 'puts': len(futures) - len(failed)}
+    
+    removed = 0
+    if layout == MONTHLY:
+        removed = remove_superseded_daily_objects(ticker, rows, uploader.client, bucket_name)
+    
+    print(f"{ticker}: uploaded {len(rows)} rows in {len(futures)} objects"
+          + (f", removed {removed} superseded daily objects" if removed else ""))
+    return {'status': 'success', 'rows': len(rows), 'puts': len(futures), 'partitions': partitions_of_keys(futures)}
+
+def load_tickers(args):
+    """Tickers from --tickers, --tickers-file, the WATCHLIST variable, or the demo default"""
+    
+    if args.tickers:
+        raw = args.tickers
+    elif args.tickers_file:
+        with open(args.tickers_file) as f:
+            raw = [line.split('#', 1)[0] for line in f]
+    elif os.environ.get('WATCHLIST'):
+        raw = os.environ['WATCHLIST'].split(',')
+    else:
+        raw = ['AAPL', 'MSFT', 'AMZN', 'GOOGL', 'TSLA']
+    
+    tickers = []
+    for item in raw:
+        for ticker in item.replace(',', ' ').split():
+            ticker = ticker.strip().upper()
+            if ticker and ticker not in tickers:
+                tickers.append(ticker)
+    return tickers
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Backfill historical prices from Stooq into S3')
+    parser.add_argument('--provider', choices=('stooq', 'mock'), default='stooq',
+                        help='price history source; mock generates synthetic prices offline')
+    parser.add_argument('--tickers', nargs='+', help='ticker symbols (default: --tickers-file or $WATCHLIST)')
+    parser.add_argument('--tickers-file', help='file with one ticker per line (# comments allowed)')
+    parser.add_argument('--start', type=lambda s: datetime.strptime(s, '%Y-%m-%d'), default=datetime(2024, 1, 1))
+    parser.add_argument('--end', type=lambda s: datetime.strptime(s, '%Y-%m-%d'),
+                        default=datetime.combine(datetime.now().date() - timedelta(days=1), datetime.min.time()))
+    parser.add_argument('--bucket', default=os.environ.get('CURATED_BUCKET', 'stox-curated-demo-1234'))
+    parser.add_argument('--layout', choices=LAYOUTS, default=MONTHLY,
+                        help='monthly: one object per ticker and month; daily: legacy one object per trading day')
+    parser.add_argument('--format', choices=FORMATS, default=os.environ.get('PRICES_FORMAT', 'csv'),
+                        help='object format; must match the stox.prices table DDL')
+    parser.add_argument('--jobs', type=int, default=8, help='tickers processed in parallel')
+    parser.add_argument('--workers', type=int, default=16, help='parallel S3 uploads')
+    parser.add_argument('--stooq-per-minute', type=float, default=60, help='provider request rate limit')
+    parser.add_argument('--database', default=os.environ.get('ATHENA_DB', 'stox'), help='Glue database of stox.prices')
+    parser.add_argument('--no-register', action='store_true',
+                        help='skip Glue partition registration (e.g. for a partition-projection table)')
+    parser.add_argument('--no-indicators', action='store_true',
+                        help='do not rebuild stox.indicators from the updated series')
+    parser.add_argument('--checkpoint', default='.backfill-checkpoint.json',
+                        help="checkpoint file of dates already written ('' disables)")
+    return parser.parse_args(argv)
+
+def run_backfill(tickers, start_date, end_date, bucket_name, layout=MONTHLY, jobs=8, workers=16,
+                 checkpoint=None, limiter=None, uploader=None, writer=None, provider=None):
+    """Backfill tickers on a thread pool; returns per-ticker results (with latency_ms), throughput and latency"""
+    
+    checkpoint = checkpoint or Checkpoint(None)
+    # One provider, so its HTTP session and connections are shared by the jobs
+    provider = provider or get_provider('stooq')
+    started = time.perf_counter()
+    with (uploader or ParallelUploader(bucket_name, workers=workers)) as shared_uploader:
+        def timed(ticker):
+            ticker_started = time.perf_counter()
+            result = backfill_stock_data(ticker, start_date, end_date, bucket_name, layout,
+                                         shared_uploader, checkpoint, limiter, writer, provider)
+            result['latency_ms'] = round((time.perf_counter() - ticker_started) * 1000, 2)
+            return result
+        
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            results = dict(zip(tickers, pool.map(timed, tickers)))
+    elapsed = time.perf_counter() - started
+    
+    rows = sum(r['rows'] for r in results.values())
+    puts = sum(r['puts'] for r in results.values())
+    return {
+        'results': results,
+        'partitions': set().union(*(r.get('partitions', set()) for r in results.values())),
+        'rows': rows,
+        'puts': puts,
+        'elapsed_s': round(elapsed, 3),
+        'rows_per_s': round(rows / elapsed, 1) if elapsed else 0.0,
+        'puts_per_s': round(puts / elapsed, 1) if elapsed else 0.0,
+        'latency': summarize_latencies(r['latency_ms'] for r in results.values())
+    }
+
+def main(argv=None):
     """Main backfill function"""
     
-    # Configuration
-    tickers = ['AAPL', 'MSFT', 'AMZN', 'GOOGL', 'TSLA']
-    start_date = datetime(2024, 1, 1)  # Adjust as needed
-    end_date = datetime.now() - timedelta(days=1)
+    args = parse_args(argv)
+    tickers = load_tickers(args)
+    
+    print(f"Backfilling data from {args.start.date()} to {args.end.date()} ({args.provider})")
+    print(f"Tickers: {len(tickers)} ({', '.join(tickers[:10])}{', ...' if len(tickers) > 10 else ''})")
+    print(f"Bucket: {args.bucket} ({args.layout} {args.format} layout, {args.jobs} jobs, {args.workers} upload workers)")
     
-    # Get bucket name from environment or use default
-    bucket_name = os.environ.get('CURATED_BUCKET', 'stox-curated-demo-1234')
+    summary = run_backfill(
+        tickers, args.start, args.end, args.bucket, args.layout, args.jobs, args.workers,
+        checkpoint=Checkpoint(args.checkpoint),
+        limiter=TokenBucket.per_minute(args.stooq_per_minute, burst=args.jobs),
+        writer=get_writer(args.format),
+        provider=get_provider(args.provider)
+    )
     
-    print(f"Backfilling data from {start_date.date()} to {end_date.date()}")
-    print(f"Tickers: {', '.join(tickers)}")
-    print(f"Bucket: {bucket_name}")
+    statuses = [r['status'] for r in summary['results'].values()]
+    success_count = sum(status in ('success', 'skipped') for status in statuses)
+    print(f"\nBackfill complete: {success_count}/{len(tickers)} tickers successful "
+          f"({statuses.count('skipped')} already complete)")
+    print(f"Throughput: {summary['rows']} rows, {summary['puts']} PUTs in {summary['elapsed_s']}s "
+          f"({summary['rows_per_s']} rows/s, {summary['puts_per_s']} PUTs/s)")
     
-    success_count = 0
-    for ticker in tickers:
-        print(f"\nBackfilling {ticker}...")
-        if backfill_stock_data(ticker, start_date, end_date, bucket_name):
-            success_count += 1
-        time.sleep(1)  # Rate limiting
+    if summary['partitions'] and not args.no_register:
+        registered = GlueCatalog(boto3.client('glue'), args.database).register(args.bucket, summary['partitions'])
+        print(f"Partitions: {registered['created']} registered, {registered['existing']} already known "
+              f"({registered['calls']} Glue calls)")
     
-    print(f"\nBackfill complete: {success_count}/{len(tickers)} tickers successful")
+    if summary['puts']:
+        # Cached agent results were computed on the old data
+        write_watermark(boto3.client('s3'), args.bucket, args.end.date().isoformat())
+        if not args.no_indicators:
+            # Backfilled days may precede the incremental state, so replay from the start
+            s3 = boto3.client('s3')
+            built = materialize(s3, args.bucket, series_tickers(s3, args.bucket), rebuild=True)
+            print(f"Indicators: {built['rows']} rows, {built['correlations']} correlations as of {built['as_of']}")
     
     if success_count > 0:
         print("\nNext steps:")
-        print("1. Run MSCK REPAIR TABLE to sync partitions:")
-        print("   aws athena start-query-execution --query-string 'MSCK REPAIR TABLE stox.prices;'")
-        print("2. Test queries in Athena console")
-        print("3. Start daily ingestion with Lambda function")
+        print("1. Test queries in Athena console")
+        print("2. Start daily ingestion with Lambda function")
 
 if __name__ == "__main__":
     main()
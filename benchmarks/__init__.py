@@ -0,0 +1,8 @@
+"""Local performance benchmarks; run from the repo root with `python -m benchmarks.<name>`"""
+
+import os
+import sys
+
+# Same import path the Lambda runtime gets from the stox-common layer
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'layers', 'common', 'python'))
@@ -0,0 +1,127 @@
+"""Athena polling overhead: fixed 2s sleep vs stox_common.athena backoff
+
+    python -m benchmarks.bench_athena_poll --runtimes 0.5 1 3 10 60
+
+Overhead is the time between a query finishing in Athena and the caller
+noticing. For each runtime band, the polling comparison averages --samples
+queries whose runtimes are spread across the band (0.5x to 1.5x). It runs
+on a simulated clock, so it takes no real time. The concurrency run uses real sleeps: it runs --concurrent
+queries of --concurrent-runtime seconds, first one after another with
+the blocking poller and then together with run_queries.
+"""
+
+import argparse
+import json
+import random
+import time
+from unittest.mock import MagicMock
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from stox_common import athena
+
+
+class SimClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def simulated_client(clock, runtime):
+    client = MagicMock()
+    client.get_query_execution.side_effect = lambda QueryExecutionId: {'QueryExecution': {
+        'Status': {'State': 'SUCCEEDED' if clock() >= runtime else 'RUNNING'}
+    }}
+    return client
+
+
+def fixed_poll(client, query_id, sleep):
+    """The loop the Lambdas used before: check, then sleep 2s"""
+    while True:
+        state = client.get_query_execution(QueryExecutionId=query_id)['QueryExecution']['Status']['State']
+        if state == 'SUCCEEDED':
+            return
+        sleep(2)
+
+
+def measure_polling(band, samples):
+    fixed, adaptive = [], []
+    for _ in range(samples):
+        runtime = band * random.uniform(0.5, 1.5)
+
+        clock = SimClock()
+        old = simulated_client(clock, runtime)
+        fixed_poll(old, 'q', clock.sleep)
+        fixed.append((clock.now - runtime, old.get_query_execution.call_count))
+
+        clock = SimClock()
+        new = simulated_client(clock, runtime)
+        athena.wait_for_query(new, 'q', timeout=runtime + 60, clock=clock, sleep=clock.sleep)
+        adaptive.append((clock.now - runtime, new.get_query_execution.call_count))
+
+    def mean(results, i):
+        return round(sum(r[i] for r in results) / len(results), 3)
+
+    return {'runtime_s': band,
+            'fixed_2s': {'overhead_s': mean(fixed, 0), 'polls': mean(fixed, 1)},
+            'adaptive': {'overhead_s': mean(adaptive, 0), 'polls': mean(adaptive, 1)}}
+
+
+def real_client(runtime):
+    started = {}
+    client = MagicMock()
+
+    def start_query_execution(QueryString, **kwargs):
+        started[QueryString] = time.monotonic()
+        return {'QueryExecutionId': QueryString}
+
+    client.start_query_execution.side_effect = start_query_execution
+    client.get_query_execution.side_effect = lambda QueryExecutionId: {'QueryExecution': {
+        'Status': {'State': 'SUCCEEDED' if time.monotonic() - started[QueryExecutionId] >= runtime else 'RUNNING'}
+    }}
+    return client
+
+
+def measure_concurrency(count, runtime):
+    statements = [f'q{i}' for i in range(count)]
+    client = real_client(runtime)
+    started = time.perf_counter()
+    for sql in statements:
+        athena.run_query(client, sql, 'stox', 's3://bench/')
+    sequential = time.perf_counter() - started
+
+    client = real_client(runtime)
+    started = time.perf_counter()
+    athena.run_queries(client, statements, 'stox', 's3://bench/')
+    concurrent = time.perf_counter() - started
+    return {'queries': count, 'runtime_s': runtime,
+            'sequential_s': round(sequential, 3), 'concurrent_s': round(concurrent, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runtimes', type=float, nargs='+', default=[0.5, 1, 3, 10, 60])
+    parser.add_argument('--samples', type=int, default=500)
+    parser.add_argument('--concurrent', type=int, default=5)
+    parser.add_argument('--concurrent-runtime', type=float, default=1.0)
+    args = parser.parse_args()
+
+    polling = [measure_polling(r, args.samples) for r in args.runtimes]
+    print(f"{'~query':>8} {'fixed 2s overhead':>18} {'polls':>6} {'adaptive overhead':>18} {'polls':>6}")
+    for row in polling:
+        print(f"{row['runtime_s']:>7g}s {row['fixed_2s']['overhead_s']:>17.2f}s {row['fixed_2s']['polls']:>6.1f}"
+              f" {row['adaptive']['overhead_s']:>17.2f}s {row['adaptive']['polls']:>6.1f}")
+
+    concurrency = measure_concurrency(args.concurrent, args.concurrent_runtime)
+    print(f"{concurrency['queries']} x {concurrency['runtime_s']:g}s queries: "
+          f"sequential {concurrency['sequential_s']:.2f}s, run_queries {concurrency['concurrent_s']:.2f}s")
+    print(json.dumps({'polling': polling, 'concurrency': concurrency}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Reading Athena results: GetQueryResults pages vs the S3 CSV output
+
+    python -m benchmarks.bench_athena_results --rows 100000 --rtt 0.05
+
+Uses a stand-in Athena client that builds each GetQueryResults page when
+it is requested, the way boto3 parses one response at a time. The S3 mode
+reads the same result from an in-memory CSV. --rtt is added to every API
+call. Peak memory is measured with tracemalloc and covers only the
+allocations made while reading.
+"""
+
+import argparse
+import io
+import json
+import time
+import tracemalloc
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from stox_common import athena
+
+COLUMN_INFO = [
+    {'Name': 'ticker', 'Type': 'varchar'},
+    {'Name': 'date', 'Type': 'date'},
+    {'Name': 'close', 'Type': 'double'},
+    {'Name': 'volume', 'Type': 'bigint'},
+]
+
+
+def cells(i):
+    return ['AAPL', f'20{10 + i // 365 % 15:02d}-{i % 12 + 1:02d}-{i % 28 + 1:02d}', f'{100 + i % 997 / 7:.4f}', str(1000000 + i)]
+
+
+class FakeResults:
+
+    def __init__(self, rows, rtt):
+        self.rows = rows
+        self.rtt = rtt
+        self.calls = 0
+
+    def get_query_results(self, QueryExecutionId, MaxResults=1000, NextToken=None):
+        self.calls += 1
+        time.sleep(self.rtt)
+        start = int(NextToken or 0)
+        data = [{'Data': [{'VarCharValue': c['Name']} for c in COLUMN_INFO]}] if start == 0 else []
+        end = min(self.rows, start + MaxResults - len(data))
+        data += [{'Data': [{'VarCharValue': v} for v in cells(i)]} for i in range(start, end)]
+        page = {'ResultSet': {'ResultSetMetadata': {'ColumnInfo': COLUMN_INFO}, 'Rows': data}}
+        if end < self.rows:
+            page['NextToken'] = str(end)
+        return page
+
+
+class FakeS3:
+
+    def __init__(self, body, rtt):
+        self.body = body
+        self.rtt = rtt
+        self.calls = 0
+
+    def get_object(self, Bucket, Key):
+        self.calls += 1
+        time.sleep(self.rtt)
+        return {'Body': io.BytesIO(self.body)}
+
+
+def csv_body(rows):
+    out = io.StringIO()
+    out.write(','.join(f'"{c["Name"]}"' for c in COLUMN_INFO) + '\n')
+    for i in range(rows):
+        out.write(','.join(f'"{v}"' for v in cells(i)) + '\n')
+    return out.getvalue().encode()
+
+
+def single_call(client):
+    """The reader the agent had: one call, string cells, nested lists"""
+    response = client.get_query_results(QueryExecutionId='q')
+    return [[f.get('VarCharValue') for f in row['Data']] for row in response['ResultSet']['Rows'][1:]]
+
+
+def measure(name, fn, calls_of):
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {'mode': name, 'rows': len(rows), 'api_calls': calls_of(),
+              'elapsed_s': round(elapsed, 3), 'peak_mb': round(peak / 1e6, 1)}
+    print(f"{name:<34} {result['rows']:>7} rows {result['api_calls']:>4} calls "
+          f"{result['elapsed_s']:>7.2f}s {result['peak_mb']:>7.1f} MB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--rtt', type=float, default=0.05)
+    args = parser.parse_args()
+
+    body = csv_body(args.rows)
+    execution = {'ResultConfiguration': {'OutputLocation': 's3://results/q.csv'}}
+    report = []
+
+    client = FakeResults(args.rows, args.rtt)
+    report.append(measure('single call (old, truncates)', lambda: single_call(client), lambda: client.calls))
+
+    client = FakeResults(args.rows, args.rtt)
+    report.append(measure('paginated, all rows', lambda: list(athena.stream_results(client, 'q')[1]),
+                          lambda: client.calls))
+
+    client = FakeResults(args.rows, args.rtt)
+    report.append(measure('paginated, first 51 rows', lambda: list(athena.stream_results(client, 'q', limit=51)[1]),
+                          lambda: client.calls))
+
+    s3 = FakeS3(body, args.rtt)
+    report.append(measure('S3 CSV, all rows', lambda: list(athena.stream_csv_results(s3, execution, COLUMN_INFO)),
+                          lambda: s3.calls))
+
+    s3 = FakeS3(body, args.rtt)
+    report.append(measure('S3 CSV, first 51 rows',
+                          lambda: list(athena.stream_csv_results(s3, execution, COLUMN_INFO, limit=51)),
+                          lambda: s3.calls))
+
+    print(json.dumps({'rows': args.rows, 'rtt_s': args.rtt, 'runs': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Scan charges under bursty dashboard traffic: reuse and in-flight coalescing
+
+    python -m benchmarks.bench_athena_reuse --requests 200 --distinct 8
+
+A burst of --requests dashboard queries, drawn from --distinct statements,
+arrives over --burst seconds on --threads workers, which play the part of
+Lambda request concurrency. A stand-in Athena runs every query for
+--runtime seconds and scans --scan-mb. With result reuse it skips the
+scan when an identical query finished within the max age. The benchmark
+counts scans for three setups: plain run_query, run_query with result
+reuse, and athena.execute, which adds coalescing.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from stox_common import athena
+
+
+class FakeAthena:
+
+    def __init__(self, runtime, scan_bytes):
+        self.runtime = runtime
+        self.scan_bytes = scan_bytes
+        self.queries = {}
+        self.finished = {}  # sql -> finish time of the last real scan
+        self.scans = 0
+        self._lock = threading.Lock()
+
+    def start_query_execution(self, QueryString, QueryExecutionContext, ResultConfiguration,
+                              ResultReuseConfiguration=None):
+        now = time.monotonic()
+        with self._lock:
+            query_id = f'q{len(self.queries)}'
+            max_age = (ResultReuseConfiguration or {}).get('ResultReuseByAgeConfiguration', {}).get('MaxAgeInMinutes', 0)
+            done = self.finished.get(QueryString)
+            reused = bool(max_age) and done is not None and done <= now and now - done <= max_age * 60
+            if not reused:
+                self.scans += 1
+                self.finished[QueryString] = now + self.runtime
+            self.queries[query_id] = (now + (0.05 if reused else self.runtime), reused)
+        return {'QueryExecutionId': query_id}
+
+    def get_query_execution(self, QueryExecutionId):
+        ready_at, reused = self.queries[QueryExecutionId]
+        state = 'SUCCEEDED' if time.monotonic() >= ready_at else 'RUNNING'
+        return {'QueryExecution': {'Status': {'State': state}, 'Statistics': {
+            'DataScannedInBytes': 0 if reused else self.scan_bytes,
+            'ResultReuseInformation': {'ReusedPreviousResult': reused}
+        }}}
+
+    def stop_query_execution(self, QueryExecutionId):
+        pass
+
+
+def burst(args, statements, arrivals, call):
+    started = time.monotonic()
+
+    def request(i):
+        delay = arrivals[i] - (time.monotonic() - started)
+        if delay > 0:
+            time.sleep(delay)
+        return call(statements[i])
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        return list(pool.map(request, range(len(statements))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--distinct', type=int, default=8)
+    parser.add_argument('--burst', type=float, default=3.0)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--runtime', type=float, default=1.0)
+    parser.add_argument('--scan-mb', type=float, default=250.0)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    pool = [f"SELECT * FROM stox.v_sma WHERE ticker = 'T{i}'" for i in range(args.distinct)]
+    statements = [rng.choice(pool) for _ in range(args.requests)]
+    arrivals = sorted(rng.uniform(0, args.burst) for _ in range(args.requests))
+    scan_bytes = int(args.scan_mb * 1e6)
+
+    setups = {
+        'fresh execution every time': lambda client: lambda sql: (
+            athena.run_query(client, sql, 'stox', 's3://bench/'), athena.EXECUTED),
+        'result reuse': lambda client: lambda sql: (
+            athena.run_query(client, sql, 'stox', 's3://bench/', reuse_minutes=60), None),
+        'result reuse + coalescing': lambda client: lambda sql: athena.execute(
+            client, sql, 'stox', 's3://bench/', reuse_minutes=60),
+    }
+    report = []
+    for name, make in setups.items():
+        client = FakeAthena(args.runtime, scan_bytes)
+        started = time.perf_counter()
+        outcomes = burst(args, statements, arrivals, make(client))
+        elapsed = time.perf_counter() - started
+        sources = {}
+        for execution, source in outcomes:
+            source = source or (athena.REUSED if athena.was_reused(execution) else athena.EXECUTED)
+            sources[source] = sources.get(source, 0) + 1
+        row = {'setup': name, 'scans': client.scans, 'scanned_gb': round(client.scans * scan_bytes / 1e9, 2),
+               'sources': sources, 'elapsed_s': round(elapsed, 2)}
+        report.append(row)
+        print(f"{name:<28} scans={row['scans']:>4}  scanned={row['scanned_gb']:>6.2f} GB  {sources}")
+
+    print(json.dumps({'requests': args.requests, 'distinct': args.distinct, 'runs': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
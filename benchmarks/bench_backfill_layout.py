@@ -0,0 +1,73 @@
+"""S3 requests and elapsed time of backfill writes, per-day vs monthly objects (moto S3)
+
+    python -m benchmarks.bench_backfill_layout --tickers 5 --years 2 --rtt 0.02
+"""
+
+import argparse
+import json
+import time
+from datetime import date, datetime
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+import boto3
+from botocore.config import Config
+from moto import mock_aws
+
+import backfill
+from benchmarks.fakes import RequestCounter, stooq_csv
+from stox_common.providers import parse_price_csv
+from stox_common.s3io import ParallelUploader
+
+BUCKET = 'bench-bucket'
+
+
+def run(tickers, start, end, layout, workers, rtt):
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1', config=Config(max_pool_connections=max(workers, 10)))
+        client.create_bucket(Bucket=BUCKET)
+        counter = RequestCounter(client, rtt=rtt)
+        rows = {t: parse_price_csv(stooq_csv(t, start.date(), end.date()).splitlines(), start, end) for t in tickers}
+
+        started = time.perf_counter()
+        with ParallelUploader(BUCKET, workers=workers, client=client) as uploader:
+            for ticker in tickers:
+                backfill._store_rows(ticker, rows[ticker], BUCKET, layout, uploader)
+        elapsed = time.perf_counter() - started
+        requests_made = counter.total
+
+        objects = sum(1 for _ in client.get_paginator('list_objects_v2').paginate(Bucket=BUCKET)
+                      for _ in _.get('Contents', []))
+        return {
+            'layout': layout,
+            'workers': workers,
+            'rows': sum(len(r) for r in rows.values()),
+            'objects': objects,
+            'requests': requests_made,
+            'put_requests': counter.calls.get('PutObject', 0),
+            'elapsed_s': round(elapsed, 3),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=5)
+    parser.add_argument('--years', type=int, default=2)
+    parser.add_argument('--rtt', type=float, default=0.02, help='simulated seconds per S3 request')
+    parser.add_argument('--workers', type=int, default=16)
+    args = parser.parse_args()
+
+    tickers = [f'T{i:03d}' for i in range(args.tickers)]
+    end = datetime(2024, 12, 31)
+    start = datetime(end.year - args.years + 1, 1, 1)
+
+    report = []
+    for layout, workers in (('daily', 1), ('daily', args.workers), ('monthly', args.workers)):
+        result = run(tickers, start, end, layout, workers, args.rtt)
+        report.append(result)
+        print(f"{layout:>8} workers={workers:>3}  objects={result['objects']:>6}  "
+              f"requests={result['requests']:>6}  elapsed={result['elapsed_s']:>7.2f}s")
+    print(json.dumps({'tickers': args.tickers, 'years': args.years, 'rtt_s': args.rtt, 'runs': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Wall time of a dashboard's questions: one /chat call per question vs a single /chat/batch call
+
+    python -m benchmarks.bench_batch --questions 50 --bedrock-ms 200 --athena-ms 300
+
+Both runs answer the same questions, drawn with repeats from a few
+question patterns over a set of tickers, against FakeBedrock and
+FakeAthena. The pipeline cache is off (CACHE_TTL_SECONDS=0), so the
+sequential run pays every Bedrock and Athena call. The batch run
+generates SQL for each distinct question concurrently, runs each
+distinct statement once and summarizes concurrently. The fake Bedrock
+writes the SQL for the ticker in the question, so every ticker is its own
+statement.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import time
+from unittest.mock import patch
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from benchmarks.fakes import FakeAthena, FakeBedrock
+from lambdas.stox_agent import lambda_function as agent
+
+TICKERS = ['AAPL', 'MSFT', 'AMZN', 'GOOGL', 'TSLA', 'NVDA', 'META', 'NFLX']
+PATTERNS = [
+    'Show me {} price trend for last 60 days',
+    '{} closing prices this month',
+    'Daily closes of {} since January',
+]
+
+
+def ticker_sql(question):
+    """The fake model's SQL: the closes of the ticker named in the question"""
+    ticker = next((t for t in TICKERS if t in question), 'AAPL')
+    return f"SELECT date, close FROM stox.prices WHERE ticker='{ticker}' ORDER BY date LIMIT 200"
+
+
+def dashboard(n, seed=7):
+    rng = random.Random(seed)
+    return [rng.choice(PATTERNS).format(rng.choice(TICKERS)) for _ in range(n)]
+
+
+def sequential(questions):
+    started = time.perf_counter()
+    for question in questions:
+        result = agent.lambda_handler({'body': json.dumps({'question': question})}, {})
+        assert result['statusCode'] == 200, result['body']
+    return time.perf_counter() - started, None
+
+
+def batch(questions):
+    started = time.perf_counter()
+    result = agent.lambda_handler({'path': '/chat/batch', 'body': json.dumps({'questions': questions})}, {})
+    assert result['statusCode'] == 200, result['body']
+    body = json.loads(result['body'])
+    assert not body['stats']['errors'], body['results']
+    return time.perf_counter() - started, {k: v for k, v in body['stats'].items() if k != 'cache'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--bedrock-ms', type=float, default=200)
+    parser.add_argument('--athena-ms', type=float, default=300)
+    parser.add_argument('--concurrency', type=int, default=8, help='BATCH_CONCURRENCY')
+    parser.add_argument('--query-concurrency', type=int, default=5, help='BATCH_QUERY_CONCURRENCY')
+    args = parser.parse_args()
+
+    questions = dashboard(args.questions)
+    env = {
+        'ATHENA_DB': 'stox', 'ATHENA_OUTPUT': 's3://bench-results/', 'BEDROCK_REGION': 'us-east-1',
+        'CACHE_STORE': 'none', 'CACHE_TTL_SECONDS': '0', 'ATHENA_REUSE_MAX_AGE_MINUTES': '0',
+        'LOCAL_ENGINE': 'off', 'AWS_DEFAULT_REGION': 'us-east-1', 'METRICS': 'off',
+        'BATCH_CONCURRENCY': str(args.concurrency), 'BATCH_QUERY_CONCURRENCY': str(args.query_concurrency),
+    }
+    report = {}
+    for name, run in (('sequential', sequential), ('batch', batch)):
+        bedrock = FakeBedrock(args.bedrock_ms / 1000, sigma=0.1, sql=ticker_sql)
+        athena_client = FakeAthena(args.athena_ms / 1000, sigma=0.1)
+        agent._cache = None
+        with patch.dict(os.environ, env), contextlib.redirect_stdout(io.StringIO()), \
+                patch.object(agent, 'get_bedrock_client', return_value=bedrock), \
+                patch.object(agent, 'get_athena_client', return_value=athena_client):
+            wall, stats = run(questions)
+        report[name] = {'wall_s': round(wall, 3), 'bedrock_calls': bedrock.calls,
+                        'athena_queries': athena_client.started, **({'stats': stats} if stats else {})}
+    agent._cache = None
+
+    print(f"{'run':<11} {'wall s':>8} {'bedrock calls':>14} {'athena queries':>15}")
+    for name, result in report.items():
+        print(f"{name:<11} {result['wall_s']:>8.2f} {result['bedrock_calls']:>14} {result['athena_queries']:>15}")
+    print(f"speedup: {report['sequential']['wall_s'] / report['batch']['wall_s']:.1f}x")
+    print(json.dumps({'questions': len(questions), 'distinct': len(set(questions)), 'runs': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
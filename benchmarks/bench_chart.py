@@ -0,0 +1,66 @@
+"""Payload size and shaping time of a time-series answer: row-major rows vs the LTTB chart
+
+    python -m benchmarks.bench_chart --years 5 --points 200
+
+One ticker's daily closes over `--years` years, typed as the agent holds
+them after reading Athena (ISO dates, floats). The table compares the JSON
+bytes of every row, of the first 50 rows the response used to carry (the
+head of the series only), and of the column-major chart, and how long
+`stox_common.charts.shape` takes. `max_abs_err` is the largest gap
+between the series and the chart's line interpolated at each day, as a
+share of the series' range.
+"""
+
+import argparse
+import json
+import time
+from datetime import date
+
+import numpy as np
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from benchmarks.synthetic import history
+from stox_common.charts import shape
+from stox_common.providers import synthetic_rows
+from stox_common.stats import summarize_latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--points', type=int, default=200)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    start, end = history(args.years, date(2025, 12, 31))
+    rows = [[r['date'], r['close']] for r in synthetic_rows('GOOGL', start, end)]
+    columns, types = ['date', 'close'], ['date', 'double']
+
+    latencies = []
+    for _ in range(args.iterations):
+        started = time.perf_counter()
+        chart = shape(columns, rows, args.points, types=types)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    days = np.array(rows, dtype=object)[:, 0].astype('datetime64[D]').astype(np.int64)
+    closes = np.array([r[1] for r in rows])
+    chart_days = np.array(chart['data'][0], dtype='datetime64[D]').astype(np.int64)
+    error = np.abs(np.interp(days, chart_days, chart['data'][1]) - closes).max() / np.ptp(closes)
+
+    payloads = {
+        'all rows': len(json.dumps({'columns': columns, 'rows': rows})),
+        'first 50 rows': len(json.dumps({'columns': columns, 'rows': rows[:50]})),
+        'chart': len(json.dumps(chart)),
+    }
+    print(f"{'payload':<14} {'bytes':>9}")
+    for name, size in payloads.items():
+        print(f"{name:<14} {size:>9,}")
+    timing = summarize_latencies(latencies)
+    print(f"shape: {len(rows)} -> {chart['points']} points, p50 {timing['p50_ms']:.2f} ms, "
+          f"max_abs_err {error:.1%} of range")
+    print(json.dumps({'rows': len(rows), 'points': chart['points'], 'payload_bytes': payloads,
+                      'shape': timing, 'max_abs_err': round(float(error), 4)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Cold start of the three Lambdas: import time, heaviest imports, client setup and first invoke
+
+    python -m benchmarks.bench_coldstart --runs 5
+
+Each run starts a fresh interpreter with `python -X importtime`, which
+corresponds to a new execution environment. It imports the handler module
+the way the Lambda runtime does (`lambda_function` from the function's
+directory, stox_common from the layer path). The run reports:
+
+- import_ms: wall time of `import lambda_function`, plus the heaviest
+  direct imports from -X importtime (cumulative, so boto3 includes
+  botocore);
+- clients: time of the first `clients.get` per service (boto3 import and
+  service model loading) and of a repeated call, which is what a warm
+  request pays now instead of a fresh client;
+- first_invoke_ms / second_invoke_ms (stox-agent only): one question
+  through the Bedrock + Athena path against zero-latency FakeBedrock and
+  FakeAthena with caching off, so only the handler's own work counts.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNCTIONS = {
+    'stox-agent': ('stox_agent', ('bedrock-runtime', 'athena', 's3')),
+    'stox-ingest': ('stox_ingest', ('s3', 'glue')),
+    'stox-maint': ('stox_maint', ('athena', 's3', 'glue')),
+}
+ENV = {
+    'AWS_DEFAULT_REGION': 'us-east-1', 'AWS_ACCESS_KEY_ID': 'bench', 'AWS_SECRET_ACCESS_KEY': 'bench',
+    'ATHENA_DB': 'stox', 'ATHENA_OUTPUT': 's3://bench-results/', 'BEDROCK_REGION': 'us-east-1',
+    'CACHE_STORE': 'none', 'CACHE_TTL_SECONDS': '0', 'LOCAL_ENGINE': 'off', 'METRICS': 'off',
+}
+
+
+def probe(function):
+    """Runs in the child interpreter; prints one JSON report"""
+    directory, services = FUNCTIONS[function]
+    sys.path[:0] = [os.path.join(ROOT, 'lambdas', directory), os.path.join(ROOT, 'layers', 'common', 'python')]
+    started = time.perf_counter()
+    import lambda_function
+    report = {'import_ms': (time.perf_counter() - started) * 1000}
+
+    if function == 'stox-agent':
+        sys.path.insert(0, ROOT)
+        from benchmarks.fakes import FakeAthena, FakeBedrock
+        lambda_function.get_bedrock_client = lambda: FakeBedrock(0, sigma=0)
+        lambda_function.get_athena_client = lambda: FakeAthena(0, sigma=0)
+        for name in ('first_invoke_ms', 'second_invoke_ms'):
+            started = time.perf_counter()
+            result = lambda_function.lambda_handler(
+                {'body': json.dumps({'question': 'Show me AAPL price trend for last 60 days'})}, {}
+            )
+            assert result['statusCode'] == 200, result['body']
+            report[name] = (time.perf_counter() - started) * 1000
+
+    from stox_common import clients
+    report['clients'] = {}
+    for service in services:
+        started = time.perf_counter()
+        clients.get(service)
+        first = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        clients.get(service)
+        report['clients'][service] = {'first_ms': first, 'cached_ms': (time.perf_counter() - started) * 1000}
+    print(json.dumps(report))
+
+
+def heaviest_imports(importtime, module='lambda_function', top=6):
+    """Direct imports of `module` by cumulative microseconds, from -X importtime output"""
+    entries = []
+    for line in importtime.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, name.strip(), int(cumulative)))
+    index = max(i for i, (_, name, _) in enumerate(entries) if name == module)
+    depth = entries[index][0]
+    children = []
+    for child_depth, name, cumulative in reversed(entries[:index]):
+        if child_depth <= depth:
+            break
+        if child_depth == depth + 1:
+            children.append((name, round(cumulative / 1000, 1)))
+    return dict(sorted(children, key=lambda c: -c[1])[:top])
+
+
+def run(function):
+    env = {**os.environ, **ENV}
+    env.pop('LOG_LEVEL', None)
+    child = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'benchmarks.bench_coldstart', '--probe', function],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    report = json.loads(child.stdout.strip().splitlines()[-1])
+    report['heaviest_imports_ms'] = heaviest_imports(child.stderr)
+    return report
+
+
+def median(values):
+    ordered = sorted(values)
+    return round(ordered[len(ordered) // 2], 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--probe', choices=sorted(FUNCTIONS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.probe:
+        probe(args.probe)
+        return
+
+    report = {}
+    for function in FUNCTIONS:
+        runs = [run(function) for _ in range(args.runs)]
+        summary = {key: median(r[key] for r in runs) for key in runs[0]
+                   if key.endswith('_ms') and key != 'heaviest_imports_ms'}
+        summary['clients'] = {
+            service: {k: median(r['clients'][service][k] for r in runs) for k in ('first_ms', 'cached_ms')}
+            for service in runs[0]['clients']
+        }
+        summary['heaviest_imports_ms'] = runs[-1]['heaviest_imports_ms']
+        report[function] = summary
+
+    print(f"{'function':<12} {'import ms':>10} {'1st invoke':>11} {'2nd invoke':>11}  first client ms")
+    for function, summary in report.items():
+        first_clients = ', '.join(f"{s} {c['first_ms']:.0f}" for s, c in summary['clients'].items())
+        invokes = ' '.join(f"{summary[k]:>11.1f}" if k in summary else f"{'-':>11}"
+                           for k in ('first_invoke_ms', 'second_invoke_ms'))
+        print(f"{function:<12} {summary['import_ms']:>10.1f} {invokes}  {first_clients}")
+    print(json.dumps({'runs': args.runs, 'functions': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
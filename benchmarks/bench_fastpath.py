@@ -0,0 +1,107 @@
+"""Agent latency: local NumPy fast path vs the Bedrock + Athena path
+
+    python -m benchmarks.bench_fastpath --iterations 200 --full-iterations 24
+
+Runs stox-agent's lambda_handler on the web UI's preset questions. The
+fast path reads real per-ticker series from moto S3: --tickers tickers
+with --years of history, either cold (series cache cleared before every
+request) or warm. The full path uses FakeBedrock and FakeAthena with
+log-normal latencies (--bedrock-ms, --athena-ms) and runs with caching
+disabled. It therefore measures the real polling, result reading and
+prompt handling on top of the simulated service time.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import boto3
+from moto import mock_aws
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from benchmarks.fakes import FakeAthena, FakeBedrock, price_rows
+from lambdas.stox_agent import lambda_function as agent
+from stox_common.series import dumps, from_rows, series_key
+from stox_common.stats import summarize_latencies
+
+BUCKET = 'bench-curated'
+QUESTIONS = [
+    '7-day SMA of {0} for last 30 days',
+    'Best performer YTD on my watchlist',
+    'Max drawdown of {1} YTD',
+    'Show me {2} price trend for last 60 days',
+    '20-day volatility of {0} for last 90 days',
+]
+
+
+def ask(question):
+    started = time.perf_counter()
+    result = agent.lambda_handler({'body': json.dumps({'question': question})}, {})
+    elapsed = (time.perf_counter() - started) * 1000
+    body = json.loads(result['body'])
+    assert result['statusCode'] == 200, body
+    return elapsed, body.get('engine')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--full-iterations', type=int, default=24)
+    parser.add_argument('--tickers', type=int, default=5)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--bedrock-ms', type=float, default=600)
+    parser.add_argument('--athena-ms', type=float, default=1500)
+    args = parser.parse_args()
+
+    tickers = [f'T{i:02d}' for i in range(args.tickers)]
+    questions = [q.format(*(tickers * 3)) for q in QUESTIONS]
+    end = date.today()
+    env = {
+        'CURATED_BUCKET': BUCKET, 'WATCHLIST': ','.join(tickers), 'ATHENA_DB': 'stox',
+        'ATHENA_OUTPUT': 's3://bench-results/', 'BEDROCK_REGION': 'us-east-1',
+        'CACHE_STORE': 'none', 'CACHE_TTL_SECONDS': '0', 'ATHENA_REUSE_MAX_AGE_MINUTES': '0',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+    }
+    report = {}
+    # The handler's DEBUG logging would drown the report
+    with mock_aws(), patch.dict(os.environ, env), contextlib.redirect_stdout(io.StringIO()):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket=BUCKET)
+        for ticker in tickers:
+            rows = price_rows(ticker, end - timedelta(days=365 * args.years), end)
+            s3.put_object(Bucket=BUCKET, Key=series_key(ticker), Body=dumps(from_rows(rows)))
+
+        with patch.object(agent, 'get_s3_client', return_value=s3):
+            for mode in ('cold', 'warm'):
+                latencies = []
+                for i in range(args.iterations):
+                    if mode == 'cold':
+                        agent._series_cache.clear()
+                    elapsed, engine = ask(questions[i % len(questions)])
+                    assert engine == 'local'
+                    latencies.append(elapsed)
+                report[f'fast path ({mode} series)'] = summarize_latencies(latencies)
+
+            bedrock = FakeBedrock(args.bedrock_ms / 1000)
+            athena_client = FakeAthena(args.athena_ms / 1000)
+            with patch.dict(os.environ, {'LOCAL_ENGINE': 'off'}), \
+                    patch.object(agent, 'get_bedrock_client', return_value=bedrock), \
+                    patch.object(agent, 'get_athena_client', return_value=athena_client):
+                with ThreadPoolExecutor(max_workers=8) as pool:
+                    outcomes = list(pool.map(ask, (questions[i % len(questions)] for i in range(args.full_iterations))))
+                report['full path (Bedrock + Athena)'] = summarize_latencies(e for e, _ in outcomes)
+
+    print(f"{'path':<32} {'n':>5} {'p50 ms':>10} {'p95 ms':>10}")
+    for name, stats in report.items():
+        print(f"{name:<32} {stats['count']:>5} {stats['p50_ms']:>10.2f} {stats['p95_ms']:>10.2f}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
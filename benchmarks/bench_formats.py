@@ -0,0 +1,132 @@
+"""Bytes scanned and latency of the v_sma / v_drawdown views on CSV vs Parquet (DuckDB)
+
+    python -m benchmarks.bench_formats --tickers 50 --years 5
+
+Each dataset mirrors the S3 layout of stox.prices in a temp directory. Bytes
+scanned are estimated the way Athena bills them: whole objects for CSV,
+only the referenced column chunks for Parquet.
+"""
+
+import argparse
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import date
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+import duckdb
+
+from benchmarks.fakes import price_rows
+from stox_common.layout import DAILY, MONTHLY, group_rows
+from stox_common.stats import summarize_latencies
+from stox_common.writers import CsvWriter, ParquetWriter
+
+VIEWS_SQL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sql', 'views.sql')
+VIEWS = ('v_sma', 'v_drawdown')
+
+QUERIES = {
+    'v_sma one ticker, 90 days': "SELECT date, close, sma_7, sma_20 FROM stox.v_sma "
+                                 "WHERE ticker = 'T000' AND date >= DATE '{recent}' ORDER BY date",
+    'v_drawdown all tickers': "SELECT ticker, MIN(max_drawdown) FROM stox.v_drawdown GROUP BY ticker",
+}
+# Columns each query needs from stox.prices (partition columns cost nothing)
+QUERY_COLUMNS = {'v_sma one ticker, 90 days': ('date', 'close'), 'v_drawdown all tickers': ('date', 'close')}
+
+
+def view_statements(names):
+    """CREATE VIEW statements from sql/views.sql, limited to `names`"""
+    with open(VIEWS_SQL) as f:
+        statements = [s.strip() for s in f.read().split(';') if s.strip()]
+    picked = []
+    for statement in statements:
+        match = re.search(r'VIEW\s+stox\.(\w+)', statement)
+        if match and match.group(1) in names:
+            picked.append(statement)
+    return picked
+
+
+def write_dataset(root, tickers, start, end, writer, layout):
+    for ticker in tickers:
+        for key, rows in group_rows(ticker, price_rows(ticker, start, end), layout, writer.filename).items():
+            path = os.path.join(root, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            body = writer.serialize(rows)
+            with open(path, 'wb') as f:
+                f.write(body.encode() if isinstance(body, str) else body)
+
+
+def connect(root, fmt):
+    con = duckdb.connect()
+    con.execute('CREATE SCHEMA stox')
+    pattern = os.path.join(root, 'prices', '**', f'*.{fmt}')
+    if fmt == 'csv':
+        source = (f"read_csv('{pattern}', header = true, hive_partitioning = true, "
+                  "columns = {'date': 'DATE', 'open': 'DOUBLE', 'high': 'DOUBLE', 'low': 'DOUBLE', "
+                  "'close': 'DOUBLE', 'volume': 'BIGINT', 'adj_close': 'DOUBLE'})")
+    else:
+        source = f"read_parquet('{pattern}', hive_partitioning = true)"
+    con.execute(f'CREATE VIEW stox.prices AS SELECT * FROM {source}')
+    for statement in view_statements(VIEWS):
+        con.execute(statement)
+    return con
+
+
+def bytes_scanned(con, root, fmt, columns, ticker=None):
+    prefix = os.path.join(root, 'prices', f'ticker={ticker}' if ticker else '')
+    files = [os.path.join(d, f) for d, _, fs in os.walk(prefix) for f in fs if f.endswith(fmt)]
+    if fmt == 'csv':
+        return sum(os.path.getsize(f) for f in files)
+    names = ', '.join(f"'{c}'" for c in columns)
+    return con.execute(
+        f"SELECT SUM(total_compressed_size) FROM parquet_metadata({files!r}) WHERE path_in_schema IN ({names})"
+    ).fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=50)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tickers = [f'T{i:03d}' for i in range(args.tickers)]
+    end = date(2024, 12, 31)
+    start = date(end.year - args.years + 1, 1, 1)
+    recent = date(2024, 10, 1).isoformat()
+
+    datasets = [
+        ('csv, daily objects', CsvWriter(), DAILY),
+        ('csv, monthly objects', CsvWriter(), MONTHLY),
+        ('parquet snappy (pyarrow), monthly', ParquetWriter(use_pyarrow=True), MONTHLY),
+        ('parquet gzip (pure python), monthly', ParquetWriter(use_pyarrow=False), MONTHLY),
+    ]
+    report = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, writer, layout in datasets:
+            root = os.path.join(tmp, re.sub(r'\W+', '_', label))
+            started = time.perf_counter()
+            write_dataset(root, tickers, start, end, writer, layout)
+            write_s = time.perf_counter() - started
+            con = connect(root, writer.format)
+            for name, sql in QUERIES.items():
+                sql = sql.format(recent=recent)
+                con.execute(sql).fetchall()  # warm-up
+                timings = []
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    con.execute(sql).fetchall()
+                    timings.append((time.perf_counter() - t0) * 1000)
+                scanned = bytes_scanned(con, root, writer.format, QUERY_COLUMNS[name],
+                                        'T000' if 'one ticker' in name else None)
+                result = {'dataset': label, 'query': name, 'write_s': round(write_s, 2),
+                          'bytes_scanned': scanned, 'latency': summarize_latencies(timings)}
+                report.append(result)
+                print(f"{label:<38} {name:<28} scanned={scanned / 1e6:>8.2f} MB  "
+                      f"p50={result['latency']['p50_ms']:>8.1f} ms")
+    print(json.dumps({'tickers': args.tickers, 'years': args.years, 'runs': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Indicator questions: full-history windows over stox.prices vs the materialized tables (DuckDB)
+
+    python -m benchmarks.bench_indicators --tickers 50 --years 5
+
+Builds stox.indicators and stox.correlations with stox_common.indicators
+on moto S3. It times the one-off replay and the daily incremental run
+that ingest does. Then it runs the same three questions in DuckDB: once
+as window functions over every stox.prices row (v_sma, v_drawdown, and
+the v_corr self-join), and once as filters on the materialized tables.
+Bytes scanned are whole CSV objects read, as Athena bills them.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+import boto3
+import duckdb
+from moto import mock_aws
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from benchmarks.bench_formats import view_statements, write_dataset
+from benchmarks.fakes import price_rows
+from stox_common.indicators import (CORRELATION_COLUMNS, CORRELATIONS_PREFIX, INDICATOR_COLUMNS, INDICATORS_PREFIX,
+                                    materialize)
+from stox_common.layout import COLUMNS, MONTHLY
+from stox_common.s3io import list_keys
+from stox_common.series import update_series
+from stox_common.stats import summarize_latencies
+from stox_common.writers import CsvWriter
+
+BUCKET = 'bench-curated'
+
+# v_corr as written cannot run (window function in WHERE); this is its single-pass equivalent
+CORR_FROM_PRICES = """
+WITH r AS (
+    SELECT ticker, date, close / LAG(close) OVER (PARTITION BY ticker ORDER BY date) - 1 AS daily_return
+    FROM stox.prices
+), pairs AS (
+    SELECT a.ticker AS ticker_a, b.ticker AS ticker_b, a.date, a.daily_return AS r1, b.daily_return AS r2
+    FROM r a JOIN r b ON a.date = b.date AND a.ticker < b.ticker
+    WHERE a.daily_return IS NOT NULL AND b.daily_return IS NOT NULL
+), c AS (
+    SELECT ticker_a, ticker_b, date,
+           CORR(r1, r2) OVER (PARTITION BY ticker_a, ticker_b ORDER BY date
+                              ROWS BETWEEN 59 PRECEDING AND CURRENT ROW) AS corr_60
+    FROM pairs
+)
+SELECT ticker_a, ticker_b, corr_60 FROM c WHERE date = (SELECT MAX(date) FROM stox.prices)
+"""
+
+QUESTIONS = {
+    'sma one ticker, 90 days': (
+        "SELECT date, close, sma_7, sma_20 FROM stox.v_sma WHERE ticker = 'T000' "
+        "AND date >= DATE '{recent}' ORDER BY date",
+        "SELECT date, close, sma_7, sma_20 FROM stox.indicators WHERE ticker = 'T000' "
+        "AND date >= DATE '{recent}' AND year = 2024 AND month >= 9 ORDER BY date",
+    ),
+    'max drawdown, all tickers': (
+        "SELECT ticker, MIN(max_drawdown) FROM stox.v_drawdown GROUP BY ticker",
+        "SELECT ticker, max_by(max_drawdown, date) FROM stox.indicators GROUP BY ticker",
+    ),
+    'latest corr_60, all pairs': (
+        CORR_FROM_PRICES,
+        "SELECT ticker_a, ticker_b, corr_60 FROM stox.correlations WHERE year = 2024 AND month = 12 "
+        "AND date = (SELECT MAX(date) FROM stox.correlations WHERE year = 2024 AND month = 12)",
+    ),
+}
+# Prefixes each variant reads after partition pruning, for the bytes-scanned estimate
+SCANS = {'sma one ticker, 90 days': (['prices/ticker=T000'],
+                                     [f'{INDICATORS_PREFIX}/year=2024/month={m:02d}' for m in (9, 10, 11, 12)]),
+         'max drawdown, all tickers': (['prices'], [INDICATORS_PREFIX]),
+         'latest corr_60, all pairs': (['prices'], [f'{CORRELATIONS_PREFIX}/year=2024/month=12'])}
+
+
+def export(s3, root, prefix):
+    for key in list_keys(s3, BUCKET, f"{prefix}/"):
+        path = os.path.join(root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(s3.get_object(Bucket=BUCKET, Key=key)['Body'].read())
+
+
+def duckdb_columns(names, types):
+    """read_csv `columns` argument; with auto_detect off, DuckDB skips sniffing every file"""
+    return '{' + ', '.join(f"'{name}': '{types.get(name, 'DOUBLE')}'" for name in names) + '}'
+
+
+TABLE_COLUMNS = {
+    'prices': duckdb_columns(COLUMNS, {'date': 'DATE', 'volume': 'BIGINT'}),
+    INDICATORS_PREFIX: duckdb_columns(INDICATOR_COLUMNS, {'ticker': 'VARCHAR', 'date': 'DATE'}),
+    CORRELATIONS_PREFIX: duckdb_columns(CORRELATION_COLUMNS, {'date': 'DATE', 'ticker_a': 'VARCHAR',
+                                                              'ticker_b': 'VARCHAR', 'observations': 'INTEGER'}),
+}
+
+
+def connect(root):
+    con = duckdb.connect()
+    con.execute('CREATE SCHEMA stox')
+    for table, columns in TABLE_COLUMNS.items():
+        pattern = os.path.join(root, table, '**', '*.csv')
+        con.execute(f"CREATE VIEW stox.{table} AS SELECT * FROM read_csv('{pattern}', header = true, "
+                    f"auto_detect = false, columns = {columns}, hive_partitioning = true, "
+                    "hive_types = {'year': INTEGER, 'month': INTEGER})")
+    for statement in view_statements(('v_sma', 'v_drawdown')):
+        con.execute(statement)
+    return con
+
+
+def scanned(root, prefixes):
+    return sum(os.path.getsize(os.path.join(d, f))
+               for prefix in prefixes for d, _, fs in os.walk(os.path.join(root, prefix)) for f in fs)
+
+
+def timed(con, sql, repeat):
+    con.execute(sql).fetchall()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        con.execute(sql).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarize_latencies(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=50)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tickers = [f'T{i:03d}' for i in range(args.tickers)]
+    end = date(2024, 12, 31)
+    start = date(end.year - args.years + 1, 1, 1)
+    history = {t: price_rows(t, start, end) for t in tickers}
+    report = {'tickers': args.tickers, 'years': args.years}
+
+    with mock_aws(), tempfile.TemporaryDirectory() as root:
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket=BUCKET)
+        for ticker, rows in history.items():
+            update_series(s3, BUCKET, ticker, rows[:-1])
+
+        started = time.perf_counter()
+        replay = materialize(s3, BUCKET, tickers, rebuild=True)
+        report['replay_s'] = round(time.perf_counter() - started, 3)
+
+        for ticker, rows in history.items():
+            update_series(s3, BUCKET, ticker, rows[-1:])
+        started = time.perf_counter()
+        daily = materialize(s3, BUCKET, tickers)
+        report['daily_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        print(f"replay: {replay['rows']} rows in {report['replay_s']}s; "
+              f"daily run: {daily['rows']} rows + {daily['correlations']} pairs in {report['daily_ms']} ms")
+
+        write_dataset(root, tickers, start, end, CsvWriter(), MONTHLY)
+        export(s3, root, INDICATORS_PREFIX)
+        export(s3, root, CORRELATIONS_PREFIX)
+        con = connect(root)
+        recent = (end - timedelta(days=90)).isoformat()
+
+        report['questions'] = []
+        print(f"{'question':<28} {'source':<14} {'scanned MB':>11} {'p50 ms':>9}")
+        for name, variants in QUESTIONS.items():
+            for source, sql, prefixes in zip(('prices views', 'materialized'), variants, SCANS[name]):
+                result = {'question': name, 'source': source, 'bytes_scanned': scanned(root, prefixes),
+                          'latency': timed(con, sql.format(recent=recent), args.repeat)}
+                report['questions'].append(result)
+                print(f"{name:<28} {source:<14} {result['bytes_scanned'] / 1e6:>11.2f} "
+                      f"{result['latency']['p50_ms']:>9.1f}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
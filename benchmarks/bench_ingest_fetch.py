@@ -0,0 +1,78 @@
+"""Requests and wall-clock time of the stox_ingest watchlist fetch, per-symbol vs batched providers
+
+    python -m benchmarks.bench_ingest_fetch --tickers 500 --latency 0.1
+
+alphavantage downloads one symbol per request from a fake Alpha Vantage.
+stooq-quotes asks a fake Stooq for the latest bar of up to 100 symbols per
+request. Both go over local HTTP and through the streamed CSV parsing.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from benchmarks.fakes import CountingS3, FakeAlphaVantage, FakeStooq
+from lambdas.stox_ingest import lambda_function as ingest
+from stox_common.providers import get_provider
+from stox_common.ratelimit import TokenBucket
+from stox_common.stats import summarize_latencies
+
+
+def run(provider_name, tickers, concurrency, calls_per_minute):
+    provider = get_provider(provider_name, session=ingest.get_http_session(), api_key='bench-key')
+    limiter = TokenBucket.per_minute(calls_per_minute, burst=min(concurrency, calls_per_minute))
+    started = time.perf_counter()
+    results = ingest.ingest_watchlist(tickers, provider, 'bench-bucket', limiter, concurrency)
+    wall = time.perf_counter() - started
+    statuses = {}
+    for r in results.values():
+        statuses[r['status']] = statuses.get(r['status'], 0) + 1
+    attempts = {r['batch']: r['attempts'] for r in results.values()}
+    return {
+        'provider': provider_name,
+        'concurrency': concurrency,
+        'requests': provider.requests,
+        'wall_s': round(wall, 3),
+        'tickers_per_s': round(len(tickers) / wall, 1),
+        'statuses': statuses,
+        'retries': sum(a - 1 for a in attempts.values()),
+        'latency': summarize_latencies(r['latency_ms'] for r in results.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.1, help='fake server latency per request (s)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--providers', nargs='+', choices=('alphavantage', 'stooq-quotes'),
+                        default=['alphavantage', 'stooq-quotes'])
+    parser.add_argument('--calls-per-minute', type=float, default=30000)
+    parser.add_argument('--throttle-every', type=int, default=0,
+                        help='return the rate-limit Note on every n-th Alpha Vantage request')
+    args = parser.parse_args()
+
+    tickers = [f'T{i:04d}' for i in range(args.tickers)]
+    ingest.s3_client = CountingS3()
+    os.environ.setdefault('RATE_LIMIT_BACKOFF_SECONDS', '0.05')
+    os.environ['INDICATORS'] = 'off'
+
+    report = []
+    with FakeAlphaVantage(latency=args.latency, throttle_every=args.throttle_every) as alphavantage, \
+            FakeStooq(latency=args.latency) as stooq:
+        os.environ['ALPHAVANTAGE_URL'] = alphavantage.url
+        os.environ['STOOQ_QUOTES_URL'] = f'{stooq.base_url}/q/l/'
+        for provider_name in args.providers:
+            for concurrency in args.concurrency:
+                result = run(provider_name, tickers, concurrency, args.calls_per_minute)
+                report.append(result)
+                print(f"{provider_name:<13} concurrency={concurrency:>3}  requests={result['requests']:>5}  "
+                      f"wall={result['wall_s']:>8.2f}s  p50={result['latency'].get('p50_ms', 0):>8.1f}ms  "
+                      f"p95={result['latency'].get('p95_ms', 0):>8.1f}ms  retries={result['retries']}")
+    print(json.dumps({'tickers': args.tickers, 'latency_s': args.latency, 'runs': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
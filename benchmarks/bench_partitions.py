@@ -0,0 +1,90 @@
+"""Partition discovery: MSCK REPAIR style full scan vs targeted Glue registration
+
+    python -m benchmarks.bench_partitions --partitions 10000 --daily-tickers 500
+
+The full scan is what MSCK REPAIR TABLE does: list every object under
+prices/, look up the partitions in the catalog and add the missing ones.
+Its cost grows with the history. Targeted registration only sends the
+partitions a writer just touched. Both run against stubbed S3 and Glue
+clients with a fixed latency per API call.
+"""
+
+import argparse
+import json
+import time
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from benchmarks.fakes import FakeGlue, FakeS3Listing
+from stox_common.partitions import GlueCatalog, partitions_of_keys
+
+BUCKET = 'bench'
+
+
+def history_keys(partitions, objects_per_partition):
+    tickers = max(1, partitions // 120)
+    keys = []
+    for t in range(tickers):
+        for m in range(partitions // tickers):
+            year, month = 2015 + m // 12, m % 12 + 1
+            for day in range(1, objects_per_partition + 1):
+                keys.append(f'prices/ticker=T{t:04d}/year={year}/month={month:02d}/day={day:02d}/data.csv')
+    return keys
+
+
+def full_scan_repair(s3, catalog):
+    """List everything, then add whatever the catalog does not know yet"""
+    keys = (obj['Key'] for page in s3.get_paginator('list_objects_v2').paginate(Bucket=BUCKET, Prefix='prices/')
+            for obj in page['Contents'])
+    found = sorted(partitions_of_keys(keys))
+    known = catalog.get_partitions(found)
+    return catalog.register(BUCKET, [p for p in found if p not in known])
+
+
+def timed(label, fn, glue, s3=None):
+    glue.calls.clear()
+    pages_before = s3.pages if s3 else 0
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    calls = glue.total_calls + ((s3.pages - pages_before) if s3 else 0)
+    print(f"{label:<52} {elapsed:>8.2f}s  api_calls={calls:>5}  created={result['created']}")
+    return {'scenario': label, 'elapsed_s': round(elapsed, 3), 'api_calls': calls, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--partitions', type=int, default=10000)
+    parser.add_argument('--objects-per-partition', type=int, default=20)
+    parser.add_argument('--daily-tickers', type=int, default=500)
+    parser.add_argument('--glue-latency', type=float, default=0.05)
+    parser.add_argument('--list-latency', type=float, default=0.03)
+    args = parser.parse_args()
+
+    keys = history_keys(args.partitions, args.objects_per_partition)
+    all_partitions = sorted(partitions_of_keys(keys))
+    daily = [(f'T{t:04d}', '2030', '01') for t in range(args.daily_tickers)]
+    report = []
+
+    # Initial load: every partition is new
+    glue = FakeGlue(args.glue_latency)
+    s3 = FakeS3Listing(keys, args.list_latency)
+    report.append(timed(f'full scan, {len(all_partitions)} new partitions',
+                        lambda: full_scan_repair(s3, GlueCatalog(glue, 'stox')), glue, s3))
+    glue = FakeGlue(args.glue_latency)
+    report.append(timed(f'targeted, {len(all_partitions)} new partitions',
+                        lambda: GlueCatalog(glue, 'stox').register(BUCKET, all_partitions), glue))
+
+    # Steady state: history registered, one day of ingest adds a new month for every ticker
+    s3 = FakeS3Listing(keys + [f'prices/ticker={t}/year={y}/month={m}/day=02/data.csv' for t, y, m in daily],
+                       args.list_latency)
+    report.append(timed(f'full scan, {len(daily)} new of {len(all_partitions) + len(daily)}',
+                        lambda: full_scan_repair(s3, GlueCatalog(glue, 'stox')), glue, s3))
+    glue.partitions = {k: v for k, v in glue.partitions.items() if k[1] != '2030'}
+    report.append(timed(f'targeted, {len(daily)} partitions written by ingest',
+                        lambda: GlueCatalog(glue, 'stox').register(BUCKET, daily), glue))
+
+    print(json.dumps({'partitions': args.partitions, 'objects': len(keys), 'runs': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Input tokens and SQL-generation latency: the old full prompt vs selected examples and a cached prefix
+
+    python -m benchmarks.bench_prompt --iterations 60 --per-1k-input 0.2
+
+`full` sends what generate_sql used to send: the schema, the rules and
+every library example in one user message. `assembled` is the current
+generate_sql: the schema and rules as a cached system prefix plus the
+FEW_SHOT_EXAMPLES nearest examples. Both run against FakeBedrock. Its
+latency is a fixed part plus `--per-1k-input` seconds per 1,000 input
+tokens not read from the prompt cache. Token counts are characters / 4,
+so they are comparable between the two, not exact. The report also gives
+the time spent selecting examples.
+"""
+
+import argparse
+import json
+import os
+import time
+from unittest.mock import patch
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from benchmarks.fakes import FakeBedrock
+from lambdas.stox_agent import lambda_function as agent
+from stox_common import bedrock, prompts
+from stox_common.stats import summarize_latencies
+
+QUESTIONS = [
+    'Show me AAPL price trend for last 60 days',
+    'Compare AAPL vs MSFT performance',
+    "What's the volatility of AMZN?",
+    'Max drawdown of NVDA this year',
+    'Which stocks correlate with TSLA?',
+    'Average volume of GOOGL last month',
+    'GOOGL trend over 5 years',
+    'Worst day for each stock this year',
+    '20-day moving average of META',
+    'Highest close of NFLX since January',
+]
+
+
+def full_prompt(question):
+    examples = prompts.user_message(question, prompts.EXAMPLES)
+    return f"{prompts.SYSTEM}\n\n{examples}"
+
+
+def run(variant, client, iterations):
+    latencies, usages = [], []
+    for i in range(iterations):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        details = {}
+        started = time.perf_counter()
+        if variant == 'full':
+            bedrock.invoke(client, full_prompt(question), max_tokens=500, purpose='sql', details=details)
+        else:
+            agent.generate_sql(question, details=details)
+        latencies.append((time.perf_counter() - started) * 1000)
+        usages.append(details)
+    return {
+        'latency': summarize_latencies(latencies),
+        **{f'mean_{field}': round(sum(u[field] for u in usages) / len(usages), 1) for field in bedrock.USAGE_FIELDS},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=60)
+    parser.add_argument('--latency', type=float, default=0.3, help='fixed part of a call (s)')
+    parser.add_argument('--per-1k-input', type=float, default=0.2, help='seconds per 1,000 uncached input tokens')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    for i in range(10000):
+        prompts.sql_prompt(QUESTIONS[i % len(QUESTIONS)])
+    selection_us = (time.perf_counter() - started) / 10000 * 1e6
+
+    report = {}
+    env = {'BEDROCK_PROMPT_CACHE': 'on', 'METRICS': 'off'}
+    for variant in ('full', 'assembled'):
+        client = FakeBedrock(args.latency, sigma=0.1, per_1k_input=args.per_1k_input)
+        with patch.dict(os.environ, env), patch.object(agent, 'get_bedrock_client', return_value=client):
+            report[variant] = run(variant, client, args.iterations)
+
+    print(f"{'variant':<10} {'input tok':>10} {'cache read':>11} {'output tok':>11} {'p50 ms':>9} {'p95 ms':>9}")
+    for variant, result in report.items():
+        print(f"{variant:<10} {result['mean_input_tokens']:>10.0f} {result['mean_cache_read_input_tokens']:>11.0f} "
+              f"{result['mean_output_tokens']:>11.0f} {result['latency']['p50_ms']:>9.1f} "
+              f"{result['latency']['p95_ms']:>9.1f}")
+    print(f"example selection: {selection_us:.1f} us per prompt")
+    print(json.dumps({'iterations': args.iterations, 'selection_us': round(selection_us, 2), 'variants': report},
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Generated SQL before and after the partition-pruning rewrite (DuckDB)
+
+    python -m benchmarks.bench_rewrite --tickers 200 --years 5
+
+Writes a synthetic stox.prices as year/month-partitioned Parquet ending
+today (see bench_views), so `current_date` bounds select recent data and
+DuckDB skips partitions from year/month predicates the way Athena skips
+S3 prefixes. Each query is written the way the model writes it. The
+benchmark runs it as generated and as rewritten by stox_common.sqlrewrite,
+checks that both return the same rows, and reports the partitions the
+rewrite estimates as pruned, the partition files read and the latency. It
+also reports the time the rewrite itself takes.
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from datetime import date
+
+import duckdb
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from benchmarks.bench_views import generate
+from stox_common.sqlrewrite import rewrite
+from stox_common.stats import summarize_latencies
+
+QUERIES = {
+    'one ticker, last 30 days':
+        "SELECT date, close FROM stox.prices WHERE ticker = 'T0001' "
+        "AND date >= current_date - interval '30' day ORDER BY date",
+    'best performer YTD':
+        "WITH r AS (SELECT ticker, close / LAG(close) OVER (PARTITION BY ticker ORDER BY date) - 1 AS daily_return "
+        "FROM stox.prices WHERE date >= date_trunc('year', current_date)) "
+        "SELECT ticker, SUM(daily_return) AS ytd_return FROM r GROUP BY ticker ORDER BY ytd_return DESC LIMIT 1",
+    'two tickers, last quarter':
+        "SELECT ticker, avg(close) FROM stox.prices WHERE ticker IN ('T0001', 'T0002') "
+        "AND date BETWEEN date_trunc('quarter', current_date) - interval '3' month "
+        "AND date_trunc('quarter', current_date) GROUP BY ticker",
+}
+
+
+def timed(con, sql, repeat):
+    rows = con.execute(sql).fetchall()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        con.execute(sql).fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(rows), summarize_latencies(timings)
+
+
+def files_read(con, sql):
+    """Parquet files the query reads after DuckDB's partition pruning"""
+    plan = '\n'.join(row[1] for row in con.execute(f"EXPLAIN ANALYZE {sql}").fetchall())
+    marker = 'Total Files Read:'
+    return sum(int(line.split(marker)[1].strip(' │')) for line in plan.splitlines() if marker in line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=200)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    today = date.today()
+    start = date(today.year - args.years + 1, 1, 1)
+    con = duckdb.connect()
+    report = {'tickers': args.tickers, 'years': args.years, 'queries': []}
+
+    with tempfile.TemporaryDirectory() as root:
+        generate(con, root, args.tickers, start, today, seed=0.42)
+        print(f"{'query':<28} {'variant':<10} {'est. pruned':>12} {'files read':>11} {'p50 ms':>9}")
+        for name, sql in QUERIES.items():
+            started = time.perf_counter()
+            for _ in range(100):
+                result = rewrite(sql, today=today, history_start=start, tickers=args.tickers)
+            rewrite_us = (time.perf_counter() - started) / 100 * 1e6
+            baseline, generated_latency = timed(con, sql, args.repeat)
+            rows, rewritten_latency = timed(con, result['sql'], args.repeat)
+            assert rows == baseline, f"{name}: rewritten query returns different rows"
+            entry = {'query': name, 'rewrite_us': round(rewrite_us, 1),
+                     'partitions_pruned': result['partitions_pruned'],
+                     'generated': {'files_read': files_read(con, sql), 'latency': generated_latency},
+                     'rewritten': {'files_read': files_read(con, result['sql']), 'latency': rewritten_latency}}
+            report['queries'].append(entry)
+            for variant in ('generated', 'rewritten'):
+                pruned = entry['partitions_pruned'] if variant == 'rewritten' else 0
+                print(f"{name:<28} {variant:<10} {pruned:>12} {entry[variant]['files_read']:>11} "
+                      f"{entry[variant]['latency']['p50_ms']:>9.1f}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Per-stage latency of stox-agent from its telemetry spans, and the cost of debug logging
+
+    python -m benchmarks.bench_stages --iterations 20
+
+Runs the Bedrock + Athena path of stox-agent against FakeBedrock and
+FakeAthena with METRICS=file. It then reads the spans back with
+`telemetry.load` and reports p50/p95 per stage (llm_sql, athena,
+llm_summary, total). A second run answers one question repeatedly from
+the in-memory cache, where the handler's own overhead dominates, with
+LOG_LEVEL=info and LOG_LEVEL=debug.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from benchmarks.fakes import FakeAthena, FakeBedrock
+from lambdas.stox_agent import lambda_function as agent
+from stox_common import telemetry
+from stox_common.stats import summarize_latencies
+
+QUESTIONS = [
+    'Show me AAPL price trend for last 60 days',
+    'Compare AAPL vs MSFT performance',
+    "What's the volatility of AMZN?",
+]
+
+
+def ask(question):
+    started = time.perf_counter()
+    result = agent.lambda_handler({'body': json.dumps({'question': question})}, {})
+    assert result['statusCode'] == 200, result['body']
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--cached-iterations', type=int, default=2000)
+    parser.add_argument('--bedrock-ms', type=float, default=900)
+    parser.add_argument('--athena-ms', type=float, default=1500)
+    args = parser.parse_args()
+
+    metrics_file = os.path.join(tempfile.mkdtemp(), 'metrics.jsonl')
+    env = {
+        'ATHENA_DB': 'stox', 'ATHENA_OUTPUT': 's3://bench-results/', 'BEDROCK_REGION': 'us-east-1',
+        'CACHE_STORE': 'none', 'ATHENA_REUSE_MAX_AGE_MINUTES': '0', 'LOCAL_ENGINE': 'off',
+        'AWS_DEFAULT_REGION': 'us-east-1', 'METRICS': 'file', 'METRICS_FILE': metrics_file,
+    }
+    bedrock = FakeBedrock(args.bedrock_ms / 1000, sigma=0.1)
+    athena_client = FakeAthena(args.athena_ms / 1000, sigma=0.1)
+    overhead = {}
+    # stdout is swallowed so that debug logging costs what writing it costs, not terminal time
+    with patch.dict(os.environ, env), contextlib.redirect_stdout(io.StringIO()), \
+            patch.object(agent, 'get_bedrock_client', return_value=bedrock), \
+            patch.object(agent, 'get_athena_client', return_value=athena_client):
+        with patch.dict(os.environ, {'CACHE_TTL_SECONDS': '0'}):
+            for i in range(args.iterations):
+                ask(QUESTIONS[i % len(QUESTIONS)])
+        records = telemetry.load(metrics_file)
+
+        agent._cache = None
+        # Results are only cached under a data watermark
+        with patch.dict(os.environ, {'CACHE_TTL_SECONDS': '3600', 'METRICS': 'off'}), \
+                patch.object(agent, 'current_watermark', return_value='2025-01-02'):
+            ask(QUESTIONS[0])
+            for level in ('info', 'debug'):
+                with patch.dict(os.environ, {'LOG_LEVEL': level}):
+                    overhead[level] = summarize_latencies(ask(QUESTIONS[0]) for _ in range(args.cached_iterations))
+        agent._cache = None
+
+    stages = {name: summarize_latencies(values) for name, values in telemetry.span_durations(records).items()}
+    print(f"{'stage':<14} {'n':>5} {'p50 ms':>10} {'p95 ms':>10}")
+    for name, stats in stages.items():
+        print(f"{name:<14} {stats['count']:>5} {stats['p50_ms']:>10.1f} {stats['p95_ms']:>10.1f}")
+    for level, stats in overhead.items():
+        print(f"cached answer, LOG_LEVEL={level:<6} p50 {stats['p50_ms']:.3f} ms  p95 {stats['p95_ms']:.3f} ms")
+    print(json.dumps({'stages': stages, 'cached_handler': overhead}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
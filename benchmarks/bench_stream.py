@@ -0,0 +1,105 @@
+"""Time to first byte and perceived latency: buffered /chat vs the streaming endpoint
+
+    python -m benchmarks.bench_stream --iterations 20
+
+Runs the Bedrock + Athena path of stox-agent against FakeBedrock and
+FakeAthena (caching off) in two ways:
+
+- buffered: lambda_handler returns one JSON body, so the first byte and
+  the answer arrive together when the summary is done;
+- streamed: stream_server.py over HTTP with chunked server-sent events.
+  The benchmark timestamps the first byte, the SQL, the rows, the first
+  summary words and the end of the stream.
+"""
+
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from benchmarks.fakes import FakeAthena, FakeBedrock
+from lambdas.stox_agent import lambda_function as agent
+from lambdas.stox_agent.stream_server import make_server
+from stox_common import sse
+from stox_common.stats import summarize_latencies
+
+QUESTION = 'Show me AAPL price trend for last 60 days'
+SUMMARY = ('AAPL rose about 6% over the last 60 trading days, from $171.20 to $181.55, with a dip in '
+           'mid-February that recovered within a week. Daily moves stayed mostly within 2%. '
+           'Chart: x-axis date, y-axis close, one series for AAPL.')
+
+
+def buffered():
+    started = time.perf_counter()
+    result = agent.lambda_handler({'body': json.dumps({'question': QUESTION})}, {})
+    assert result['statusCode'] == 200, result['body']
+    total = (time.perf_counter() - started) * 1000
+    return {'first_byte': total, 'sql': total, 'rows': total, 'first_summary': total, 'done': total}
+
+
+def streamed(port):
+    marks = {}
+    started = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('POST', '/chat', body=json.dumps({'question': QUESTION}),
+                 headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    text = ''
+    while True:
+        data = response.read1(65536)
+        if not data:
+            break
+        now = (time.perf_counter() - started) * 1000
+        marks.setdefault('first_byte', now)
+        text += data.decode()
+        for event, _ in sse.decode(text):
+            key = 'first_summary' if event == 'summary' else event
+            marks.setdefault(key, now)
+    conn.close()
+    assert 'error' not in marks and 'done' in marks, text
+    return marks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--bedrock-ms', type=float, default=900)
+    parser.add_argument('--athena-ms', type=float, default=1500)
+    args = parser.parse_args()
+
+    env = {
+        'ATHENA_DB': 'stox', 'ATHENA_OUTPUT': 's3://bench-results/', 'BEDROCK_REGION': 'us-east-1',
+        'CACHE_STORE': 'none', 'CACHE_TTL_SECONDS': '0', 'ATHENA_REUSE_MAX_AGE_MINUTES': '0',
+        'LOCAL_ENGINE': 'off', 'AWS_DEFAULT_REGION': 'us-east-1',
+    }
+    bedrock = FakeBedrock(args.bedrock_ms / 1000, sigma=0.1, summary=SUMMARY)
+    athena_client = FakeAthena(args.athena_ms / 1000, sigma=0.1)
+    server = make_server(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    marks = {'buffered': [], 'streamed': []}
+    # The handler's DEBUG logging would drown the report
+    with patch.dict(os.environ, env), contextlib.redirect_stdout(io.StringIO()), \
+            patch.object(agent, 'get_bedrock_client', return_value=bedrock), \
+            patch.object(agent, 'get_athena_client', return_value=athena_client):
+        for _ in range(args.iterations):
+            marks['buffered'].append(buffered())
+            marks['streamed'].append(streamed(server.server_address[1]))
+    server.shutdown()
+
+    report = {mode: {stage: summarize_latencies(m[stage] for m in runs) for stage in runs[0]}
+              for mode, runs in marks.items()}
+    stages = ('first_byte', 'sql', 'rows', 'first_summary', 'done')
+    print(f"{'mode':<10} " + ' '.join(f"{s + ' p50':>18}" for s in stages))
+    for mode, stats in report.items():
+        print(f"{mode:<10} " + ' '.join(f"{stats[s]['p50_ms']:>18.0f}" for s in stages))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""Correctness and runtime of the stox views and their date-range versions (DuckDB)
+
+    python -m benchmarks.bench_views --tickers 500 --years 10
+
+Generates a synthetic stox.prices (a random walk per ticker on weekdays)
+in DuckDB and writes it as Parquet partitioned by year/month, so
+partition filters prune files the way they prune S3 prefixes in Athena.
+Then it:
+
+- creates every view in sql/views.sql (they must all be valid SQL);
+- checks v_returns against NumPy, and returns_sql / corr_sql against the
+  views on the same dates;
+- checks correlation_60d of a few pairs against NumPy;
+- times full-history views vs the date-range queries.
+
+The full-history v_corr self-joins every ticker pair, so it is timed on
+the first --corr-tickers tickers only.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from datetime import date, timedelta
+
+import duckdb
+import numpy as np
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from stox_common.stats import summarize_latencies
+from stox_common.views import corr_sql, lookback_days, partition_filter, returns_sql
+
+VIEWS_SQL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sql', 'views.sql')
+
+
+def view_statements():
+    with open(VIEWS_SQL) as f:
+        return [s.strip() for s in f.read().split(';') if re.search(r'CREATE\s+OR\s+REPLACE\s+VIEW', s)]
+
+
+def generate(con, root, tickers, start, end, seed):
+    """Random-walk closes for every ticker and weekday, written as year/month-partitioned Parquet"""
+    con.execute(f"SELECT setseed({seed})")
+    con.execute(f"""
+        CREATE TABLE generated AS
+        WITH days AS (
+            SELECT CAST(d AS DATE) AS date
+            FROM generate_series(DATE '{start}', DATE '{end}', INTERVAL 1 DAY) t(d)
+            WHERE dayofweek(d) BETWEEN 1 AND 5
+        ), tickers AS (
+            SELECT 'T' || lpad(CAST(i AS VARCHAR), 4, '0') AS ticker, 20 + random() * 480 AS base
+            FROM range({tickers}) r(i)
+        ), steps AS (
+            SELECT ticker, base, date, ln(1 + 0.02 * (random() + random() + random() - 1.5)) AS step
+            FROM tickers CROSS JOIN days
+        )
+        SELECT ticker, date,
+            round(base * exp(SUM(step) OVER (PARTITION BY ticker ORDER BY date)), 4) AS close,
+            year(date) AS year, month(date) AS month
+        FROM steps
+    """)
+    con.execute(f"COPY generated TO '{root}' (FORMAT parquet, PARTITION_BY (year, month))")
+    con.execute("DROP TABLE generated")
+    con.execute("CREATE SCHEMA stox")
+    con.execute(f"CREATE VIEW stox.prices AS SELECT * FROM read_parquet('{root}/**/*.parquet', "
+                "hive_partitioning = true, hive_types = {'year': INTEGER, 'month': INTEGER})")
+    for statement in view_statements():
+        con.execute(statement)
+
+
+def timed(con, sql, repeat):
+    timings, rows = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = con.execute(f"SELECT COUNT(*) FROM ({sql})").fetchone()[0]
+        timings.append((time.perf_counter() - started) * 1000)
+    return rows, summarize_latencies(timings)
+
+
+def assert_same(con, left, right, keys, value):
+    """Both queries return the same keys and (within float tolerance) the same values"""
+    diff = con.execute(f"""
+        SELECT COUNT(*) FILTER (WHERE l.{keys[0]} IS NULL OR r.{keys[0]} IS NULL),
+               COALESCE(MAX(abs(l.{value} - r.{value})), 0)
+        FROM ({left}) l FULL OUTER JOIN ({right}) r USING ({', '.join(keys)})
+    """).fetchone()
+    assert diff[0] == 0 and diff[1] < 1e-9, f"results differ: {diff}"
+
+
+def check(con, tickers, corr_tickers, range_start, end):
+    """Raise AssertionError on the first mismatch"""
+    # v_returns against NumPy for a few tickers
+    for ticker in random.Random(0).sample(tickers, 3):
+        closes = np.array([c for c, in con.execute(
+            f"SELECT close FROM stox.prices WHERE ticker = '{ticker}' ORDER BY date").fetchall()])
+        returns = np.array([r for r, in con.execute(
+            f"SELECT daily_return FROM stox.v_returns WHERE ticker = '{ticker}' ORDER BY date").fetchall()])
+        assert np.allclose(returns, closes[1:] / closes[:-1] - 1)
+
+    assert_same(con, returns_sql(range_start, end),
+                f"SELECT * FROM stox.v_returns WHERE date BETWEEN DATE '{range_start}' AND DATE '{end}'",
+                ('ticker', 'date'), 'daily_return')
+
+    subset = ', '.join(f"'{t}'" for t in corr_tickers)
+    assert_same(con, corr_sql(range_start, end, corr_tickers),
+                f"SELECT * FROM stox.v_corr WHERE ticker1 IN ({subset}) AND ticker2 IN ({subset}) "
+                f"AND date BETWEEN DATE '{range_start}' AND DATE '{end}'",
+                ('ticker1', 'ticker2', 'date'), 'correlation_60d')
+
+    # correlation_60d on the last day against NumPy
+    a, b = corr_tickers[:2]
+    series = [np.array([r for r, in con.execute(
+        f"SELECT daily_return FROM stox.v_returns WHERE ticker = '{t}' ORDER BY date").fetchall()])[-60:]
+        for t in (a, b)]
+    value, = con.execute(f"SELECT correlation_60d FROM ({corr_sql(end, end, [a, b])})").fetchone()
+    assert abs(value - np.corrcoef(*series)[0, 1]) < 1e-9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--range-days', type=int, default=30, help='date range of the ranged queries')
+    parser.add_argument('--corr-tickers', type=int, default=50, help='tickers in the full-history v_corr run')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    end = date(2024, 12, 31)
+    start = date(end.year - args.years + 1, 1, 1)
+    range_start = end - timedelta(days=args.range_days)
+    con = duckdb.connect()
+    report = {'tickers': args.tickers, 'years': args.years, 'range_days': args.range_days}
+
+    with tempfile.TemporaryDirectory() as root:
+        started = time.perf_counter()
+        generate(con, root, args.tickers, start, end, seed=0.42)
+        report['rows'] = con.execute("SELECT COUNT(*) FROM stox.prices").fetchone()[0]
+        report['generate_s'] = round(time.perf_counter() - started, 2)
+
+        tickers = [t for t, in con.execute("SELECT DISTINCT ticker FROM stox.prices ORDER BY 1").fetchall()]
+        corr_tickers = tickers[:args.corr_tickers]
+        subset = ', '.join(f"'{t}'" for t in corr_tickers)
+
+        started = time.perf_counter()
+        check(con, tickers, corr_tickers, range_start, end)
+        report['checks'] = 'passed'
+        report['check_s'] = round(time.perf_counter() - started, 2)
+
+        def months(lookback=None):
+            """year/month partitions a query reads"""
+            where = 'TRUE' if lookback is None else \
+                partition_filter(range_start - timedelta(days=lookback_days(lookback)), end)
+            return con.execute(f"SELECT COUNT(DISTINCT (year, month)) FROM stox.prices WHERE {where}").fetchone()[0]
+
+        queries = {
+            'v_returns, full history': ("SELECT * FROM stox.v_returns", months()),
+            f'returns_sql, last {args.range_days} days': (returns_sql(range_start, end), months(1)),
+            f'v_corr, full history, {len(corr_tickers)} tickers':
+                (f"SELECT * FROM stox.v_corr WHERE ticker1 IN ({subset}) AND ticker2 IN ({subset})", months()),
+            f'corr_sql, last {args.range_days} days, {len(corr_tickers)} tickers':
+                (corr_sql(range_start, end, corr_tickers), months(60)),
+            f'corr_sql, last {args.range_days} days, all tickers': (corr_sql(range_start, end), months(60)),
+        }
+        report['queries'] = []
+        print(f"{report['rows']} price rows generated in {report['generate_s']}s; checks passed "
+              f"in {report['check_s']}s")
+        print(f"{'query':<46} {'months read':>12} {'rows':>10} {'p50 ms':>10}")
+        for name, (sql, partitions) in queries.items():
+            rows, latency = timed(con, sql, args.repeat)
+            report['queries'].append({'query': name, 'partitions': partitions, 'rows': rows, 'latency': latency})
+            print(f"{name:<46} {partitions:>12} {rows:>10} {latency['p50_ms']:>10.1f}")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
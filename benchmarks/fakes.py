@@ -0,0 +1,436 @@
+"""In-process stand-ins for the external services the benchmarks talk to"""
+
+import io
+import json
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+
+def daily_series(symbol: str, days: int = 100, end: Optional[date] = None) -> Dict[str, Dict[str, str]]:
+    """Deterministic Alpha Vantage style 'Time Series (Daily)' payload"""
+    rng = random.Random(symbol)
+    end = end or date.today()
+    price = rng.uniform(20, 500)
+    series = {}
+    day = end
+    while len(series) < days:
+        if day.weekday() < 5:
+            price *= 1 + rng.gauss(0, 0.02)
+            series[day.isoformat()] = {
+                '1. open': f'{price * 0.99:.4f}',
+                '2. high': f'{price * 1.01:.4f}',
+                '3. low': f'{price * 0.98:.4f}',
+                '4. close': f'{price:.4f}',
+                '5. volume': str(rng.randint(100_000, 50_000_000)),
+            }
+        day -= timedelta(days=1)
+    return series
+
+
+class FakeHTTPService:
+    """Threaded local HTTP server with a fixed latency per request; subclasses implement `respond`"""
+
+    def __init__(self, latency: float = 0.1):
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def respond(self, path: str, params: Dict[str, List[str]]) -> Tuple[str, bytes]:
+        """(content type, body) of one request"""
+        raise NotImplementedError
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                with fake._lock:
+                    fake.requests += 1
+                time.sleep(fake.latency)
+                content_type, body = fake.respond(url.path, parse_qs(url.query, keep_blank_values=True))
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeAlphaVantage(FakeHTTPService):
+    """Answers TIME_SERIES_DAILY as JSON, or as CSV with datatype=csv
+
+    `throttle_every` makes every n-th request return the rate-limit 'Note'
+    payload, which the real API sends as JSON in both modes.
+    """
+
+    def __init__(self, latency: float = 0.1, throttle_every: int = 0):
+        super().__init__(latency)
+        self.throttle_every = throttle_every
+        self.throttled = 0
+
+    @property
+    def url(self) -> str:
+        return f'{self.base_url}/query'
+
+    def respond(self, path: str, params: Dict[str, List[str]]) -> Tuple[str, bytes]:
+        symbol = params.get('symbol', ['X'])[0]
+        with self._lock:
+            throttle = self.throttle_every and self.requests % self.throttle_every == 0
+            if throttle:
+                self.throttled += 1
+        if throttle:
+            payload: Dict[str, Any] = {'Note': 'Thank you for using Alpha Vantage! API call frequency exceeded.'}
+        elif params.get('datatype') == ['csv']:
+            lines = ['timestamp,open,high,low,close,volume']
+            for day, values in sorted(daily_series(symbol).items(), reverse=True):
+                lines.append(','.join([day] + list(values.values())))
+            return 'application/x-download', ('\r\n'.join(lines) + '\r\n').encode()
+        else:
+            payload = {'Meta Data': {'2. Symbol': symbol}, 'Time Series (Daily)': daily_series(symbol)}
+        return 'application/json', json.dumps(payload).encode()
+
+
+class FakeStooq(FakeHTTPService):
+    """Answers Stooq's multi-symbol quote CSV (/q/l/) and per-symbol history CSV (/q/d/l/) of `history_days`"""
+
+    def __init__(self, latency: float = 0.1, history_days: int = 365):
+        super().__init__(latency)
+        self.history_days = history_days
+
+    def respond(self, path: str, params: Dict[str, List[str]]) -> Tuple[str, bytes]:
+        today = date.today()
+        if path.startswith('/q/l'):
+            lines = ['Symbol,Date,Open,High,Low,Close,Volume']
+            for symbol in params.get('s', [''])[0].split():
+                r = daily_rows(symbol.upper(), days=1, end=today)[-1]
+                lines.append(f"{symbol.upper()},{r['date']},{r['open']},{r['high']},{r['low']},{r['close']},{r['volume']}")
+            body = '\r\n'.join(lines) + '\r\n'
+        else:
+            symbol = params.get('s', ['x'])[0].upper()
+            body = stooq_csv(symbol, today - timedelta(days=self.history_days), today)
+        return 'text/csv', body.encode()
+
+
+class CountingS3:
+    """Minimal thread-safe S3 client stand-in that keeps objects in memory"""
+
+    def __init__(self, put_latency: float = 0.0):
+        self.put_latency = put_latency
+        self.objects: Dict[str, Any] = {}
+        self.put_calls = 0
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket: str, Key: str, Body: Any, **kwargs) -> Dict[str, Any]:
+        if self.put_latency:
+            time.sleep(self.put_latency)
+        with self._lock:
+            self.put_calls += 1
+            self.objects[f'{Bucket}/{Key}'] = Body
+        return {'ETag': '"fake"'}
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            body = self.objects.get(f'{Bucket}/{Key}')
+        if body is None:
+            raise self.exceptions.NoSuchKey(Key)
+        return {'Body': io.BytesIO(body if isinstance(body, bytes) else body.encode())}
+
+
+def price_rows(symbol: str, start: date, end: date) -> List[Dict[str, Any]]:
+    """Deterministic random-walk OHLCV rows in stox.prices shape (weekdays only)"""
+    rng = random.Random(symbol)
+    price = rng.uniform(20, 500)
+    rows = []
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            price *= 1 + rng.gauss(0, 0.02)
+            close = round(price, 4)
+            rows.append({
+                'date': day.isoformat(),
+                'open': round(price * 0.99, 4),
+                'high': round(price * 1.01, 4),
+                'low': round(price * 0.98, 4),
+                'close': close,
+                'volume': rng.randint(100_000, 50_000_000),
+                'adj_close': close,
+            })
+        day += timedelta(days=1)
+    return rows
+
+
+def daily_rows(symbol: str, days: int = 100, end: Optional[date] = None) -> List[Dict[str, Any]]:
+    """daily_series as stox.prices rows, oldest first"""
+    return [
+        {'date': day, 'open': float(v['1. open']), 'high': float(v['2. high']), 'low': float(v['3. low']),
+         'close': float(v['4. close']), 'volume': int(v['5. volume']), 'adj_close': float(v['4. close'])}
+        for day, v in sorted(daily_series(symbol, days, end).items())
+    ]
+
+
+def stooq_csv(symbol: str, start: date, end: date) -> str:
+    """Deterministic Stooq style daily CSV (oldest first, weekdays only)"""
+    lines = ['Date,Open,High,Low,Close,Volume']
+    for r in price_rows(symbol, start, end):
+        lines.append(f"{r['date']},{r['open']},{r['high']},{r['low']},{r['close']},{r['volume']}")
+    return '\n'.join(lines) + '\n'
+
+
+class RequestCounter:
+    """Counts (and optionally delays) API calls made through a boto3 client
+
+    The delay emulates the network round trip that an in-process stand-in
+    such as moto does not have.
+    """
+
+    def __init__(self, client: Any, service: str = 's3', rtt: float = 0.0):
+        self.rtt = rtt
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        client.meta.events.register(f'before-call.{service}', self._before_call)
+
+    def _before_call(self, model=None, **kwargs):
+        with self._lock:
+            self.calls[model.name] = self.calls.get(model.name, 0) + 1
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+
+class FakeGlue:
+    """In-memory Glue catalog for one table with a fixed latency per API call"""
+
+    def __init__(self, latency: float = 0.05, location: str = 's3://bench/prices/'):
+        self.latency = latency
+        self.partitions: Dict[tuple, Dict[str, Any]] = {}
+        self.calls: Dict[str, int] = {}
+        self._descriptor = {'Location': location, 'InputFormat': 'org.apache.hadoop.mapred.TextInputFormat'}
+        self._lock = threading.Lock()
+
+    def _call(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_table(self, DatabaseName: str, Name: str) -> Dict[str, Any]:
+        self._call('GetTable')
+        return {'Table': {'Name': Name, 'StorageDescriptor': dict(self._descriptor)}}
+
+    def batch_get_partition(self, DatabaseName: str, TableName: str, PartitionsToGet: List[Dict[str, Any]]):
+        self._call('BatchGetPartition')
+        found = [self.partitions[tuple(p['Values'])] for p in PartitionsToGet if tuple(p['Values']) in self.partitions]
+        return {'Partitions': found}
+
+    def batch_create_partition(self, DatabaseName: str, TableName: str, PartitionInputList: List[Dict[str, Any]]):
+        self._call('BatchCreatePartition')
+        errors = []
+        for entry in PartitionInputList:
+            values = tuple(entry['Values'])
+            if values in self.partitions:
+                errors.append({'PartitionValues': list(values),
+                               'ErrorDetail': {'ErrorCode': 'AlreadyExistsException'}})
+            else:
+                self.partitions[values] = entry
+        return {'Errors': errors}
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+
+class FakeS3Listing:
+    """ListObjectsV2 paginator over synthetic keys with a fixed latency per page"""
+
+    def __init__(self, keys: List[str], latency: float = 0.03):
+        self.keys = sorted(keys)
+        self.latency = latency
+        self.pages = 0
+
+    def get_paginator(self, name: str):
+        listing = self
+
+        class Paginator:
+            def paginate(self, Bucket: str, Prefix: str = ''):
+                keys = [k for k in listing.keys if k.startswith(Prefix)]
+                for i in range(0, len(keys), 1000):
+                    listing.pages += 1
+                    if listing.latency:
+                        time.sleep(listing.latency)
+                    yield {'Contents': [{'Key': k} for k in keys[i:i + 1000]]}
+
+        return Paginator()
+
+
+def _jittered(mean: float, sigma: float, rng: random.Random) -> float:
+    return mean * rng.lognormvariate(0, sigma) if sigma else mean
+
+
+class FakeBedrock:
+    """bedrock-runtime stand-in with log-normal latency; answers SQL and summary prompts
+
+    InvokeModelWithResponseStream sends the first words after
+    `first_token` of the call's latency and spreads the rest evenly over
+    the remainder, so a streamed and a buffered call finish together.
+
+    `sql` is the SQL every SQL prompt gets, or a function of the question
+    that returns it.
+
+    Tokens are counted as characters / 4. `per_1k_input` adds that many
+    seconds per 1,000 input tokens that are not read from the prompt
+    cache. A system block with a `cache_control` checkpoint is cached after
+    the first call that sends it, like Bedrock prompt caching.
+    """
+
+    def __init__(self, latency: float = 0.6, sigma: float = 0.3,
+                 sql: Union[str, Callable[[str], str]] =
+                 "SELECT date, close FROM stox.prices WHERE ticker='AAPL' ORDER BY date LIMIT 200",
+                 summary: str = 'Prices rose steadily. Chart: date vs close.', first_token: float = 0.25,
+                 per_1k_input: float = 0.0):
+        self.latency = latency
+        self.sigma = sigma
+        self.sql = sql
+        self.summary = summary
+        self.first_token = first_token
+        self.per_1k_input = per_1k_input
+        self.calls = 0
+        self.bodies: List[Dict[str, Any]] = []
+        self._cached: set = set()
+        self._rng = random.Random(11)
+        self._lock = threading.Lock()
+
+    def _start(self, body: str):
+        """(delay, prompt, text, usage) of one call"""
+        request = json.loads(body)
+        prompt = request['messages'][0]['content']
+        if isinstance(prompt, list):
+            prompt = ' '.join(block.get('text', '') for block in prompt)
+        system = request.get('system', [])
+        usage = {'input_tokens': len(prompt) // 4, 'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0}
+        with self._lock:
+            self.calls += 1
+            self.bodies.append(request)
+            delay = _jittered(self.latency, self.sigma, self._rng)
+            for block in system:
+                tokens = len(block['text']) // 4
+                if 'cache_control' not in block:
+                    usage['input_tokens'] += tokens
+                elif block['text'] in self._cached:
+                    usage['cache_read_input_tokens'] += tokens
+                else:
+                    self._cached.add(block['text'])
+                    usage['cache_creation_input_tokens'] += tokens
+        delay += self.per_1k_input * (usage['input_tokens'] + usage['cache_creation_input_tokens']) / 1000
+        if '<SQL>' in prompt + ' '.join(b['text'] for b in system):
+            asked = re.search(r'Question: (.*)', prompt)
+            text = f"<SQL>{self.sql(asked.group(1) if asked else '') if callable(self.sql) else self.sql}</SQL>"
+        else:
+            text = self.summary
+        if '</SQL>' in request.get('stop_sequences', []):
+            text = text.replace('</SQL>', '')
+        usage['output_tokens'] = len(text) // 4
+        return delay, prompt, text, usage
+
+    def invoke_model(self, modelId: str, body: str, contentType: str = 'application/json', **kwargs):
+        delay, _, text, usage = self._start(body)
+        time.sleep(delay)
+        payload = {'content': [{'type': 'text', 'text': text}], 'usage': usage}
+        return {'body': io.BytesIO(json.dumps(payload).encode())}
+
+    def invoke_model_with_response_stream(self, modelId: str, body: str, contentType: str = 'application/json',
+                                          **kwargs):
+        delay, _, text, usage = self._start(body)
+        words = [w + ' ' for w in text.split(' ')]
+        words[-1] = words[-1].rstrip()
+
+        def events():
+            time.sleep(delay * self.first_token)
+            for word in words:
+                chunk = {'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': word}}
+                yield {'chunk': {'bytes': json.dumps(chunk).encode()}}
+                time.sleep(delay * (1 - self.first_token) / len(words))
+            yield {'chunk': {'bytes': json.dumps({'type': 'message_delta', 'usage': usage}).encode()}}
+
+        return {'body': events()}
+
+
+class FakeAthena:
+    """Athena stand-in: every query runs for a log-normal time and returns `rows` synthetic rows"""
+
+    def __init__(self, runtime: float = 1.5, sigma: float = 0.3, rows: int = 200):
+        self.runtime = runtime
+        self.sigma = sigma
+        self.rows = rows
+        self.started = 0
+        self._queries: Dict[str, float] = {}
+        self._runtimes: Dict[str, float] = {}
+        self._rng = random.Random(13)
+        self._lock = threading.Lock()
+
+    def start_query_execution(self, QueryString: str, **kwargs):
+        with self._lock:
+            self.started += 1
+            query_id = f'q{self.started}'
+            runtime = _jittered(self.runtime, self.sigma, self._rng)
+            self._queries[query_id] = time.monotonic() + runtime
+            self._runtimes[query_id] = runtime
+        return {'QueryExecutionId': query_id}
+
+    def get_query_execution(self, QueryExecutionId: str):
+        done = time.monotonic() >= self._queries[QueryExecutionId]
+        # No queueing in the fake: all of the runtime counts as engine execution
+        statistics = {'DataScannedInBytes': 50_000_000, 'QueryQueueTimeInMillis': 0,
+                      'EngineExecutionTimeInMillis': int(self._runtimes.get(QueryExecutionId, 0) * 1000)}
+        return {'QueryExecution': {'QueryExecutionId': QueryExecutionId,
+                                   'Status': {'State': 'SUCCEEDED' if done else 'RUNNING'},
+                                   'Statistics': statistics}}
+
+    def stop_query_execution(self, QueryExecutionId: str):
+        self._queries[QueryExecutionId] = 0.0
+
+    def get_query_results(self, QueryExecutionId: str, MaxResults: int = 1000, NextToken: Optional[str] = None):
+        start = int(NextToken or 0)
+        info = [{'Name': 'date', 'Type': 'date'}, {'Name': 'close', 'Type': 'double'}]
+        data = [{'Data': [{'VarCharValue': 'date'}, {'VarCharValue': 'close'}]}] if start == 0 else []
+        end = min(self.rows, start + MaxResults - len(data))
+        day = date(2024, 1, 1)
+        data += [{'Data': [{'VarCharValue': (day + timedelta(days=i)).isoformat()},
+                           {'VarCharValue': f'{100 + i * 0.1:.4f}'}]} for i in range(start, end)]
+        page = {'ResultSet': {'ResultSetMetadata': {'ColumnInfo': info}, 'Rows': data}}
+        if end < self.rows:
+            page['NextToken'] = str(end)
+        return page
@@ -0,0 +1,412 @@
+"""End-to-end benchmark suite: ingest, backfill, maint and the agent under load, saved as JSON
+
+    python -m benchmarks.suite                                  # every scenario
+    python -m benchmarks.suite --scenarios ingest agent --ingest-tickers 10 100
+    python -m benchmarks.suite --compare benchmarks/results/BASE.json      # this run vs BASE
+    python -m benchmarks.suite --compare BASE.json NEW.json                # two saved runs
+
+Every scenario runs against local stand-ins, no AWS account needed:
+
+- ingest-N: the stox-ingest handler for a watchlist of N tickers (10, 100
+  and 1,000 by default) on moto S3 and Glue, fetching from the fake Stooq
+  quotes server (or the fake Alpha Vantage with --provider alphavantage).
+  Latency is per ticker, fetch and store; throughput is tickers/s of the
+  handler's wall time;
+- backfill: backfill.run_backfill of --backfill-tickers tickers x
+  --backfill-years years from the fake Stooq history server into moto S3.
+  Latency is per ticker; throughput is rows/s;
+- maint: the stox-maint handler over a year of daily objects on moto S3 and
+  Glue: compact, compact again (nothing left to do) and indicators, one run
+  each, reported as wall times; throughput is partitions compacted/s;
+- agent-C: stox-agent answering --agent-requests questions from C
+  concurrent clients. FakeBedrock writes the SQL and the summaries, and
+  DuckDB (ATHENA_BACKEND=duckdb) runs the SQL over benchmarks.synthetic
+  data. The pipeline cache is off. Latency is per request; throughput is
+  requests/s.
+
+Each scenario runs in a fresh interpreter (multiprocessing spawn), so
+moto state, caches and imports do not leak between scenarios, and peak RSS
+(ru_maxrss) is the scenario's own. The JSON file records the commit, the
+machine and the arguments next to the results. `--compare` prints the
+p50/p95/p99, throughput and peak RSS changes between two result files and
+exits with status 1 when any of them got worse by more than --threshold
+percent.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from benchmarks import synthetic
+from stox_common.stats import summarize_latencies
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+BUCKET = 'bench-curated'
+SCENARIOS = ('ingest', 'backfill', 'maint', 'agent')
+
+# Question templates of the agent load and the SQL the fake model writes for them
+AGENT_QUESTIONS = {
+    'Show me {} price trend for last 60 days':
+        "SELECT date, close FROM stox.prices WHERE ticker='{}' AND date >= current_date - interval '60' day "
+        "ORDER BY date LIMIT 200",
+    '7-day SMA of {} for last 30 days':
+        "SELECT date, close, sma_7 FROM stox.indicators WHERE ticker='{}' "
+        "AND date >= current_date - interval '30' day ORDER BY date",
+    'Max drawdown of {} over the whole history':
+        "SELECT MIN(max_drawdown) AS max_drawdown FROM stox.v_drawdown WHERE ticker='{}'",
+    'Average daily volume of {} last quarter':
+        "SELECT AVG(volume) AS avg_volume FROM stox.prices WHERE ticker='{}' "
+        "AND date >= current_date - interval '90' day",
+}
+
+# (label, path in a scenario result, True when higher is better)
+COMPARED = (
+    ('p50 ms', ('latency', 'p50_ms'), False),
+    ('p95 ms', ('latency', 'p95_ms'), False),
+    ('p99 ms', ('latency', 'p99_ms'), False),
+    ('throughput', ('throughput', 'value'), True),
+    ('peak RSS MB', ('peak_rss_mb',), False),
+)
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def create_catalog(glue):
+    """Glue database and stox.prices table, so partition registration and compaction find them"""
+    glue.create_database(DatabaseInput={'Name': 'stox'})
+    glue.create_table(DatabaseName='stox', TableInput={
+        'Name': 'prices',
+        'PartitionKeys': [{'Name': 'ticker', 'Type': 'string'}, {'Name': 'year', 'Type': 'int'},
+                          {'Name': 'month', 'Type': 'int'}],
+        'StorageDescriptor': {
+            'Columns': [{'Name': 'date', 'Type': 'date'}, {'Name': 'close', 'Type': 'double'}],
+            'Location': f's3://{BUCKET}/prices/',
+            'InputFormat': 'org.apache.hadoop.mapred.TextInputFormat',
+            'SerdeInfo': {'SerializationLibrary': 'org.apache.hadoop.hive.serde2.lazy.LazySimpleSerDe'}
+        }
+    })
+
+
+@contextlib.contextmanager
+def aws():
+    """moto S3 and Glue with the curated bucket and the stox catalog"""
+    import boto3
+    from moto import mock_aws
+    with mock_aws(), patch.dict(os.environ, {'AWS_DEFAULT_REGION': 'us-east-1'}):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket=BUCKET)
+        create_catalog(boto3.client('glue', region_name='us-east-1'))
+        yield s3
+
+
+def run_ingest(size, args):
+    from benchmarks.fakes import FakeAlphaVantage, FakeStooq
+    from lambdas.stox_ingest import lambda_function as ingest
+
+    watchlist = synthetic.tickers(size)
+    with aws(), FakeStooq(latency=args.provider_latency) as stooq, \
+            FakeAlphaVantage(latency=args.provider_latency) as alphavantage:
+        env = {
+            'CURATED_BUCKET': BUCKET, 'WATCHLIST': ','.join(watchlist), 'ATHENA_DB': 'stox', 'METRICS': 'off',
+            'INGEST_PROVIDER': args.provider, 'STOOQ_QUOTES_URL': f'{stooq.base_url}/q/l/',
+            'ALPHAVANTAGE_URL': alphavantage.url, 'ALPHAVANTAGE_API_KEY': 'bench-key',
+            'PROVIDER_CALLS_PER_MINUTE': '1000000', 'INGEST_CONCURRENCY': str(args.ingest_concurrency),
+            'INDICATORS': 'on' if args.ingest_indicators else 'off',
+        }
+        with patch.dict(os.environ, env), patch.object(ingest, 's3_client', None):
+            started = time.perf_counter()
+            response = ingest.lambda_handler({}, SimpleNamespace(aws_request_id='bench'))
+            wall = time.perf_counter() - started
+    body = json.loads(response['body'])
+    return {
+        'tickers': size,
+        'wall_s': round(wall, 3),
+        'latency': body['stats']['latency'],
+        'throughput': {'value': round(size / wall, 1), 'unit': 'tickers/s'},
+        'requests': body['stats']['requests'],
+        'days_written': body['stats']['days_written'],
+        'errors': sum(r['status'] != 'success' for r in body['results'].values()),
+    }
+
+
+def run_backfill(args):
+    import backfill
+    from benchmarks.fakes import FakeStooq
+    from stox_common.providers import get_provider
+
+    tickers = synthetic.tickers(args.backfill_tickers)
+    end = datetime.combine(date.today(), datetime.min.time())
+    start = end - timedelta(days=365 * args.backfill_years)
+    with aws(), FakeStooq(latency=args.provider_latency, history_days=365 * args.backfill_years + 7) as stooq:
+        with patch.dict(os.environ, {'STOOQ_URL': f'{stooq.base_url}/q/d/l/'}):
+            summary = backfill.run_backfill(tickers, start, end, BUCKET, jobs=args.backfill_jobs,
+                                            provider=get_provider('stooq'))
+    return {
+        'tickers': len(tickers),
+        'years': args.backfill_years,
+        'wall_s': summary['elapsed_s'],
+        'latency': summary['latency'],
+        'throughput': {'value': summary['rows_per_s'], 'unit': 'rows/s'},
+        'rows': summary['rows'],
+        'puts': summary['puts'],
+        'errors': sum(r['status'] == 'error' for r in summary['results'].values()),
+    }
+
+
+def run_maint(args):
+    import boto3
+    from lambdas.stox_maint import lambda_function as maint
+    from stox_common.layout import DAILY, group_rows
+    from stox_common.partitions import GlueCatalog, partitions_of_keys
+    from stox_common.providers import synthetic_rows
+    from stox_common.series import update_series
+    from stox_common.writers import CsvWriter
+
+    # A year of closed months, written the way daily ingest writes them
+    end = date.today().replace(day=1) - timedelta(days=1)
+    start = end - timedelta(days=365)
+    writer = CsvWriter()
+    with aws() as s3:
+        keys = []
+        for ticker in synthetic.tickers(args.maint_tickers):
+            rows = synthetic_rows(ticker, start, end)
+            for key, group in group_rows(ticker, rows, DAILY).items():
+                s3.put_object(Bucket=BUCKET, Key=key, Body=writer.serialize(group))
+                keys.append(key)
+            update_series(s3, BUCKET, ticker, rows)
+        GlueCatalog(boto3.client('glue', region_name='us-east-1'), 'stox').register(BUCKET, partitions_of_keys(keys))
+
+        env = {'CURATED_BUCKET': BUCKET, 'ATHENA_DB': 'stox', 'ATHENA_OUTPUT': 's3://bench-results/',
+               'METRICS': 'off'}
+        tasks = {}
+        with patch.dict(os.environ, env):
+            for label, task in (('compact', 'compact'), ('compact_rerun', 'compact'), ('indicators', 'indicators')):
+                started = time.perf_counter()
+                response = maint.lambda_handler({'tasks': [task]}, SimpleNamespace(aws_request_id='bench'))
+                tasks[label] = {'wall_s': round(time.perf_counter() - started, 3),
+                                **json.loads(response['body']).get('results', {}).get(task, {})}
+    compacted = tasks['compact'].get('partitions_compacted', 0)
+    return {
+        'tickers': args.maint_tickers,
+        'objects': len(keys),
+        'wall_s': round(sum(t['wall_s'] for t in tasks.values()), 3),
+        'tasks': {label: {k: v for k, v in t.items() if not isinstance(v, (list, dict))} for label, t in tasks.items()},
+        'throughput': {'value': round(compacted / tasks['compact']['wall_s'], 1), 'unit': 'partitions/s'},
+    }
+
+
+def run_agent(clients, args):
+    from benchmarks.fakes import FakeBedrock
+    from lambdas.stox_agent import lambda_function as agent
+    from stox_common import athena
+
+    tickers = synthetic.tickers(args.agent_tickers)
+    sql_of = {question.format(t): sql.format(t) for t in tickers for question, sql in AGENT_QUESTIONS.items()}
+    questions = sorted(sql_of)
+    bedrock = FakeBedrock(args.bedrock_ms / 1000, sigma=0.1, sql=lambda question: sql_of[question])
+
+    with tempfile.TemporaryDirectory() as root:
+        start, end = synthetic.history(args.agent_years)
+        synthetic.generate(root, tickers, start, end)
+        synthetic.materialize_indicators(root, tickers, start, end)
+        env = {
+            'ATHENA_BACKEND': 'duckdb', 'ATHENA_LOCAL_DIR': root, 'ATHENA_DB': 'stox',
+            'ATHENA_OUTPUT': 's3://bench-results/', 'BEDROCK_REGION': 'us-east-1', 'CACHE_STORE': 'none',
+            'CACHE_TTL_SECONDS': '0', 'LOCAL_ENGINE': 'off', 'METRICS': 'off',
+        }
+
+        def ask(i):
+            question = questions[(i * 7919) % len(questions)]
+            started = time.perf_counter()
+            response = agent.lambda_handler({'body': json.dumps({'question': question})}, {})
+            return (time.perf_counter() - started) * 1000, response['statusCode']
+
+        with patch.dict(os.environ, env), patch.object(agent, 'get_bedrock_client', return_value=bedrock):
+            ask(0)  # DuckDB connection and views
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=clients) as pool:
+                outcomes = list(pool.map(ask, range(args.agent_requests)))
+            wall = time.perf_counter() - started
+            queries = athena.get_client().started
+    return {
+        'clients': clients,
+        'requests': args.agent_requests,
+        'wall_s': round(wall, 3),
+        'latency': summarize_latencies(ms for ms, _ in outcomes),
+        'throughput': {'value': round(args.agent_requests / wall, 1), 'unit': 'requests/s'},
+        'errors': sum(status != 200 for _, status in outcomes),
+        'bedrock_calls': bedrock.calls,
+        'queries': queries,
+    }
+
+
+def scenario_runs(args):
+    """(name, function, parameter) of each selected scenario"""
+    runs = []
+    for scenario in args.scenarios:
+        if scenario == 'ingest':
+            runs += [(f'ingest-{n}', 'run_ingest', n) for n in args.ingest_tickers]
+        elif scenario == 'agent':
+            runs += [(f'agent-{c}', 'run_agent', c) for c in args.agent_clients]
+        else:
+            runs.append((scenario, f'run_{scenario}', None))
+    return runs
+
+
+def child(function, parameter, options, connection):
+    """Entry point of a scenario's process: sends back its result and peak RSS, or the error"""
+    try:
+        args = argparse.Namespace(**options)
+        run = globals()[function]
+        # The handlers' own prints would drown the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run(args) if parameter is None else run(parameter, args)
+        result['peak_rss_mb'] = peak_rss_mb()
+    except Exception as e:
+        result = {'error': f'{type(e).__name__}: {e}'}
+    connection.send(result)
+    connection.close()
+
+
+def run_isolated(function, parameter, args):
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=child, args=(function, parameter, vars(args), sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {'error': 'scenario process exited without a result'}
+    process.join()
+    if process.exitcode:
+        result.setdefault('error', f'exit code {process.exitcode}')
+    return result
+
+
+def git(*command):
+    try:
+        return subprocess.run(['git', *command], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    status = git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(status) if status is not None else None,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def metric(result, path):
+    for part in path:
+        if not isinstance(result, dict) or part not in result:
+            return None
+        result = result[part]
+    return result
+
+
+def compare(base, head, threshold):
+    """Print the changes from `base` to `head`; returns how many got worse by more than `threshold` %"""
+    print(f"\n{'scenario':<14} {'metric':<12} {'base':>12} {'head':>12} {'change':>9}")
+    regressions = 0
+    for name, result in head['scenarios'].items():
+        previous = base['scenarios'].get(name)
+        if not previous:
+            continue
+        for label, path, higher_is_better in COMPARED:
+            old, new = metric(previous, path), metric(result, path)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            worse = (-change if higher_is_better else change) > threshold
+            regressions += worse
+            print(f"{name:<14} {label:<12} {old:>12,.1f} {new:>12,.1f} {change:>+8.1f}%{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--ingest-tickers', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--ingest-concurrency', type=int, default=8)
+    parser.add_argument('--ingest-indicators', action='store_true',
+                        help='let ingest update stox.indicators / correlations (every ticker pair)')
+    parser.add_argument('--provider', choices=('stooq-quotes', 'alphavantage'), default='stooq-quotes')
+    parser.add_argument('--provider-latency', type=float, default=0.05, help='fake provider latency per request (s)')
+    parser.add_argument('--backfill-tickers', type=int, default=20)
+    parser.add_argument('--backfill-years', type=int, default=5)
+    parser.add_argument('--backfill-jobs', type=int, default=8)
+    parser.add_argument('--maint-tickers', type=int, default=10)
+    parser.add_argument('--agent-clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--agent-requests', type=int, default=200)
+    parser.add_argument('--agent-tickers', type=int, default=20)
+    parser.add_argument('--agent-years', type=int, default=3)
+    parser.add_argument('--bedrock-ms', type=float, default=200, help='fake Bedrock latency per call')
+    parser.add_argument('--output', help=f'result file (default: {os.path.relpath(RESULTS_DIR, ROOT)}/<time>-<commit>.json)')
+    parser.add_argument('--compare', nargs='+', metavar='RESULTS',
+                        help='BASE (compared with this run) or BASE HEAD (two saved runs, nothing is run)')
+    parser.add_argument('--threshold', type=float, default=10.0, help='regression threshold in percent')
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error('--compare takes one or two result files')
+    if args.compare and len(args.compare) == 2:
+        sys.exit(1 if compare(load(args.compare[0]), load(args.compare[1]), args.threshold) else 0)
+
+    options = {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'threshold')}
+    report = {**environment(), 'args': options, 'scenarios': {}}
+    print(f"{'scenario':<14} {'wall s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'throughput':>20} {'peak RSS':>10}")
+    for name, function, parameter in scenario_runs(args):
+        result = run_isolated(function, parameter, args)
+        report['scenarios'][name] = result
+        if 'error' in result:
+            print(f"{name:<14} failed: {result['error']}")
+            continue
+        latency = result.get('latency', {})
+        throughput = f"{result['throughput']['value']:,.1f} {result['throughput']['unit']}"
+        print(f"{name:<14} {result['wall_s']:>8.2f} {latency.get('p50_ms', 0):>9.1f} {latency.get('p95_ms', 0):>9.1f} "
+              f"{latency.get('p99_ms', 0):>9.1f} {throughput:>20} {result['peak_rss_mb']:>8.1f}MB")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{(report['commit'] or 'nocommit')[:8]}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults: {output}")
+    if args.compare:
+        sys.exit(1 if compare(load(args.compare[0]), report, args.threshold) else 0)
+
+
+if __name__ == '__main__':
+    main()
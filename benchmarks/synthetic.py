@@ -0,0 +1,116 @@
+"""Synthetic stox data: N tickers x M years of daily OHLCV in the curated bucket layout
+
+    python -m benchmarks.synthetic --tickers 100 --years 5 --out /tmp/stox-local
+
+Writes stox.prices objects (`prices/ticker=/year=/month=/[day=/]`) for the
+tickers T0000.. under `--out`, from the deterministic random walk of the
+mock price provider, so the same arguments always give the same data.
+`--layout daily` writes one object per trading day as daily ingest does,
+`monthly` one per month as backfill does. `--indicators` also builds
+stox.indicators and stox.correlations with stox_common.indicators (on moto
+S3, then copied out); correlations cover every ticker pair, so this is
+slow beyond a few dozen tickers.
+
+The directory is what ATHENA_BACKEND=duckdb reads:
+
+    ATHENA_BACKEND=duckdb ATHENA_LOCAL_DIR=/tmp/stox-local ...
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import benchmarks  # noqa: F401  (sets up the layer import path)
+from stox_common.layout import LAYOUTS, MONTHLY, PRICES_PREFIX, group_rows
+from stox_common.providers import synthetic_rows
+from stox_common.writers import CSV, PARQUET, get_writer
+
+
+def tickers(n: int) -> List[str]:
+    return [f'T{i:04d}' for i in range(n)]
+
+
+def history(years: int, end: Optional[date] = None) -> tuple:
+    """(start, end) of `years` calendar years ending with `end`'s year"""
+    end = end or date.today()
+    return date(end.year - years + 1, 1, 1), end
+
+
+def write(root: str, key: str, body: Any) -> int:
+    path = os.path.join(root, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = body.encode() if isinstance(body, str) else body
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+
+def generate(root: str, symbols: List[str], start: date, end: date, layout: str = MONTHLY,
+             fmt: str = CSV) -> Dict[str, Any]:
+    """Write the prices of `symbols` for start..end under `root`; returns rows, objects and bytes written"""
+    writer = get_writer(fmt)
+    stats = {'tickers': len(symbols), 'rows': 0, 'objects': 0, 'bytes': 0}
+    for ticker in symbols:
+        rows = synthetic_rows(ticker, start, end)
+        stats['rows'] += len(rows)
+        for key, group in group_rows(ticker, rows, layout, writer.filename).items():
+            stats['bytes'] += write(root, key, writer.serialize(group))
+            stats['objects'] += 1
+    return stats
+
+
+def materialize_indicators(root: str, symbols: List[str], start: date, end: date) -> Dict[str, Any]:
+    """stox.indicators and stox.correlations for `symbols`, built on moto S3 and copied under `root`"""
+    import boto3
+    from moto import mock_aws
+    from stox_common.indicators import CORRELATIONS_PREFIX, INDICATORS_PREFIX, materialize
+    from stox_common.s3io import list_keys
+    from stox_common.series import update_series
+
+    bucket = 'synthetic-curated'
+    with mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket=bucket)
+        for ticker in symbols:
+            update_series(s3, bucket, ticker, synthetic_rows(ticker, start, end))
+        result = materialize(s3, bucket, symbols, rebuild=True)
+        for prefix in (INDICATORS_PREFIX, CORRELATIONS_PREFIX):
+            for key in list_keys(s3, bucket, f'{prefix}/'):
+                write(root, key, s3.get_object(Bucket=bucket, Key=key)['Body'].read())
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tickers', type=int, default=100)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--end', type=date.fromisoformat, default=None, help='last day (default: today)')
+    parser.add_argument('--out', required=True, help='directory to write the bucket layout to')
+    parser.add_argument('--layout', choices=LAYOUTS, default=MONTHLY)
+    parser.add_argument('--format', choices=(CSV, PARQUET), default=CSV)
+    parser.add_argument('--indicators', action='store_true', help='also build stox.indicators / correlations')
+    args = parser.parse_args()
+
+    if os.path.exists(os.path.join(args.out, PRICES_PREFIX)):
+        parser.error(f"{args.out} already has a {PRICES_PREFIX}/ directory; pick an empty one")
+    symbols = tickers(args.tickers)
+    start, end = history(args.years, args.end)
+    started = time.perf_counter()
+    report = generate(args.out, symbols, start, end, args.layout, args.format)
+    report['prices_s'] = round(time.perf_counter() - started, 2)
+    if args.indicators:
+        started = time.perf_counter()
+        report['indicators'] = materialize_indicators(args.out, symbols, start, end)
+        report['indicators_s'] = round(time.perf_counter() - started, 2)
+    report.update({'start': start.isoformat(), 'end': end.isoformat(), 'layout': args.layout,
+                   'format': args.format, 'out': args.out})
+    print(f"{report['tickers']} tickers, {report['rows']} rows, {report['objects']} objects, "
+          f"{report['bytes'] / 1e6:.1f} MB in {report['prices_s']:.1f}s")
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Lambda functions load shared code from the stox-common layer (/opt/python);
+# mirror that for local test runs.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'layers', 'common', 'python'))
@@ -1,61 +1,193 @@
 import json
 import os
-import boto3
 import re
-from typing import Dict, Any, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+from typing import Callable, Dict, Any, Iterator, List, Optional
+
+from stox_common import athena, bedrock, clients, prompts, sse, telemetry
+from stox_common.cache import (
+    FileStore, LRUCache, MISS, PipelineCache, S3Store, digest, normalize_question, read_watermark
+)
+from stox_common.sqlrewrite import RejectedQuery, rewrite
+from stox_common.summaries import template_summary
+
+RESPONSE_ROWS = 50
+SERIES_MAX_ROWS = 5000
+NO_DATA = "No data found for the given criteria."
+SUMMARY_MODES = ('none', 'async', 'sync')
+
+_local_engine = None
+_charts = None
+_cache = None
+_watermark = (None, 0.0)
+_series_cache = LRUCache(maxsize=64, ttl=300)
 
 def get_bedrock_client():
-    return boto3.client('bedrock-runtime', region_name=os.environ['BEDROCK_REGION'])
+    return clients.get('bedrock-runtime', region_name=os.environ['BEDROCK_REGION'])
 
 def get_athena_client():
-    return boto3.client('athena')
+    return athena.get_client()
+
+def get_lambda_client():
+    return clients.get('lambda')
+
+def get_s3_client():
+    return clients.get('s3')
+
+def get_local_engine() -> Optional[Any]:
+    """LocalEngine, imported with NumPy on the first template question; None without NumPy"""
+    global _local_engine
+    if _local_engine is None:
+        try:
+            from stox_common.fastpath import LocalEngine
+            _local_engine = LocalEngine
+        except ImportError:
+            # Without NumPy every question takes the Bedrock + Athena path
+            _local_engine = False
+    return _local_engine or None
+
+def get_charts() -> Optional[Any]:
+    """stox_common.charts, imported with NumPy on the first time-series result; None without NumPy"""
+    global _charts
+    if _charts is None:
+        try:
+            from stox_common import charts
+            _charts = charts
+        except ImportError:
+            # Without NumPy responses carry the first RESPONSE_ROWS rows only
+            _charts = False
+    return _charts or None
+
+def series_max_rows() -> Optional[int]:
+    """Rows of a time-series result read for its chart; None when charts are off"""
+    if not int(os.environ.get('CHART_POINTS', '200')) or get_charts() is None:
+        return None
+    return int(os.environ.get('SERIES_MAX_ROWS', str(SERIES_MAX_ROWS)))
+
+def chart_of(columns: List[str], rows: List[List[Any]],
+             types: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    """Column-major chart of a time-series result, downsampled to CHART_POINTS; None for other results"""
+    
+    points = int(os.environ.get('CHART_POINTS', '200'))
+    charts = get_charts() if points and rows else None
+    if charts is None:
+        return None
+    with telemetry.span('chart') as stage:
+        chart = charts.shape(columns, rows, points, types=types)
+        stage['points'] = chart and chart['points']
+    return chart
+
+def json_default(value: Any) -> Any:
+    """JSON encoding for the typed values Athena results are converted to"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def get_cache() -> PipelineCache:
+    """Pipeline cache kept for the life of the execution environment"""
+    global _cache
+    if _cache is None:
+        store_kind = os.environ.get('CACHE_STORE', 'none')
+        store = None
+        if store_kind == 's3':
+            store = S3Store(get_s3_client(), os.environ['CURATED_BUCKET'])
+        elif store_kind == 'file':
+            store = FileStore(os.environ.get('CACHE_DIR', '/tmp/stox-cache'))
+        _cache = PipelineCache(
+            maxsize=int(os.environ.get('CACHE_MAX_ENTRIES', '256')),
+            ttl=float(os.environ.get('CACHE_TTL_SECONDS', '3600')),
+            store=store
+        )
+    return _cache
+
+def current_watermark() -> Optional[str]:
+    """Data watermark written by ingest/backfill, re-read at most every CACHE_WATERMARK_SECONDS"""
+    global _watermark
+    bucket = os.environ.get('CURATED_BUCKET')
+    if not bucket:
+        return None
+    value, read_at = _watermark
+    if time.time() - read_at >= float(os.environ.get('CACHE_WATERMARK_SECONDS', '30')):
+        try:
+            value = read_watermark(get_s3_client(), bucket)
+        except Exception as e:
+            print(f"Could not read data watermark: {str(e)}")
+            value = None
+        _watermark = (value, time.time())
+    return value
 
+@telemetry.instrumented('stox-agent')
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """AI agent that converts natural language to SQL and executes it"""
     
-    print(f"DEBUG: Received event: {json.dumps(event)}")
-    print(f"DEBUG: Context: {context}")
-    
-    # Check environment variables
-    print(f"DEBUG: Environment variables:")
-    print(f"  ATHENA_DB: {os.environ.get('ATHENA_DB', 'NOT_SET')}")
-    print(f"  ATHENA_OUTPUT: {os.environ.get('ATHENA_OUTPUT', 'NOT_SET')}")
-    print(f"  BEDROCK_REGION: {os.environ.get('BEDROCK_REGION', 'NOT_SET')}")
+    # Events and bodies are logged only with LOG_LEVEL=debug
+    if telemetry.debug_enabled():
+        telemetry.debug("Received event: %s", json.dumps(event))
+        telemetry.debug("ATHENA_DB=%s ATHENA_OUTPUT=%s BEDROCK_REGION=%s", os.environ.get('ATHENA_DB', 'NOT_SET'),
+                        os.environ.get('ATHENA_OUTPUT', 'NOT_SET'), os.environ.get('BEDROCK_REGION', 'NOT_SET'))
     
     try:
-        print("DEBUG: Starting request processing")
+        # Asynchronous self-invocation from dispatch_summary
+        if 'summarize' in event:
+            return run_summary_job(event['summarize'])
         
         # Parse the request body
         body_str = event.get('body', '{}')
-        print(f"DEBUG: Raw body: {body_str}")
-        
         body = json.loads(body_str)
-        print(f"DEBUG: Parsed body: {body}")
-        
         question = body.get('question', '')
-        print(f"DEBUG: Question: {question}")
+        telemetry.debug("Question: %s", question)
+        
+        if is_batch_request(event, body):
+            return batch_response(body)
+        
+        if not question and body.get('summary_id'):
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps(summary_status(body['summary_id']))
+            }
         
         if not question:
-            print("DEBUG: No question provided")
+            telemetry.debug("No question provided")
             return {
                 'statusCode': 400,
                 'body': json.dumps({'error': 'Question is required'})
             }
         
-        print("DEBUG: Generating SQL using Bedrock")
-        # Generate SQL using Bedrock
-        sql = generate_sql(question)
-        print(f"DEBUG: Generated SQL: {sql}")
+        summary = body.get('summary') or os.environ.get('SUMMARY_MODE', 'sync')
+        if summary not in SUMMARY_MODES:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f"summary must be one of {', '.join(SUMMARY_MODES)}"})
+            }
         
-        print("DEBUG: Executing SQL in Athena")
-        # Execute SQL in Athena
-        columns, rows = execute_athena_query(sql)
-        print(f"DEBUG: Query results - Columns: {columns}, Rows: {len(rows)}")
+        if body.get('stream'):
+            # Without a streaming integration the events arrive in one body, but in the same format
+            events = []
+            stream_answer(question, events.append, summary=summary)
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': sse.CONTENT_TYPE,
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': ''.join(events)
+            }
         
-        print("DEBUG: Summarizing results using Bedrock")
-        # Summarize results using Bedrock
-        answer = summarize_results(question, columns, rows)
-        print(f"DEBUG: Generated answer: {answer}")
+        # Template questions (SMA, drawdown, ...) are answered from the per-ticker series
+        payload = answer_locally(question)
+        if payload is None:
+            payload = answer_with_athena(question, summary=summary)
         
         return {
             'statusCode': 200,
@@ -63,13 +195,18 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({
-                'question': question,
-                'sql': sql,
-                'columns': columns,
-                'rows': rows[:50],  # Limit to 50 rows
-                'answer': answer
-            })
+            'body': json.dumps({'question': question, **payload}, default=json_default)
+        }
+        
+    except RejectedQuery as e:
+        print(f"ERROR: Rejected generated SQL: {str(e)}")
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': f"Generated SQL was rejected: {str(e)}", 'type': 'RejectedQuery'})
         }
         
     except Exception as e:
@@ -86,138 +223,513 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': str(e), 'type': str(type(e))})
         }
 
-def generate_sql(question: str) -> str:
-    """Generate SQL from natural language using Bedrock"""
+def is_batch_request(event: Dict[str, Any], body: Dict[str, Any]) -> bool:
+    """POST /chat/batch, or a body with a `questions` list"""
+    path = event.get('path') or event.get('rawPath') or ''
+    return path.rstrip('/').endswith('/chat/batch') or 'questions' in body
+
+def batch_response(body: Dict[str, Any]) -> Dict[str, Any]:
+    """API Gateway response of a /chat/batch request"""
     
-    few_shot_examples = """
-Examples:
-Q: "7-day SMA of AAPL for last 30 days"
-A: <SQL>SELECT date, close, AVG(close) OVER (ORDER BY date ROWS BETWEEN 6 PRECEDING AND CURRENT ROW) as sma_7 FROM stox.prices WHERE ticker='AAPL' AND date >= current_date - interval '30' day ORDER BY date;</SQL>
+    questions = body.get('questions')
+    limit = int(os.environ.get('BATCH_MAX_QUESTIONS', '100'))
+    summary = body.get('summary') or os.environ.get('SUMMARY_MODE', 'sync')
+    error = None
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) and q.strip() for q in questions):
+        error = 'questions must be a non-empty list of questions'
+    elif len(questions) > limit:
+        error = f"at most {limit} questions per batch"
+    elif summary not in SUMMARY_MODES:
+        error = f"summary must be one of {', '.join(SUMMARY_MODES)}"
+    if error:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': error})
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(answer_batch(questions, summary=summary), default=json_default)
+    }
 
-Q: "Best performer YTD on my watchlist"
-A: <SQL>WITH ytd_returns AS (SELECT ticker, (close - LAG(close) OVER (PARTITION BY ticker ORDER BY date)) / LAG(close) OVER (PARTITION BY ticker ORDER BY date) as daily_return FROM stox.prices WHERE date >= date_trunc('year', current_date)) SELECT ticker, SUM(daily_return) as ytd_return FROM ytd_returns GROUP BY ticker ORDER BY ytd_return DESC LIMIT 1;</SQL>
+def item_error(e: Exception) -> Dict[str, Any]:
+    """Error entry of one batch item, shaped like the single-question error bodies"""
+    if isinstance(e, RejectedQuery):
+        return {'error': f"Generated SQL was rejected: {str(e)}", 'type': 'RejectedQuery'}
+    return {'error': str(e), 'type': type(e).__name__}
 
-Q: "Max drawdown of TSLA YTD"
-A: <SQL>WITH running_peak AS (SELECT date, close, MAX(close) OVER (ORDER BY date) as peak FROM stox.prices WHERE ticker='TSLA' AND date >= date_trunc('year', current_date)) SELECT MIN((close - peak) / peak) as max_drawdown FROM running_peak;</SQL>
-"""
+def answer_batch(questions: List[str], summary: str = 'sync') -> Dict[str, Any]:
+    """Answer a list of questions; results in input order, each with its answer or its own error
+    
+    Template questions take the local fast path. For the others, every distinct
+    question gets its SQL concurrently (BATCH_CONCURRENCY Bedrock calls). Identical
+    rewritten SQL runs once, with at most BATCH_QUERY_CONCURRENCY Athena
+    queries in flight; a query starts as soon as its SQL exists. Summaries
+    then run on the Bedrock pool as results arrive.
+    """
+    
+    started = time.perf_counter()
+    cache = get_cache()
+    watermark = current_watermark()
+    cache.observe_watermark(watermark)
+    items: List[Optional[Dict[str, Any]]] = [None] * len(questions)
+    
+    # Distinct questions (as the SQL cache keys them) -> positions in the batch
+    pending: Dict[str, List[int]] = {}
+    local = 0
+    for i, question in enumerate(questions):
+        try:
+            payload = answer_locally(question)
+        except Exception as e:
+            items[i] = {'question': question, **item_error(e)}
+            continue
+        if payload is not None:
+            items[i] = {'question': question, **payload}
+            local += 1
+        else:
+            pending.setdefault(normalize_question(question), []).append(i)
     
-    prompt = f"""\n\nHuman: You are a SQL expert. Convert the natural language question to SQL for Athena against the stox.prices table.
+    def generate(key: str) -> Dict[str, Any]:
+        timings = {}
+        try:
+            sql, source = sql_stage(questions[pending[key][0]], cache, timings)
+            rewritten = rewrite_sql(sql)
+        except Exception as e:
+            return item_error(e)
+        return {
+            'sql': rewritten['sql'], 'source': source, 'timings': timings,
+            'rewrite': {k: rewritten[k] for k in ('limit', 'predicates', 'partitions_pruned', 'pruning')}
+        }
+    
+    def run(sql: str) -> Dict[str, Any]:
+        timings = {}
+        try:
+            result, source, query = results_stage(sql, watermark, cache, timings)
+        except Exception as e:
+            return item_error(e)
+        return {'result': result, 'source': source, 'query': query if source == MISS else None, 'timings': timings}
+    
+    def summarize(key: str, ran: Dict[str, Any]) -> Dict[str, Any]:
+        timings = {}
+        columns, rows = ran['result']['columns'], ran['result']['rows']
+        try:
+            answer, source, info = summary_stage(questions[pending[key][0]], columns, rows[:RESPONSE_ROWS],
+                                                 len(rows) > RESPONSE_ROWS, summary, cache, timings)
+        except Exception as e:
+            return item_error(e)
+        return {'answer': answer, 'source': source, 'summary': info, 'timings': timings}
+    
+    generated: Dict[str, Dict[str, Any]] = {}
+    queries: Dict[str, Any] = {}
+    statement_of: Dict[str, str] = {}
+    summaries: Dict[str, Any] = {}
+    with ThreadPoolExecutor(max_workers=max(1, int(os.environ.get('BATCH_CONCURRENCY', '8')))) as llm_pool, \
+            ThreadPoolExecutor(max_workers=max(1, int(os.environ.get('BATCH_QUERY_CONCURRENCY', '5')))) as query_pool:
+        sql_futures = {llm_pool.submit(generate, key): key for key in pending}
+        for future in as_completed(sql_futures):
+            key = sql_futures[future]
+            generated[key] = future.result()
+            if 'error' in generated[key]:
+                continue
+            statement = athena.normalize_sql(generated[key]['sql'])
+            statement_of[key] = statement
+            if statement not in queries:
+                queries[statement] = query_pool.submit(run, generated[key]['sql'])
+        
+        keys_of: Dict[Any, List[str]] = {}
+        for key, statement in statement_of.items():
+            keys_of.setdefault(queries[statement], []).append(key)
+        for future in as_completed(keys_of):
+            ran = future.result()
+            if 'error' not in ran:
+                for key in keys_of[future]:
+                    summaries[key] = llm_pool.submit(summarize, key, ran)
+        summarized = {key: future.result() for key, future in summaries.items()}
+    
+    for key, positions in pending.items():
+        sql_info = generated[key]
+        ran = queries[statement_of[key]].result() if key in statement_of else None
+        summarized_info = summarized.get(key)
+        failed = next((r for r in (sql_info, ran, summarized_info) if r and 'error' in r), None)
+        if failed:
+            payload = dict(failed)
+        else:
+            rows = ran['result']['rows']
+            sources = {'sql': sql_info['source'], 'results': ran['source'], 'summary': summarized_info['source']}
+            for name, source in sources.items():
+                telemetry.count(f"{name}_{source}")
+            payload = {
+                'engine': 'athena',
+                'sql': sql_info['sql'],
+                'columns': ran['result']['columns'],
+                'rows': rows[:RESPONSE_ROWS],
+                'truncated': len(rows) > RESPONSE_ROWS,
+                'chart': chart_of(ran['result']['columns'], rows, ran['result'].get('types')),
+                'answer': summarized_info['answer'],
+                'summary': summarized_info['summary'],
+                'rewrite': sql_info['rewrite'],
+                'timings': {**sql_info['timings'], **ran['timings'], **summarized_info['timings']},
+                'cache': {**sources, 'watermark': watermark},
+                'query': ran['query']
+            }
+        for i in positions:
+            items[i] = {'question': questions[i], **payload}
+    
+    errors = sum(1 for item in items if 'error' in item)
+    telemetry.count('batch_questions', len(questions))
+    telemetry.count('batch_errors', errors)
+    return {
+        'results': items,
+        'stats': {
+            'questions': len(questions),
+            'local': local,
+            'distinct_questions': len(pending),
+            'distinct_sql': len(queries),
+            'errors': errors,
+            'wall_ms': elapsed_ms(started),
+            'cache': cache.stats()
+        }
+    }
 
-Table schema:
-- date DATE
-- open DOUBLE, high DOUBLE, low DOUBLE, close DOUBLE
-- volume BIGINT, adj_close DOUBLE
-- PARTITIONED BY (ticker STRING, year INT, month INT, day INT)
+def answer_with_athena(question: str, emit: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+                       summary: str = 'sync') -> Dict[str, Any]:
+    """Bedrock writes the SQL, Athena runs it and Bedrock summarizes, each stage cached
+    
+    `emit(event, data)`, when given, receives the SQL and the rows as soon as
+    each exists, and the summary in pieces as Bedrock streams it.
+    `summary` is one of SUMMARY_MODES: `none` skips the summary, `async`
+    returns without it and a `summary.id` to fetch it with later.
+    """
+    
+    started = time.perf_counter()
+    timings = {}
+    cache = get_cache()
+    watermark = current_watermark()
+    cache.observe_watermark(watermark)
+    sources = {}
+    
+    # Generate SQL using Bedrock; the same question always maps to the same SQL
+    sql, sources['sql'] = sql_stage(question, cache, timings)
+    telemetry.debug("Generated SQL: %s (%s)", sql, sources['sql'])
+    
+    # Not cached with the SQL: relative date bounds depend on the day it runs
+    rewritten = rewrite_sql(sql)
+    sql = rewritten['sql']
+    telemetry.debug("Rewritten SQL: %s (%s partitions pruned)", sql, rewritten['partitions_pruned'])
+    rewrite_report = {k: rewritten[k] for k in ('limit', 'predicates', 'partitions_pruned', 'pruning')}
+    if emit:
+        emit('sql', {'engine': 'athena', 'sql': sql, 'rewrite': rewrite_report})
+    
+    result, sources['results'], query = results_stage(sql, watermark, cache, timings)
+    columns, rows = result['columns'], result['rows']
+    chart = chart_of(columns, rows, result.get('types'))
+    truncated = len(rows) > RESPONSE_ROWS
+    rows = rows[:RESPONSE_ROWS]
+    telemetry.debug("Query results - Columns: %s, Rows: %d, Truncated: %s (%s)",
+                    columns, len(rows), truncated, sources['results'])
+    if emit:
+        emit('rows', {'columns': columns, 'rows': rows, 'truncated': truncated, 'chart': chart})
+    
+    answer, sources['summary'], summary_info = summary_stage(question, columns, rows, truncated, summary,
+                                                             cache, timings, emit)
+    timings['total_ms'] = elapsed_ms(started)
+    for name, source in sources.items():
+        telemetry.count(f"{name}_{source}")
+    telemetry.debug("Generated answer: %s (%s)", answer, sources['summary'])
+    
+    return {
+        'engine': 'athena',
+        'sql': sql,
+        'columns': columns,
+        'rows': rows,
+        'truncated': truncated,
+        'chart': chart,
+        'answer': answer,
+        'summary': summary_info,
+        'rewrite': rewrite_report,
+        'timings': timings,
+        'cache': {**sources, 'watermark': watermark, 'stats': cache.stats()},
+        # Only meaningful when the results stage missed the cache
+        'query': query if sources['results'] == MISS else None
+    }
 
-{few_shot_examples}
+def sql_stage(question: str, cache: PipelineCache, timings: Dict[str, Any]) -> tuple[str, str]:
+    """(SQL, cache source) of a question, generated by Bedrock on a miss"""
+    
+    with telemetry.span('llm_sql') as stage:
+        sql, source = cache['sql'].get_or_compute(
+            normalize_question(question), lambda: generate_sql(question, details=stage)
+        )
+        stage['source'] = source
+    timings['llm_sql_ms'] = stage['duration_ms']
+    return sql, source
 
-Question: {question}
+def results_stage(sql: str, watermark: Optional[str], cache: PipelineCache,
+                  timings: Dict[str, Any]) -> tuple[Dict[str, Any], str, Dict[str, Any]]:
+    """(columns and rows, cache source, Athena query details) of a rewritten SQL statement"""
+    
+    # One extra row tells us whether the result was cut off; time series are read in full for the chart
+    query = {'source': athena.EXECUTED}
+    series_rows = series_max_rows()
+    def run_query() -> Dict[str, Any]:
+        columns, rows = execute_athena_query(sql, max_rows=RESPONSE_ROWS + 1, details=query,
+                                             series_rows=series_rows and series_rows + 1)
+        return {'columns': columns, 'types': query.get('types'),
+                'rows': json.loads(json.dumps(rows, default=json_default))}
+    
+    # Results are only reusable while the data behind them is unchanged
+    with telemetry.span('athena') as stage:
+        if watermark:
+            result, source = cache['results'].get_or_compute(digest(athena.normalize_sql(sql), watermark), run_query)
+        else:
+            result, source = run_query(), MISS
+        stage['source'] = source
+        if source == MISS:
+            # Athena's own split of the wall time: waiting for capacity vs running the query
+            stage['queue_ms'] = timings['athena_queue_ms'] = query.get('queue_ms')
+            stage['exec_ms'] = timings['athena_exec_ms'] = query.get('exec_ms')
+    timings['athena_ms'] = stage['duration_ms']
+    return result, source, query
 
-Rules:
-1. Return ONLY the SQL query wrapped in <SQL>...</SQL> tags
-2. Use only SELECT statements, no DDL/DML
-3. Always filter by ticker when specific stock mentioned
-4. Limit date ranges to reasonable defaults (last 90 days if not specified)
-5. Use proper Athena SQL syntax
-6. Add LIMIT 200 to prevent large result sets
+def summary_stage(question: str, columns: List[str], rows: List[List[Any]], truncated: bool, summary: str,
+                  cache: PipelineCache, timings: Dict[str, Any],
+                  emit: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> tuple[Optional[str], str, Dict[str, Any]]:
+    """(answer, source, summary info): from the template for single values, else using Bedrock"""
+    
+    with telemetry.span('llm_summary', mode=summary) as stage:
+        summary_key = digest(normalize_question(question), columns, rows, truncated)
+        summary_info = {'mode': summary}
+        answer = None
+        templated = template_summary(columns, rows) if rows else NO_DATA
+        if summary == 'none':
+            source = 'skipped'
+        elif templated:
+            answer = templated
+            source = 'template'
+            if emit:
+                emit('summary', {'text': answer})
+        elif summary == 'async':
+            source, answer = cache['summary'].peek(summary_key)
+            summary_info.update({'id': summary_key, 'status': 'pending' if answer is None else 'done'})
+            if answer is None:
+                dispatch_summary({'summary_id': summary_key, 'question': question, 'columns': columns,
+                                  'rows': rows, 'truncated': truncated})
+        else:
+            def summarize() -> str:
+                if emit is None:
+                    return summarize_results(question, columns, rows, truncated=truncated)
+                parts = []
+                for text in stream_summary(question, columns, rows, truncated=truncated):
+                    parts.append(text)
+                    emit('summary', {'text': text})
+                return ''.join(parts).strip()
+            
+            answer, source = cache['summary'].get_or_compute(summary_key, summarize)
+            if emit and source != MISS:
+                emit('summary', {'text': answer})
+        stage['source'] = source
+    timings['llm_summary_ms'] = stage['duration_ms']
+    return answer, source, summary_info
 
-SQL:
+def elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
 
-\n\nAssistant:"""
+def dispatch_summary(job: Dict[str, Any]) -> None:
+    """Summarize in the background: an asynchronous self-invocation in Lambda, a thread elsewhere"""
+    
+    function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+    if function_name:
+        get_lambda_client().invoke(
+            FunctionName=function_name,
+            InvocationType='Event',
+            Payload=json.dumps({'summarize': job}, default=json_default)
+        )
+    else:
+        threading.Thread(target=run_summary_job, args=(job,), daemon=True).start()
+
+def run_summary_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarize a dispatched result into the summary cache, where a follow-up request finds it"""
+    
+    with telemetry.span('llm_summary', mode='async'):
+        answer, source = get_cache()['summary'].get_or_compute(
+            job['summary_id'],
+            lambda: summarize_results(job['question'], job['columns'], job['rows'], truncated=job['truncated'])
+        )
+    return {'summary_id': job['summary_id'], 'status': 'done', 'answer': answer, 'source': source}
+
+def summary_status(summary_id: str) -> Dict[str, Any]:
+    """Follow-up for `summary=async`: the summary once the background job stored it"""
+    
+    source, answer = get_cache()['summary'].peek(summary_id)
+    return {'summary_id': summary_id, 'status': 'pending' if answer is None else 'done', 'answer': answer}
+
+def stream_answer(question: str, write: Callable[[str], None], summary: str = 'sync') -> None:
+    """Answer a question as server-sent events passed to `write` as soon as each stage finishes
+    
+    Events: `sql`, `rows`, one `summary` per piece of summary text, then
+    `done` with the rest of the response (cache, query, ...) or `error`.
+    Streaming already delivers the rows before the summary, so `async` is
+    treated as `sync`.
+    """
     
-    bedrock_client = get_bedrock_client()
-    response = bedrock_client.invoke_model(
-        modelId='anthropic.claude-3-haiku-20240307-v1:0',
-        body=json.dumps({
-            'anthropic_version': 'bedrock-2023-05-31',
-            'messages': [
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ],
-            'max_tokens': 500,
-            'temperature': 0
-        }),
-        contentType='application/json'
+    def emit(event: str, data: Dict[str, Any]) -> None:
+        write(sse.encode(event, data, default=json_default))
+    
+    try:
+        payload = answer_locally(question)
+        if payload is None:
+            payload = answer_with_athena(question, emit=emit, summary='none' if summary == 'none' else 'sync')
+        else:
+            emit('sql', {'engine': payload['engine'], 'sql': payload['sql']})
+            emit('rows', {k: payload[k] for k in ('columns', 'rows', 'truncated', 'chart')})
+            emit('summary', {'text': payload['answer']})
+        rest = {k: v for k, v in payload.items() if k not in ('columns', 'rows', 'chart')}
+        emit('done', {'question': question, **rest})
+    except RejectedQuery as e:
+        emit('error', {'error': f"Generated SQL was rejected: {str(e)}", 'type': 'RejectedQuery', 'status': 400})
+    except (BrokenPipeError, ConnectionResetError):
+        # The client disconnected; there is no one left to send an error event to
+        raise
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        emit('error', {'error': str(e), 'type': str(type(e)), 'status': 500})
+
+def rewrite_sql(sql: str) -> Dict[str, Any]:
+    """Enforce SELECT-only and LIMIT on generated SQL and add year/month predicates for its date ranges"""
+    
+    watchlist = [t for t in os.environ.get('WATCHLIST', '').split(',') if t.strip()]
+    return rewrite(
+        sql,
+        max_limit=int(os.environ.get('SQL_MAX_LIMIT', '200')),
+        history_start=date.fromisoformat(os.environ.get('HISTORY_START', '2024-01-01')),
+        tickers=len(watchlist) or None,
+        series_limit=series_max_rows()
     )
+
+def answer_locally(question: str) -> Optional[Dict[str, Any]]:
+    """Answer a template question with the local engine; None when it does not apply"""
     
-    response_body = json.loads(response['body'].read())
-    sql_text = response_body['content'][0]['text']
+    if not os.environ.get('CURATED_BUCKET') or os.environ.get('LOCAL_ENGINE', 'on') == 'off':
+        return None
+    LocalEngine = get_local_engine()
+    if LocalEngine is None:
+        return None
+    watchlist = [t.strip().upper() for t in os.environ.get('WATCHLIST', '').split(',') if t.strip()]
+    try:
+        with telemetry.span('local_engine') as stage:
+            result = LocalEngine(load_ticker_series, watchlist).answer(question)
+            stage['intent'] = result and result['intent']
+    except Exception as e:
+        print(f"Local engine failed, falling back to Athena: {str(e)}")
+        return None
+    if result is None:
+        return None
+    telemetry.debug("Answered locally (%s)", result['intent'])
+    return {
+        'engine': 'local',
+        'intent': result['intent'],
+        'sql': result['sql'],
+        'columns': result['columns'],
+        'rows': result['rows'][:RESPONSE_ROWS],
+        'truncated': len(result['rows']) > RESPONSE_ROWS,
+        'chart': chart_of(result['columns'], result['rows']),
+        'answer': result['answer']
+    }
+
+def load_ticker_series(ticker: str) -> Optional[Dict[str, Any]]:
+    """Per-ticker price arrays, kept in memory until the data watermark moves"""
+    
+    from stox_common.series import load_series
+    
+    key = f"{ticker}@{current_watermark()}"
+    found, series = _series_cache.get(key)
+    if not found:
+        series = load_series(get_s3_client(), os.environ['CURATED_BUCKET'], ticker)
+        _series_cache.put(key, series)
+    return series
+
+def generate_sql(question: str, details: Optional[Dict[str, Any]] = None) -> str:
+    """Generate SQL from natural language using Bedrock
     
-    # Extract SQL from <SQL> tags
-    sql_match = re.search(r'<SQL>(.*?)</SQL>', sql_text, re.DOTALL)
-    if sql_match:
+    The prompt is the cached schema and rules prefix plus the FEW_SHOT_EXAMPLES
+    library examples closest to the question. `details`, when given,
+    receives the call's token counts and latency.
+    """
+    
+    system, prompt = prompts.sql_prompt(question, int(os.environ.get('FEW_SHOT_EXAMPLES', '3')))
+    # Generation stops at the closing tag instead of running on into an explanation
+    sql_text = bedrock.invoke(get_bedrock_client(), prompt, max_tokens=500, temperature=0, system=system,
+                              stop_sequences=['</SQL>'], purpose='sql', details=details)
+    
+    # Extract SQL from <SQL> tags; the stop sequence itself is not part of the completion
+    sql_match = re.search(r'<SQL>(.*?)(?:</SQL>|$)', sql_text, re.DOTALL)
+    if sql_match and sql_match.group(1).strip():
         return sql_match.group(1).strip()
     else:
         raise Exception("No SQL found in response")
 
-def execute_athena_query(sql: str) -> tuple[List[str], List[List[Any]]]:
-    """Execute SQL query in Athena and return results"""
+def execute_athena_query(sql: str, max_rows: Optional[int] = None, details: Optional[Dict[str, Any]] = None,
+                         series_rows: Optional[int] = None) -> tuple[List[str], List[List[Any]]]:
+    """Execute SQL query in Athena and return up to max_rows typed rows
+
+    `details`, when given, receives the query id, the column types and where the
+    result came from (a fresh execution, Athena result reuse, or an identical
+    query already in flight). A result whose column types make it a time
+    series is read up to `series_rows` rows instead, when that is given.
+    """
     
     athena_db = os.environ['ATHENA_DB']
     athena_output = os.environ['ATHENA_OUTPUT']
     
-    athena_client = get_athena_client()
-    # Start query execution
-    response = athena_client.start_query_execution(
-        QueryString=sql,
-        QueryExecutionContext={'Database': athena_db},
-        ResultConfiguration={'OutputLocation': athena_output}
-    )
+    # API Gateway gives up after 29s; stop the query before that instead of letting it run on
+    timeout = float(os.environ.get('ATHENA_QUERY_TIMEOUT_SECONDS', '25'))
     
-    query_execution_id = response['QueryExecutionId']
+    reuse_minutes = int(os.environ.get('ATHENA_REUSE_MAX_AGE_MINUTES', '60'))
     
-    # Poll for completion
-    while True:
-        response = athena_client.get_query_execution(QueryExecutionId=query_execution_id)
-        status = response['QueryExecution']['Status']['State']
-        
-        if status == 'SUCCEEDED':
-            break
-        elif status == 'FAILED':
-            error_reason = response['QueryExecution']['Status'].get('StateChangeReason', 'Unknown error')
-            raise Exception(f"Athena query failed: {error_reason}")
-        
-        import time
-        time.sleep(2)
-    
-    # Get results
-    response = athena_client.get_query_results(QueryExecutionId=query_execution_id)
-    
-    # Parse column names
-    columns = []
-    if 'ResultSet' in response and 'ResultSetMetadata' in response['ResultSet']:
-        columns = [col['Name'] for col in response['ResultSet']['ResultSetMetadata']['ColumnInfo']]
-    
-    # Parse rows
-    rows = []
-    if 'ResultSet' in response and 'Rows' in response['ResultSet']:
-        for row in response['ResultSet']['Rows'][1:]:  # Skip header row
-            row_data = []
-            for field in row['Data']:
-                if 'VarCharValue' in field:
-                    row_data.append(field['VarCharValue'])
-                else:
-                    row_data.append(None)
-            rows.append(row_data)
-    
-    return columns, rows
-
-def summarize_results(question: str, columns: List[str], rows: List[List[Any]]) -> str:
-    """Summarize query results using Bedrock"""
+    athena_client = get_athena_client()
+    execution, source = athena.execute(athena_client, sql, athena_db, athena_output,
+                                       timeout=timeout, reuse_minutes=reuse_minutes)
+    query_execution_id = execution['QueryExecutionId']
+    if details is not None:
+        details.update({
+            'query_id': query_execution_id,
+            'source': source,
+            'bytes_scanned': execution.get('Statistics', {}).get('DataScannedInBytes'),
+            'queue_ms': execution.get('Statistics', {}).get('QueryQueueTimeInMillis'),
+            'exec_ms': execution.get('Statistics', {}).get('EngineExecutionTimeInMillis')
+        })
     
-    if not rows:
-        return "No data found for the given criteria."
+    # 's3' reads the result CSV in one stream instead of GetQueryResults pages of 1,000 rows
+    if os.environ.get('ATHENA_RESULTS_MODE', 'api') == 's3':
+        column_info = athena.result_columns(athena_client, query_execution_id)
+        rows = athena.stream_csv_results(get_s3_client(), execution, column_info)
+    else:
+        column_info, rows = athena.stream_results(athena_client, query_execution_id)
+    
+    # Both readers fetch lazily, so the limit can follow the column types
+    types = [col.get('Type', 'varchar').lower() for col in column_info]
+    if details is not None:
+        details['types'] = types
+    if series_rows and get_charts() and get_charts().series_axis(types) is not None:
+        max_rows = max(max_rows or 0, series_rows)
+    columns = [col['Name'] for col in column_info]
+    return columns, list(islice(rows, max_rows))
+
+def summary_prompt(question: str, columns: List[str], rows: List[List[Any]], truncated: bool = False) -> str:
+    """Bedrock prompt asking for a short summary of the results"""
     
     # Prepare data summary
     data_summary = f"Columns: {', '.join(columns)}\n"
-    data_summary += f"Rows returned: {len(rows)}\n"
+    data_summary += f"Rows returned: {len(rows)}{' (more rows not shown)' if truncated else ''}\n"
     data_summary += f"Sample data (first 3 rows):\n"
     for i, row in enumerate(rows[:3]):
-        data_summary += f"Row {i+1}: {dict(zip(columns, row))}\n"
+        data_summary += f"Row {i+1}: {json.dumps(dict(zip(columns, row)), default=json_default)}\n"
     
-    prompt = f"""\n\nHuman: Summarize the following SQL query results in 2-3 sentences. If the data appears to be time series, suggest a chart mapping (x-axis, y-axis, series) in plain words.
+    return f"""\n\nHuman: Summarize the following SQL query results in 2-3 sentences. If the data appears to be time series, suggest a chart mapping (x-axis, y-axis, series) in plain words.
 
 Original question: {question}
 
@@ -227,23 +739,22 @@ Query results:
 Provide a concise summary and chart suggestion if applicable:
 
 \n\nAssistant:"""
+
+def summarize_results(question: str, columns: List[str], rows: List[List[Any]], truncated: bool = False) -> str:
+    """Summarize query results using Bedrock"""
     
-    bedrock_client = get_bedrock_client()
-    response = bedrock_client.invoke_model(
-        modelId='anthropic.claude-3-haiku-20240307-v1:0',
-        body=json.dumps({
-            'anthropic_version': 'bedrock-2023-05-31',
-            'messages': [
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ],
-            'max_tokens': 300,
-            'temperature': 0.3
-        }),
-        contentType='application/json'
-    )
+    if not rows:
+        return NO_DATA
+    
+    prompt = summary_prompt(question, columns, rows, truncated)
+    return bedrock.invoke(get_bedrock_client(), prompt, max_tokens=300, temperature=0.3, purpose='summary').strip()
+
+def stream_summary(question: str, columns: List[str], rows: List[List[Any]], truncated: bool = False) -> Iterator[str]:
+    """The summarize_results text in pieces, as Bedrock generates it"""
+    
+    if not rows:
+        yield NO_DATA
+        return
     
-    response_body = json.loads(response['body'].read())
-    return response_body['content'][0]['text'].strip()
+    prompt = summary_prompt(question, columns, rows, truncated)
+    yield from bedrock.stream(get_bedrock_client(), prompt, max_tokens=300, temperature=0.3)
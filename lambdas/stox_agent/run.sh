@@ -0,0 +1,3 @@
+#!/bin/sh
+# Entry point under the Lambda Web Adapter (StoxAgentStreamFunction)
+exec python3 stream_server.py
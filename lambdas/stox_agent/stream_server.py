@@ -0,0 +1,107 @@
+"""Streaming front end for stox-agent: POST /chat answers with server-sent events
+
+API Gateway (REST) buffers Lambda responses, and the Python runtime has
+no native response streaming. This server writes each event of
+`stream_answer` with chunked transfer encoding as soon as it is produced.
+The SQL arrives after the Bedrock SQL call, the rows when Athena
+finishes, and then the summary word by word.
+
+Deployed, it runs under the Lambda Web Adapter behind a Function URL with
+RESPONSE_STREAM invoke mode (StoxAgentStreamFunction in the template).
+Locally:
+
+    python -m lambdas.stox_agent.stream_server --port 8080
+"""
+
+import argparse
+import json
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import lambda_function as agent
+except ImportError:
+    from lambdas.stox_agent import lambda_function as agent
+
+from stox_common import sse
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _cors(self) -> None:
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self._cors()
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError:
+            body = {}
+        body = body if isinstance(body, dict) else {}
+        question = body.get('question', '')
+        summary = body.get('summary') or os.environ.get('SUMMARY_MODE', 'sync')
+        if not question:
+            self._error('Question is required')
+            return
+        if summary not in agent.SUMMARY_MODES:
+            self._error(f"summary must be one of {', '.join(agent.SUMMARY_MODES)}")
+            return
+
+        self.send_response(200)
+        self._cors()
+        self.send_header('Content-Type', sse.CONTENT_TYPE)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def write(text: str) -> None:
+            data = text.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            agent.stream_answer(question, write, summary=summary)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away mid-stream; the rest of the answer has nowhere to go
+            self.close_connection = True
+
+    def _error(self, message: str) -> None:
+        payload = json.dumps({'error': message}).encode()
+        self.send_response(400)
+        self._cors()
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_server(host: str = '127.0.0.1', port: int = 8080) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), StreamHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    # The Lambda Web Adapter forwards requests to AWS_LWA_PORT (8080 by default)
+    parser.add_argument('--port', type=int, default=int(os.environ.get('AWS_LWA_PORT', '8080')))
+    args = parser.parse_args()
+    make_server(args.host, args.port).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
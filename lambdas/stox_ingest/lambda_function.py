@@ -1,95 +1,293 @@
 import json
 import os
-import boto3
-import requests
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
-s3_client = boto3.client('s3')
+from stox_common import clients, providers, telemetry
+from stox_common.cache import write_watermark
+from stox_common.layout import BATCH, group_rows
+from stox_common.manifest import FileManifestStore, IngestManifest, S3ManifestStore, find_gap, new_rows
+from stox_common.partitions import GlueCatalog, partitions_of_keys
+from stox_common.providers import Provider, RateLimitError
+from stox_common.ratelimit import TokenBucket
+from stox_common.stats import summarize_latencies
+from stox_common.writers import get_writer
 
+# Created on first use (get_s3_client), not at import
+s3_client = None
+_http_session = None
+
+def get_s3_client():
+    global s3_client
+    if s3_client is None:
+        s3_client = clients.get('s3')
+    return s3_client
+
+def get_glue_client():
+    return clients.get('glue')
+
+def get_http_session():
+    """requests Session shared by the fetch workers, so connections to the provider stay open"""
+    global _http_session
+    if _http_session is None:
+        import requests
+        session = requests.Session()
+        pool = int(os.environ.get('INGEST_CONCURRENCY', '8'))
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(pool, 1))
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _http_session = session
+    return _http_session
+
+def get_provider() -> Provider:
+    """Price provider named by INGEST_PROVIDER; batch providers fetch many tickers per request"""
+    return providers.get_provider(os.environ.get('INGEST_PROVIDER', 'alphavantage'), session=get_http_session())
+
+@telemetry.instrumented('stox-ingest')
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    """Daily stock data ingestion from Alpha Vantage API"""
+    """Daily stock data ingestion from the configured price provider (Alpha Vantage by default)"""
     
     curated_bucket = os.environ['CURATED_BUCKET']
-    watchlist = os.environ['WATCHLIST'].split(',')
-    api_key = os.environ['ALPHAVANTAGE_API_KEY']
+    watchlist = [t.strip().upper() for t in os.environ['WATCHLIST'].split(',') if t.strip()]
+    provider = get_provider()
     
-    results = {}
+    concurrency = int(os.environ.get('INGEST_CONCURRENCY', '8'))
+    calls_per_minute = float(os.environ.get('PROVIDER_CALLS_PER_MINUTE',
+                                            os.environ.get('ALPHAVANTAGE_CALLS_PER_MINUTE', '5')))
+    limiter = TokenBucket.per_minute(calls_per_minute, burst=min(concurrency, calls_per_minute))
     
-    for ticker in watchlist:
-        ticker = ticker.strip().upper()
-        try:
-            data = fetch_stock_data(ticker, api_key)
-            if data:
-                s3_key = write_to_s3(data, ticker, curated_bucket)
-                results[ticker] = {'status': 'success', 's3_key': s3_key}
-            else:
-                results[ticker] = {'status': 'no_data'}
-        except Exception as e:
-            print(f"Error processing {ticker}: {str(e)}")
-            results[ticker] = {'status': 'error', 'error': str(e)}
+    manifest = load_manifest(curated_bucket)
+    started = time.perf_counter()
+    results = ingest_watchlist(watchlist, provider, curated_bucket, limiter, concurrency, manifest)
+    wall_ms = (time.perf_counter() - started) * 1000
+    # Tickers of one batch share its request and its retries
+    attempts = {r['batch']: r['attempts'] for r in results.values()}
+    
+    succeeded = [r for r in results.values() if r['status'] == 'success']
+    written = [key for r in succeeded for key in r['s3_keys']]
+    with telemetry.span('register_partitions'):
+        partitions = register_partitions(written, curated_bucket)
+    with telemetry.span('watermark'):
+        watermark = record_watermark([r['latest'] for r in succeeded], curated_bucket)
+        save_manifest(manifest)
+    with telemetry.span('indicators'):
+        indicators = materialize_indicators(
+            [t for t, r in results.items() if r['status'] == 'success'], curated_bucket
+        )
     
     return {
         'statusCode': 200,
         'body': json.dumps({
             'timestamp': datetime.now().isoformat(),
-            'results': results
+            'results': results,
+            'partitions': partitions,
+            'watermark': watermark,
+            'indicators': indicators,
+            'stats': {
+                'tickers': len(watchlist),
+                'provider': provider.name,
+                'requests': sum(attempts.values()),
+                'days_written': sum(r['days'] for r in succeeded),
+                'gaps': sorted(t for t, r in results.items() if r.get('gap')),
+                'concurrency': concurrency,
+                'wall_ms': round(wall_ms, 2),
+                'latency': summarize_latencies(r['latency_ms'] for r in results.values()),
+                'rate_limit_retries': sum(a - 1 for a in attempts.values())
+            }
         })
     }
 
-def fetch_stock_data(ticker: str, api_key: str) -> Dict[str, Any]:
-    """Fetch latest stock data from Alpha Vantage"""
+def register_partitions(keys: List[str], bucket: str) -> Dict[str, Any]:
+    """Register the partitions behind the written keys so Athena sees them immediately"""
     
-    url = f"https://www.alphavantage.co/query"
-    params = {
-        'function': 'TIME_SERIES_DAILY',
-        'symbol': ticker,
-        'apikey': api_key,
-        'outputsize': 'compact'
-    }
+    if not keys or os.environ.get('PARTITION_MODE', 'register') == 'projection':
+        return {'created': 0, 'existing': 0, 'calls': 0}
+    try:
+        catalog = GlueCatalog(get_glue_client(), os.environ.get('ATHENA_DB', 'stox'))
+        return catalog.register(bucket, partitions_of_keys(keys))
+    except Exception as e:
+        # The objects are stored; the next run or a maint repair can still register them
+        print(f"Error registering partitions: {str(e)}")
+        return {'error': str(e)}
+
+def load_manifest(bucket: str) -> Optional[IngestManifest]:
+    """Per-ticker high-watermarks; None (write only the latest day) when the manifest cannot be read"""
     
-    response = requests.get(url, params=params, timeout=30)
-    response.raise_for_status()
-    data = response.json()
+    try:
+        if os.environ.get('MANIFEST_STORE', 's3') == 'file':
+            store = FileManifestStore(os.environ.get('MANIFEST_PATH', '/tmp/stox-ingest-manifest.json'))
+        else:
+            store = S3ManifestStore(get_s3_client(), bucket)
+        # Tickers never recorded here were last written by backfill or older runs
+        return IngestManifest.load(store, lookup=lambda ticker: stored_last_date(ticker, bucket))
+    except Exception as e:
+        # Without the manifest, saving one would drop the other tickers' watermarks
+        print(f"Error reading ingest manifest: {str(e)}")
+        return None
+
+def stored_last_date(ticker: str, bucket: str) -> Optional[str]:
+    """Last day in the ticker's series, for tickers the manifest has not recorded yet"""
     
-    if 'Error Message' in data:
-        raise Exception(f"Alpha Vantage error: {data['Error Message']}")
+    try:
+        from stox_common.series import load_series, to_date
+        series = load_series(get_s3_client(), bucket, ticker)
+    except Exception as e:
+        # Without it only the latest day is written; backfill fills anything older
+        print(f"Error reading series of {ticker}: {str(e)}")
+        return None
+    if series is None or not len(series['date']):
+        return None
+    return to_date(int(series['date'][-1])).isoformat()
+
+def save_manifest(manifest: Optional[IngestManifest]) -> None:
+    if manifest is None:
+        return
+    try:
+        manifest.save()
+    except Exception as e:
+        # The next run writes the same days again, to the same keys
+        print(f"Error saving ingest manifest: {str(e)}")
+
+def record_watermark(latest_dates: List[str], bucket: str) -> Optional[Dict[str, Any]]:
+    """Move the data watermark so agent caches stop serving results from before this run"""
     
-    if 'Note' in data:
-        raise Exception(f"API limit reached: {data['Note']}")
+    if not latest_dates:
+        return None
+    try:
+        return write_watermark(get_s3_client(), bucket, max(latest_dates))
+    except Exception as e:
+        print(f"Error writing watermark: {str(e)}")
+        return {'error': str(e)}
+
+def materialize_indicators(tickers: List[str], bucket: str) -> Optional[Dict[str, Any]]:
+    """Append today's rows to stox.indicators and stox.correlations from the rolling state"""
     
-    time_series = data.get('Time Series (Daily)', {})
-    if not time_series:
+    if not tickers or os.environ.get('INDICATORS', 'on') == 'off':
         return None
+    try:
+        # NumPy is only imported when indicators are on and a ticker got new days
+        from stox_common.indicators import materialize
+        return materialize(get_s3_client(), bucket, tickers)
+    except Exception as e:
+        # The state is only saved after a full run, so the next run picks these days up
+        print(f"Error materializing indicators: {str(e)}")
+        return {'error': str(e)}
+
+def ingest_watchlist(tickers: List[str], provider: Provider, bucket: str, limiter: TokenBucket,
+                     concurrency: int, manifest: Optional[IngestManifest] = None) -> Dict[str, Dict[str, Any]]:
+    """Fetch the tickers in batches of provider.batch_size, at most `concurrency` requests in flight, and store each"""
     
-    latest_date = max(time_series.keys())
-    latest_data = time_series[latest_date]
+    batches = provider.batches(tickers)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        fetched = pool.map(lambda batch: fetch_batch(batch, provider, limiter), batches)
+        # A batch's tickers are stored in parallel as soon as its response is parsed
+        stored = {}
+        for number, (batch, outcome) in enumerate(zip(batches, fetched)):
+            for ticker in batch:
+                stored[ticker] = pool.submit(store_ticker, ticker, outcome, number, bucket, manifest)
+        return {ticker: stored[ticker].result() for ticker in tickers}
+
+def fetch_batch(tickers: List[str], provider: Provider, limiter: TokenBucket) -> Dict[str, Any]:
+    """One provider request (plus retries) for a batch of tickers; errors are returned, not raised"""
     
-    return {
-        'date': latest_date,
-        'open': float(latest_data['1. open']),
-        'high': float(latest_data['2. high']),
-        'low': float(latest_data['3. low']),
-        'close': float(latest_data['4. close']),
-        'volume': int(latest_data['5. volume']),
-        'adj_close': float(latest_data['4. close'])  # Use close as adj_close for free endpoint
-    }
+    started = time.perf_counter()
+    outcome: Dict[str, Any] = {'rows': {}, 'attempts': 1}
+    try:
+        with telemetry.span('fetch', provider=provider.name, tickers=len(tickers)) as stage:
+            outcome['rows'], outcome['attempts'] = fetch_with_retry(provider, tickers, limiter)
+            stage['attempts'] = outcome['attempts']
+    except Exception as e:
+        outcome['error'] = str(e)
+    if 'error' in outcome:
+        print(f"Error fetching {', '.join(tickers[:5])}{' ...' if len(tickers) > 5 else ''}: {outcome['error']}")
+    telemetry.count('provider_requests', outcome['attempts'])
+    telemetry.count('rate_limit_retries', outcome['attempts'] - 1)
+    outcome['latency_ms'] = (time.perf_counter() - started) * 1000
+    return outcome
 
-def write_to_s3(data: Dict[str, Any], ticker: str, bucket: str) -> str:
-    """Write stock data to S3 with proper partitioning"""
+def store_ticker(ticker: str, fetched: Dict[str, Any], batch: int, bucket: str,
+                 manifest: Optional[IngestManifest] = None) -> Dict[str, Any]:
+    """Write every fetched day of the ticker past its watermark to S3"""
     
-    date_obj = datetime.strptime(data['date'], '%Y-%m-%d')
+    started = time.perf_counter()
+    try:
+        if 'error' in fetched:
+            raise Exception(fetched['error'])
+        rows = fetched['rows'].get(ticker, [])
+        watermark = manifest.watermark(ticker) if manifest else None
+        pending = new_rows(rows, watermark)
+        if pending:
+            with telemetry.span('s3_put', ticker=ticker, days=len(pending)):
+                s3_keys = write_to_s3(pending, ticker, bucket)
+            with telemetry.span('series_update', ticker=ticker):
+                update_ticker_series(ticker, pending, bucket)
+            if manifest:
+                manifest.advance(ticker, pending[-1]['date'])
+            result = {'status': 'success', 's3_keys': s3_keys, 'days': len(pending), 'latest': pending[-1]['date']}
+        else:
+            result = {'status': 'up_to_date' if rows else 'no_data'}
+        gap = find_gap(rows, watermark)
+        if gap:
+            # Older than the provider's response reaches; only backfill.py can fill it
+            result['gap'] = gap
+            telemetry.count('gaps')
+    except Exception as e:
+        print(f"Error processing {ticker}: {str(e)}")
+        result = {'status': 'error', 'error': str(e)}
     
-    csv_content = f"date,open,high,low,close,volume,adj_close\n"
-    csv_content += f"{data['date']},{data['open']},{data['high']},{data['low']},{data['close']},{data['volume']},{data['adj_close']}\n"
+    result['batch'] = batch
+    result['attempts'] = fetched['attempts']
+    telemetry.count(f"tickers_{result['status']}")
+    result['latency_ms'] = round(fetched['latency_ms'] + (time.perf_counter() - started) * 1000, 2)
+    return result
+
+def update_ticker_series(ticker: str, rows: List[Dict[str, Any]], bucket: str) -> None:
+    """Append the days to the ticker's compact series used by the agent's local engine"""
+    
+    try:
+        from stox_common.series import update_series
+        update_series(get_s3_client(), bucket, ticker, rows)
+    except Exception as e:
+        # The prices object is stored; the series catches up on the next write
+        print(f"Error updating series for {ticker}: {str(e)}")
+
+def fetch_with_retry(provider: Provider, tickers: List[str], limiter: TokenBucket, retries: Optional[int] = None,
+                     backoff: Optional[float] = None) -> tuple[Dict[str, List[Dict[str, Any]]], int]:
+    """Fetch one batch under the rate limiter, backing off when the provider throttles"""
     
-    s3_key = f"prices/ticker={ticker}/year={date_obj.year}/month={date_obj.month:02d}/day={date_obj.day:02d}/data.csv"
+    if retries is None:
+        retries = int(os.environ.get('RATE_LIMIT_RETRIES', '3'))
+    if backoff is None:
+        backoff = float(os.environ.get('RATE_LIMIT_BACKOFF_SECONDS', '15'))
+    
+    attempt = 0
+    while True:
+        attempt += 1
+        limiter.acquire()
+        try:
+            return provider.fetch(tickers), attempt
+        except RateLimitError:
+            if attempt > retries:
+                raise
+            # The quota is shared by every worker, so stop the others from spending it too
+            limiter.drain()
+            time.sleep(backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.0))
+
+def write_to_s3(rows: List[Dict[str, Any]], ticker: str, bucket: str) -> List[str]:
+    """Write the rows to S3 with proper partitioning: one object per month of new days"""
     
-    s3_client.put_object(
-        Bucket=bucket,
-        Key=s3_key,
-        Body=csv_content,
-        ContentType='text/csv'
-    )
+    writer = get_writer()
+    keys = []
+    for s3_key, group in group_rows(ticker, rows, BATCH, writer.filename).items():
+        get_s3_client().put_object(
+            Bucket=bucket,
+            Key=s3_key,
+            Body=writer.serialize(group),
+            ContentType=writer.content_type
+        )
+        keys.append(s3_key)
     
-    return s3_key
+    return keys
@@ -1,27 +1,40 @@
 import json
 import os
-import boto3
 from typing import Dict, Any
 
+from stox_common import athena, clients, telemetry
+from stox_common.compaction import compact
+
 def get_athena_client():
-    return boto3.client('athena')
+    return athena.get_client()
 
+@telemetry.instrumented('stox-maint')
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """Weekly maintenance tasks for stock data"""
     
     athena_db = os.environ['ATHENA_DB']
     athena_output = os.environ['ATHENA_OUTPUT']
+    tasks = event.get('tasks') or os.environ.get('MAINT_TASKS', 'compact').split(',')
     
     results = {}
     
     try:
-        # Repair table to sync new partitions
-        repair_result = repair_table(athena_db, athena_output)
-        results['repair_table'] = repair_result
+        # Ingest and backfill register their own partitions; a full MSCK REPAIR
+        # scan is only needed to recover objects written outside those paths
+        if 'repair' in tasks:
+            with telemetry.span('repair'):
+                results['repair_table'] = repair_table(athena_db, athena_output)
+        
+        # Compact closed months; only partitions with new data are rewritten
+        if 'compact' in tasks:
+            with telemetry.span('compact'):
+                results['compact'] = compact_partitions(os.environ['CURATED_BUCKET'], athena_db)
         
-        # Optional: Compact recent data to Parquet (commented for week-1)
-        # compact_result = compact_to_parquet(athena_db, athena_output)
-        # results['compact_parquet'] = compact_result
+        # Replay stox.indicators from the series archives, e.g. after a backfill
+        # rewrote history that the incremental state has already moved past
+        if 'indicators' in tasks:
+            with telemetry.span('indicators'):
+                results['indicators'] = rebuild_indicators(os.environ['CURATED_BUCKET'])
         
         return {
             'statusCode': 200,
@@ -43,28 +56,13 @@ def repair_table(athena_db: str, athena_output: str) -> Dict[str, Any]:
     
     sql = "MSCK REPAIR TABLE stox.prices"
     
-    athena_client = get_athena_client()
-    response = athena_client.start_query_execution(
-        QueryString=sql,
-        QueryExecutionContext={'Database': athena_db},
-        ResultConfiguration={'OutputLocation': athena_output}
-    )
+    timeout = float(os.environ.get('ATHENA_QUERY_TIMEOUT_SECONDS', '600'))
     
-    query_execution_id = response['QueryExecutionId']
-    
-    # Poll for completion
-    while True:
-        response = athena_client.get_query_execution(QueryExecutionId=query_execution_id)
-        status = response['QueryExecution']['Status']['State']
-        
-        if status == 'SUCCEEDED':
-            break
-        elif status == 'FAILED':
-            error_reason = response['QueryExecution']['Status'].get('StateChangeReason', 'Unknown error')
-            raise Exception(f"MSCK REPAIR failed: {error_reason}")
-        
-        import time
-        time.sleep(2)
+    try:
+        execution = athena.run_query(get_athena_client(), sql, athena_db, athena_output, timeout=timeout)
+    except athena.QueryFailed as e:
+        raise Exception(f"MSCK REPAIR failed: {e.reason}")
+    query_execution_id = execution['QueryExecutionId']
     
     return {
         'status': 'success',
@@ -72,46 +70,23 @@ def repair_table(athena_db: str, athena_output: str) -> Dict[str, Any]:
         'message': 'Partitions synced successfully'
     }
 
-def compact_to_parquet(athena_db: str, athena_output: str) -> Dict[str, Any]:
-    """Compact last 90 days of data to Parquet format (optional)"""
-    
-    sql = """
-    CREATE TABLE stox.prices_parquet
-    WITH (
-        format = 'PARQUET',
-        external_location = 's3://stox-curated-demo-1234/prices_parquet/'
-    )
-    AS
-    SELECT date, open, high, low, close, volume, adj_close, ticker, year, month, day
-    FROM stox.prices
-    WHERE date >= current_date - interval '90' day
-    """
+def compact_partitions(curated_bucket: str, athena_db: str) -> Dict[str, Any]:
+    """Roll closed monthly partitions into one file each and switch readers to it"""
     
-    athena_client = get_athena_client()
-    response = athena_client.start_query_execution(
-        QueryString=sql,
-        QueryExecutionContext={'Database': athena_db},
-        ResultConfiguration={'OutputLocation': athena_output}
+    return compact(
+        clients.get('s3'),
+        clients.get('glue'),
+        curated_bucket,
+        athena_db,
+        grace_days=int(os.environ.get('COMPACTION_GRACE_DAYS', '3')),
+        max_partitions=int(os.environ.get('COMPACTION_MAX_PARTITIONS', '500'))
     )
+
+def rebuild_indicators(curated_bucket: str) -> Dict[str, Any]:
+    """Recompute every ticker's indicators and rolling state from scratch"""
     
-    query_execution_id = response['QueryExecutionId']
-    
-    # Poll for completion
-    while True:
-        response = athena_client.get_query_execution(QueryExecutionId=query_execution_id)
-        status = response['QueryExecution']['Status']['State']
-        
-        if status == 'SUCCEEDED':
-            break
-        elif status == 'FAILED':
-            error_reason = response['QueryExecution']['Status'].get('StateChangeReason', 'Unknown error')
-            raise Exception(f"Parquet compaction failed: {error_reason}")
-        
-        import time
-        time.sleep(5)
+    # NumPy is only needed for this task, not for the weekly compaction
+    from stox_common.indicators import materialize, series_tickers
     
-    return {
-        'status': 'success',
-        'query_id': query_execution_id,
-        'message': 'Data compacted to Parquet successfully'
-    }
+    s3 = clients.get('s3')
+    return materialize(s3, curated_bucket, series_tickers(s3, curated_bucket), rebuild=True)
@@ -0,0 +1 @@
+"""Shared code for the stox Lambda functions, deployed as the stox-common layer"""
@@ -0,0 +1,337 @@
+"""Athena query execution shared by the Lambdas
+
+Queries are polled with a jittered exponential backoff: the first checks
+come quickly so short queries return as soon as they finish, and the
+interval grows to MAX_DELAY for long ones. Every query runs against a
+deadline. When the deadline passes, the query is cancelled with
+StopQueryExecution so it stops scanning (and billing). `run_query_async`
+runs the same loop on asyncio, so a caller can wait on several queries at
+once; asyncio is imported only by those functions.
+
+`execute` avoids scanning the same data twice. It asks Athena to reuse
+the results of an identical query that ran within `reuse_minutes`. While
+an identical statement is still running in this process, it also joins
+that query instead of starting another one. The returned source says
+which of the three happened.
+
+Results are read lazily. `stream_results` follows NextToken one page at a
+time, and `stream_csv_results` reads the CSV file Athena writes to S3,
+which is faster for large results. Both convert cells to Python types
+using the ColumnInfo types and stop fetching once `limit` rows are read.
+"""
+
+import csv
+import io
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from stox_common import clients
+
+TERMINAL_STATES = ('SUCCEEDED', 'FAILED', 'CANCELLED')
+
+DEFAULT_TIMEOUT = 300.0
+INITIAL_DELAY = 0.1
+MAX_DELAY = 1.0
+BACKOFF_FACTOR = 1.5
+JITTER = 0.2
+
+PAGE_SIZE = 1000  # GetQueryResults maximum
+
+EXECUTED = 'executed'
+REUSED = 'reused'
+COALESCED = 'coalesced'
+
+_client = None
+
+
+class QueryFailed(Exception):
+    """Athena finished the query in FAILED or CANCELLED state"""
+
+    def __init__(self, query_id: str, state: str, reason: str):
+        super().__init__(f"Athena query {state.lower()}: {reason}")
+        self.query_id = query_id
+        self.state = state
+        self.reason = reason
+
+
+class QueryTimeout(QueryFailed):
+    """The query outlived its deadline and was stopped"""
+
+    def __init__(self, query_id: str, timeout: float):
+        super().__init__(query_id, 'CANCELLED', f"deadline of {timeout:g}s exceeded")
+        self.timeout = timeout
+
+
+def get_client():
+    """Athena client created once per execution environment
+
+    With ATHENA_BACKEND=duckdb it is a `localathena.LocalAthena` over the
+    directory ATHENA_LOCAL_DIR, which needs no AWS account.
+    """
+    global _client
+    if _client is None:
+        if os.environ.get('ATHENA_BACKEND', 'athena') == 'duckdb':
+            from stox_common.localathena import LocalAthena
+            _client = LocalAthena(os.environ['ATHENA_LOCAL_DIR'], os.environ.get('ATHENA_DB', 'stox'),
+                                  views=os.environ.get('ATHENA_LOCAL_VIEWS'))
+        else:
+            _client = clients.get('athena')
+    return _client
+
+
+def poll_delays(initial: float = INITIAL_DELAY, maximum: float = MAX_DELAY,
+                factor: float = BACKOFF_FACTOR, jitter: float = JITTER) -> Iterator[float]:
+    """Endless sequence of poll intervals: initial, initial*factor, ... capped at maximum"""
+    delay = initial
+    while True:
+        yield delay * random.uniform(1 - jitter, 1 + jitter)
+        delay = min(maximum, delay * factor)
+
+
+def start_query(client: Any, sql: str, database: str, output: str, reuse_minutes: int = 0) -> str:
+    request = {
+        'QueryString': sql,
+        'QueryExecutionContext': {'Database': database},
+        'ResultConfiguration': {'OutputLocation': output},
+    }
+    if reuse_minutes > 0:
+        request['ResultReuseConfiguration'] = {
+            'ResultReuseByAgeConfiguration': {'Enabled': True, 'MaxAgeInMinutes': reuse_minutes}
+        }
+    return client.start_query_execution(**request)['QueryExecutionId']
+
+
+def _check(client: Any, query_id: str) -> Optional[Dict[str, Any]]:
+    """The QueryExecution once it is terminal, None while it is still running"""
+    execution = client.get_query_execution(QueryExecutionId=query_id)['QueryExecution']
+    state = execution['Status']['State']
+    if state == 'SUCCEEDED':
+        return {'QueryExecutionId': query_id, **execution}
+    if state in TERMINAL_STATES:
+        raise QueryFailed(query_id, state, execution['Status'].get('StateChangeReason', 'Unknown error'))
+    return None
+
+
+def _stop(client: Any, query_id: str, timeout: float) -> QueryTimeout:
+    try:
+        client.stop_query_execution(QueryExecutionId=query_id)
+    except Exception as e:
+        print(f"Could not stop Athena query {query_id}: {e}")
+    return QueryTimeout(query_id, timeout)
+
+
+def wait_for_query(client: Any, query_id: str, timeout: float = DEFAULT_TIMEOUT,
+                   delays: Optional[Iterator[float]] = None,
+                   clock: Callable[[], float] = time.monotonic,
+                   sleep: Callable[[float], None] = time.sleep) -> Dict[str, Any]:
+    """Poll until the query succeeds; raise QueryFailed, or stop it and raise QueryTimeout"""
+    deadline = clock() + timeout
+    delays = delays or poll_delays()
+    while True:
+        execution = _check(client, query_id)
+        if execution:
+            return execution
+        remaining = deadline - clock()
+        if remaining <= 0:
+            raise _stop(client, query_id, timeout)
+        sleep(min(next(delays), remaining))
+
+
+def run_query(client: Any, sql: str, database: str, output: str,
+              timeout: float = DEFAULT_TIMEOUT, reuse_minutes: int = 0) -> Dict[str, Any]:
+    """Start `sql` and block until it succeeds; returns the final QueryExecution"""
+    query_id = start_query(client, sql, database, output, reuse_minutes)
+    return wait_for_query(client, query_id, timeout)
+
+
+def was_reused(execution: Dict[str, Any]) -> bool:
+    return bool(execution.get('Statistics', {}).get('ResultReuseInformation', {}).get('ReusedPreviousResult'))
+
+
+class InFlight:
+    """Lets concurrent callers with the same key share one running computation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running: Dict[Any, Future] = {}
+
+    def run(self, key: Any, compute: Callable[[], Any]) -> Tuple[Any, bool]:
+        """(result, joined): joined is True when another caller did the work"""
+        with self._lock:
+            future = self._running.get(key)
+            leader = future is None
+            if leader:
+                future = self._running[key] = Future()
+        if not leader:
+            return future.result(), True
+        try:
+            result = compute()
+            future.set_result(result)
+            return result, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._running[key]
+
+
+_in_flight = InFlight()
+
+
+def normalize_sql(sql: str) -> str:
+    """Whitespace and a trailing semicolon do not change what a statement returns"""
+    return re.sub(r'\s+', ' ', sql).strip().rstrip(';').strip()
+
+
+def statement_key(sql: str, database: str) -> Tuple[str, str]:
+    return database, normalize_sql(sql)
+
+
+def execute(client: Any, sql: str, database: str, output: str, timeout: float = DEFAULT_TIMEOUT,
+            reuse_minutes: int = 0) -> Tuple[Dict[str, Any], str]:
+    """(QueryExecution, source) with source 'executed', 'reused' or 'coalesced'"""
+    execution, joined = _in_flight.run(
+        statement_key(sql, database),
+        lambda: run_query(client, sql, database, output, timeout, reuse_minutes)
+    )
+    if joined:
+        return execution, COALESCED
+    return execution, REUSED if was_reused(execution) else EXECUTED
+
+
+async def wait_for_query_async(client: Any, query_id: str, timeout: float = DEFAULT_TIMEOUT,
+                               delays: Optional[Iterator[float]] = None) -> Dict[str, Any]:
+    """`wait_for_query` that yields to the event loop between polls"""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delays = delays or poll_delays()
+    while True:
+        # boto3 is blocking; run each API call on the default executor
+        execution = await asyncio.to_thread(_check, client, query_id)
+        if execution:
+            return execution
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise await asyncio.to_thread(_stop, client, query_id, timeout)
+        await asyncio.sleep(min(next(delays), remaining))
+
+
+async def run_query_async(client: Any, sql: str, database: str, output: str,
+                          timeout: float = DEFAULT_TIMEOUT, reuse_minutes: int = 0) -> Dict[str, Any]:
+    import asyncio
+    query_id = await asyncio.to_thread(start_query, client, sql, database, output, reuse_minutes)
+    return await wait_for_query_async(client, query_id, timeout)
+
+
+def run_queries(client: Any, statements: List[str], database: str, output: str,
+                timeout: float = DEFAULT_TIMEOUT, reuse_minutes: int = 0) -> List[Any]:
+    """Run several statements concurrently; each result is a QueryExecution or the exception it raised
+
+    Identical statements in the batch run once and share the result.
+    """
+    # Imported here: asyncio costs ~50 ms at startup and only batch callers need it
+    import asyncio
+    unique = list(dict.fromkeys(statement_key(sql, database) for sql in statements))
+
+    async def gather():
+        return await asyncio.gather(
+            *(run_query_async(client, sql, database, output, timeout, reuse_minutes) for _, sql in unique),
+            return_exceptions=True
+        )
+
+    results = dict(zip(unique, asyncio.run(gather())))
+    return [results[statement_key(sql, database)] for sql in statements]
+
+
+def _timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace(' ', 'T', 1))
+
+
+_CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    'boolean': lambda v: v == 'true',
+    'tinyint': int,
+    'smallint': int,
+    'integer': int,
+    'bigint': int,
+    'float': float,
+    'real': float,
+    'double': float,
+    'decimal': Decimal,
+    'date': date.fromisoformat,
+    'timestamp': _timestamp,
+}
+
+
+def converters(column_info: List[Dict[str, Any]]) -> List[Optional[Callable[[str], Any]]]:
+    """Per-column converter from Athena's string cells; None keeps the string"""
+    return [_CONVERTERS.get(col.get('Type', 'varchar').lower()) for col in column_info]
+
+
+def _convert(cells: List[Optional[str]], convs: List[Optional[Callable[[str], Any]]]) -> List[Any]:
+    row = []
+    for cell, conv in zip(cells, convs):
+        # An empty cell in a typed column is a NULL (the CSV output cannot tell them apart)
+        if cell is None or conv is None:
+            row.append(cell)
+        elif cell == '':
+            row.append(None)
+        else:
+            row.append(conv(cell))
+    return row
+
+
+def stream_results(client: Any, query_id: str, limit: Optional[int] = None,
+                   page_size: int = PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Iterator[List[Any]]]:
+    """(ColumnInfo, typed rows) of a SELECT; pages are fetched only as rows are consumed"""
+    request = {'QueryExecutionId': query_id, 'MaxResults': page_size}
+    first = client.get_query_results(**request)
+    column_info = first.get('ResultSet', {}).get('ResultSetMetadata', {}).get('ColumnInfo', [])
+    convs = converters(column_info)
+
+    def rows() -> Iterator[List[Any]]:
+        page, skip = first, 1  # the first row of the first page repeats the column names
+        while True:
+            for row in page.get('ResultSet', {}).get('Rows', [])[skip:]:
+                yield _convert([field.get('VarCharValue') for field in row['Data']], convs)
+            token = page.get('NextToken')
+            if not token:
+                return
+            page, skip = client.get_query_results(NextToken=token, **request), 0
+
+    return column_info, islice(rows(), limit)
+
+
+def stream_csv_results(s3: Any, execution: Dict[str, Any], column_info: List[Dict[str, Any]],
+                       limit: Optional[int] = None) -> Iterator[List[Any]]:
+    """Typed rows read straight from the query's CSV output in S3"""
+    location = execution['ResultConfiguration']['OutputLocation']
+    bucket, _, key = location[len('s3://'):].partition('/')
+    body = s3.get_object(Bucket=bucket, Key=key)['Body']
+    convs = converters(column_info)
+
+    def rows() -> Iterator[List[Any]]:
+        try:
+            reader = csv.reader(io.TextIOWrapper(body, encoding='utf-8', newline=''))
+            next(reader, None)  # header
+            for cells in reader:
+                yield _convert(cells, convs)
+        finally:
+            body.close()
+
+    return islice(rows(), limit)
+
+
+def result_columns(client: Any, query_id: str) -> List[Dict[str, Any]]:
+    """ColumnInfo of a finished query without reading more than one row"""
+    response = client.get_query_results(QueryExecutionId=query_id, MaxResults=1)
+    return response['ResultSet']['ResultSetMetadata']['ColumnInfo']
@@ -0,0 +1,141 @@
+"""Bedrock model calls shared by the agent
+
+`invoke` returns the whole completion once the model has finished.
+`stream` calls InvokeModelWithResponseStream and yields the text as the
+model produces it, so a caller can forward the first words while the
+rest is still being generated. Both accept the Messages API response
+shape (`content` blocks, `content_block_delta` events) and the older
+text-completion shape (`completion`).
+
+A static `system` prefix is sent as a separate system block. When
+`prompt_caching` allows it, the block carries a `cache_control` checkpoint,
+and Bedrock serves the prefix from its prompt cache on later calls within
+the cache's lifetime: it is billed at a fraction of the input price and
+skips most of its processing time. BEDROCK_PROMPT_CACHE is `auto` (on for
+models that support caching on Bedrock), `on` or `off`; BEDROCK_MODEL_ID
+overrides the model.
+
+Every call records its token usage (input, output, cache read and cache
+write) and latency as a `bedrock` telemetry span with a `purpose`, and adds
+it to the bedrock_*_tokens counters.
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional
+
+from stox_common import telemetry
+
+MODEL_ID = 'anthropic.claude-3-haiku-20240307-v1:0'
+# Model ids (substrings) that accept cache_control checkpoints on Bedrock
+CACHING_MODELS = ('claude-3-5-haiku', 'claude-3-7-sonnet', 'claude-sonnet-4', 'claude-opus-4', 'claude-haiku-4')
+USAGE_FIELDS = ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens')
+
+
+def default_model() -> str:
+    return os.environ.get('BEDROCK_MODEL_ID', MODEL_ID)
+
+
+def prompt_caching(model_id: str) -> bool:
+    mode = os.environ.get('BEDROCK_PROMPT_CACHE', 'auto')
+    if mode == 'auto':
+        return any(name in model_id for name in CACHING_MODELS)
+    return mode == 'on'
+
+
+def system_blocks(system: str, cache: bool) -> List[Dict[str, Any]]:
+    block: Dict[str, Any] = {'type': 'text', 'text': system}
+    if cache:
+        block['cache_control'] = {'type': 'ephemeral'}
+    return [block]
+
+
+def request_body(prompt: str, max_tokens: int, temperature: float, system: Optional[str] = None,
+                 cache: bool = False, stop_sequences: Optional[List[str]] = None) -> str:
+    body: Dict[str, Any] = {
+        'anthropic_version': 'bedrock-2023-05-31',
+        'messages': [
+            {
+                'role': 'user',
+                'content': prompt
+            }
+        ],
+        'max_tokens': max_tokens,
+        'temperature': temperature
+    }
+    if system:
+        body['system'] = system_blocks(system, cache)
+    if stop_sequences:
+        body['stop_sequences'] = stop_sequences
+    return json.dumps(body)
+
+
+def usage_of(payload: Dict[str, Any]) -> Dict[str, int]:
+    """Token counts of a response body or stream event; absent fields are 0"""
+    usage = payload.get('usage') or payload.get('message', {}).get('usage') or {}
+    return {field: int(usage.get(field) or 0) for field in USAGE_FIELDS}
+
+
+def record_usage(usage: Dict[str, int]) -> None:
+    for field, value in usage.items():
+        if value:
+            telemetry.count(f"bedrock_{field}", value)
+
+
+def response_text(payload: Dict[str, Any]) -> str:
+    """Text of an InvokeModel response body"""
+    if 'content' in payload:
+        return ''.join(block.get('text', '') for block in payload['content'] if block.get('type', 'text') == 'text')
+    return payload.get('completion', '')
+
+
+def chunk_text(payload: Dict[str, Any]) -> Optional[str]:
+    """Text of one response stream chunk, None for chunks without text"""
+    if payload.get('type') == 'content_block_delta':
+        return payload.get('delta', {}).get('text')
+    return payload.get('completion')
+
+
+def invoke(client: Any, prompt: str, max_tokens: int, temperature: float = 0.0,
+           model_id: Optional[str] = None, system: Optional[str] = None,
+           stop_sequences: Optional[List[str]] = None, purpose: str = 'completion',
+           details: Optional[Dict[str, Any]] = None) -> str:
+    """Completion text; `details`, when given, receives the call's usage and latency"""
+    model_id = model_id or default_model()
+    with telemetry.span('bedrock', purpose=purpose) as call:
+        response = client.invoke_model(
+            modelId=model_id,
+            body=request_body(prompt, max_tokens, temperature, system, prompt_caching(model_id), stop_sequences),
+            contentType='application/json'
+        )
+        payload = json.loads(response['body'].read())
+        call.update(usage_of(payload))
+    record_usage(usage_of(payload))
+    if details is not None:
+        details.update(usage_of(payload), latency_ms=call['duration_ms'])
+    return response_text(payload)
+
+
+def stream(client: Any, prompt: str, max_tokens: int, temperature: float = 0.0,
+           model_id: Optional[str] = None, system: Optional[str] = None) -> Iterator[str]:
+    """Completion text pieces in order, as the model generates them"""
+    model_id = model_id or default_model()
+    response = client.invoke_model_with_response_stream(
+        modelId=model_id,
+        body=request_body(prompt, max_tokens, temperature, system, prompt_caching(model_id)),
+        contentType='application/json'
+    )
+    usage = dict.fromkeys(USAGE_FIELDS, 0)
+    for event in response['body']:
+        if 'chunk' not in event:
+            # Stream errors arrive as events (e.g. throttlingException) rather than exceptions
+            name = next(iter(event), 'unknown')
+            raise RuntimeError(f"Bedrock stream failed: {name}: {event[name]}")
+        payload = json.loads(event['chunk']['bytes'])
+        # message_start carries the input tokens, message_delta the output tokens
+        for field, value in usage_of(payload).items():
+            usage[field] = max(usage[field], value)
+        text = chunk_text(payload)
+        if text:
+            yield text
+    record_usage(usage)
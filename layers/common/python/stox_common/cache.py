@@ -0,0 +1,232 @@
+"""Multi-stage cache for the stox-agent pipeline
+
+Each stage (question -> SQL, SQL -> rows, rows -> summary) has an
+in-process LRU tier with a TTL and, optionally, a persistent tier shared
+by all Lambda instances: FileStore for local runs, S3Store in AWS. A hit
+in the persistent tier is copied into memory.
+
+Results depend on the data, so their keys include the data watermark
+that ingest and backfill write after every successful run (latest price
+date plus write time). New data changes the watermark, which invalidates
+every cached result and summary at once; stale entries are never read
+again and expire by TTL.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+WATERMARK_KEY = 'manifests/watermark.json'
+
+MEMORY = 'memory'
+STORE = 'store'
+MISS = 'miss'
+
+
+def normalize_question(question: str) -> str:
+    """Case, whitespace and trailing punctuation do not change the SQL a question maps to"""
+    return re.sub(r'\s+', ' ', question).strip().rstrip('?.!').strip().lower()
+
+
+def digest(*parts: Any) -> str:
+    """Stable hash of JSON-serializable parts, used as a cache key"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-process tier: least recently used entries go first, all expire after `ttl`"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 3600,
+                 clock: Callable[[], float] = time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def put(self, key: str, value: Any, expires_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at or self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class FileStore:
+    """Persistent tier on the local filesystem, one JSON file per entry"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key.replace('/', '_')}.json")
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry['expires_at'], entry['value']
+
+    def put(self, key: str, value: Any, expires_at: float) -> None:
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'expires_at': expires_at, 'value': value}, f)
+        os.replace(tmp, path)
+
+
+class S3Store:
+    """Persistent tier in S3, shared by every Lambda instance"""
+
+    def __init__(self, client: Any, bucket: str, prefix: str = 'cache/'):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)['Body'].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+        entry = json.loads(body)
+        return entry['expires_at'], entry['value']
+
+    def put(self, key: str, value: Any, expires_at: float) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key,
+                               Body=json.dumps({'expires_at': expires_at, 'value': value}),
+                               ContentType='application/json')
+
+
+class StageCache:
+    """One pipeline stage: memory tier, optional persistent tier and hit/miss counters"""
+
+    def __init__(self, name: str, memory: LRUCache, store: Optional[Any] = None):
+        self.name = name
+        self.memory = memory
+        self.store = store
+        self.hits = {MEMORY: 0, STORE: 0}
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, source: str) -> None:
+        with self._lock:
+            if source == MISS:
+                self.misses += 1
+            else:
+                self.hits[source] += 1
+
+    def _lookup(self, key: str) -> Tuple[str, Any]:
+        found, value = self.memory.get(key)
+        if found:
+            return MEMORY, value
+        if self.store is not None:
+            try:
+                entry = self.store.get(f"{self.name}/{key}")
+            except Exception as e:
+                print(f"Cache store read failed ({self.name}): {e}")
+                entry = None
+            if entry and entry[0] > self.memory.clock():
+                self.memory.put(key, entry[1], expires_at=entry[0])
+                return STORE, entry[1]
+        return MISS, None
+
+    def put(self, key: str, value: Any) -> None:
+        expires_at = self.memory.clock() + self.memory.ttl
+        self.memory.put(key, value, expires_at)
+        if self.store is not None:
+            try:
+                self.store.put(f"{self.name}/{key}", value, expires_at)
+            except Exception as e:
+                print(f"Cache store write failed ({self.name}): {e}")
+
+    def peek(self, key: str) -> Tuple[str, Any]:
+        """(source, value) without counting a hit or miss; value is None on a miss"""
+        return self._lookup(key)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Tuple[Any, str]:
+        """(value, source) where source is 'memory', 'store' or 'miss'"""
+        source, value = self._lookup(key)
+        self._count(source)
+        if source == MISS:
+            value = compute()
+            self.put(key, value)
+        return value, source
+
+    def stats(self) -> Dict[str, Any]:
+        return {'hits': dict(self.hits), 'misses': self.misses, 'entries': len(self.memory)}
+
+
+class PipelineCache:
+    """The agent's question -> SQL -> rows -> summary stages"""
+
+    STAGES = ('sql', 'results', 'summary')
+
+    def __init__(self, maxsize: int = 256, ttl: float = 3600, store: Optional[Any] = None,
+                 clock: Callable[[], float] = time.time):
+        self.stages = {name: StageCache(name, LRUCache(maxsize, ttl, clock), store) for name in self.STAGES}
+        self.watermark: Optional[str] = None
+
+    def __getitem__(self, name: str) -> StageCache:
+        return self.stages[name]
+
+    def observe_watermark(self, watermark: Optional[str]) -> None:
+        """Drop data-dependent memory entries as soon as a new watermark is seen"""
+        if watermark != self.watermark:
+            if self.watermark is not None:
+                self.stages['results'].memory.clear()
+                self.stages['summary'].memory.clear()
+            self.watermark = watermark
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: stage.stats() for name, stage in self.stages.items()}
+
+
+def read_watermark(s3: Any, bucket: str) -> Optional[str]:
+    """Token identifying the current data; None when nothing was ever written"""
+    try:
+        body = s3.get_object(Bucket=bucket, Key=WATERMARK_KEY)['Body'].read()
+    except s3.exceptions.NoSuchKey:
+        return None
+    mark = json.loads(body)
+    return f"{mark['latest_date']}@{mark['updated_at']}"
+
+
+def write_watermark(s3: Any, bucket: str, latest_date: str) -> Dict[str, str]:
+    """Record a write of data up to `latest_date`; the latest date never moves back"""
+    try:
+        current = json.loads(s3.get_object(Bucket=bucket, Key=WATERMARK_KEY)['Body'].read())
+        latest_date = max(latest_date, current['latest_date'])
+    except s3.exceptions.NoSuchKey:
+        pass
+    mark = {'latest_date': latest_date, 'updated_at': datetime.now(timezone.utc).isoformat()}
+    s3.put_object(Bucket=bucket, Key=WATERMARK_KEY, Body=json.dumps(mark), ContentType='application/json')
+    return mark
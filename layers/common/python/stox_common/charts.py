@@ -0,0 +1,147 @@
+"""Chart-ready shaping of time-series query results
+
+The agent returns at most RESPONSE_ROWS rows, so "GOOGL over 5 years" used
+to come back as its first 50 days. When a result is a single time series
+(a date or timestamp column in ascending order, at least one numeric
+column, and any text column holding a single value such as the ticker),
+`shape` downsamples it to a target number of points with Largest Triangle
+Three Buckets (LTTB). The chart keeps the peaks, troughs and overall shape
+of the series instead of its head.
+
+The chart is column-major with a type per column, so the browser gets one
+array per series instead of a list per row:
+
+    {"x": "date", "columns": ["date", "close"], "types": ["date", "double"],
+     "data": [["2021-01-04", ...], [86.31, ...]], "rows": 1258, "points": 200, "method": "lttb"}
+
+LTTB ranks points on the first numeric column; the other columns are taken
+from the same rows. Each bucket's choice depends on the point chosen in
+the previous one, so buckets are visited in order. The work within a
+bucket, the bucket bounds and the next-bucket averages are NumPy array
+operations.
+"""
+
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+TEMPORAL = ('date', 'timestamp')
+NUMERIC = ('tinyint', 'smallint', 'integer', 'bigint', 'float', 'real', 'double', 'decimal')
+LTTB = 'lttb'
+
+
+def infer_types(rows: Sequence[Sequence[Any]], width: int) -> List[str]:
+    """Athena type names of columns from their first non-NULL values (for results without ColumnInfo)"""
+    types = []
+    for i in range(width):
+        value = next((row[i] for row in rows if row[i] is not None), None)
+        if isinstance(value, bool) or value is None:
+            types.append('varchar' if value is None else 'boolean')
+        elif isinstance(value, int):
+            types.append('bigint')
+        elif isinstance(value, float):
+            types.append('double')
+        elif isinstance(value, date):
+            types.append('date')
+        elif isinstance(value, str) and _is_date(value):
+            types.append('date')
+        else:
+            types.append('varchar')
+    return types
+
+
+def _is_date(value: str) -> bool:
+    try:
+        date.fromisoformat(value)
+        return True
+    except ValueError:
+        return False
+
+
+def series_axis(types: Sequence[str], rows: Optional[Sequence[Sequence[Any]]] = None) -> Optional[int]:
+    """Index of the time column if the result is one time series, else None
+
+    Without `rows` only the column types are checked, which is what a
+    caller knows before reading the result.
+    """
+    types = [t.lower() for t in types]
+    temporal = [i for i, t in enumerate(types) if t in TEMPORAL]
+    if len(temporal) != 1 or not any(t in NUMERIC for t in types):
+        return None
+    x = temporal[0]
+    if rows is None:
+        return x
+    if len(rows) < 3:
+        return None
+    for i, t in enumerate(types):
+        # Several tickers (or other labels) in one result are several series
+        if t not in NUMERIC and i != x and len({row[i] for row in rows}) > 1:
+            return None
+    stamps = [_key(row[x]) for row in rows]
+    if None in stamps or any(a > b for a, b in zip(stamps, stamps[1:])):
+        return None
+    return x
+
+
+def _key(value: Any) -> Optional[str]:
+    """Sortable form of a date/timestamp value, typed or ISO string"""
+    if value is None:
+        return None
+    return value.isoformat() if isinstance(value, date) else str(value).replace(' ', 'T', 1)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Indices of the `points` samples LTTB keeps of the series (x ascending, y finite)"""
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    # The first and last points are always kept; the rest is split into points - 2 buckets
+    edges = 1 + np.arange(points - 1, dtype=np.int64) * (n - 2) // (points - 2)
+    counts = np.diff(edges)
+    x_avg = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    y_avg = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    # The third vertex for the last bucket is the last point
+    next_x = np.append(x_avg[1:], x[-1])
+    next_y = np.append(y_avg[1:], y[-1])
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b, (start, end) in enumerate(zip(edges[:-1], edges[1:])):
+        ax, ay = x[a], y[a]
+        # Twice the triangle area (a, candidate, next bucket's average) for every candidate at once
+        area = np.abs((ax - next_x[b]) * (y[start:end] - ay) - (ax - x[start:end]) * (next_y[b] - ay))
+        a = start + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
+
+
+def shape(columns: Sequence[str], rows: Sequence[Sequence[Any]], points: int,
+          types: Optional[Sequence[str]] = None) -> Optional[Dict[str, Any]]:
+    """Column-major chart of a time-series result, downsampled to `points`; None if it is not one"""
+    types = list(types) if types else infer_types(rows, len(columns))
+    x = series_axis(types, rows)
+    if x is None:
+        return None
+    y = next(i for i, t in enumerate(types) if t.lower() in NUMERIC)
+
+    # NULL values cannot be ranked; those rows are left out of the chart
+    present = [row for row in rows if row[y] is not None]
+    if len(present) < 3:
+        return None
+    stamps = np.array([_key(row[x]) for row in present], dtype='datetime64[ms]').astype(np.int64)
+    values = np.array([row[y] for row in present], dtype=np.float64)
+    keep = lttb(stamps, values, points)
+    data = [[present[i][c] for i in keep.tolist()] for c in range(len(columns))]
+    return {
+        'x': columns[x],
+        'columns': list(columns),
+        'types': [t.lower() for t in types],
+        'data': data,
+        'rows': len(rows),
+        'points': len(keep),
+        'method': LTTB if len(keep) < len(present) else 'none',
+    }
@@ -0,0 +1,71 @@
+"""AWS clients created once per execution environment
+
+Creating a boto3 client loads and parses the service model, which takes
+tens of milliseconds. Creating one per request, as the Lambdas used to do
+for Bedrock, S3 and Glue, added that time to every invocation. `get`
+returns one client per (service, region) for the life of the container.
+Clients are thread-safe, so the ingest workers and the agent's background
+summaries share them.
+
+Every client uses the same tuned botocore Config:
+
+- `max_pool_connections` sized for the ingest and backfill thread pools
+  (CLIENT_MAX_POOL_CONNECTIONS, default 32) instead of botocore's 10;
+- TCP keep-alive, so a warm container reuses its connections instead of
+  paying a new TLS handshake after an idle period;
+- `standard` retries with a small budget (CLIENT_MAX_ATTEMPTS, default 3,
+  the first call included). The agent answers within the API Gateway
+  timeout, so a long retry ladder would cost more than it saves;
+- connect and read timeouts short enough to fail over to a retry. Bedrock
+  gets a longer read timeout, because a model call can take tens of seconds.
+
+Callers that need a different setting, such as a larger pool for an
+upload thread pool, pass it as an override; each distinct set of
+overrides is cached as its own client.
+
+boto3 itself is imported on the first `get`, not when this module is.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# Model invocations stream or return after the whole completion is generated
+LONG_READ_SERVICES = ('bedrock-runtime',)
+
+_clients: Dict[Tuple[Any, ...], Any] = {}
+_lock = threading.Lock()
+
+
+def config(service: str, **overrides: Any) -> Any:
+    """botocore Config shared by the Lambdas' clients, with any Config arguments in `overrides` replaced"""
+    from botocore.config import Config
+    settings = dict(
+        max_pool_connections=int(os.environ.get('CLIENT_MAX_POOL_CONNECTIONS', '32')),
+        tcp_keepalive=True,
+        connect_timeout=5,
+        read_timeout=120 if service in LONG_READ_SERVICES else 30,
+        retries={'total_max_attempts': int(os.environ.get('CLIENT_MAX_ATTEMPTS', '3')), 'mode': 'standard'},
+    )
+    settings.update(overrides)
+    return Config(**settings)
+
+
+def get(service: str, region_name: Optional[str] = None, **overrides: Any) -> Any:
+    """The container's client for `service` (and region, and Config overrides), created on first use"""
+    key = (service, region_name) + tuple(sorted(overrides.items()))
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                import boto3
+                client = boto3.client(service, region_name=region_name, config=config(service, **overrides))
+                _clients[key] = client
+    return client
+
+
+def clear() -> None:
+    """Forget the cached clients, e.g. between tests that change credentials or endpoints"""
+    with _lock:
+        _clients.clear()
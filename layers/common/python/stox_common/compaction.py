@@ -0,0 +1,193 @@
+"""Incremental compaction of stox.prices partitions
+
+Each (ticker, year, month) partition collects one small object per trading
+day. Once a month is closed, compaction merges all of its objects into a
+single file under compacted/ticker=T/year=Y/month=MM/v=<run>/ and then points
+the Glue partition at that prefix. Swapping the partition location is a
+single catalog update, so readers see either the old objects or the
+compacted file, never a mix. A partition Glue rejects keeps its old
+location: it is not recorded as compacted, its new file is deleted, and the
+next run retries it.
+
+A manifest in the curated bucket records a signature (keys and ETags) of the
+source objects behind every compacted partition. Later runs only touch
+partitions that are new or whose sources changed, e.g. a late backfill.
+Source objects are kept; they stay the source of truth for recompaction.
+"""
+
+import csv
+import hashlib
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from stox_common.layout import COLUMNS, PRICES_PREFIX, key_values
+from stox_common.partitions import GlueCatalog, Partition
+from stox_common.s3io import delete_keys, list_keys
+from stox_common.writers import CsvWriter, ParquetWriter
+
+MANIFEST_KEY = 'manifests/compaction.json'
+COMPACTED_PREFIX = 'compacted'
+
+
+def partition_id(partition: Partition) -> str:
+    return '/'.join(partition)
+
+
+def scan_partitions(s3: Any, bucket: str) -> Dict[Partition, List[Dict[str, Any]]]:
+    """Source objects (Key, ETag, Size) under prices/, grouped by partition"""
+    partitions: Dict[Partition, List[Dict[str, Any]]] = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{PRICES_PREFIX}/"):
+        for obj in page.get('Contents', []):
+            values = key_values(obj['Key'])
+            if not {'ticker', 'year', 'month'} <= values.keys():
+                continue
+            partition = (values['ticker'], values['year'], values['month'])
+            partitions.setdefault(partition, []).append(
+                {'Key': obj['Key'], 'ETag': obj.get('ETag', ''), 'Size': obj.get('Size', 0)}
+            )
+    return partitions
+
+
+def signature(objects: Iterable[Dict[str, Any]]) -> str:
+    digest = hashlib.sha1()
+    for obj in sorted(objects, key=lambda o: o['Key']):
+        digest.update(f"{obj['Key']}:{obj['ETag']}\n".encode())
+    return digest.hexdigest()
+
+
+def is_closed(partition: Partition, today: date, grace_days: int) -> bool:
+    """A month is closed once `grace_days` have passed since it ended"""
+    year, month = int(partition[1]), int(partition[2])
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return today >= next_month + timedelta(days=grace_days)
+
+
+def load_manifest(s3: Any, bucket: str) -> Dict[str, Any]:
+    try:
+        body = s3.get_object(Bucket=bucket, Key=MANIFEST_KEY)['Body'].read()
+    except s3.exceptions.NoSuchKey:
+        return {'partitions': {}}
+    return json.loads(body)
+
+
+def save_manifest(s3: Any, bucket: str, manifest: Dict[str, Any]) -> None:
+    s3.put_object(Bucket=bucket, Key=MANIFEST_KEY, Body=json.dumps(manifest, sort_keys=True),
+                  ContentType='application/json')
+
+
+def read_rows(s3: Any, bucket: str, key: str) -> List[Dict[str, Any]]:
+    """Price rows of one CSV or Parquet source object"""
+    body = s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+    if key.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(io.BytesIO(body), columns=COLUMNS)
+        rows = table.to_pylist()
+        for row in rows:
+            row['date'] = row['date'].isoformat()
+        return rows
+    rows = []
+    for record in csv.DictReader(io.StringIO(body.decode())):
+        rows.append({
+            'date': record['date'],
+            'open': float(record['open']),
+            'high': float(record['high']),
+            'low': float(record['low']),
+            'close': float(record['close']),
+            'volume': int(float(record['volume'])),
+            'adj_close': float(record['adj_close']),
+        })
+    return rows
+
+
+def merge_rows(objects: List[Dict[str, Any]], rows_by_key: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """One row per date; a per-day object wins over a monthly one for the same date"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    # Monthly objects (no day= in the key) first so daily objects overwrite them
+    for obj in sorted(objects, key=lambda o: ('/day=' in o['Key'], o['Key'])):
+        for row in rows_by_key[obj['Key']]:
+            merged[row['date']] = row
+    return [merged[d] for d in sorted(merged)]
+
+
+def compact(s3: Any, glue: Any, bucket: str, database: str, table: str = 'prices',
+            today: Optional[date] = None, grace_days: int = 3, max_partitions: int = 500,
+            workers: int = 16, run_id: Optional[str] = None) -> Dict[str, Any]:
+    """Compact closed partitions whose sources changed since the last run"""
+    today = today or datetime.now(timezone.utc).date()
+    run_id = run_id or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    catalog = GlueCatalog(glue, database, table)
+    writer = ParquetWriter() if catalog.is_parquet else CsvWriter()
+
+    manifest = load_manifest(s3, bucket)
+    sources = scan_partitions(s3, bucket)
+    pending = []
+    for partition in sorted(sources):
+        if not is_closed(partition, today, grace_days):
+            continue
+        entry = manifest['partitions'].get(partition_id(partition))
+        if entry and entry['signature'] == signature(sources[partition]):
+            continue
+        pending.append(partition)
+    deferred = len(pending) - max_partitions if len(pending) > max_partitions else 0
+    pending = pending[:max_partitions]
+
+    def compact_one(partition: Partition) -> Tuple[Partition, str, int]:
+        objects = sources[partition]
+        rows_by_key = {obj['Key']: read_rows(s3, bucket, obj['Key']) for obj in objects}
+        rows = merge_rows(objects, rows_by_key)
+        ticker, year, month = partition
+        prefix = f"{COMPACTED_PREFIX}/ticker={ticker}/year={year}/month={month}/v={run_id}/"
+        s3.put_object(Bucket=bucket, Key=prefix + writer.filename, Body=writer.serialize(rows),
+                      ContentType=writer.content_type)
+        return partition, prefix, len(rows)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        compacted = list(pool.map(compact_one, pending))
+
+    # Readers switch only after every file of this run is written
+    failed = catalog.switch_locations({p: f"s3://{bucket}/{prefix}" for p, prefix, _ in compacted})
+    for partition, detail in failed.items():
+        print(f"Location switch failed for {partition_id(partition)}: {detail}")
+    # A rejected partition still reads its old files: it stays pending and its new files are dropped
+    orphaned = [prefix for p, prefix, _ in compacted if p in failed]
+    compacted = [entry for entry in compacted if entry[0] not in failed]
+
+    stale_prefixes = []
+    for partition, prefix, row_count in compacted:
+        pid = partition_id(partition)
+        previous = manifest['partitions'].get(pid, {})
+        if previous.get('previous_prefix'):
+            stale_prefixes.append(previous['previous_prefix'])
+        manifest['partitions'][pid] = {
+            'signature': signature(sources[partition]),
+            'prefix': prefix,
+            'previous_prefix': previous.get('prefix'),
+            'rows': row_count,
+            'source_objects': len(sources[partition]),
+            'compacted_at': run_id,
+        }
+    if compacted:
+        save_manifest(s3, bucket, manifest)
+
+    # Keep the version readers used until now (queries may still be running) and drop older ones
+    removed = 0
+    for prefix in stale_prefixes + orphaned:
+        keys = list(list_keys(s3, bucket, prefix))
+        delete_keys(s3, bucket, keys)
+        removed += len(keys)
+
+    return {
+        'format': writer.format,
+        'partitions_compacted': len(compacted),
+        'partitions_deferred': deferred,
+        'partitions_failed': len(failed),
+        'source_objects': sum(len(sources[p]) for p, _, _ in compacted),
+        'rows': sum(n for _, _, n in compacted),
+        'stale_objects_removed': removed,
+        'run_id': run_id,
+    }
@@ -0,0 +1,276 @@
+"""Local answers for the agent's common question templates
+
+Most dashboard questions follow the few-shot patterns in the agent's
+prompt: an N-day SMA, the best YTD performer, max drawdown, volatility or
+a price trend. `LocalEngine` recognizes those intents with a few regular
+expressions. It computes the answer with vectorized NumPy over the
+per-ticker arrays from stox_common.series, so no Bedrock call or Athena
+query is needed. The result has the agent's columns/rows shape, plus the
+equivalent Athena SQL for display. Anything it does not recognize returns
+None, and the caller takes the Bedrock + Athena path.
+"""
+
+import re
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from stox_common.series import day_number, to_date
+
+SMA = 'sma'
+BEST = 'best_performer'
+DRAWDOWN = 'max_drawdown'
+VOLATILITY = 'volatility'
+TREND = 'trend'
+
+DEFAULT_DAYS = 90  # the prompt's default range
+DEFAULT_WINDOW = {SMA: 7, VOLATILITY: 20}
+TRADING_DAYS = 252
+
+_INTENT_PATTERNS = {
+    SMA: r'\bsma\b|moving average',
+    BEST: r'\b(best|top)\b.*\bperform',
+    DRAWDOWN: r'drawdown',
+    VOLATILITY: r'volatil',
+    TREND: r'\btrend\b|price history',
+}
+
+# Upper-case words in questions that are not tickers
+_NOT_TICKERS = {'SMA', 'YTD', 'MTD', 'EMA', 'ETF', 'AND', 'THE', 'FOR', 'OF', 'ME', 'MY', 'A', 'I', 'VS'}
+
+_UNIT_DAYS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
+# "last 30 days", "over the past 5 years", "over 2 weeks", "last month"
+_PERIOD = r'\b(?:(?:last|past)|over\s+(?:the\s+)?(?:last|past)?)\s*(\d+)?\s+(day|week|month|year)s?\b'
+
+# Time qualifiers the presets cannot express; a question with one is left to Bedrock + Athena
+_OTHER_PERIODS = (
+    r'\b(?:19|20)\d{2}\b|\bsince\b|\bbetween\b|\bfrom\b.*\b(?:to|until)\b|\bquarter|\bq[1-4]\b'
+    r'|\b(?:january|february|march|april|may|june|july|august|september|october|november|december)\b'
+)
+
+
+def parse_question(question: str, known_tickers: Iterable[str] = ()) -> Optional[Dict[str, Any]]:
+    """Intent, tickers, window and period of a template question, or None"""
+    text = question.lower()
+    intents = [name for name, pattern in _INTENT_PATTERNS.items() if re.search(pattern, text)]
+    if len(intents) != 1:
+        return None
+    intent = intents[0]
+
+    known = {t.upper() for t in known_tickers}
+    tickers = [w for w in re.findall(r'\b[A-Z][A-Z.]{0,5}\b', question) if w not in _NOT_TICKERS]
+    tickers += [t for t in known if re.search(rf'\b{re.escape(t.lower())}\b', text) and t not in tickers]
+    tickers = list(dict.fromkeys(tickers))
+
+    if intent == BEST:
+        tickers = tickers or sorted(known)
+        if not tickers:
+            return None
+    elif len(tickers) != 1:
+        return None
+
+    window = DEFAULT_WINDOW.get(intent)
+    match = re.search(r'(\d+)[- ]?day\s+(sma|moving average|volatility|rolling)', text)
+    if match and window:
+        window = int(match.group(1))
+
+    if re.search(_OTHER_PERIODS, text):
+        return None
+    if re.search(r'\bytd\b|year to date|this year', text):
+        period = 'ytd'
+    else:
+        match = re.search(_PERIOD, text)
+        if match:
+            period = int(match.group(1) or 1) * _UNIT_DAYS[match.group(2)]
+        elif re.search(r'\b(?:last|past|over|this|since|during)\b', text):
+            # A period phrase not matched above; a default would answer another question
+            return None
+        else:
+            # Same defaults as the few-shot examples
+            period = 'ytd' if intent in (BEST, DRAWDOWN) else DEFAULT_DAYS
+
+    return {'intent': intent, 'tickers': tickers, 'window': window, 'period': period}
+
+
+def period_start(period: Any, today: date) -> date:
+    if period == 'ytd':
+        return date(today.year, 1, 1)
+    return today - timedelta(days=int(period))
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Mean over the last `window` values, over fewer at the start (AVG ... ROWS n PRECEDING)"""
+    sums = np.concatenate([[0.0], np.cumsum(values)])
+    idx = np.arange(1, len(values) + 1)
+    lo = np.maximum(idx - window, 0)
+    return (sums[idx] - sums[lo]) / (idx - lo)
+
+
+def rolling_std(values: np.ndarray, window: int) -> np.ndarray:
+    """Sample standard deviation over the last `window` values; NaN with fewer than two"""
+    s1 = np.concatenate([[0.0], np.cumsum(values)])
+    s2 = np.concatenate([[0.0], np.cumsum(values * values)])
+    idx = np.arange(1, len(values) + 1)
+    lo = np.maximum(idx - window, 0)
+    n = idx - lo
+    total, squares = s1[idx] - s1[lo], s2[idx] - s2[lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var = (squares - total * total / n) / (n - 1)
+    return np.sqrt(np.clip(var, 0, None))
+
+
+def _sql_period(period: Any) -> str:
+    if period == 'ytd':
+        return "date >= date_trunc('year', current_date)"
+    return f"date >= current_date - interval '{int(period)}' day"
+
+
+def _rows(*columns: np.ndarray) -> List[List[Any]]:
+    out = []
+    for values in zip(*columns):
+        out.append([v if isinstance(v, str) else (None if v != v else float(v)) for v in values])
+    return out
+
+
+def _dates(days: np.ndarray) -> np.ndarray:
+    return np.array([to_date(d).isoformat() for d in days], dtype=object)
+
+
+def _describe_period(period: Any) -> str:
+    return 'year to date' if period == 'ytd' else f"over the last {period} days"
+
+
+class LocalEngine:
+    """Answers template questions from per-ticker series returned by `load(ticker)`"""
+
+    def __init__(self, load: Callable[[str], Optional[Dict[str, np.ndarray]]],
+                 watchlist: Iterable[str] = (), today: Optional[Callable[[], date]] = None):
+        self.load = load
+        self.watchlist = [t.upper() for t in watchlist]
+        self.today = today or date.today
+
+    def answer(self, question: str) -> Optional[Dict[str, Any]]:
+        """columns/rows/answer/sql for a recognized question; None to fall back"""
+        parsed = parse_question(question, self.watchlist)
+        if not parsed:
+            return None
+        series = {}
+        for ticker in parsed['tickers']:
+            data = self.load(ticker)
+            if data is None or not len(data['date']):
+                return None
+            series[ticker] = data
+        start = day_number(period_start(parsed['period'], self.today()))
+        result = getattr(self, f"_{parsed['intent']}")(parsed, series, start)
+        if result is None:
+            return None
+        return {**result, 'intent': parsed['intent']}
+
+    def _sma(self, parsed, series, start):
+        ticker, window = parsed['tickers'][0], parsed['window']
+        data = series[ticker]
+        sma = rolling_mean(data['close'], window)
+        mask = data['date'] >= start
+        if not mask.any():
+            return None
+        dates, close, avg = data['date'][mask], data['close'][mask], sma[mask]
+        position = 'above' if close[-1] >= avg[-1] else 'below'
+        return {
+            'columns': ['date', 'close', f'sma_{window}'],
+            'rows': _rows(_dates(dates), close, avg),
+            'answer': (f"{ticker}'s {window}-day SMA was {avg[-1]:.2f} on {to_date(dates[-1])}, with the close at "
+                       f"{close[-1]:.2f}, {position} the average. Chart: date on the x-axis, close and "
+                       f"sma_{window} as two lines."),
+            'sql': (f"WITH s AS (SELECT date, close, AVG(close) OVER (ORDER BY date ROWS BETWEEN {window - 1} "
+                    f"PRECEDING AND CURRENT ROW) as sma_{window} FROM stox.prices WHERE ticker='{ticker}') "
+                    f"SELECT * FROM s WHERE {_sql_period(parsed['period'])} ORDER BY date;"),
+        }
+
+    def _trend(self, parsed, series, start):
+        ticker = parsed['tickers'][0]
+        data = series[ticker]
+        mask = data['date'] >= start
+        if not mask.any():
+            return None
+        dates, close = data['date'][mask], data['close'][mask]
+        change = close[-1] / close[0] - 1
+        return {
+            'columns': ['date', 'close'],
+            'rows': _rows(_dates(dates), close),
+            'answer': (f"{ticker} moved from {close[0]:.2f} to {close[-1]:.2f} ({change:+.2%}) "
+                       f"{_describe_period(parsed['period'])}, ranging between {close.min():.2f} and "
+                       f"{close.max():.2f}. Chart: date on the x-axis, close on the y-axis."),
+            'sql': (f"SELECT date, close FROM stox.prices WHERE ticker='{ticker}' "
+                    f"AND {_sql_period(parsed['period'])} ORDER BY date;"),
+        }
+
+    def _max_drawdown(self, parsed, series, start):
+        ticker = parsed['tickers'][0]
+        data = series[ticker]
+        mask = data['date'] >= start
+        if not mask.any():
+            return None
+        dates, close = data['date'][mask], data['close'][mask]
+        peak = np.maximum.accumulate(close)
+        drawdown = (close - peak) / peak
+        trough = int(np.argmin(drawdown))
+        peak_at = int(np.argmax(close[:trough + 1]))
+        return {
+            'columns': ['max_drawdown'],
+            'rows': _rows(np.array([drawdown[trough]])),
+            'answer': (f"{ticker}'s max drawdown {_describe_period(parsed['period'])} is {drawdown[trough]:.2%}, "
+                       f"from {close[peak_at]:.2f} on {to_date(dates[peak_at])} to {close[trough]:.2f} "
+                       f"on {to_date(dates[trough])}."),
+            'sql': (f"WITH running_peak AS (SELECT date, close, MAX(close) OVER (ORDER BY date) as peak "
+                    f"FROM stox.prices WHERE ticker='{ticker}' AND {_sql_period(parsed['period'])}) "
+                    f"SELECT MIN((close - peak) / peak) as max_drawdown FROM running_peak;"),
+        }
+
+    def _volatility(self, parsed, series, start):
+        ticker, window = parsed['tickers'][0], parsed['window']
+        data = series[ticker]
+        close = data['close']
+        returns = np.concatenate([[np.nan], close[1:] / close[:-1] - 1])
+        vol = np.concatenate([[np.nan], rolling_std(returns[1:], window)])
+        mask = data['date'] >= start
+        if not mask.any():
+            return None
+        dates, vol_p = data['date'][mask], vol[mask]
+        latest = vol_p[-1]
+        annual = latest * np.sqrt(TRADING_DAYS)
+        return {
+            'columns': ['date', 'close', f'vol_{window}'],
+            'rows': _rows(_dates(dates), close[mask], vol_p),
+            'answer': (f"{ticker}'s {window}-day volatility of daily returns is {latest:.2%} as of "
+                       f"{to_date(dates[-1])} (about {annual:.1%} annualized). Chart: date on the x-axis, "
+                       f"vol_{window} on the y-axis."),
+            'sql': (f"WITH r AS (SELECT date, close, close / LAG(close) OVER (ORDER BY date) - 1 as daily_return "
+                    f"FROM stox.prices WHERE ticker='{ticker}') SELECT date, close, STDDEV(daily_return) OVER "
+                    f"(ORDER BY date ROWS BETWEEN {window - 1} PRECEDING AND CURRENT ROW) as vol_{window} "
+                    f"FROM r WHERE {_sql_period(parsed['period'])} ORDER BY date;"),
+        }
+
+    def _best_performer(self, parsed, series, start):
+        ranking = []
+        for ticker, data in series.items():
+            mask = data['date'] >= start
+            if mask.sum() < 2:
+                continue
+            close = data['close'][mask]
+            ranking.append((ticker, close[-1] / close[0] - 1))
+        if not ranking:
+            return None
+        ranking.sort(key=lambda r: r[1], reverse=True)
+        best, worst = ranking[0], ranking[-1]
+        tickers = ', '.join(f"'{t}'" for t in parsed['tickers'])
+        return {
+            'columns': ['ticker', 'period_return'],
+            'rows': [[t, float(r)] for t, r in ranking],
+            'answer': (f"{best[0]} is the best performer {_describe_period(parsed['period'])} at {best[1]:+.2%}; "
+                       f"{worst[0]} trails at {worst[1]:+.2%}. Chart: a bar per ticker with period_return."),
+            'sql': (f"SELECT ticker, max_by(close, date) / min_by(close, date) - 1 as period_return "
+                    f"FROM stox.prices WHERE ticker IN ({tickers}) AND {_sql_period(parsed['period'])} "
+                    f"GROUP BY ticker ORDER BY period_return DESC;"),
+        }
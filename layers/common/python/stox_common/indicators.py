@@ -0,0 +1,285 @@
+"""Materialized indicators maintained incrementally from per-ticker state
+
+The stox views recompute window functions over the whole price history on
+every query, and v_corr self-joins every ticker pair to do it. Here, the
+same indicators are computed once, when a day arrives, and appended to two
+tables:
+
+- stox.indicators: one row per ticker and date with daily_return, sma_7,
+  sma_20, vol_20, peak, drawdown and max_drawdown
+- stox.correlations: corr_60 for every ticker pair on every date, like v_corr
+
+Each ticker keeps a small RollingState in manifests/indicators.json: its
+last 20 closes, last 60 (date, return) pairs, running peak and worst
+drawdown. A run reads each ticker's series archive, jumps to the first
+day after the state's last one with a binary search and computes only the
+new days, so its work grows with the days added, not with the history. A
+ticker without state is replayed once from its series archive, and so is
+every ticker after `rebuild`.
+
+Correlations are written for each day a run adds. Each ticker's (date,
+return) history is the window in its state followed by the new days, and a
+snapshot as of day D uses each ticker's last 60 returns up to D. A catch-up
+over several days therefore leaves no gaps, and a rebuild writes the whole
+history again.
+
+Objects are named after the state version they produce
+(`indicators/year=Y/month=MM/v000042.csv`). A run that fails before the
+state is saved rewrites the same keys when it is retried, instead of
+appending duplicate rows.
+"""
+
+import bisect
+import csv
+import io
+import json
+import math
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from stox_common.layout import parse_date
+from stox_common.s3io import ParallelUploader, delete_keys, list_keys
+from stox_common.series import SERIES_PREFIX, day_number, load_series, to_date
+
+STATE_KEY = 'manifests/indicators.json'
+INDICATORS_PREFIX = 'indicators'
+CORRELATIONS_PREFIX = 'correlations'
+
+SMA_WINDOWS = (7, 20)
+VOL_WINDOW = 20
+CORR_WINDOW = 60
+CORR_MIN_PERIODS = 20
+
+INDICATOR_COLUMNS = ['ticker', 'date', 'close', 'daily_return', 'sma_7', 'sma_20', 'vol_20',
+                     'peak', 'drawdown', 'max_drawdown']
+CORRELATION_COLUMNS = ['date', 'ticker_a', 'ticker_b', 'corr_60', 'observations']
+
+
+def _stdev(values: List[float]) -> Optional[float]:
+    """Sample standard deviation (Athena's STDDEV); None with fewer than two values"""
+    n = len(values)
+    if n < 2:
+        return None
+    mean = sum(values) / n
+    return math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1))
+
+
+class RollingState:
+    """Everything needed to compute the next day's indicators of one ticker"""
+
+    def __init__(self, last_date: Optional[str] = None, closes: Optional[List[float]] = None,
+                 returns: Optional[List[List[Any]]] = None, peak: Optional[float] = None,
+                 max_drawdown: float = 0.0):
+        self.last_date = last_date
+        self.closes = list(closes or [])[-max(SMA_WINDOWS):]
+        self.returns = [list(r) for r in (returns or [])][-CORR_WINDOW:]
+        self.peak = peak
+        self.max_drawdown = max_drawdown
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'RollingState':
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'last_date': self.last_date, 'closes': self.closes, 'returns': self.returns,
+                'peak': self.peak, 'max_drawdown': self.max_drawdown}
+
+    def update(self, ticker: str, day: str, close: float) -> Optional[Dict[str, Any]]:
+        """Indicator row for `day`; None if the day is not after the last one seen"""
+        if self.last_date is not None and day <= self.last_date:
+            return None
+        daily_return = close / self.closes[-1] - 1 if self.closes else None
+
+        self.last_date = day
+        self.closes = (self.closes + [close])[-max(SMA_WINDOWS):]
+        if daily_return is not None:
+            self.returns = (self.returns + [[day, daily_return]])[-CORR_WINDOW:]
+        self.peak = close if self.peak is None else max(self.peak, close)
+        drawdown = (close - self.peak) / self.peak
+        self.max_drawdown = min(self.max_drawdown, drawdown)
+
+        row = {'ticker': ticker, 'date': day, 'close': close, 'daily_return': daily_return}
+        for window in SMA_WINDOWS:
+            recent = self.closes[-window:]
+            row[f'sma_{window}'] = sum(recent) / len(recent)
+        row[f'vol_{VOL_WINDOW}'] = _stdev([r for _, r in self.returns[-VOL_WINDOW:]])
+        row.update(peak=self.peak, drawdown=drawdown, max_drawdown=self.max_drawdown)
+        return row
+
+    def advance(self, ticker: str, series: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        """Rows for every day of `series` after the last one seen"""
+        start = 0
+        if self.last_date is not None:
+            start = int(np.searchsorted(series['date'], day_number(self.last_date), side='right'))
+        rows = []
+        for day, close in zip(series['date'][start:].tolist(), series['close'][start:].tolist()):
+            row = self.update(ticker, to_date(day).isoformat(), float(close))
+            if row:
+                rows.append(row)
+        return rows
+
+
+def pairwise_corr(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(Pearson correlation, observations) of every pair of rows over the columns both have (non-NaN)
+
+    Sums over each pair's shared days come from matrix products with the
+    presence mask, so all pairs are computed at once even when tickers
+    traded on different days.
+    """
+    present = (~np.isnan(matrix)).astype(np.float64)
+    values = np.nan_to_num(matrix)
+    counts = present @ present.T
+    sums = values @ present.T  # sums[i, j]: row i over the days row j has too
+    squares = (values ** 2) @ present.T
+    products = values @ values.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = products - sums * sums.T / counts
+        var = squares - sums ** 2 / counts
+        corr = cov / np.sqrt(var * var.T)
+    corr[counts < 2] = np.nan
+    return corr, counts.astype(int)
+
+
+def correlation_history(returns: Dict[str, List[List[Any]]], as_of_days: Iterable[str],
+                        min_periods: int = CORR_MIN_PERIODS) -> Dict[str, List[Dict[str, Any]]]:
+    """corr_60 rows as of each day, from each ticker's last CORR_WINDOW (date, return) pairs up to that day"""
+    tickers = sorted(t for t, r in returns.items() if r)
+    days = sorted({d for t in tickers for d, _ in returns[t]})
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    if len(tickers) < 2 or not days:
+        return out
+    index = {d: i for i, d in enumerate(days)}
+    matrix = np.full((len(tickers), len(days)), np.nan)
+    for row, ticker in enumerate(tickers):
+        for day, value in returns[ticker]:
+            matrix[row, index[day]] = value
+    present = ~np.isnan(matrix)
+    seen = np.cumsum(present, axis=1)  # seen[t, c]: returns of ticker t up to and including day c
+
+    upper = np.triu_indices(len(tickers), 1)
+    for as_of in sorted(set(as_of_days)):
+        end = bisect.bisect_right(days, as_of)
+        if end == 0:
+            continue
+        # Each ticker's window starts at the day after which it has at most CORR_WINDOW returns left
+        floor = np.maximum(seen[:, end - 1] - CORR_WINDOW, 0)
+        starts = [int(np.searchsorted(seen[t, :end], floor[t], side='right')) for t in range(len(tickers))]
+        lo = min(starts)
+        window = matrix[:, lo:end].copy()
+        for t, start in enumerate(starts):
+            window[t, :start - lo] = np.nan
+        corr, counts = pairwise_corr(window)
+        out[as_of] = [
+            {'date': as_of, 'ticker_a': tickers[i], 'ticker_b': tickers[j],
+             'corr_60': float(corr[i, j]), 'observations': int(counts[i, j])}
+            for i, j in zip(*upper) if counts[i, j] >= min_periods and not np.isnan(corr[i, j])
+        ]
+    return out
+
+
+def correlations(states: Dict[str, RollingState], as_of: str,
+                 min_periods: int = CORR_MIN_PERIODS) -> List[Dict[str, Any]]:
+    """corr_60 of every ticker pair over the returns both have in their windows"""
+    history = correlation_history({t: s.returns for t, s in states.items()}, [as_of], min_periods)
+    return history.get(as_of, [])
+
+
+def _cell(value: Any) -> Any:
+    if value is None:
+        return ''
+    # Ten significant digits are plenty and keep the scanned bytes down
+    return f"{value:.10g}" if isinstance(value, float) else value
+
+
+def to_csv(rows: Iterable[Dict[str, Any]], columns: List[str]) -> str:
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([_cell(row[c]) for c in columns])
+    return out.getvalue()
+
+
+def indicator_keys(rows: Iterable[Dict[str, Any]], version: int) -> Dict[str, List[Dict[str, Any]]]:
+    """Rows grouped by the monthly object of this state version they go to"""
+    groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        day = parse_date(row['date'])
+        groups[f"{INDICATORS_PREFIX}/year={day.year}/month={day.month:02d}/v{version:06d}.csv"].append(row)
+    return dict(groups)
+
+
+def correlation_key(as_of: str) -> str:
+    day = parse_date(as_of)
+    return f"{CORRELATIONS_PREFIX}/year={day.year}/month={day.month:02d}/day={day.day:02d}/data.csv"
+
+
+def load_state(s3: Any, bucket: str) -> Dict[str, Any]:
+    try:
+        return json.loads(s3.get_object(Bucket=bucket, Key=STATE_KEY)['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        return {'version': 0, 'tickers': {}}
+
+
+def save_state(s3: Any, bucket: str, state: Dict[str, Any]) -> None:
+    s3.put_object(Bucket=bucket, Key=STATE_KEY, Body=json.dumps(state), ContentType='application/json')
+
+
+def series_tickers(s3: Any, bucket: str) -> List[str]:
+    """Tickers that have a series archive"""
+    prefix = f"{SERIES_PREFIX}/ticker="
+    return sorted({key[len(prefix):].split('/', 1)[0] for key in list_keys(s3, bucket, prefix)})
+
+
+def materialize(s3: Any, bucket: str, tickers: Iterable[str], rebuild: bool = False) -> Dict[str, Any]:
+    """Append the indicators of every day the tickers' series gained since the last run
+
+    With `rebuild`, previous output and state are dropped and the tickers are
+    replayed from the start of their series.
+    """
+    stored = {'version': 0, 'tickers': {}} if rebuild else load_state(s3, bucket)
+    version = stored['version'] + 1
+    states = {t: RollingState.from_dict(s) for t, s in stored['tickers'].items()}
+
+    if rebuild:
+        stale = [k for prefix in (INDICATORS_PREFIX, CORRELATIONS_PREFIX)
+                 for k in list_keys(s3, bucket, f"{prefix}/")]
+        delete_keys(s3, bucket, stale)
+
+    rows = []
+    returns = {t: list(s.returns) for t, s in states.items()}
+    for ticker in tickers:
+        series = load_series(s3, bucket, ticker)
+        if series is None:
+            continue
+        state = states.setdefault(ticker, RollingState())
+        added = state.advance(ticker, series)
+        returns.setdefault(ticker, []).extend(
+            [r['date'], r['daily_return']] for r in added if r['daily_return'] is not None
+        )
+        rows += added
+
+    summary = {'version': stored['version'], 'rows': len(rows), 'objects': 0, 'correlations': 0, 'as_of': None}
+    if not rows:
+        return summary
+
+    pair_count = 0
+    # A rebuild writes one correlations object per day of history
+    with ParallelUploader(bucket, workers=8, client=s3) as uploader:
+        for key, group in indicator_keys(rows, version).items():
+            uploader.put(key, to_csv(group, INDICATOR_COLUMNS))
+        for day, pairs in correlation_history(returns, {row['date'] for row in rows}).items():
+            if pairs:
+                uploader.put(correlation_key(day), to_csv(pairs, CORRELATION_COLUMNS))
+                pair_count += len(pairs)
+    if uploader.errors:
+        # The state is not saved, so a retry writes the same keys again
+        raise RuntimeError(f"Indicator upload failed: {uploader.errors[0]}")
+    summary['objects'] = uploader.puts
+
+    as_of = max(s.last_date for s in states.values())
+    save_state(s3, bucket, {'version': version, 'tickers': {t: s.to_dict() for t, s in states.items()}})
+    summary.update(version=version, correlations=pair_count, as_of=as_of)
+    return summary
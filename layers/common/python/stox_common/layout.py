@@ -0,0 +1,69 @@
+"""S3 object layout of the stox.prices table
+
+The table is partitioned by (ticker, year, month). Daily ingest writes one
+object per trading day below the month partition (`.../day=DD/data.csv`,
+the original layout, still read because Athena reads a partition prefix
+recursively); batched writers put a whole month in `.../data.csv`.
+Ingest catching up on several days writes one object per month of new
+days (BATCH), at the daily key of its first day, so it is read and
+compacted like any daily object. Its key names only the first day, so
+backfill reads it before deleting it as superseded.
+"""
+
+from collections import defaultdict
+from datetime import date
+from typing import Any, Dict, Iterable, List
+
+PRICES_PREFIX = 'prices'
+COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume', 'adj_close']
+
+DAILY = 'daily'
+MONTHLY = 'monthly'
+BATCH = 'batch'
+LAYOUTS = (DAILY, MONTHLY)
+
+
+def parse_date(value: str) -> date:
+    return date.fromisoformat(value[:10])
+
+
+def partition_prefix(ticker: str, year: int, month: int) -> str:
+    return f"{PRICES_PREFIX}/ticker={ticker}/year={year}/month={month:02d}/"
+
+
+def object_key(ticker: str, day: date, layout: str = DAILY, filename: str = 'data.csv') -> str:
+    """Key of the object holding `day` for `ticker` in the given layout"""
+    prefix = partition_prefix(ticker, day.year, day.month)
+    if layout == DAILY:
+        return f"{prefix}day={day.day:02d}/{filename}"
+    if layout == MONTHLY:
+        return f"{prefix}{filename}"
+    raise ValueError(f"Unknown layout: {layout}")
+
+
+def group_rows(ticker: str, rows: Iterable[Dict[str, Any]], layout: str = MONTHLY,
+               filename: str = 'data.csv') -> Dict[str, List[Dict[str, Any]]]:
+    """Group rows by destination object key, keeping each group in date order"""
+    if layout == BATCH:
+        return {
+            object_key(ticker, parse_date(group[0]['date']), DAILY, filename): group
+            for group in group_rows(ticker, rows, MONTHLY, filename).values()
+        }
+    groups: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in sorted(rows, key=lambda r: r['date']):
+        groups[object_key(ticker, parse_date(row['date']), layout, filename)].append(row)
+    return dict(groups)
+
+
+def is_daily_key(key: str) -> bool:
+    return '/day=' in key
+
+
+def key_values(key: str) -> Dict[str, str]:
+    """Hive-style partition values (ticker, year, month, day) found in a key"""
+    return dict(part.split('=', 1) for part in key.split('/') if '=' in part)
+
+
+def date_of_daily_key(key: str) -> date:
+    values = key_values(key)
+    return date(int(values['year']), int(values['month']), int(values['day']))
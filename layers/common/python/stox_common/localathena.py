@@ -0,0 +1,215 @@
+"""DuckDB stand-in for Athena over a local copy of the curated bucket
+
+Tests mock `execute_athena_query` away, so they say nothing about how fast
+a query runs or whether the views in sql/views.sql are valid. `LocalAthena`
+answers the Athena API calls the Lambdas make (StartQueryExecution,
+GetQueryExecution, GetQueryResults, StopQueryExecution) by running the SQL
+with DuckDB against a directory laid out like the bucket:
+
+    <root>/prices/ticker=T/year=Y/month=MM/[day=DD/]data.csv|data.parquet
+    <root>/indicators/year=Y/month=MM/...
+    <root>/correlations/year=Y/month=MM/...
+
+`athena.get_client` returns one when ATHENA_BACKEND=duckdb, so stox-agent and
+stox-maint use it without any other change: polling, coalescing, the result
+cache and the typed result conversion all run as they do against Athena.
+
+The tables mirror sql/create_table_*.sql. Each one is a view over the files
+that exist, read with hive partitioning, so year/month (and ticker)
+predicates skip files the way Athena skips S3 prefixes. Daily objects
+(`day=DD/`) and monthly ones are read side by side, like Athena's recursive
+read of a partition prefix. A table with no files yet is empty; MSCK REPAIR
+TABLE (and the other catalog statements) re-scan the layout, like partition
+registration does for Athena. The views from sql/views.sql are created on
+top.
+
+A query runs inside StartQueryExecution, so the first poll finds it
+finished and EngineExecutionTimeInMillis is DuckDB's time alone. SQL that
+DuckDB cannot run (a Trino-only function, say) fails like an Athena syntax
+error: the execution is FAILED with DuckDB's message as the reason.
+Results come back through GetQueryResults only; ATHENA_RESULTS_MODE=s3
+needs a real results bucket.
+"""
+
+import glob
+import itertools
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import duckdb
+
+# (columns, partition columns) as declared in sql/create_table_*.sql
+TABLES: Dict[str, Tuple[Dict[str, str], Dict[str, str]]] = {
+    'prices': (
+        {'date': 'DATE', 'open': 'DOUBLE', 'high': 'DOUBLE', 'low': 'DOUBLE', 'close': 'DOUBLE',
+         'volume': 'BIGINT', 'adj_close': 'DOUBLE'},
+        {'ticker': 'VARCHAR', 'year': 'INTEGER', 'month': 'INTEGER'},
+    ),
+    'indicators': (
+        {'ticker': 'VARCHAR', 'date': 'DATE', 'close': 'DOUBLE', 'daily_return': 'DOUBLE', 'sma_7': 'DOUBLE',
+         'sma_20': 'DOUBLE', 'vol_20': 'DOUBLE', 'peak': 'DOUBLE', 'drawdown': 'DOUBLE', 'max_drawdown': 'DOUBLE'},
+        {'year': 'INTEGER', 'month': 'INTEGER'},
+    ),
+    'correlations': (
+        {'date': 'DATE', 'ticker_a': 'VARCHAR', 'ticker_b': 'VARCHAR', 'corr_60': 'DOUBLE',
+         'observations': 'INTEGER'},
+        {'year': 'INTEGER', 'month': 'INTEGER'},
+    ),
+}
+
+DEFAULT_VIEWS = os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir] * 4, 'sql', 'views.sql')
+
+# Statements that change the Glue catalog in Athena; here the layout is the catalog
+_CATALOG = re.compile(r'^\s*(MSCK\s+REPAIR|ALTER\s+TABLE|CREATE\s+(EXTERNAL\s+TABLE|DATABASE|SCHEMA))', re.I)
+_VIEW = re.compile(r'CREATE\s+OR\s+REPLACE\s+VIEW', re.I)
+
+# DuckDB result types as Athena names them in ColumnInfo; anything else is returned as varchar
+_TYPES = {
+    'VARCHAR': 'varchar', 'BOOLEAN': 'boolean', 'TINYINT': 'tinyint', 'SMALLINT': 'smallint',
+    'INTEGER': 'integer', 'BIGINT': 'bigint', 'HUGEINT': 'bigint', 'FLOAT': 'float', 'DOUBLE': 'double',
+    'DATE': 'date', 'TIMESTAMP': 'timestamp',
+}
+
+MAX_RESULTS = 100
+
+
+def athena_type(duckdb_type: str) -> str:
+    if duckdb_type.startswith('DECIMAL'):
+        return 'decimal'
+    return _TYPES.get(duckdb_type, 'varchar')
+
+
+def cell(value: Any) -> Dict[str, str]:
+    """A GetQueryResults datum: the value as Athena's string, no VarCharValue for NULL"""
+    if value is None:
+        return {}
+    if isinstance(value, bool):
+        return {'VarCharValue': 'true' if value else 'false'}
+    if isinstance(value, datetime):
+        return {'VarCharValue': value.isoformat(sep=' ', timespec='milliseconds')}
+    if isinstance(value, date):
+        return {'VarCharValue': value.isoformat()}
+    return {'VarCharValue': str(value)}
+
+
+def read_statements(path: str) -> List[str]:
+    """The CREATE OR REPLACE VIEW statements of a SQL file"""
+    with open(path) as f:
+        return [s.strip() for s in f.read().split(';') if _VIEW.search(s)]
+
+
+class LocalAthena:
+    """Athena client interface backed by DuckDB over `root`; thread-safe"""
+
+    def __init__(self, root: str, database: str = 'stox', views: Optional[str] = None):
+        self.root = root
+        self.database = database
+        self.views = views if views is not None else (DEFAULT_VIEWS if os.path.exists(DEFAULT_VIEWS) else '')
+        self.started = 0
+        self._con = duckdb.connect()
+        self._con.execute(f'CREATE SCHEMA {database}')
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._executions: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.refresh()
+
+    def sources(self, table: str) -> List[str]:
+        """SELECTs over each file shape present under the table's prefix"""
+        columns, partitions = TABLES[table]
+        hive_types = '{' + ', '.join(f"'{name}': {kind}" for name, kind in partitions.items()) + '}'
+        selects = []
+        # Monthly objects sit directly in the last partition, daily ones one level (day=DD) below
+        for depth in (len(partitions) + 1, len(partitions) + 2):
+            for extension in ('csv', 'parquet'):
+                pattern = os.path.join(self.root, table, *['*'] * (depth - 1), f'*.{extension}')
+                if next(glob.iglob(pattern), None) is None:
+                    continue
+                if extension == 'csv':
+                    types = '{' + ', '.join(f"'{name}': '{kind}'" for name, kind in columns.items()) + '}'
+                    reader = (f"read_csv('{pattern}', header = true, auto_detect = false, columns = {types}, "
+                              f"hive_partitioning = true, hive_types = {hive_types})")
+                else:
+                    reader = f"read_parquet('{pattern}', hive_partitioning = true, hive_types = {hive_types})"
+                casts = ', '.join(f'CAST({name} AS {kind}) AS {name}' for name, kind in columns.items())
+                selects.append(f"SELECT {casts}, {', '.join(partitions)} FROM {reader}")
+        return selects
+
+    def refresh(self):
+        """(Re)create the table views from the files on disk, then the views from sql/views.sql"""
+        with self._lock:
+            for table, (columns, partitions) in TABLES.items():
+                selects = self.sources(table)
+                if not selects:
+                    nulls = ', '.join(f'CAST(NULL AS {kind}) AS {name}'
+                                      for name, kind in {**columns, **partitions}.items())
+                    selects = [f'SELECT {nulls} WHERE false']
+                self._con.execute(f"CREATE OR REPLACE VIEW {self.database}.{table} AS {' UNION ALL '.join(selects)}")
+            for statement in read_statements(self.views) if self.views else []:
+                self._con.execute(statement)
+
+    def _run(self, sql: str, database: str) -> Tuple[List[Dict[str, str]], List[Tuple[Any, ...]]]:
+        if _CATALOG.match(sql):
+            self.refresh()
+            return [], []
+        cursor = self._con.cursor()
+        try:
+            cursor.execute(f"SET schema = '{database}'")
+            cursor.execute(sql)
+            if cursor.description is None:
+                return [], []
+            column_info = [{'Name': name, 'Label': name, 'Type': athena_type(str(kind))}
+                           for name, kind, *_ in cursor.description]
+            return column_info, cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def start_query_execution(self, QueryString: str, QueryExecutionContext: Optional[Dict[str, str]] = None,
+                              ResultConfiguration: Optional[Dict[str, str]] = None, **kwargs) -> Dict[str, str]:
+        query_id = f'local-{next(self._ids)}'
+        database = (QueryExecutionContext or {}).get('Database', self.database)
+        started = time.perf_counter()
+        status: Dict[str, str] = {'State': 'SUCCEEDED'}
+        column_info, rows = [], []
+        try:
+            column_info, rows = self._run(QueryString, database)
+        except duckdb.Error as e:
+            status = {'State': 'FAILED', 'StateChangeReason': f'{type(e).__name__}: {e}'}
+        execution = {
+            'QueryExecutionId': query_id,
+            'Query': QueryString,
+            'Status': status,
+            'ResultConfiguration': dict(ResultConfiguration or {}),
+            'Statistics': {'QueryQueueTimeInMillis': 0,
+                           'EngineExecutionTimeInMillis': int((time.perf_counter() - started) * 1000)},
+        }
+        with self._lock:
+            self.started += 1
+            self._executions[query_id] = {'execution': execution, 'columns': column_info, 'rows': rows}
+            # Results are read right after the query; keep only the most recent ones
+            while len(self._executions) > MAX_RESULTS:
+                self._executions.popitem(last=False)
+        return {'QueryExecutionId': query_id}
+
+    def get_query_execution(self, QueryExecutionId: str) -> Dict[str, Any]:
+        return {'QueryExecution': self._executions[QueryExecutionId]['execution']}
+
+    def stop_query_execution(self, QueryExecutionId: str) -> Dict[str, Any]:
+        return {}
+
+    def get_query_results(self, QueryExecutionId: str, MaxResults: int = 1000,
+                          NextToken: Optional[str] = None) -> Dict[str, Any]:
+        """One page of rows; like Athena, the first page starts with a row of column names"""
+        result = self._executions[QueryExecutionId]
+        start = int(NextToken or 0)
+        data = [{'Data': [{'VarCharValue': col['Name']} for col in result['columns']]}] if start == 0 else []
+        end = min(len(result['rows']), start + MaxResults - len(data))
+        data += [{'Data': [cell(value) for value in row]} for row in result['rows'][start:end]]
+        page = {'ResultSet': {'ResultSetMetadata': {'ColumnInfo': result['columns']}, 'Rows': data}}
+        if end < len(result['rows']):
+            page['NextToken'] = str(end)
+        return page
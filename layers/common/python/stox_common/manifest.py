@@ -0,0 +1,155 @@
+"""Per-ticker high-watermarks of daily ingest
+
+Alpha Vantage's compact daily series returns the last 100 trading days on
+every call, but ingest used to keep only the latest one. Days missed by
+failed runs then stayed missing until backfill was rerun by hand. The
+ingest manifest records the last date written per ticker. Each run writes
+every downloaded day newer than that date, so catching up after an outage
+costs no extra API calls.
+
+The manifest is one small JSON document, `manifests/ingest.json` in the
+curated bucket (S3ManifestStore), or a local file for tests and local runs
+(FileManifestStore):
+
+    {"tickers": {"AAPL": {"last_date": "2025-10-16", "updated_at": "..."}}}
+
+A ticker without an entry falls back to `lookup(ticker)`, the last day
+stored for that ticker (ingest reads it from the ticker's series), because
+backfill and older ingest runs wrote data without recording per-ticker
+dates. The global data watermark is not a fallback: it is the latest day
+of any ticker, so a ticker that lagged behind would skip its missing days.
+When the lookup finds nothing, only the latest day is written, as before.
+
+`find_gap` reports the days that the download cannot fill: the watermark
+is older than the oldest day in the response. Those days need backfill.
+"""
+
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from stox_common.layout import parse_date
+
+MANIFEST_KEY = 'manifests/ingest.json'
+
+
+class S3ManifestStore:
+
+    def __init__(self, client: Any, bucket: str, key: str = MANIFEST_KEY):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+
+    def read(self) -> Optional[Dict[str, Any]]:
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self.key)['Body'].read()
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return json.loads(body)
+
+    def write(self, document: Dict[str, Any]) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self.key, Body=json.dumps(document, sort_keys=True),
+                               ContentType='application/json')
+
+
+class FileManifestStore:
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def read(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            return json.load(f)
+
+    def write(self, document: Dict[str, Any]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(document, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class IngestManifest:
+    """Last written date per ticker; thread-safe, saved once per run"""
+
+    def __init__(self, store: Any, document: Optional[Dict[str, Any]] = None,
+                 lookup: Optional[Callable[[str], Optional[str]]] = None):
+        self.store = store
+        self.lookup = lookup
+        self._document = document or {'tickers': {}}
+        self._looked_up: Dict[str, Optional[str]] = {}
+        self._changed = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, store: Any, lookup: Optional[Callable[[str], Optional[str]]] = None) -> 'IngestManifest':
+        return cls(store, store.read(), lookup)
+
+    def watermark(self, ticker: str) -> Optional[str]:
+        """Last date written for `ticker`: its entry, else its own last stored day, else None"""
+        with self._lock:
+            entry = self._document['tickers'].get(ticker)
+            if entry:
+                return entry['last_date']
+            if ticker in self._looked_up or self.lookup is None:
+                return self._looked_up.get(ticker)
+        last_date = self.lookup(ticker)
+        with self._lock:
+            self._looked_up[ticker] = last_date
+        return last_date
+
+    def advance(self, ticker: str, last_date: str) -> None:
+        """Record a write up to `last_date`; the watermark never moves back"""
+        with self._lock:
+            entry = self._document['tickers'].get(ticker)
+            if entry and entry['last_date'] >= last_date:
+                return
+            self._document['tickers'][ticker] = {
+                'last_date': last_date, 'updated_at': datetime.now(timezone.utc).isoformat()
+            }
+            self._changed = True
+
+    def save(self) -> bool:
+        """Write the manifest if any watermark moved; returns whether it wrote"""
+        with self._lock:
+            if not self._changed:
+                return False
+            document = json.loads(json.dumps(self._document))
+            self._changed = False
+        self.store.write(document)
+        return True
+
+
+def new_rows(rows: List[Dict[str, Any]], watermark: Optional[str]) -> List[Dict[str, Any]]:
+    """Rows (in date order) newer than the watermark; only the latest row without one"""
+    ordered = sorted(rows, key=lambda r: r['date'])
+    if watermark is None:
+        return ordered[-1:]
+    return [row for row in ordered if row['date'] > watermark]
+
+
+def next_weekday(day: date) -> date:
+    day += timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day
+
+
+def find_gap(rows: List[Dict[str, Any]], watermark: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Weekdays between the watermark and the oldest downloaded row, which this download cannot fill"""
+    if watermark is None or not rows:
+        return None
+    oldest = parse_date(min(row['date'] for row in rows))
+    first_missing = next_weekday(parse_date(watermark))
+    if first_missing >= oldest:
+        return None
+    last_missing = oldest - timedelta(days=1)
+    weekdays = sum(1 for n in range((last_missing - first_missing).days + 1)
+                   if (first_missing + timedelta(days=n)).weekday() < 5)
+    return {'from': first_missing.isoformat(), 'to': last_missing.isoformat(), 'weekdays': weekdays}
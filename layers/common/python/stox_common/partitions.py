@@ -0,0 +1,121 @@
+"""Glue catalog access for the partitions of stox.prices
+
+Writers register exactly the partitions they touched with
+BatchCreatePartition instead of relying on a MSCK REPAIR TABLE scan of the
+whole prefix. Partition values are the strings used in the S3 keys
+(year '2024', month '01'), the same values MSCK REPAIR would register.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from stox_common.layout import key_values, partition_prefix
+
+PARQUET_INPUT_FORMAT = 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat'
+
+Partition = Tuple[str, str, str]
+
+# BatchCreatePartition / BatchUpdatePartition accept at most 100 entries
+GLUE_BATCH_SIZE = 100
+
+
+def partitions_of_keys(keys: Iterable[str]) -> Set[Partition]:
+    """(ticker, year, month) partitions of the given stox.prices object keys"""
+    partitions = set()
+    for key in keys:
+        values = key_values(key)
+        if {'ticker', 'year', 'month'} <= values.keys():
+            partitions.add((values['ticker'], values['year'], values['month']))
+    return partitions
+
+
+def partition_location(bucket: str, partition: Partition) -> str:
+    ticker, year, month = partition
+    return f"s3://{bucket}/{partition_prefix(ticker, int(year), int(month))}"
+
+
+class GlueCatalog:
+    """Partition lookups, registration and location swaps for one Glue table"""
+
+    def __init__(self, glue: Any, database: str, table: str = 'prices'):
+        self.glue = glue
+        self.database = database
+        self.table = table
+        self._table: Optional[Dict[str, Any]] = None
+
+    @property
+    def storage_descriptor(self) -> Dict[str, Any]:
+        if self._table is None:
+            self._table = self.glue.get_table(DatabaseName=self.database, Name=self.table)['Table']
+        return self._table['StorageDescriptor']
+
+    @property
+    def is_parquet(self) -> bool:
+        return self.storage_descriptor.get('InputFormat') == PARQUET_INPUT_FORMAT
+
+    def _partition_input(self, partition: Partition, location: str,
+                         descriptor: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        descriptor = dict(descriptor or self.storage_descriptor)
+        descriptor['Location'] = location
+        return {'Values': list(partition), 'StorageDescriptor': descriptor}
+
+    def get_partitions(self, partitions: List[Partition]) -> Dict[Partition, Dict[str, Any]]:
+        found = {}
+        for i in range(0, len(partitions), 1000):
+            response = self.glue.batch_get_partition(
+                DatabaseName=self.database, TableName=self.table,
+                PartitionsToGet=[{'Values': list(p)} for p in partitions[i:i + 1000]]
+            )
+            for partition in response.get('Partitions', []):
+                found[tuple(partition['Values'])] = partition
+        return found
+
+    def register(self, bucket: str, partitions: Iterable[Partition]) -> Dict[str, int]:
+        """Create missing partitions at their prices/ location; existing ones are left alone
+
+        Already-registered partitions come back as AlreadyExistsException entries,
+        which is what keeps a compacted partition pointing at its compacted files.
+        """
+        inputs = [self._partition_input(p, partition_location(bucket, p)) for p in sorted(set(partitions))]
+        created = existing = calls = 0
+        failed: List[Dict[str, Any]] = []
+        for i in range(0, len(inputs), GLUE_BATCH_SIZE):
+            batch = inputs[i:i + GLUE_BATCH_SIZE]
+            response = self.glue.batch_create_partition(DatabaseName=self.database, TableName=self.table,
+                                                        PartitionInputList=batch)
+            calls += 1
+            errors = response.get('Errors', [])
+            already = [e for e in errors if e['ErrorDetail'].get('ErrorCode') == 'AlreadyExistsException']
+            failed += [e for e in errors if e not in already]
+            existing += len(already)
+            created += len(batch) - len(errors)
+        if failed:
+            raise RuntimeError(f"Partition registration failed: {failed[0]['ErrorDetail']}")
+        return {'created': created, 'existing': existing, 'calls': calls}
+
+    def switch_locations(self, locations: Dict[Partition, str]) -> Dict[Partition, Dict[str, Any]]:
+        """Point each partition at its new location, creating missing partitions
+
+        Returns the ErrorDetail of every partition Glue rejected; those still
+        point at their previous location.
+        """
+        existing = self.get_partitions(list(locations))
+        updates, creates = [], []
+        for partition, location in locations.items():
+            descriptor = existing.get(partition, {}).get('StorageDescriptor')
+            entry = self._partition_input(partition, location, descriptor)
+            if partition in existing:
+                updates.append({'PartitionValueList': list(partition), 'PartitionInput': entry})
+            else:
+                creates.append(entry)
+        failed: Dict[Partition, Dict[str, Any]] = {}
+        for i in range(0, len(updates), GLUE_BATCH_SIZE):
+            response = self.glue.batch_update_partition(DatabaseName=self.database, TableName=self.table,
+                                                        Entries=updates[i:i + GLUE_BATCH_SIZE])
+            for error in response.get('Errors', []):
+                failed[tuple(error['PartitionValueList'])] = error['ErrorDetail']
+        for i in range(0, len(creates), GLUE_BATCH_SIZE):
+            response = self.glue.batch_create_partition(DatabaseName=self.database, TableName=self.table,
+                                                        PartitionInputList=creates[i:i + GLUE_BATCH_SIZE])
+            for error in response.get('Errors', []):
+                failed[tuple(error['PartitionValues'])] = error['ErrorDetail']
+        return failed
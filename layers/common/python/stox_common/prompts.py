@@ -0,0 +1,171 @@
+"""Prompt assembly for stox-agent's SQL generation
+
+The SQL prompt used to be one f-string with the schema, every few-shot
+example and the rules, rebuilt and sent whole on every call. The model's
+time to first token grows with the input, and every input token is billed.
+The prompt now has two parts:
+
+- a static system prefix (`SYSTEM`): the table schemas and the rules. It is
+  identical on every call, so Bedrock prompt caching can serve it from its
+  cache (see `bedrock.prompt_caching`). Caching needs a prefix above the
+  model's minimum (1,024 or 2,048 tokens depending on the model); below it
+  Bedrock just processes the prefix normally;
+- a short user message: the `k` library examples most similar to the
+  question, then the question itself.
+
+`ExampleIndex` is a TF-IDF index over the example questions, built on first
+use (a few dozen examples, tens of microseconds per lookup). Ticker
+symbols and numbers are replaced by placeholders before indexing, so
+"volatility of MSFT" and "volatility of AMZN over 30 days" match the same
+example. The selected examples are ordered from least to most similar,
+which puts the closest one next to the question.
+"""
+
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+SCHEMA = """Table stox.prices (raw daily prices):
+- date DATE
+- open DOUBLE, high DOUBLE, low DOUBLE, close DOUBLE
+- volume BIGINT, adj_close DOUBLE
+- PARTITIONED BY (ticker STRING, year INT, month INT)
+
+Table stox.indicators (precomputed, one row per ticker and date):
+- ticker STRING, date DATE, close DOUBLE
+- daily_return DOUBLE, sma_7 DOUBLE, sma_20 DOUBLE, vol_20 DOUBLE
+- peak DOUBLE (all-time high so far), drawdown DOUBLE, max_drawdown DOUBLE (worst drawdown so far)
+- PARTITIONED BY (year INT, month INT)
+
+Table stox.correlations (precomputed 60-day return correlation for every date, ticker_a < ticker_b):
+- date DATE, ticker_a STRING, ticker_b STRING, corr_60 DOUBLE, observations INT
+- PARTITIONED BY (year INT, month INT)"""
+
+RULES = """Rules:
+1. Return ONLY the SQL query wrapped in <SQL>...</SQL> tags
+2. Use only SELECT statements, no DDL/DML
+3. Always filter by ticker when specific stock mentioned
+4. Limit date ranges to reasonable defaults (last 90 days if not specified)
+5. Use proper Athena SQL syntax
+6. Add LIMIT 200 to prevent large result sets; a single series ordered by date (a trend or history) may use LIMIT 5000
+7. Prefer stox.indicators and stox.correlations over window functions on stox.prices; use stox.prices for OHLCV, volume or indicators they do not have"""
+
+SYSTEM = f"""You are a SQL expert. Convert the natural language question to SQL for Athena against the stox tables.
+
+{SCHEMA}
+
+{RULES}"""
+
+EXAMPLES: List[Tuple[str, str]] = [
+    ("7-day SMA of AAPL for last 30 days",
+     "SELECT date, close, sma_7 FROM stox.indicators WHERE ticker='AAPL' AND date >= current_date - interval '30' day ORDER BY date;"),
+    ("Best performer YTD on my watchlist",
+     "WITH ytd_returns AS (SELECT ticker, (close - LAG(close) OVER (PARTITION BY ticker ORDER BY date)) / LAG(close) OVER (PARTITION BY ticker ORDER BY date) as daily_return FROM stox.prices WHERE date >= date_trunc('year', current_date)) SELECT ticker, SUM(daily_return) as ytd_return FROM ytd_returns GROUP BY ticker ORDER BY ytd_return DESC LIMIT 1;"),
+    ("Max drawdown of TSLA YTD",
+     "WITH running_peak AS (SELECT date, close, MAX(close) OVER (ORDER BY date) as peak FROM stox.prices WHERE ticker='TSLA' AND date >= date_trunc('year', current_date)) SELECT MIN((close - peak) / peak) as max_drawdown FROM running_peak;"),
+    ("20-day volatility of MSFT",
+     "SELECT date, close, vol_20 FROM stox.indicators WHERE ticker='MSFT' AND date >= current_date - interval '90' day ORDER BY date;"),
+    ("Which stocks move most like NVDA?",
+     "SELECT ticker_a, ticker_b, corr_60 FROM stox.correlations WHERE date >= current_date - interval '14' day AND date = (SELECT max(date) FROM stox.correlations WHERE date >= current_date - interval '14' day) AND 'NVDA' IN (ticker_a, ticker_b) ORDER BY corr_60 DESC LIMIT 200;"),
+    ("Show me AAPL price trend for last 60 days",
+     "SELECT date, close FROM stox.prices WHERE ticker='AAPL' AND date >= current_date - interval '60' day ORDER BY date LIMIT 200;"),
+    ("Compare AAPL vs MSFT closing prices this month",
+     "SELECT date, ticker, close FROM stox.prices WHERE ticker IN ('AAPL', 'MSFT') AND date >= date_trunc('month', current_date) ORDER BY date, ticker LIMIT 200;"),
+    ("Average daily trading volume of AMZN last quarter",
+     "SELECT AVG(volume) as avg_volume FROM stox.prices WHERE ticker='AMZN' AND date >= current_date - interval '90' day;"),
+    ("Worst performing day for each stock",
+     "SELECT ticker, date, daily_return FROM (SELECT ticker, date, daily_return, ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY daily_return) as rn FROM stox.indicators WHERE daily_return IS NOT NULL) WHERE rn = 1 ORDER BY daily_return LIMIT 200;"),
+    ("Highest close of GOOGL in the last year",
+     "SELECT date, close FROM stox.prices WHERE ticker='GOOGL' AND date >= current_date - interval '1' year ORDER BY close DESC LIMIT 1;"),
+    ("Daily returns of META over the last 2 weeks",
+     "SELECT date, close, daily_return FROM stox.indicators WHERE ticker='META' AND date >= current_date - interval '14' day ORDER BY date;"),
+    ("Days when NFLX traded above its 20-day moving average",
+     "SELECT date, close, sma_20 FROM stox.indicators WHERE ticker='NFLX' AND close > sma_20 AND date >= current_date - interval '90' day ORDER BY date LIMIT 200;"),
+    ("Current drawdown from all-time high for every ticker",
+     "SELECT ticker, close, peak, drawdown FROM stox.indicators WHERE date = (SELECT max(date) FROM stox.indicators) ORDER BY drawdown LIMIT 200;"),
+    ("Biggest intraday range of TSLA this year",
+     "SELECT date, high, low, (high - low) / low as intraday_range FROM stox.prices WHERE ticker='TSLA' AND date >= date_trunc('year', current_date) ORDER BY intraday_range DESC LIMIT 10;"),
+    ("Monthly average close of AAPL over 5 years",
+     "SELECT date_trunc('month', date) as month, AVG(close) as avg_close FROM stox.prices WHERE ticker='AAPL' AND date >= current_date - interval '5' year GROUP BY 1 ORDER BY 1 LIMIT 200;"),
+    ("Least correlated pairs on the watchlist",
+     "SELECT ticker_a, ticker_b, corr_60 FROM stox.correlations WHERE date >= current_date - interval '14' day AND date = (SELECT max(date) FROM stox.correlations WHERE date >= current_date - interval '14' day) ORDER BY corr_60 ASC LIMIT 20;"),
+]
+
+STOPWORDS = frozenset(
+    'a an and are as at be by did do does for from how i in is it me my of on or over show than that the '
+    'their them this to was were what when which who with'.split()
+)
+# Upper-case words that are finance terms (or the pronoun), not tickers
+ACRONYMS = frozenset('I YTD MTD QTD SMA EMA RSI ETF OHLC OHLCV'.split())
+_TICKER = re.compile(r'\b[A-Z]{1,5}\b')
+_WORD = re.compile(r'[a-z]+|\d+')
+
+
+def terms(question: str) -> List[str]:
+    """Index terms: lower-case words without stopwords, tickers as `<ticker>`, numbers as `<n>`"""
+    text = _TICKER.sub(lambda m: m.group() if m.group() in ACRONYMS else ' zzticker ', question).lower()
+    result = []
+    for word in _WORD.findall(text):
+        if word.isdigit():
+            result.append('<n>')
+        elif word == 'zzticker':
+            result.append('<ticker>')
+        elif word not in STOPWORDS:
+            # Crude plural folding: "stocks" and "stock", "days" and "day"
+            result.append(word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word)
+    return result
+
+
+class ExampleIndex:
+    """TF-IDF cosine similarity over example questions"""
+
+    def __init__(self, examples: List[Tuple[str, str]]):
+        self.examples = examples
+        documents = [terms(question) for question, _ in examples]
+        frequency: Dict[str, int] = {}
+        for document in documents:
+            for term in set(document):
+                frequency[term] = frequency.get(term, 0) + 1
+        self.idf = {term: math.log((1 + len(documents)) / (1 + n)) + 1 for term, n in frequency.items()}
+        self.vectors = [self._vector(document) for document in documents]
+
+    def _vector(self, document: List[str]) -> Dict[str, float]:
+        weights: Dict[str, float] = {}
+        for term in document:
+            if term in self.idf:
+                weights[term] = weights.get(term, 0.0) + self.idf[term]
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {term: w / norm for term, w in weights.items()}
+
+    def scores(self, question: str) -> List[float]:
+        query = self._vector(terms(question))
+        return [sum(w * vector.get(term, 0.0) for term, w in query.items()) for vector in self.vectors]
+
+    def select(self, question: str, k: int) -> List[Tuple[str, str]]:
+        """The `k` most similar examples, least similar first; library order breaks ties"""
+        scores = self.scores(question)
+        best = sorted(range(len(self.examples)), key=lambda i: (-scores[i], i))[:max(0, k)]
+        return [self.examples[i] for i in reversed(best)]
+
+
+_index: Optional[ExampleIndex] = None
+
+
+def get_index() -> ExampleIndex:
+    global _index
+    if _index is None:
+        _index = ExampleIndex(EXAMPLES)
+    return _index
+
+
+def user_message(question: str, examples: List[Tuple[str, str]]) -> str:
+    lines = ['Examples:']
+    for example_question, sql in examples:
+        lines.append(f'Q: "{example_question}"\nA: <SQL>{sql}</SQL>\n')
+    lines.append(f'Question: {question}\n\nSQL:')
+    return '\n'.join(lines)
+
+
+def sql_prompt(question: str, k: int = 3) -> Tuple[str, str]:
+    """(system prefix, user message) for a question, with its `k` nearest examples"""
+    return SYSTEM, user_message(question, get_index().select(question, k))
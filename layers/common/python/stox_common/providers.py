@@ -0,0 +1,323 @@
+"""Daily price providers shared by stox-ingest and backfill.py
+
+A provider turns a list of tickers into price rows in stox.prices shape,
+oldest first:
+
+    provider.fetch(['AAPL', 'MSFT'], start, end) -> {'AAPL': [row, ...], 'MSFT': [...]}
+
+`batch_size` is the number of tickers one HTTP request can carry. Callers
+split the watchlist with `batches` and spend one rate-limiter token per
+batch, so a provider with a multi-symbol endpoint needs about N/100
+requests for N tickers instead of N:
+
+- alphavantage: TIME_SERIES_DAILY, one symbol and the last 100 trading days
+  per request (ingest's default);
+- stooq: the full daily history CSV of one symbol (backfill's default);
+- stooq-quotes: the latest daily bar of up to STOOQ_BATCH_SIZE (100)
+  symbols in one CSV request. It is meant for daily ingest. It only knows
+  the latest day, so a day missed by a failed run becomes a manifest gap
+  for backfill.py to fill;
+- mock: deterministic random-walk rows without any network access, for
+  tests and local runs.
+
+Responses are requested as CSV and parsed line by line from the response
+stream (`iter_lines`) with the csv module. Neither the body text nor a
+JSON document is ever held in memory as a whole. Header names select the
+columns, so the Alpha Vantage (timestamp,open,...), Stooq history
+(Date,Open,...) and Stooq quote (Symbol,Date,Open,...) layouts all go
+through `iter_price_csv`.
+"""
+
+import csv
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_ALPHAVANTAGE_URL = 'https://www.alphavantage.co/query'
+DEFAULT_STOOQ_URL = 'https://stooq.com/q/d/l/'
+DEFAULT_STOOQ_QUOTES_URL = 'https://stooq.com/q/l/'
+PROVIDERS = ('alphavantage', 'stooq', 'stooq-quotes', 'mock')
+
+# Header names (lower case) of the supported CSV layouts
+COLUMNS = {
+    'symbol': 'symbol', 'date': 'date', 'timestamp': 'date', 'open': 'open',
+    'high': 'high', 'low': 'low', 'close': 'close', 'volume': 'volume',
+}
+
+
+class ProviderError(Exception):
+    """The provider answered with an error instead of prices"""
+
+
+class RateLimitError(ProviderError):
+    """The provider throttled the request; retrying later can succeed"""
+
+
+def _number(value: str) -> float:
+    return float(value) if value else 0.0
+
+
+def iter_price_csv(lines: Iterable[str]) -> Iterator[Tuple[Optional[str], Dict[str, Any]]]:
+    """(symbol, row) per weekday line of a price CSV; symbol is None without a Symbol column"""
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if not header:
+        return
+    index = {COLUMNS[name.strip().lower()]: i for i, name in enumerate(header) if name.strip().lower() in COLUMNS}
+    if 'date' not in index or 'close' not in index:
+        raise ProviderError(f"unexpected CSV header: {','.join(header)[:200]}")
+    width = max(index.values()) + 1
+
+    for fields in reader:
+        if len(fields) < width:
+            continue
+        day = fields[index['date']].strip()
+        try:
+            if datetime.strptime(day, '%Y-%m-%d').weekday() >= 5:
+                continue
+            close = _number(fields[index['close']])
+            row = {
+                'date': day,
+                'open': _number(fields[index['open']]) if 'open' in index else close,
+                'high': _number(fields[index['high']]) if 'high' in index else close,
+                'low': _number(fields[index['low']]) if 'low' in index else close,
+                'close': close,
+                'volume': int(_number(fields[index['volume']])) if 'volume' in index else 0,
+                'adj_close': close,  # Neither source adjusts the free daily series
+            }
+        except ValueError:
+            # Bad dates, and 'N/D' quotes of unknown symbols
+            continue
+        yield (fields[index['symbol']].strip() if 'symbol' in index else None), row
+
+
+def _day(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.isoformat() if isinstance(value, date) else str(value)
+
+
+def in_range(row: Dict[str, Any], start: Any = None, end: Any = None) -> bool:
+    """Whether the row's date lies in [start, end]; dates, datetimes or ISO strings"""
+    start, end = _day(start), _day(end)
+    return (start is None or row['date'] >= start) and (end is None or row['date'] <= end)
+
+
+def parse_price_csv(lines: Iterable[str], start: Any = None, end: Any = None) -> List[Dict[str, Any]]:
+    """Rows of a single-symbol price CSV within [start, end], oldest first"""
+    rows = [row for _, row in iter_price_csv(lines) if in_range(row, start, end)]
+    rows.sort(key=lambda r: r['date'])
+    return rows
+
+
+class Provider:
+    """Base class: `fetch` up to `batch_size` tickers per request"""
+
+    name = 'base'
+    batch_size = 1
+
+    def __init__(self, session: Any = None):
+        self._session = session
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def session(self) -> Any:
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    def batches(self, tickers: List[str]) -> List[List[str]]:
+        size = max(1, self.batch_size)
+        return [tickers[i:i + size] for i in range(0, len(tickers), size)]
+
+    def fetch(self, tickers: List[str], start: Any = None, end: Any = None) -> Dict[str, List[Dict[str, Any]]]:
+        raise NotImplementedError
+
+    def _get(self, url: str, params: Dict[str, Any]) -> Any:
+        """Streamed GET; the caller reads `iter_lines` and closes the response"""
+        with self._lock:
+            self.requests += 1
+        response = self.session.get(url, params=params, timeout=30, stream=True)
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        # CSV bodies come without a charset, which would make iter_lines yield bytes
+        response.encoding = response.encoding or 'utf-8'
+        return response
+
+
+class AlphaVantageProvider(Provider):
+    """TIME_SERIES_DAILY as CSV, one symbol per request"""
+
+    name = 'alphavantage'
+
+    def __init__(self, api_key: str, url: Optional[str] = None, session: Any = None):
+        super().__init__(session)
+        self.api_key = api_key
+        self.url = url or DEFAULT_ALPHAVANTAGE_URL
+
+    def fetch(self, tickers: List[str], start: Any = None, end: Any = None) -> Dict[str, List[Dict[str, Any]]]:
+        return {ticker: self._fetch_one(ticker, start, end) for ticker in tickers}
+
+    def _fetch_one(self, ticker: str, start: Any, end: Any) -> List[Dict[str, Any]]:
+        params = {
+            'function': 'TIME_SERIES_DAILY',
+            'symbol': ticker,
+            'apikey': self.api_key,
+            'outputsize': 'compact',
+            'datatype': 'csv',
+        }
+        response = self._get(self.url, params)
+        try:
+            lines = response.iter_lines(decode_unicode=True)
+            first = next(lines, '')
+            if first.lstrip().startswith('{'):
+                # Errors and throttling come back as a small JSON document even in CSV mode
+                raise_for_payload(json.loads('\n'.join(itertools.chain([first], lines))))
+            return parse_price_csv(itertools.chain([first], lines), start, end)
+        finally:
+            response.close()
+
+
+def raise_for_payload(payload: Dict[str, Any]) -> None:
+    """Turn an Alpha Vantage JSON error document into an exception"""
+    if 'Error Message' in payload:
+        raise ProviderError(f"Alpha Vantage error: {payload['Error Message']}")
+    # 'Note' is the per-minute quota, 'Information' the daily one
+    for field in ('Note', 'Information'):
+        if field in payload:
+            raise RateLimitError(f"API limit reached: {payload[field]}")
+    raise ProviderError(f"Alpha Vantage error: unexpected response {json.dumps(payload)[:200]}")
+
+
+class StooqProvider(Provider):
+    """Full daily history CSV of one symbol"""
+
+    name = 'stooq'
+
+    def __init__(self, url: Optional[str] = None, suffix: str = '', session: Any = None):
+        super().__init__(session)
+        self.url = url or DEFAULT_STOOQ_URL
+        self.suffix = suffix
+
+    def fetch(self, tickers: List[str], start: Any = None, end: Any = None) -> Dict[str, List[Dict[str, Any]]]:
+        result = {}
+        for ticker in tickers:
+            response = self._get(self.url, {'s': f"{ticker}{self.suffix}".lower(), 'i': 'd', 'f': 'csv'})
+            try:
+                result[ticker] = parse_price_csv(response.iter_lines(decode_unicode=True), start, end)
+            finally:
+                response.close()
+        return result
+
+
+class StooqQuotesProvider(Provider):
+    """Latest daily bar of up to `batch_size` symbols per request"""
+
+    name = 'stooq-quotes'
+
+    def __init__(self, url: Optional[str] = None, suffix: str = '', batch_size: int = 100, session: Any = None):
+        super().__init__(session)
+        self.url = url or DEFAULT_STOOQ_QUOTES_URL
+        self.suffix = suffix
+        self.batch_size = batch_size
+
+    def fetch(self, tickers: List[str], start: Any = None, end: Any = None) -> Dict[str, List[Dict[str, Any]]]:
+        symbols = {f"{ticker}{self.suffix}".upper(): ticker for ticker in tickers}
+        result: Dict[str, List[Dict[str, Any]]] = {ticker: [] for ticker in tickers}
+        # f: symbol, date, open, high, low, close, volume; h: with a header line
+        params = {'s': ' '.join(symbol.lower() for symbol in symbols), 'f': 'sd2ohlcv', 'h': '', 'e': 'csv'}
+        response = self._get(self.url, params)
+        try:
+            for symbol, row in iter_price_csv(response.iter_lines(decode_unicode=True)):
+                ticker = symbols.get((symbol or '').upper())
+                if ticker and in_range(row, start, end):
+                    result[ticker].append(row)
+        finally:
+            response.close()
+        return result
+
+
+def synthetic_rows(ticker: str, start: Any = None, end: Any = None, days: int = 100) -> List[Dict[str, Any]]:
+    """Deterministic random-walk rows for the weekdays of [start, end], or the last `days` up to `end`"""
+    rng = random.Random(ticker)
+    last = date.fromisoformat(_day(end)) if end is not None else date.today()
+    first = date.fromisoformat(_day(start)) if start is not None else None
+    dates = []
+    day = last
+    while (day >= first) if first else (len(dates) < days):
+        if day.weekday() < 5:
+            dates.append(day)
+        day -= timedelta(days=1)
+    price = rng.uniform(20, 500)
+    rows = []
+    for day in reversed(dates):
+        price *= 1 + rng.gauss(0, 0.02)
+        close = round(price, 4)
+        rows.append({
+            'date': day.isoformat(),
+            'open': round(price * 0.99, 4),
+            'high': round(price * 1.01, 4),
+            'low': round(price * 0.98, 4),
+            'close': close,
+            'volume': rng.randint(100_000, 50_000_000),
+            'adj_close': close,
+        })
+    return rows
+
+
+class MockProvider(Provider):
+    """In-memory provider: fixed `rows` per ticker, or synthetic ones; `latency` seconds per request"""
+
+    name = 'mock'
+
+    def __init__(self, rows: Optional[Dict[str, List[Dict[str, Any]]]] = None, batch_size: int = 100,
+                 latency: float = 0.0, days: int = 100, session: Any = None):
+        super().__init__(session)
+        self.rows = rows
+        self.batch_size = batch_size
+        self.latency = latency
+        self.days = days
+        self.calls: List[List[str]] = []
+
+    def fetch(self, tickers: List[str], start: Any = None, end: Any = None) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            self.requests += 1
+            self.calls.append(list(tickers))
+        if self.latency:
+            time.sleep(self.latency)
+        result = {}
+        for ticker in tickers:
+            if self.rows is not None:
+                rows = sorted(self.rows.get(ticker, []), key=lambda r: r['date'])
+            else:
+                rows = synthetic_rows(ticker, start, end, self.days)
+            result[ticker] = [dict(row) for row in rows if in_range(row, start, end)]
+        return result
+
+
+def get_provider(name: str, session: Any = None, api_key: Optional[str] = None) -> Provider:
+    """Provider by name, configured from the environment"""
+    suffix = os.environ.get('STOOQ_SUFFIX', '')
+    if name == 'alphavantage':
+        return AlphaVantageProvider(api_key or os.environ['ALPHAVANTAGE_API_KEY'],
+                                    os.environ.get('ALPHAVANTAGE_URL'), session)
+    if name == 'stooq':
+        return StooqProvider(os.environ.get('STOOQ_URL'), suffix, session)
+    if name == 'stooq-quotes':
+        return StooqQuotesProvider(os.environ.get('STOOQ_QUOTES_URL'), suffix,
+                                   int(os.environ.get('STOOQ_BATCH_SIZE', '100')), session)
+    if name == 'mock':
+        return MockProvider(batch_size=int(os.environ.get('MOCK_BATCH_SIZE', '100')))
+    raise ValueError(f"unknown price provider {name!r}; expected one of {', '.join(PROVIDERS)}")
@@ -0,0 +1,80 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def pooled_s3_client(max_connections: int = 32):
+    """The shared S3 client, or one with a larger pool if `max_connections` threads would outgrow it"""
+    from stox_common import clients
+    if max_connections <= clients.config('s3').max_pool_connections:
+        return clients.get('s3')
+    return clients.get('s3', max_pool_connections=max_connections)
+
+
+class ParallelUploader:
+    """Runs put_object calls on a thread pool that shares one pooled client
+
+    Use as a context manager; leaving the block waits for every upload.
+    """
+
+    def __init__(self, bucket: str, workers: int = 16, client: Optional[Any] = None):
+        self.bucket = bucket
+        self.workers = max(1, workers)
+        self.client = client or pooled_s3_client(self.workers)
+        self.puts = 0
+        self.bytes = 0
+        self.errors: List[Dict[str, str]] = []
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._futures: List[Future] = []
+
+    def __enter__(self) -> 'ParallelUploader':
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.wait()
+        self._pool.shutdown()
+
+    def put(self, key: str, body: Any, content_type: str = 'text/csv') -> Future:
+        future = self._pool.submit(self._put, key, body, content_type)
+        self._futures.append(future)
+        return future
+
+    def _put(self, key: str, body: Any, content_type: str) -> str:
+        try:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+        except Exception as e:
+            with self._lock:
+                self.errors.append({'key': key, 'error': str(e)})
+            raise
+        with self._lock:
+            self.puts += 1
+            self.bytes += len(body)
+        return key
+
+    def wait(self) -> None:
+        """Block until all submitted uploads finished (errors are kept in `errors`)"""
+        futures, self._futures = self._futures, []
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+
+def list_keys(client: Any, bucket: str, prefix: str) -> Iterable[str]:
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            yield obj['Key']
+
+
+def delete_keys(client: Any, bucket: str, keys: List[str]) -> int:
+    """Delete keys in batches of 1000 (the DeleteObjects limit); returns requests made"""
+    requests_made = 0
+    for i in range(0, len(keys), 1000):
+        batch = keys[i:i + 1000]
+        client.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': k} for k in batch], 'Quiet': True})
+        requests_made += 1
+    return requests_made
@@ -0,0 +1,95 @@
+"""Compact per-ticker price arrays for in-process analytics
+
+Alongside the stox.prices objects, each ticker has its full history as one
+NumPy archive: `series/ticker=T/prices.npz`. The archive holds one array per
+column, sorted by date, with dates stored as days since the epoch. Ingest
+and backfill merge their new rows into it, so the agent's local engine can
+answer a question with one small GET instead of an Athena query.
+"""
+
+import io
+from datetime import date
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+from stox_common.layout import COLUMNS, parse_date
+
+SERIES_PREFIX = 'series'
+
+_DTYPES = {
+    'date': np.int32,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.int64,
+    'adj_close': np.float64,
+}
+
+EPOCH = date(1970, 1, 1)
+
+
+def series_key(ticker: str) -> str:
+    return f"{SERIES_PREFIX}/ticker={ticker}/prices.npz"
+
+
+def day_number(value: Any) -> int:
+    day = value if isinstance(value, date) else parse_date(str(value))
+    return (day - EPOCH).days
+
+
+def to_date(day: int) -> date:
+    return date.fromordinal(EPOCH.toordinal() + int(day))
+
+
+def empty() -> Dict[str, np.ndarray]:
+    return {col: np.empty(0, dtype=dtype) for col, dtype in _DTYPES.items()}
+
+
+def from_rows(rows: Iterable[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Column arrays of price rows, sorted by date, last row winning per date"""
+    by_day = {day_number(row['date']): row for row in rows}
+    days = sorted(by_day)
+    series = {'date': np.array(days, dtype=np.int32)}
+    for col in COLUMNS[1:]:
+        series[col] = np.array([by_day[d][col] for d in days], dtype=_DTYPES[col])
+    return series
+
+
+def merge(existing: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Union of two series; on equal dates the values from `new` win"""
+    if not len(existing['date']):
+        return new
+    keep = ~np.isin(existing['date'], new['date'])
+    days = np.concatenate([existing['date'][keep], new['date']])
+    order = np.argsort(days, kind='stable')
+    return {col: np.concatenate([existing[col][keep], new[col]])[order] for col in _DTYPES}
+
+
+def dumps(series: Dict[str, np.ndarray]) -> bytes:
+    out = io.BytesIO()
+    np.savez(out, **series)
+    return out.getvalue()
+
+
+def loads(body: bytes) -> Dict[str, np.ndarray]:
+    with np.load(io.BytesIO(body)) as archive:
+        return {col: archive[col] for col in _DTYPES}
+
+
+def load_series(s3: Any, bucket: str, ticker: str) -> Optional[Dict[str, np.ndarray]]:
+    """The stored series of `ticker`, or None if it has none yet"""
+    try:
+        body = s3.get_object(Bucket=bucket, Key=series_key(ticker))['Body'].read()
+    except s3.exceptions.NoSuchKey:
+        return None
+    return loads(body)
+
+
+def update_series(s3: Any, bucket: str, ticker: str, rows: Iterable[Dict[str, Any]]) -> int:
+    """Merge `rows` into the stored series; returns the number of days it now holds"""
+    series = merge(load_series(s3, bucket, ticker) or empty(), from_rows(rows))
+    s3.put_object(Bucket=bucket, Key=series_key(ticker), Body=dumps(series),
+                  ContentType='application/octet-stream')
+    return len(series['date'])
@@ -0,0 +1,429 @@
+"""Guard and partition-pruning rewrite for model-generated SQL
+
+The agent's SQL comes from a model, so it is checked rather than trusted:
+
+- it must be a single SELECT (or WITH ... SELECT) statement, anything
+  else raises RejectedQuery;
+- the outermost query gets a LIMIT of at most `max_limit`, or of at most
+  `series_limit` when it is ordered by date first (a time series, which
+  the agent downsamples for its chart rather than cutting off);
+- every date bound on a year/month-partitioned table (stox.prices,
+  stox.indicators, stox.correlations) also gets the equivalent predicate
+  on year and month. Athena prunes partitions only on partition columns,
+  so `date >= current_date - interval '30' day` alone reads every month.
+
+The rewrite works on tokens, not on a full SQL grammar. A recognized date
+predicate `date >= X` becomes `(date >= X AND <year/month predicate>)`.
+The added predicate is implied by the original one, so results do not
+change wherever the comparison appears. Bounds that cannot be evaluated
+here (column arithmetic, unknown functions) are left alone. Bounds relative
+to current_date get a day of slack, because Athena evaluates current_date
+in UTC and possibly on another day than the rewrite.
+"""
+
+import calendar
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from stox_common.views import partition_filter
+
+DEFAULT_LIMIT = 200
+
+# Tables partitioned by year/month, with any partition columns in front of those
+PARTITIONED_TABLES = {'prices': ('ticker',), 'indicators': (), 'correlations': ()}
+
+_DENIED = {
+    'INSERT', 'UPDATE', 'DELETE', 'MERGE', 'DROP', 'CREATE', 'ALTER', 'TRUNCATE', 'GRANT', 'REVOKE',
+    'MSCK', 'UNLOAD', 'CALL', 'PREPARE', 'EXECUTE', 'DEALLOCATE', 'VACUUM', 'OPTIMIZE',
+}
+# Keywords that may follow a complete scalar expression
+_EXPRESSION_END = {
+    'AND', 'OR', 'THEN', 'ELSE', 'END', 'WHEN', 'AS', 'ORDER', 'GROUP', 'LIMIT', 'HAVING', 'UNION',
+    'INTERSECT', 'EXCEPT', 'WINDOW', 'OFFSET', 'FETCH', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'CROSS',
+    'WHERE', 'ON',
+}
+# Keywords that end the FROM clause, or cannot be a table alias
+_FROM_END = {'WHERE', 'GROUP', 'ORDER', 'LIMIT', 'HAVING', 'WINDOW', 'UNION', 'INTERSECT', 'EXCEPT', 'OFFSET'}
+_NOT_ALIAS = _FROM_END | {'ON', 'USING', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 'FULL', 'OUTER', 'CROSS', 'NATURAL',
+                          'TABLESAMPLE', 'FETCH'}
+_SET_OPERATORS = {'UNION', 'INTERSECT', 'EXCEPT'}
+_COMPARISONS = {'>=': 'lower', '>': 'lower', '<=': 'upper', '<': 'upper', '=': 'both'}
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<str>'(?:[^']|'')*')
+  | (?P<ident>(?:[A-Za-z_][A-Za-z0-9_]*|"(?:[^"]|"")+")(?:\.(?:[A-Za-z_][A-Za-z0-9_]*|"(?:[^"]|"")+"))*)
+  | (?P<num>\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+  | (?P<op><=|>=|<>|!=|\|\||->|[-+*/%<>=])
+  | (?P<lparen>\()
+  | (?P<rparen>\))
+  | (?P<comma>,)
+  | (?P<semi>;)
+  | (?P<quote>['"])
+  | (?P<punct>.)
+""", re.X | re.S)
+
+
+class RejectedQuery(ValueError):
+    """The SQL is not a single read-only SELECT statement"""
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+    start: int
+    end: int
+    depth: int
+    block: int
+
+    @property
+    def word(self) -> str:
+        return self.text.upper() if self.kind == 'ident' else ''
+
+
+def tokenize(sql: str) -> List[Token]:
+    """Significant tokens with their paren depth and the query block they belong to
+
+    A block is one SELECT: the top level, each parenthesized subquery, and
+    each side of a UNION/INTERSECT/EXCEPT.
+    """
+    matches = [m for m in _TOKEN.finditer(sql) if m.lastgroup not in ('ws', 'comment')]
+    tokens: List[Token] = []
+    stack: List[Optional[int]] = [0]  # block of each open paren, None for parens that are not a subquery
+    blocks = 1
+    for index, match in enumerate(matches):
+        kind, text = match.lastgroup, match.group()
+        if kind == 'quote':
+            raise RejectedQuery(f"Unterminated quote at offset {match.start()}")
+        if kind == 'rparen':
+            if len(stack) == 1:
+                raise RejectedQuery("Unbalanced parentheses")
+            stack.pop()
+        level = max(i for i, block in enumerate(stack) if block is not None)
+        if kind == 'ident' and text.upper() in _SET_OPERATORS:
+            stack[level] = blocks
+            blocks += 1
+        tokens.append(Token(kind, text, match.start(), match.end(), len(stack) - 1, stack[level]))
+        if kind == 'lparen':
+            following = matches[index + 1].group().upper() if index + 1 < len(matches) else ''
+            if following in ('SELECT', 'WITH'):
+                stack.append(blocks)
+                blocks += 1
+            else:
+                stack.append(None)
+    if len(stack) != 1:
+        raise RejectedQuery("Unbalanced parentheses")
+    return tokens
+
+
+def check_read_only(tokens: List[Token]) -> List[Token]:
+    """The tokens without trailing semicolons; raises RejectedQuery for anything but one SELECT"""
+    while tokens and tokens[-1].kind == 'semi':
+        tokens = tokens[:-1]
+    if not tokens:
+        raise RejectedQuery("Empty query")
+    if any(t.kind == 'semi' for t in tokens):
+        raise RejectedQuery("Only a single statement is allowed")
+    first = next((t for t in tokens if t.kind != 'lparen'), tokens[0])
+    if first.word not in ('SELECT', 'WITH'):
+        raise RejectedQuery(f"Only SELECT queries are allowed, not {first.text[:20]!r}")
+    for token in tokens:
+        if token.word in _DENIED:
+            raise RejectedQuery(f"{token.word} is not allowed")
+    return tokens
+
+
+def _name(text: str) -> str:
+    """Last part of a possibly qualified and quoted identifier, lower-cased"""
+    return text.split('.')[-1].strip('"').lower()
+
+
+def from_tables(tokens: List[Token], block: int) -> Dict[str, str]:
+    """{alias or name: table name} of the tables a block reads directly"""
+    own = [t for t in tokens if t.block == block]
+    if not own:
+        return {}
+    depth = min(t.depth for t in own)
+    own = [t for t in own if t.depth == depth]
+    tables: Dict[str, str] = {}
+    in_from = expect_table = False
+    for i, token in enumerate(own):
+        if token.word == 'FROM':
+            in_from = expect_table = True
+        elif in_from and (token.word == 'JOIN' or token.kind == 'comma'):
+            expect_table = True
+        elif in_from and token.word in _FROM_END:
+            in_from = expect_table = False
+        elif expect_table:
+            expect_table = False
+            if token.kind != 'ident' or token.word in _NOT_ALIAS:
+                continue
+            alias = name = _name(token.text)
+            rest = own[i + 1:i + 3]
+            if len(rest) == 2 and rest[0].word == 'AS' and rest[1].kind == 'ident':
+                alias = _name(rest[1].text)
+            elif rest and rest[0].kind == 'ident' and rest[0].word not in _NOT_ALIAS:
+                alias = _name(rest[0].text)
+            tables[alias] = name
+    return tables
+
+
+def add_months(day: date, months: int) -> date:
+    """`day` moved by whole months, clamped to the end of shorter months"""
+    year, month = divmod(day.month - 1 + months, 12)
+    year, month = day.year + year, month + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _shift(day: date, amount: int, unit: str) -> Optional[date]:
+    unit = unit.lower().rstrip('s')
+    if unit == 'day':
+        return day + timedelta(days=amount)
+    if unit == 'week':
+        return day + timedelta(weeks=amount)
+    months = {'month': 1, 'quarter': 3, 'year': 12}.get(unit)
+    return add_months(day, amount * months) if months else None
+
+
+def _truncate(day: date, unit: str) -> Optional[date]:
+    unit = unit.lower()
+    if unit == 'day':
+        return day
+    if unit == 'week':
+        return day - timedelta(days=day.weekday())
+    if unit == 'month':
+        return day.replace(day=1)
+    if unit == 'quarter':
+        return date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
+    if unit == 'year':
+        return date(day.year, 1, 1)
+    return None
+
+
+def _literal(token: Token) -> str:
+    return token.text[1:-1].replace("''", "'")
+
+
+class DateExpression:
+    """Evaluates the constant date expressions models write as range bounds
+
+    Understands DATE '...', CAST('...' AS DATE), current_date, now(),
+    date_trunc(unit, x), date_add(unit, n, x) and x +/- interval 'n' unit.
+    """
+
+    def __init__(self, tokens: List[Token], today: date):
+        self.tokens = tokens
+        self.today = today
+
+    def _is(self, i: int, kind: str, word: str = '') -> bool:
+        if i >= len(self.tokens):
+            return False
+        token = self.tokens[i]
+        return token.kind == kind and (not word or token.word == word)
+
+    def _call(self, i: int, name: str) -> bool:
+        """name('unit', ..."""
+        return self._is(i, 'ident', name) and self._is(i + 1, 'lparen') and self._is(i + 2, 'str') \
+            and self._is(i + 3, 'comma')
+
+    def term(self, i: int) -> Tuple[Optional[date], int]:
+        if i >= len(self.tokens):
+            return None, i
+        t = self.tokens
+        word = t[i].word
+        if word == 'DATE' and self._is(i + 1, 'str'):
+            return date.fromisoformat(_literal(t[i + 1])), i + 2
+        if word in ('CURRENT_DATE', 'CURRENT_TIMESTAMP', 'LOCALTIMESTAMP'):
+            return self.today, i + 1
+        if word == 'NOW' and self._is(i + 1, 'lparen') and self._is(i + 2, 'rparen'):
+            return self.today, i + 3
+        if word == 'CAST' and self._is(i + 1, 'lparen') and self._is(i + 2, 'str') \
+                and self._is(i + 3, 'ident', 'AS') and self._is(i + 4, 'ident', 'DATE') and self._is(i + 5, 'rparen'):
+            return date.fromisoformat(_literal(t[i + 2])), i + 6
+        if self._call(i, 'DATE_TRUNC'):
+            inner, j = self.expression(i + 4)
+            if inner and self._is(j, 'rparen'):
+                return _truncate(inner, _literal(t[i + 2])), j + 1
+        if self._call(i, 'DATE_ADD'):
+            j, sign = i + 4, 1
+            if j < len(t) and t[j].text == '-':
+                j, sign = j + 1, -1
+            if self._is(j, 'num') and self._is(j + 1, 'comma'):
+                inner, k = self.expression(j + 2)
+                if inner and self._is(k, 'rparen'):
+                    return _shift(inner, sign * int(float(t[j].text)), _literal(t[i + 2])), k + 1
+        return None, i
+
+    def expression(self, i: int) -> Tuple[Optional[date], int]:
+        """(date, index after the expression), or (None, i) when it is not a constant date"""
+        t = self.tokens
+        try:
+            value, j = self.term(i)
+            while value is not None and j < len(t) and t[j].text in ('+', '-') \
+                    and self._is(j + 1, 'ident', 'INTERVAL') and self._is(j + 2, 'str') and self._is(j + 3, 'ident'):
+                amount = int(_literal(t[j + 2]).strip())
+                value = _shift(value, amount if t[j].text == '+' else -amount, t[j + 3].text)
+                j += 4
+        except (ValueError, OverflowError):
+            return None, i
+        if value is None:
+            return None, i
+        # Anything else continuing the expression (arithmetic, AT TIME ZONE, ...) makes it unknown
+        if j < len(t) and (t[j].kind in ('op', 'lparen', 'str', 'num', 'punct') or
+                           (t[j].kind == 'ident' and t[j].word not in _EXPRESSION_END)):
+            return None, i
+        return value, j
+
+
+def _date_column(token: Token, tables: Dict[str, str]) -> Optional[Tuple[str, str]]:
+    """(partitioned table, column prefix) when `token` is the date column of one"""
+    parts = [p.strip('"').lower() for p in token.text.split('.')]
+    if parts[-1] != 'date':
+        return None
+    if len(parts) > 1:
+        table = tables.get(parts[-2])
+        return (table, f"{parts[-2]}.") if table in PARTITIONED_TABLES else None
+    # An unqualified column is only unambiguous with a single table
+    if len(tables) == 1:
+        table = next(iter(tables.values()))
+        return (table, '') if table in PARTITIONED_TABLES else None
+    return None
+
+
+def _tickers_in(tokens: List[Token], block: int) -> Optional[int]:
+    """Number of tickers a block filters on with ticker = '...' or ticker IN ('...', ...)"""
+    own = [t for t in tokens if t.block == block]
+    for i, token in enumerate(own[:-2]):
+        if token.kind != 'ident' or _name(token.text) != 'ticker':
+            continue
+        if own[i + 1].text == '=' and own[i + 2].kind == 'str':
+            return 1
+        if own[i + 1].word == 'IN' and own[i + 2].kind == 'lparen':
+            values = []
+            for t in own[i + 3:]:
+                if t.kind == 'rparen':
+                    break
+                if t.kind != 'comma':
+                    values.append(t)
+            if values and all(t.kind == 'str' for t in values):
+                return len(values)
+    return None
+
+
+def _months(start: date, end: date) -> int:
+    return max(0, (end.year - start.year) * 12 + end.month - start.month + 1)
+
+
+def orders_by_date(top: List[Token]) -> bool:
+    """Whether the outermost ORDER BY starts with an ascending `date`"""
+    for i in range(len(top) - 3, -1, -1):
+        if top[i].word == 'ORDER' and top[i + 1].word == 'BY':
+            key = top[i + 2]
+            following = top[i + 3].word if i + 3 < len(top) else ''
+            return key.kind == 'ident' and _name(key.text) == 'date' and following != 'DESC'
+    return False
+
+
+def enforce_limit(sql: str, max_limit: int, series_limit: Optional[int] = None) -> Tuple[str, int]:
+    """SQL whose outermost LIMIT is at most `max_limit` (`series_limit` for a time series), and that limit"""
+    top = [t for t in tokenize(sql) if t.depth == 0]
+    if series_limit and series_limit > max_limit and orders_by_date(top):
+        max_limit = series_limit
+    for i in range(len(top) - 1, -1, -1):
+        if top[i].word == 'FETCH':
+            # FETCH FIRST n ROWS ONLY is left to the caller's max_rows
+            return sql, max_limit
+        if top[i].word == 'LIMIT' and i + 1 < len(top):
+            value = top[i + 1]
+            if value.kind == 'num' and float(value.text) <= max_limit:
+                return sql, int(float(value.text))
+            return sql[:value.start] + str(max_limit) + sql[value.end:], max_limit
+    return f"{sql} LIMIT {max_limit}", max_limit
+
+
+def rewrite(sql: str, today: Optional[date] = None, max_limit: int = DEFAULT_LIMIT,
+            history_start: Optional[date] = None, tickers: Optional[int] = None,
+            series_limit: Optional[int] = None) -> Dict[str, Any]:
+    """Checked and rewritten SQL, with what changed and the partitions it no longer reads
+
+    `history_start` (first month of data) and `tickers` (tickers in
+    stox.prices) only feed the estimate. The result has `sql`, `limit`,
+    `predicates` (partition predicates added) and `pruning`, one entry per
+    query block and table with the months it reads. Pruned partitions are
+    the skipped months times the tickers the block covers.
+    """
+    today = today or date.today()
+    tokens = check_read_only(tokenize(sql))
+    # Drops trailing semicolons and comments, so an appended LIMIT is not commented out
+    sql = sql[:tokens[-1].end]
+
+    edits = []
+    ranges: Dict[Tuple[int, str, str], List[Optional[date]]] = {}
+    tables: Dict[int, Dict[str, str]] = {}
+    for i, token in enumerate(tokens):
+        if token.kind != 'ident' or i + 2 >= len(tokens):
+            continue
+        if token.block not in tables:
+            tables[token.block] = from_tables(tokens, token.block)
+        column = _date_column(token, tables[token.block])
+        if column is None or (i > 0 and tokens[i - 1].kind in ('op', 'punct')):
+            continue
+        # Functions of current_date only grow with it, so the day before gives the lowest bound
+        earliest = DateExpression(tokens, today - timedelta(days=1))
+        latest = DateExpression(tokens, today + timedelta(days=1))
+        op = tokens[i + 1]
+        if op.word == 'BETWEEN':
+            lower, j = earliest.expression(i + 2)
+            if lower is None or j >= len(tokens) or tokens[j].word != 'AND':
+                continue
+            upper, end = latest.expression(j + 1)
+            if upper is None:
+                continue
+        elif op.text in _COMPARISONS:
+            kind = _COMPARISONS[op.text]
+            lower, end = earliest.expression(i + 2) if kind != 'upper' else (None, i + 2)
+            upper, end = latest.expression(i + 2) if kind != 'lower' else (None, end)
+            if end == i + 2:
+                continue
+        else:
+            continue
+        if lower and upper and lower > upper:
+            continue
+        table, prefix = column
+        edits.append((token.start, tokens[end - 1].end, partition_filter(lower, upper, prefix)))
+        bounds = ranges.setdefault((token.block, table, prefix), [None, None])
+        if lower:
+            bounds[0] = max(bounds[0], lower) if bounds[0] else lower
+        if upper:
+            bounds[1] = min(bounds[1], upper) if bounds[1] else upper
+
+    for start, end, predicate in sorted(edits, reverse=True):
+        sql = f"{sql[:start]}({sql[start:end]} AND {predicate}){sql[end:]}"
+    sql, limit = enforce_limit(sql, max_limit, series_limit)
+
+    pruning = []
+    for (block, table, _), (lower, upper) in ranges.items():
+        first = min(history_start or lower or today, today)
+        total = _months(first, today)
+        scanned = min(total, _months(max(lower or first, first), min(upper or today, today)))
+        per_month = 1
+        if 'ticker' in PARTITIONED_TABLES[table]:
+            per_month = _tickers_in(tokens, block) or tickers or 1
+        pruning.append({
+            'table': f"stox.{table}",
+            'from': lower.isoformat() if lower else None,
+            'to': upper.isoformat() if upper else None,
+            'months_total': total,
+            'months_scanned': scanned,
+            'partitions_pruned': (total - scanned) * per_month,
+        })
+
+    return {
+        'sql': sql,
+        'limit': limit,
+        'predicates': len(edits),
+        'pruning': pruning,
+        'partitions_pruned': sum(p['partitions_pruned'] for p in pruning),
+    }
@@ -0,0 +1,34 @@
+"""Server-sent events framing for the agent's streaming responses
+
+A streamed answer is a series of events, each a JSON object on a single
+`data:` line:
+
+    event: sql
+    data: {"sql": "SELECT ...", ...}
+
+`encode` writes one event and `decode` parses a complete or partial
+stream back into (event, data) pairs, skipping a trailing event that is
+not complete yet.
+"""
+
+import json
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+CONTENT_TYPE = 'text/event-stream'
+
+
+def encode(event: str, data: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    # json.dumps escapes newlines, so the data always fits on one line
+    return f"event: {event}\ndata: {json.dumps(data, default=default)}\n\n"
+
+
+def decode(text: str) -> Iterator[Tuple[str, Any]]:
+    for block in text.split('\n\n')[:-1]:
+        event, data = 'message', []
+        for line in block.split('\n'):
+            if line.startswith('event:'):
+                event = line[6:].strip()
+            elif line.startswith('data:'):
+                data.append(line[5:].strip())
+        if data:
+            yield event, json.loads('\n'.join(data))
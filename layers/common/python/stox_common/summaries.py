@@ -0,0 +1,51 @@
+"""Template summaries for results too simple to need the model
+
+A second Bedrock call costs about a second, and it adds nothing when the
+answer is one number ("TSLA's max drawdown YTD"). `template_summary`
+phrases a one-row result with a single numeric value, optionally with a
+label (a ticker or a date), and returns None for anything else, so the
+caller falls back to Bedrock.
+"""
+
+import re
+from typing import Any, List, Optional
+
+# Columns holding fractions that read better as percentages
+_PERCENT = re.compile(r'return|drawdown|change|pct|percent|vol(?!ume)', re.I)
+_SIGNED = re.compile(r'return|change', re.I)
+_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _label(column: str) -> str:
+    return column.replace('_', ' ')
+
+
+def format_value(column: str, value: Any) -> str:
+    if isinstance(value, int):
+        return f"{value:,}"
+    if _PERCENT.search(column) and abs(value) < 10:
+        return f"{value:+.2%}" if _SIGNED.search(column) else f"{value:.2%}"
+    return f"{value:,.2f}" if abs(value) >= 1 else f"{value:.4g}"
+
+
+def template_summary(columns: List[str], rows: List[List[Any]]) -> Optional[str]:
+    """One sentence for a single-value result; None when the result needs the model"""
+    if len(rows) != 1 or not 1 <= len(columns) <= 2:
+        return None
+    numeric = [i for i, value in enumerate(rows[0]) if _is_number(value)]
+    if len(numeric) != 1:
+        return None
+    index = numeric[0]
+    column, value = columns[index], rows[0][index]
+    text = f"{_label(column)} is {format_value(column, value)}"
+    if len(columns) == 2:
+        other = rows[0][1 - index]
+        if other is None:
+            return None
+        other = str(other)
+        text = f"{text} on {other}" if _DATE.match(other) else f"{other}: {text}"
+    return text[0].upper() + text[1:] + '.'
@@ -0,0 +1,164 @@
+"""Timing spans, counters and CloudWatch embedded-metric-format lines
+
+A Lambda handler is wrapped in `instrumented(function)`. Inside it,
+`span('athena')` times a stage and `count('cache_hit')` adds to a
+counter, from any thread. Spans nest: a span opened inside another
+records it as its `parent`. When the handler returns, everything is
+written once, as one record per invocation. Where it goes depends on
+METRICS:
+
+- `emf` (default): one JSON line on stdout in the embedded metric format.
+  CloudWatch turns each span name into a `<name>_ms` metric and each
+  counter into a Count metric (namespace Stox, dimension Function),
+  without any PutMetricData calls. The spans ride along as a property.
+- `file`: the same record appended as a JSON line to METRICS_FILE, for
+  benchmarks and local runs; `load` reads the records back.
+- `off`: nothing.
+
+The record is per process, like a Lambda execution environment that runs
+one invocation at a time; concurrent handler calls in one process share it.
+
+`debug` replaces the handlers' `print("DEBUG: ...")` calls. It formats
+and prints only when LOG_LEVEL=debug, so by default the hot path logs no
+events, bodies or answers.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+NAMESPACE = 'Stox'
+
+_lock = threading.Lock()
+_local = threading.local()
+_state: Dict[str, Any] = {'function': None, 'started': time.perf_counter(), 'spans': [], 'counters': {}}
+
+
+def debug_enabled() -> bool:
+    return os.environ.get('LOG_LEVEL', 'info').lower() == 'debug'
+
+
+def debug(message: str, *args: Any) -> None:
+    """Print `message % args` when LOG_LEVEL=debug; the formatting is skipped otherwise"""
+    if debug_enabled():
+        print('DEBUG: ' + (message % args if args else message))
+
+
+def _stack() -> List[str]:
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def reset(function: Optional[str] = None) -> None:
+    """Start a new invocation record"""
+    with _lock:
+        _state.update(function=function, started=time.perf_counter(), spans=[], counters={})
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """Time the block as `name`; the yielded record takes more attributes and gets `duration_ms` on exit"""
+    stack = _stack()
+    record = {'name': name, 'parent': stack[-1] if stack else None, **attributes}
+    started = time.perf_counter()
+    stack.append(name)
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        stack.pop()
+        record['start_ms'] = round((started - _state['started']) * 1000, 1)
+        record['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        with _lock:
+            _state['spans'].append(record)
+
+
+def count(name: str, value: float = 1) -> None:
+    with _lock:
+        _state['counters'][name] = _state['counters'].get(name, 0) + value
+
+
+def snapshot() -> Dict[str, Any]:
+    """The current invocation's record: function, total_ms, spans and counters"""
+    with _lock:
+        return {
+            'function': _state['function'],
+            'total_ms': round((time.perf_counter() - _state['started']) * 1000, 1),
+            'spans': list(_state['spans']),
+            'counters': dict(_state['counters']),
+        }
+
+
+def emf(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Embedded-metric-format document for an invocation record"""
+    values: Dict[str, List[float]] = {'total_ms': [record['total_ms']]}
+    for item in record['spans']:
+        values.setdefault(f"{item['name']}_ms", []).append(item['duration_ms'])
+    metrics = [{'Name': name, 'Unit': 'Milliseconds'} for name in values]
+    metrics += [{'Name': name, 'Unit': 'Count'} for name in record['counters']]
+    return {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{'Namespace': NAMESPACE, 'Dimensions': [['Function']], 'Metrics': metrics}],
+        },
+        'Function': record['function'] or 'local',
+        # EMF accepts a list of values per metric, one per span with that name
+        **{name: items if len(items) > 1 else items[0] for name, items in values.items()},
+        **record['counters'],
+        'spans': record['spans'],
+    }
+
+
+def flush() -> Optional[Dict[str, Any]]:
+    """Write the current invocation record as METRICS says and return it"""
+    mode = os.environ.get('METRICS', 'emf')
+    if mode == 'off':
+        return None
+    record = snapshot()
+    if mode == 'file':
+        with _lock, open(os.environ.get('METRICS_FILE', 'stox-metrics.jsonl'), 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+    else:
+        print(json.dumps(emf(record), default=str))
+    return record
+
+
+def load(path: str) -> List[Dict[str, Any]]:
+    """Invocation records written with METRICS=file"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def span_durations(records: List[Dict[str, Any]]) -> Dict[str, List[float]]:
+    """Durations in milliseconds per span name across records, plus `total`"""
+    durations: Dict[str, List[float]] = {}
+    for record in records:
+        durations.setdefault('total', []).append(record['total_ms'])
+        for item in record['spans']:
+            durations.setdefault(item['name'], []).append(item['duration_ms'])
+    return durations
+
+
+def instrumented(function: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator for a Lambda handler: a fresh record per invocation, flushed when it returns"""
+    def decorate(handler: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(handler)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            reset(function)
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                try:
+                    flush()
+                except Exception as e:
+                    # Metrics must never fail the request
+                    print(f"Could not write metrics: {e}")
+        return wrapper
+    return decorate
@@ -0,0 +1,106 @@
+"""Date-range versions of the v_returns and v_corr views
+
+Athena views take no parameters. A date or year/month filter applied on
+top of a view is not pushed below the view's window functions either,
+because it would change what LAG or CORR see at the start of the range,
+so querying v_corr for one month still scans and self-joins every day of
+every ticker. The functions here return the same single-pass SQL as the
+views, with the range applied inside: stox.prices is read only for the
+year/month partitions from `start` minus the lookback the windows need
+through `end`, and rows before `start` are only used as window input.
+For dates in the range, the rows match the views.
+"""
+
+import math
+import re
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+CORR_WINDOW = 60
+
+# Longest run of calendar days without a trading day (weekend plus holidays)
+_MAX_GAP_DAYS = 10
+
+_TICKER = re.compile(r'^[A-Z0-9.\-]{1,10}$')
+
+
+def lookback_days(rows: int) -> int:
+    """Calendar days that hold at least `rows` earlier trading days"""
+    return math.ceil(rows * 7 / 5) + _MAX_GAP_DAYS
+
+
+def partition_filter(start: Optional[date], end: Optional[date], prefix: str = '') -> str:
+    """Predicate on the year/month partition columns covering start..end (either may be open)
+
+    `prefix` qualifies the columns, e.g. 'p.' for a table aliased p.
+    """
+    year, month = f"{prefix}year", f"{prefix}month"
+    if start and end:
+        if start.year == end.year:
+            return f"{year} = {start.year} AND {month} BETWEEN {start.month} AND {end.month}"
+        return (f"(({year} = {start.year} AND {month} >= {start.month}) "
+                f"OR {year} BETWEEN {start.year + 1} AND {end.year - 1} "
+                f"OR ({year} = {end.year} AND {month} <= {end.month}))")
+    if start:
+        return f"({year} > {start.year} OR ({year} = {start.year} AND {month} >= {start.month}))"
+    if end:
+        return f"({year} < {end.year} OR ({year} = {end.year} AND {month} <= {end.month}))"
+    raise ValueError("partition_filter needs a start or an end")
+
+
+def ticker_filter(tickers: Optional[Iterable[str]]) -> str:
+    if not tickers:
+        return ''
+    tickers = [t.upper() for t in tickers]
+    for ticker in tickers:
+        if not _TICKER.match(ticker):
+            raise ValueError(f"Invalid ticker: {ticker!r}")
+    return ' AND ticker IN (' + ', '.join(f"'{t}'" for t in tickers) + ')'
+
+
+def _lagged(start: date, end: date, tickers: Optional[Iterable[str]]) -> str:
+    return f"""lagged AS (
+    SELECT ticker, date, close,
+        LAG(close) OVER (PARTITION BY ticker ORDER BY date) as prev_close
+    FROM stox.prices
+    WHERE {partition_filter(start, end)}
+        AND date BETWEEN DATE '{start}' AND DATE '{end}'{ticker_filter(tickers)}
+)"""
+
+
+def returns_sql(start: date, end: date, tickers: Optional[Iterable[str]] = None) -> str:
+    """v_returns rows dated start..end"""
+    scan_start = start - timedelta(days=lookback_days(1))
+    return f"""WITH {_lagged(scan_start, end, tickers)}
+SELECT ticker, date, close, prev_close, (close - prev_close) / prev_close as daily_return
+FROM lagged
+WHERE prev_close IS NOT NULL AND date >= DATE '{start}'"""
+
+
+def corr_sql(start: date, end: date, tickers: Optional[Iterable[str]] = None,
+             window: int = CORR_WINDOW) -> str:
+    """v_corr rows dated start..end (correlation over `window` common trading days)"""
+    scan_start = start - timedelta(days=lookback_days(window))
+    return f"""WITH {_lagged(scan_start, end, tickers)},
+returns AS (
+    SELECT ticker, date, (close - prev_close) / prev_close as daily_return
+    FROM lagged
+    WHERE prev_close IS NOT NULL
+),
+pairs AS (
+    SELECT a.ticker as ticker1, b.ticker as ticker2, a.date,
+        a.daily_return as return1, b.daily_return as return2
+    FROM returns a
+    JOIN returns b ON a.date = b.date AND a.ticker < b.ticker
+),
+rolling AS (
+    SELECT ticker1, ticker2, date,
+        CORR(return1, return2) OVER (
+            PARTITION BY ticker1, ticker2 ORDER BY date
+            ROWS BETWEEN {window - 1} PRECEDING AND CURRENT ROW
+        ) as correlation_{window}d
+    FROM pairs
+)
+SELECT ticker1, ticker2, date, correlation_{window}d
+FROM rolling
+WHERE date >= DATE '{start}' AND correlation_{window}d IS NOT NULL"""
@@ -0,0 +1,300 @@
+"""Serializers for stox.prices objects
+
+`get_writer()` picks the format from PRICES_FORMAT (csv or parquet); the
+table DDL has to match (sql/create_table_prices.sql or
+sql/create_table_prices_parquet.sql). Parquet is written with pyarrow and
+Snappy when pyarrow is installed; otherwise a small pure-Python writer emits
+the same typed schema, GZIP-compressed because Snappy is not in the
+standard library.
+"""
+
+import gzip
+import io
+import os
+import struct
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional
+
+from stox_common.layout import COLUMNS
+
+CSV = 'csv'
+PARQUET = 'parquet'
+FORMATS = (CSV, PARQUET)
+
+EPOCH = date(1970, 1, 1)
+
+
+def to_csv(rows: Iterable[Dict[str, Any]]) -> str:
+    """Render price rows as the headed CSV the stox.prices table reads"""
+    out = io.StringIO()
+    out.write(','.join(COLUMNS) + '\n')
+    for row in rows:
+        out.write(','.join(str(row[col]) for col in COLUMNS) + '\n')
+    return out.getvalue()
+
+
+class CsvWriter:
+    format = CSV
+    filename = 'data.csv'
+    content_type = 'text/csv'
+
+    def serialize(self, rows: Iterable[Dict[str, Any]]) -> str:
+        return to_csv(rows)
+
+
+class ParquetWriter:
+    format = PARQUET
+    filename = 'data.parquet'
+    content_type = 'application/vnd.apache.parquet'
+
+    def __init__(self, compression: str = 'snappy', use_pyarrow: Optional[bool] = None):
+        if use_pyarrow is None:
+            try:
+                import pyarrow  # noqa: F401
+                use_pyarrow = True
+            except ImportError:
+                use_pyarrow = False
+        self.use_pyarrow = use_pyarrow
+        self.compression = compression if use_pyarrow else 'gzip'
+
+    def serialize(self, rows: Iterable[Dict[str, Any]]) -> bytes:
+        rows = list(rows)
+        if self.use_pyarrow:
+            return _pyarrow_parquet(rows, self.compression)
+        return _pure_parquet(rows)
+
+
+def get_writer(fmt: Optional[str] = None):
+    """Writer for `fmt`, defaulting to the PRICES_FORMAT environment variable"""
+    fmt = (fmt or os.environ.get('PRICES_FORMAT', CSV)).lower()
+    if fmt == CSV:
+        return CsvWriter()
+    if fmt == PARQUET:
+        return ParquetWriter()
+    raise ValueError(f"Unknown prices format: {fmt}")
+
+
+# Typed columns shared by both Parquet paths: (name, parquet physical type)
+_PARQUET_COLUMNS = [
+    ('date', 'date'),
+    ('open', 'double'),
+    ('high', 'double'),
+    ('low', 'double'),
+    ('close', 'double'),
+    ('volume', 'int64'),
+    ('adj_close', 'double'),
+]
+
+
+def _to_date(value: Any) -> date:
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _columns(rows: List[Dict[str, Any]]) -> Dict[str, list]:
+    columns = {}
+    for name, kind in _PARQUET_COLUMNS:
+        if kind == 'date':
+            columns[name] = [_to_date(r[name]) for r in rows]
+        elif kind == 'int64':
+            columns[name] = [int(r[name]) for r in rows]
+        else:
+            columns[name] = [float(r[name]) for r in rows]
+    return columns
+
+
+def _pyarrow_parquet(rows: List[Dict[str, Any]], compression: str) -> bytes:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {'date': pa.date32(), 'double': pa.float64(), 'int64': pa.int64()}
+    schema = pa.schema([(name, types[kind], False) for name, kind in _PARQUET_COLUMNS])
+    table = pa.table(_columns(rows), schema=schema)
+    out = io.BytesIO()
+    pq.write_table(table, out, compression=compression)
+    return out.getvalue()
+
+
+# --- pure-Python Parquet (one row group, one PLAIN data page per column) ---
+
+_THRIFT_I32, _THRIFT_I64, _THRIFT_BINARY, _THRIFT_LIST, _THRIFT_STRUCT = 5, 6, 8, 9, 12
+
+# Parquet enum values
+_TYPE = {'date': 1, 'int64': 2, 'double': 5}  # INT32, INT64, DOUBLE
+_PLAIN, _RLE = 0, 3
+_GZIP = 2
+_CONVERTED_DATE = 6
+_DATA_PAGE = 0
+
+
+class _Thrift:
+    """Just enough of the Thrift compact protocol to write Parquet metadata"""
+
+    def __init__(self):
+        self.buf = bytearray()
+        self._last = [0]
+
+    def _varint(self, n: int) -> None:
+        while True:
+            byte = n & 0x7F
+            n >>= 7
+            if n:
+                self.buf.append(byte | 0x80)
+            else:
+                self.buf.append(byte)
+                return
+
+    def _zigzag(self, n: int) -> None:
+        self._varint((n << 1) ^ (n >> 63))
+
+    def _field(self, fid: int, ftype: int) -> None:
+        delta = fid - self._last[-1]
+        if 0 < delta <= 15:
+            self.buf.append((delta << 4) | ftype)
+        else:
+            self.buf.append(ftype)
+            self._zigzag(fid)
+        self._last[-1] = fid
+
+    def i32(self, fid: int, value: int) -> None:
+        self._field(fid, _THRIFT_I32)
+        self._zigzag(value)
+
+    def i64(self, fid: int, value: int) -> None:
+        self._field(fid, _THRIFT_I64)
+        self._zigzag(value)
+
+    def binary(self, fid: int, value: bytes) -> None:
+        self._field(fid, _THRIFT_BINARY)
+        self._varint(len(value))
+        self.buf += value
+
+    def begin_struct(self, fid: int) -> None:
+        self._field(fid, _THRIFT_STRUCT)
+        self._last.append(0)
+
+    def end_struct(self) -> None:
+        self.buf.append(0)
+        self._last.pop()
+
+    def list_header(self, fid: int, elem_type: int, size: int) -> None:
+        self._field(fid, _THRIFT_LIST)
+        if size < 15:
+            self.buf.append((size << 4) | elem_type)
+        else:
+            self.buf.append(0xF0 | elem_type)
+            self._varint(size)
+
+    def list_i32(self, fid: int, values: List[int]) -> None:
+        self.list_header(fid, _THRIFT_I32, len(values))
+        for value in values:
+            self._zigzag(value)
+
+    def list_binary(self, fid: int, values: List[bytes]) -> None:
+        self.list_header(fid, _THRIFT_BINARY, len(values))
+        for value in values:
+            self._varint(len(value))
+            self.buf += value
+
+    def begin_list_struct(self) -> None:
+        self._last.append(0)
+
+    def end_list_struct(self) -> None:
+        self.end_struct()
+
+
+def _plain(kind: str, values: list) -> bytes:
+    if kind == 'date':
+        return struct.pack(f'<{len(values)}i', *[(v - EPOCH).days for v in values])
+    if kind == 'int64':
+        return struct.pack(f'<{len(values)}q', *values)
+    return struct.pack(f'<{len(values)}d', *values)
+
+
+def _statistics(t: _Thrift, fid: int, kind: str, values: list) -> None:
+    t.begin_struct(fid)
+    t.i64(3, 0)  # null_count
+    if values:
+        t.binary(5, _plain(kind, [max(values)]))  # max_value
+        t.binary(6, _plain(kind, [min(values)]))  # min_value
+    t.end_struct()
+
+
+def _pure_parquet(rows: List[Dict[str, Any]]) -> bytes:
+    columns = _columns(rows)
+    out = bytearray(b'PAR1')
+    chunks = []
+
+    for name, kind in _PARQUET_COLUMNS:
+        values = columns[name]
+        raw = _plain(kind, values)
+        compressed = gzip.compress(raw, mtime=0)
+
+        header = _Thrift()
+        header.i32(1, _DATA_PAGE)
+        header.i32(2, len(raw))
+        header.i32(3, len(compressed))
+        header.begin_struct(5)  # data_page_header
+        header.i32(1, len(values))
+        header.i32(2, _PLAIN)
+        header.i32(3, _RLE)
+        header.i32(4, _RLE)
+        header.end_struct()
+        header.buf.append(0)
+
+        offset = len(out)
+        out += header.buf
+        out += compressed
+        chunks.append((name, kind, values, offset, len(header.buf) + len(raw), len(header.buf) + len(compressed)))
+
+    meta = _Thrift()
+    meta.i32(1, 1)  # version
+    meta.list_header(2, _THRIFT_STRUCT, len(_PARQUET_COLUMNS) + 1)  # schema
+    meta.begin_list_struct()
+    meta.binary(4, b'schema')
+    meta.i32(5, len(_PARQUET_COLUMNS))
+    meta.end_list_struct()
+    for name, kind in _PARQUET_COLUMNS:
+        meta.begin_list_struct()
+        meta.i32(1, _TYPE[kind])
+        meta.i32(3, 0)  # REQUIRED
+        meta.binary(4, name.encode())
+        if kind == 'date':
+            meta.i32(6, _CONVERTED_DATE)
+        meta.end_list_struct()
+    meta.i64(3, len(rows))  # num_rows
+
+    meta.list_header(4, _THRIFT_STRUCT, 1)  # row_groups
+    meta.begin_list_struct()
+    meta.list_header(1, _THRIFT_STRUCT, len(chunks))  # columns
+    for name, kind, values, offset, uncompressed, compressed in chunks:
+        meta.begin_list_struct()
+        meta.i64(2, offset)  # file_offset
+        meta.begin_struct(3)  # meta_data
+        meta.i32(1, _TYPE[kind])
+        meta.list_i32(2, [_PLAIN, _RLE])
+        meta.list_binary(3, [name.encode()])
+        meta.i32(4, _GZIP)
+        meta.i64(5, len(values))
+        meta.i64(6, uncompressed)
+        meta.i64(7, compressed)
+        meta.i64(9, offset)  # data_page_offset
+        _statistics(meta, 12, kind, values)
+        meta.end_struct()
+        meta.end_list_struct()
+    meta.i64(2, sum(c[4] for c in chunks))  # total_byte_size
+    meta.i64(3, len(rows))
+    meta.end_list_struct()
+    meta.binary(6, b'stox_common.writers')  # created_by
+    # column_orders: TYPE_ORDER for every column, which makes min_value/max_value valid
+    meta.list_header(7, _THRIFT_STRUCT, len(_PARQUET_COLUMNS))
+    for _ in _PARQUET_COLUMNS:
+        meta.begin_list_struct()
+        meta.begin_struct(1)
+        meta.end_struct()
+        meta.end_list_struct()
+    meta.buf.append(0)
+
+    out += meta.buf
+    out += struct.pack('<i', len(meta.buf))
+    out += b'PAR1'
+    return bytes(out)
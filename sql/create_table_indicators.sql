@@ -0,0 +1,61 @@
+-- Indicators materialized by stox-ingest (see stox_common/indicators.py).
+-- Both tables use partition projection on year/month, so the daily appends
+-- never need partition registration.
+CREATE EXTERNAL TABLE IF NOT EXISTS stox.indicators (
+    ticker STRING,
+    date DATE,
+    close DOUBLE,
+    daily_return DOUBLE,
+    sma_7 DOUBLE,
+    sma_20 DOUBLE,
+    vol_20 DOUBLE,
+    peak DOUBLE,
+    drawdown DOUBLE,
+    max_drawdown DOUBLE
+)
+PARTITIONED BY (
+    year INT,
+    month INT
+)
+STORED AS TEXTFILE
+LOCATION 's3://stox-curated-demo-1234/indicators/'
+TBLPROPERTIES (
+    'skip.header.line.count' = '1',
+    'serialization.format' = ',',
+    'field.delim' = ',',
+    'projection.enabled' = 'true',
+    'projection.year.type' = 'integer',
+    'projection.year.range' = '2000,2099',
+    'projection.month.type' = 'integer',
+    'projection.month.range' = '1,12',
+    'projection.month.digits' = '2',
+    'storage.location.template' = 's3://stox-curated-demo-1234/indicators/year=${year}/month=${month}/'
+);
+
+-- 60-day return correlation of every ticker pair (ticker_a < ticker_b), one
+-- snapshot per ingested date
+CREATE EXTERNAL TABLE IF NOT EXISTS stox.correlations (
+    date DATE,
+    ticker_a STRING,
+    ticker_b STRING,
+    corr_60 DOUBLE,
+    observations INT
+)
+PARTITIONED BY (
+    year INT,
+    month INT
+)
+STORED AS TEXTFILE
+LOCATION 's3://stox-curated-demo-1234/correlations/'
+TBLPROPERTIES (
+    'skip.header.line.count' = '1',
+    'serialization.format' = ',',
+    'field.delim' = ',',
+    'projection.enabled' = 'true',
+    'projection.year.type' = 'integer',
+    'projection.year.range' = '2000,2099',
+    'projection.month.type' = 'integer',
+    'projection.month.range' = '1,12',
+    'projection.month.digits' = '2',
+    'storage.location.template' = 's3://stox-curated-demo-1234/correlations/year=${year}/month=${month}/'
+);
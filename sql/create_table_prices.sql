@@ -10,8 +10,7 @@ CREATE EXTERNAL TABLE IF NOT EXISTS stox.prices (
 PARTITIONED BY (
     ticker STRING,
     year INT,
-    month INT,
-    day INT
+    month INT
 )
 STORED AS TEXTFILE
 LOCATION 's3://stox-curated-demo-1234/prices/'
@@ -0,0 +1,21 @@
+-- Parquet variant of stox.prices: use instead of create_table_prices.sql when
+-- ingest and backfill run with PRICES_FORMAT=parquet
+CREATE EXTERNAL TABLE IF NOT EXISTS stox.prices (
+    date DATE,
+    open DOUBLE,
+    high DOUBLE,
+    low DOUBLE,
+    close DOUBLE,
+    volume BIGINT,
+    adj_close DOUBLE
+)
+PARTITIONED BY (
+    ticker STRING,
+    year INT,
+    month INT
+)
+STORED AS PARQUET
+LOCATION 's3://stox-curated-demo-1234/prices/'
+TBLPROPERTIES (
+    'parquet.compression' = 'SNAPPY'
+);
@@ -0,0 +1,36 @@
+-- Partition-projection variant of stox.prices: Athena computes partitions from
+-- these properties, so nothing has to register them (run ingest with
+-- PARTITION_MODE=projection and backfill with --no-register).
+-- Projection ignores catalog partitions, so it cannot be combined with the
+-- stox-maint compaction, which works by repointing catalog partitions.
+-- Keep projection.ticker.values in sync with the watchlist.
+CREATE EXTERNAL TABLE IF NOT EXISTS stox.prices (
+    date DATE,
+    open DOUBLE,
+    high DOUBLE,
+    low DOUBLE,
+    close DOUBLE,
+    volume BIGINT,
+    adj_close DOUBLE
+)
+PARTITIONED BY (
+    ticker STRING,
+    year INT,
+    month INT
+)
+STORED AS TEXTFILE
+LOCATION 's3://stox-curated-demo-1234/prices/'
+TBLPROPERTIES (
+    'skip.header.line.count' = '1',
+    'serialization.format' = ',',
+    'field.delim' = ',',
+    'projection.enabled' = 'true',
+    'projection.ticker.type' = 'enum',
+    'projection.ticker.values' = 'AAPL,MSFT,AMZN,GOOGL,TSLA',
+    'projection.year.type' = 'integer',
+    'projection.year.range' = '2000,2099',
+    'projection.month.type' = 'integer',
+    'projection.month.range' = '1,12',
+    'projection.month.digits' = '2',
+    'storage.location.template' = 's3://stox-curated-demo-1234/prices/ticker=${ticker}/year=${year}/month=${month}/'
+);
@@ -1,13 +1,26 @@
--- Daily returns per ticker
+-- Daily returns per ticker (a ticker's first day has no previous close and is left out).
+-- LAG is computed once, and year/month pass through so callers can filter on them.
 CREATE OR REPLACE VIEW stox.v_returns AS
+WITH lagged AS (
+    SELECT 
+        ticker,
+        date,
+        close,
+        LAG(close) OVER (PARTITION BY ticker ORDER BY date) as prev_close,
+        year,
+        month
+    FROM stox.prices
+)
 SELECT 
     ticker,
     date,
     close,
-    LAG(close) OVER (PARTITION BY ticker ORDER BY date) as prev_close,
-    (close - LAG(close) OVER (PARTITION BY ticker ORDER BY date)) / LAG(close) OVER (PARTITION BY ticker ORDER BY date) as daily_return
-FROM stox.prices
-WHERE LAG(close) OVER (PARTITION BY ticker ORDER BY date) IS NOT NULL;
+    prev_close,
+    (close - prev_close) / prev_close as daily_return,
+    year,
+    month
+FROM lagged
+WHERE prev_close IS NOT NULL;
 
 -- Moving averages
 CREATE OR REPLACE VIEW stox.v_sma AS
@@ -47,38 +60,37 @@ SELECT
     MIN((close - peak) / peak) OVER (PARTITION BY ticker ORDER BY date ROWS UNBOUNDED PRECEDING) as max_drawdown
 FROM running_peak;
 
--- 60-day rolling correlation between tickers
+-- 60-day rolling correlation between tickers over their common trading days.
+-- The CORR window is computed once and filtered afterwards. For a date
+-- range, use stox_common.views.corr_sql, which bounds the scan and the
+-- pair join to the range plus the 60-day lookback.
 CREATE OR REPLACE VIEW stox.v_corr AS
-WITH returns_data AS (
-    SELECT 
-        ticker,
-        date,
-        daily_return
-    FROM stox.v_returns
-    WHERE daily_return IS NOT NULL
-),
-correlation_data AS (
+WITH pairs AS (
     SELECT 
         a.ticker as ticker1,
         b.ticker as ticker2,
         a.date,
         a.daily_return as return1,
         b.daily_return as return2
-    FROM returns_data a
-    JOIN returns_data b ON a.date = b.date AND a.ticker < b.ticker
+    FROM stox.v_returns a
+    JOIN stox.v_returns b ON a.date = b.date AND a.ticker < b.ticker
+),
+rolling AS (
+    SELECT 
+        ticker1,
+        ticker2,
+        date,
+        CORR(return1, return2) OVER (
+            PARTITION BY ticker1, ticker2 
+            ORDER BY date 
+            ROWS BETWEEN 59 PRECEDING AND CURRENT ROW
+        ) as correlation_60d
+    FROM pairs
 )
 SELECT 
     ticker1,
     ticker2,
     date,
-    CORR(return1, return2) OVER (
-        PARTITION BY ticker1, ticker2 
-        ORDER BY date 
-        ROWS BETWEEN 59 PRECEDING AND CURRENT ROW
-    ) as correlation_60d
-FROM correlation_data
-WHERE CORR(return1, return2) OVER (
-    PARTITION BY ticker1, ticker2 
-    ORDER BY date 
-    ROWS BETWEEN 59 PRECEDING AND CURRENT ROW
-) IS NOT NULL;
+    correlation_60d
+FROM rolling
+WHERE correlation_60d IS NOT NULL;
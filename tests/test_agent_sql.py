@@ -1,7 +1,11 @@
 import pytest
 import json
-from unittest.mock import patch, MagicMock
-from lambdas.stox_agent.lambda_function import lambda_handler, generate_sql, execute_athena_query, summarize_results
+from datetime import date, timedelta
+from unittest.mock import ANY, patch, MagicMock
+from lambdas.stox_agent.lambda_function import (
+    lambda_handler, generate_sql, execute_athena_query, stream_summary, summarize_results
+)
+from stox_common import sse
 
 class TestStoxAgent:
     
@@ -32,6 +36,257 @@ class TestStoxAgent:
         assert len(body['rows']) == 1
         assert body['answer'] == "AAPL closed at $100 on 2024-01-15"
     
+    @patch.dict('os.environ', {
+        'ATHENA_DB': 'stox',
+        'ATHENA_OUTPUT': 's3://test-bucket/',
+        'BEDROCK_REGION': 'us-east-1'
+    })
+    @patch('lambdas.stox_agent.lambda_function.summarize_results')
+    @patch('lambdas.stox_agent.lambda_function.execute_athena_query')
+    @patch('lambdas.stox_agent.lambda_function.generate_sql')
+    def test_lambda_handler_truncates_rows(self, mock_generate_sql, mock_execute_athena, mock_summarize):
+        """Test that only the response rows are read and truncation is reported"""
+        mock_generate_sql.return_value = "SELECT date, close FROM stox.prices"
+        mock_execute_athena.return_value = (['date', 'close'], [[date(2024, 1, 1), 100.0]] * 51)
+        mock_summarize.return_value = "Summary"
+        
+        result = lambda_handler({'body': json.dumps({'question': 'AAPL history'})}, {})
+        
+        mock_execute_athena.assert_called_once_with("SELECT date, close FROM stox.prices LIMIT 200", max_rows=51,
+                                                    details=ANY, series_rows=5001)
+        body = json.loads(result['body'])
+        assert len(body['rows']) == 50
+        assert body['truncated'] is True
+        assert body['rows'][0] == ['2024-01-01', 100.0]
+    
+    @patch.dict('os.environ', {
+        'ATHENA_DB': 'stox',
+        'ATHENA_OUTPUT': 's3://test-bucket/',
+        'BEDROCK_REGION': 'us-east-1',
+        'CHART_POINTS': '100'
+    })
+    @patch('lambdas.stox_agent.lambda_function.summarize_results')
+    @patch('lambdas.stox_agent.lambda_function.execute_athena_query')
+    @patch('lambdas.stox_agent.lambda_function.generate_sql')
+    def test_lambda_handler_chart(self, mock_generate_sql, mock_execute_athena, mock_summarize):
+        """Test that a time-series result comes with a downsampled column-major chart, other results without"""
+        series = [[date(2020, 1, 1) + timedelta(days=i), 100.0 + i % 30] for i in range(1000)]
+        series[500][1] = 500.0
+        mock_generate_sql.side_effect = ["SELECT date, close FROM stox.prices ORDER BY date LIMIT 1000",
+                                         "SELECT ticker, close FROM stox.prices LIMIT 10"]
+        mock_execute_athena.side_effect = [(['date', 'close'], series), (['ticker', 'close'], [['AAPL', 1.0]] * 10)]
+        mock_summarize.return_value = "Summary"
+        
+        chart = json.loads(lambda_handler({'body': json.dumps({'question': 'AAPL history'})}, {})['body'])['chart']
+        other = json.loads(lambda_handler({'body': json.dumps({'question': 'AAPL closes'})}, {})['body'])
+        
+        assert chart['x'] == 'date' and chart['columns'] == ['date', 'close'] and chart['types'] == ['date', 'double']
+        assert chart['rows'] == 1000 and chart['points'] == 100 and chart['method'] == 'lttb'
+        dates, closes = chart['data']
+        assert len(dates) == len(closes) == 100
+        assert dates[0] == '2020-01-01' and dates[-1] == (date(2020, 1, 1) + timedelta(days=999)).isoformat()
+        assert 500.0 in closes
+        assert other['chart'] is None
+    
+    @patch.dict('os.environ', {
+        'ATHENA_DB': 'stox',
+        'ATHENA_OUTPUT': 's3://test-bucket/',
+        'BEDROCK_REGION': 'us-east-1',
+        'WATCHLIST': 'AAPL,MSFT,AMZN,GOOGL,TSLA'
+    })
+    @patch('lambdas.stox_agent.lambda_function.summarize_results')
+    @patch('lambdas.stox_agent.lambda_function.execute_athena_query')
+    @patch('lambdas.stox_agent.lambda_function.generate_sql')
+    def test_lambda_handler_rewrites_generated_sql(self, mock_generate_sql, mock_execute_athena, mock_summarize):
+        """Test that generated SQL gets partition predicates and that non-SELECT SQL is rejected with a 400"""
+        mock_generate_sql.return_value = "SELECT date, close FROM stox.prices WHERE date >= DATE '2024-03-01';"
+        mock_execute_athena.return_value = (['date', 'close'], [])
+        mock_summarize.return_value = "Summary"
+        
+        body = json.loads(lambda_handler({'body': json.dumps({'question': 'prices since March'})}, {})['body'])
+        
+        executed = mock_execute_athena.call_args[0][0]
+        assert "(date >= DATE '2024-03-01' AND (year > 2024 OR (year = 2024 AND month >= 3)))" in executed
+        assert executed.endswith(' LIMIT 200')
+        assert body['sql'] == executed
+        assert body['rewrite']['predicates'] == 1
+        assert body['rewrite']['partitions_pruned'] == 2 * 5
+        
+        mock_generate_sql.return_value = "DROP TABLE stox.prices"
+        result = lambda_handler({'body': json.dumps({'question': 'drop it'})}, {})
+        
+        assert result['statusCode'] == 400
+        assert json.loads(result['body'])['type'] == 'RejectedQuery'
+        assert mock_execute_athena.call_count == 1
+    
+    @patch.dict('os.environ', {
+        'ATHENA_DB': 'stox',
+        'ATHENA_OUTPUT': 's3://test-bucket/',
+        'BEDROCK_REGION': 'us-east-1',
+        'CURATED_BUCKET': 'curated',
+        'LOCAL_ENGINE': 'off'
+    })
+    @patch('lambdas.stox_agent.lambda_function._cache', None)
+    @patch('lambdas.stox_agent.lambda_function.current_watermark')
+    @patch('lambdas.stox_agent.lambda_function.summarize_results')
+    @patch('lambdas.stox_agent.lambda_function.execute_athena_query')
+    @patch('lambdas.stox_agent.lambda_function.generate_sql')
+    def test_lambda_handler_cache(self, mock_generate_sql, mock_execute_athena, mock_summarize, mock_watermark):
+        """Test that a repeated question is served from cache until the data watermark moves"""
+        mock_generate_sql.return_value = "SELECT close FROM stox.prices WHERE ticker='AAPL'"
+        mock_execute_athena.return_value = (['close'], [[100.0], [101.0]])
+        mock_summarize.return_value = "AAPL closed at $100"
+        mock_watermark.return_value = '2024-01-15@t1'
+        
+        lambda_handler({'body': json.dumps({'question': '7-day SMA of AAPL'})}, {})
+        second = json.loads(lambda_handler({'body': json.dumps({'question': '7-day sma of AAPL?'})}, {})['body'])
+        mock_watermark.return_value = '2024-01-16@t2'
+        third = json.loads(lambda_handler({'body': json.dumps({'question': '7-day SMA of AAPL'})}, {})['body'])
+        
+        assert (second['cache']['sql'], second['cache']['results'], second['cache']['summary']) == ('memory', 'memory', 'memory')
+        assert second['answer'] == "AAPL closed at $100"
+        assert (third['cache']['sql'], third['cache']['results']) == ('memory', 'miss')
+        assert mock_generate_sql.call_count == 1
+        assert mock_execute_athena.call_count == 2
+        assert third['cache']['stats']['results']['misses'] == 2
+    
+    @patch.dict('os.environ', {
+        'ATHENA_DB': 'stox',
+        'ATHENA_OUTPUT': 's3://test-bucket/',
+        'BEDROCK_REGION': 'us-east-1'
+    })
+    @patch('lambdas.stox_agent.lambda_function.stream_summary')
+    @patch('lambdas.stox_agent.lambda_function.execute_athena_query')
+    @patch('lambdas.stox_agent.lambda_function.generate_sql')
+    def test_lambda_handler_stream(self, mock_generate_sql, mock_execute_athena, mock_stream_summary):
+        """Test that stream mode sends the SQL, the rows and the summary pieces as separate events"""
+        mock_generate_sql.return_value = "SELECT date, close FROM stox.prices WHERE ticker='MSFT'"
+        mock_execute_athena.return_value = (['date', 'close'], [[date(2024, 1, 15), 100.0], [date(2024, 1, 16), 101.0]])
+        mock_stream_summary.return_value = iter(['MSFT closed ', 'at $100.'])
+        
+        result = lambda_handler({'body': json.dumps({'question': 'MSFT close stream', 'stream': True})}, {})
+        
+        assert result['headers']['Content-Type'] == 'text/event-stream'
+        events = list(sse.decode(result['body']))
+        assert [e for e, _ in events] == ['sql', 'rows', 'summary', 'summary', 'done']
+        assert events[0][1]['sql'].endswith('LIMIT 200')
+        assert events[1][1]['rows'] == [['2024-01-15', 100.0], ['2024-01-16', 101.0]]
+        assert events[4][1]['answer'] == 'MSFT closed at $100.'
+        assert 'rows' not in events[4][1]
+        
+        mock_generate_sql.side_effect = Exception('Bedrock unavailable')
+        result = lambda_handler({'body': json.dumps({'question': 'another question', 'stream': True})}, {})
+        
+        assert list(sse.decode(result['body']))[-1] == (
+            'error', {'error': 'Bedrock unavailable', 'type': "<class 'Exception'>", 'status': 500})
+    
+    @patch.dict('os.environ', {
+        'ATHENA_DB': 'stox',
+        'ATHENA_OUTPUT': 's3://test-bucket/',
+        'BEDROCK_REGION': 'us-east-1'
+    })
+    @patch('lambdas.stox_agent.lambda_function._cache', None)
+    @patch('lambdas.stox_agent.lambda_function.dispatch_summary')
+    @patch('lambdas.stox_agent.lambda_function.summarize_results')
+    @patch('lambdas.stox_agent.lambda_function.execute_athena_query')
+    @patch('lambdas.stox_agent.lambda_function.generate_sql')
+    def test_lambda_handler_summary_modes(self, mock_generate_sql, mock_execute_athena, mock_summarize,
+                                          mock_dispatch):
+        """Test summary=none/async, the follow-up request and the template summary for a single value"""
+        mock_generate_sql.return_value = "SELECT date, close FROM stox.prices WHERE ticker='AAPL'"
+        mock_execute_athena.return_value = (['date', 'close'], [['2024-01-15', 100.0], ['2024-01-16', 101.0]])
+        mock_summarize.return_value = "AAPL rose 1%"
+        ask = lambda **body: json.loads(lambda_handler({'body': json.dumps(body)}, {})['body'])
+        
+        skipped = ask(question='AAPL closes', summary='none')
+        pending = ask(question='AAPL closes', summary='async')
+        job = mock_dispatch.call_args[0][0]
+        lambda_handler({'summarize': job}, {})
+        done = ask(summary_id=pending['summary']['id'])
+        
+        assert skipped['answer'] is None and skipped['cache']['summary'] == 'skipped'
+        assert pending['answer'] is None and pending['summary']['status'] == 'pending'
+        assert len(pending['rows']) == 2
+        assert done == {'summary_id': pending['summary']['id'], 'status': 'done', 'answer': "AAPL rose 1%"}
+        assert set(skipped['timings']) >= {'llm_sql_ms', 'athena_ms', 'llm_summary_ms', 'total_ms'}
+        
+        mock_execute_athena.return_value = (['ticker', 'ytd_return'], [['NVDA', 0.4123]])
+        single = ask(question='Best performer YTD')
+        
+        assert single['answer'] == 'NVDA: ytd return is +41.23%.'
+        assert single['cache']['summary'] == 'template'
+        assert mock_summarize.call_count == 1
+        assert lambda_handler({'body': json.dumps({'question': 'x', 'summary': 'later'})}, {})['statusCode'] == 400
+    
+    @patch.dict('os.environ', {
+        'ATHENA_DB': 'stox',
+        'ATHENA_OUTPUT': 's3://test-bucket/',
+        'BEDROCK_REGION': 'us-east-1',
+        'LOCAL_ENGINE': 'off'
+    })
+    @patch('lambdas.stox_agent.lambda_function._cache', None)
+    @patch('lambdas.stox_agent.lambda_function.summarize_results')
+    @patch('lambdas.stox_agent.lambda_function.execute_athena_query')
+    @patch('lambdas.stox_agent.lambda_function.generate_sql')
+    def test_lambda_handler_batch(self, mock_generate_sql, mock_execute_athena, mock_summarize):
+        """Test that a batch answers in input order, runs identical SQL once and reports errors per question"""
+        sql_of = {
+            'AAPL closes': "SELECT date, close FROM stox.prices WHERE ticker='AAPL'",
+            'AAPL closing prices': "SELECT date, close FROM stox.prices WHERE ticker='AAPL'",
+            'MSFT closes': "SELECT date, close FROM stox.prices WHERE ticker='MSFT'",
+            'drop it': "DROP TABLE stox.prices",
+        }
+        mock_generate_sql.side_effect = lambda question, details=None: sql_of[question]
+        mock_execute_athena.side_effect = lambda sql, **kwargs: (
+            ['date', 'close'], [['2024-01-15', 100.0 if 'AAPL' in sql else 400.0], ['2024-01-16', 101.0]]
+        )
+        mock_summarize.side_effect = lambda question, columns, rows, truncated: f"{question}: {rows[0][1]}"
+        questions = ['MSFT closes', 'AAPL closes', 'drop it', 'AAPL closing prices', 'aapl closes?']
+        
+        result = lambda_handler({'path': '/chat/batch', 'body': json.dumps({'questions': questions})}, {})
+        
+        assert result['statusCode'] == 200
+        body = json.loads(result['body'])
+        assert [item['question'] for item in body['results']] == questions
+        assert body['results'][0]['answer'] == 'MSFT closes: 400.0'
+        assert body['results'][1]['rows'][0] == ['2024-01-15', 100.0]
+        assert body['results'][2]['type'] == 'RejectedQuery' and 'rows' not in body['results'][2]
+        assert body['results'][4]['sql'] == body['results'][1]['sql']
+        assert body['stats'] | {'wall_ms': 0, 'cache': {}} == {
+            'questions': 5, 'local': 0, 'distinct_questions': 4, 'distinct_sql': 2, 'errors': 1,
+            'wall_ms': 0, 'cache': {}
+        }
+        assert mock_generate_sql.call_count == 4
+        assert mock_execute_athena.call_count == 2
+    
+    def test_lambda_handler_batch_validation(self):
+        """Test that an empty, oversized or malformed batch is rejected with a 400"""
+        ask = lambda **body: lambda_handler({'path': '/chat/batch', 'body': json.dumps(body)}, {})
+        
+        with patch.dict('os.environ', {'BATCH_MAX_QUESTIONS': '2'}):
+            assert ask(questions=['a', 'b', 'c'])['statusCode'] == 400
+        assert ask(questions=[])['statusCode'] == 400
+        assert ask(questions=['ok', 7])['statusCode'] == 400
+        assert ask(questions=['ok'], summary='later')['statusCode'] == 400
+    
+    @patch('lambdas.stox_agent.lambda_function.get_bedrock_client')
+    def test_stream_summary(self, mock_get_bedrock):
+        """Test that summary text is yielded per response stream chunk"""
+        chunks = [{'type': 'message_start'},
+                  {'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': 'AAPL closed '}},
+                  {'type': 'content_block_delta', 'delta': {'type': 'text_delta', 'text': 'at $100.'}},
+                  {'type': 'message_stop'}]
+        mock_bedrock = MagicMock()
+        mock_bedrock.invoke_model_with_response_stream.return_value = {
+            'body': [{'chunk': {'bytes': json.dumps(c).encode()}} for c in chunks]
+        }
+        mock_get_bedrock.return_value = mock_bedrock
+        
+        pieces = list(stream_summary('Show me AAPL price', ['date', 'close'], [['2024-01-15', 100.0]]))
+        
+        assert pieces == ['AAPL closed ', 'at $100.']
+        assert list(stream_summary('Show me AAPL price', [], [])) == ["No data found for the given criteria."]
+    
     def test_lambda_handler_missing_question(self):
         """Test handling of missing question"""
         event = {'body': json.dumps({})}
@@ -71,6 +326,30 @@ class TestStoxAgent:
         with pytest.raises(Exception, match="No SQL found in response"):
             generate_sql('Invalid question')
     
+    @patch.dict('os.environ', {'BEDROCK_MODEL_ID': 'anthropic.claude-3-5-haiku-20241022-v1:0', 'FEW_SHOT_EXAMPLES': '2'})
+    @patch('lambdas.stox_agent.lambda_function.get_bedrock_client')
+    def test_generate_sql_prompt_caching_and_usage(self, mock_get_bedrock):
+        """Test the cached system prefix, the selected examples, the stop sequence and the usage record"""
+        mock_response = MagicMock()
+        mock_response['body'].read.return_value = json.dumps({
+            'content': [{'type': 'text', 'text': "<SQL>SELECT vol_20 FROM stox.indicators WHERE ticker='AMZN'"}],
+            'usage': {'input_tokens': 180, 'output_tokens': 20, 'cache_read_input_tokens': 310}
+        }).encode()
+        mock_get_bedrock.return_value.invoke_model.return_value = mock_response
+        details = {}
+        
+        result = generate_sql("What's the 20-day volatility of AMZN?", details=details)
+        
+        body = json.loads(mock_get_bedrock.return_value.invoke_model.call_args[1]['body'])
+        assert result == "SELECT vol_20 FROM stox.indicators WHERE ticker='AMZN'"
+        assert body['system'][0]['cache_control'] == {'type': 'ephemeral'}
+        assert 'Table stox.indicators' in body['system'][0]['text']
+        assert body['messages'][0]['content'].count('<SQL>') == 2
+        assert 'Q: "20-day volatility of MSFT"' in body['messages'][0]['content']
+        assert body['stop_sequences'] == ['</SQL>']
+        assert (details['input_tokens'], details['output_tokens'], details['cache_read_input_tokens']) == (180, 20, 310)
+        assert details['latency_ms'] >= 0
+    
     @patch.dict('os.environ', {
         'ATHENA_DB': 'stox',
         'ATHENA_OUTPUT': 's3://test-bucket/'
@@ -162,3 +441,63 @@ class TestStoxAgent:
         result = summarize_results('Test question', [], [])
         
         assert result == "No data found for the given criteria."
+
+class TestStreamServer:
+    
+    @pytest.fixture
+    def server(self):
+        import threading
+        from lambdas.stox_agent.stream_server import make_server
+        server = make_server('127.0.0.1', 0)
+        server.errors = []
+        server.handle_error = lambda request, address: server.errors.append(address)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+    
+    def post(self, server, body):
+        import http.client
+        connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+        connection.request('POST', '/chat', json.dumps(body), {'Content-Type': 'application/json'})
+        return connection
+    
+    @patch('lambdas.stox_agent.lambda_function.stream_answer')
+    def test_summary_mode_passed_through(self, mock_stream_answer, server):
+        """Test that the summary field reaches stream_answer and an unknown mode is a 400"""
+        mock_stream_answer.side_effect = lambda question, write, summary: write(sse.encode('done', {'summary': summary}))
+        
+        response = self.post(server, {'question': 'q', 'summary': 'none'}).getresponse()
+        rejected = self.post(server, {'question': 'q', 'summary': 'later'}).getresponse()
+        
+        assert response.status == 200 and b'"summary": "none"' in response.read()
+        mock_stream_answer.assert_called_once_with('q', ANY, summary='none')
+        assert rejected.status == 400 and b'summary must be one of' in rejected.read()
+    
+    @patch('lambdas.stox_agent.lambda_function.stream_answer')
+    def test_client_disconnect_ends_stream(self, mock_stream_answer, server):
+        """Test that a client closing the socket mid-stream stops the answer without an error"""
+        import threading
+        import time
+        stopped = threading.Event()
+        
+        def stream(question, write, summary):
+            try:
+                for _ in range(500):
+                    write(sse.encode('summary', {'text': 'x' * 1024}))
+                    time.sleep(0.005)
+            except (BrokenPipeError, ConnectionResetError):
+                stopped.set()
+                raise
+        mock_stream_answer.side_effect = stream
+        
+        connection = self.post(server, {'question': 'q'})
+        response = connection.getresponse()
+        response.read(10)
+        response.close()
+        connection.close()
+        
+        assert stopped.wait(5)
+        time.sleep(0.05)
+        assert server.errors == []
@@ -0,0 +1,187 @@
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from datetime import date
+from unittest.mock import MagicMock
+from stox_common import athena
+
+class FakeClock:
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.now += seconds
+
+def fake_athena(clock, runtime, final_state='SUCCEEDED'):
+    """Athena client mock whose query reaches `final_state` after `runtime` seconds"""
+    client = MagicMock()
+    client.start_query_execution.return_value = {'QueryExecutionId': 'q-1'}
+    
+    def get_query_execution(QueryExecutionId):
+        state = final_state if clock() >= runtime else 'RUNNING'
+        return {'QueryExecution': {'Status': {'State': state, 'StateChangeReason': 'boom'}}}
+    
+    client.get_query_execution.side_effect = get_query_execution
+    return client
+
+class TestAthena:
+    
+    def test_poll_delays_grow_to_cap(self):
+        """Test that poll intervals back off exponentially up to the cap"""
+        delays = athena.poll_delays(initial=0.1, maximum=1.0, factor=2, jitter=0)
+        
+        assert [next(delays) for _ in range(6)] == pytest.approx([0.1, 0.2, 0.4, 0.8, 1.0, 1.0])
+    
+    def test_fast_query_returns_quickly(self):
+        """Test that a sub-second query is not held back by a fixed poll interval"""
+        clock = FakeClock()
+        client = fake_athena(clock, runtime=0.3)
+        
+        execution = athena.wait_for_query(client, 'q-1', timeout=30, clock=clock, sleep=clock.sleep,
+                                          delays=athena.poll_delays(jitter=0))
+        
+        assert execution['QueryExecutionId'] == 'q-1'
+        assert clock.now < 0.5
+    
+    def test_failure_raises_with_reason(self):
+        """Test that a FAILED query raises QueryFailed with Athena's reason"""
+        clock = FakeClock()
+        client = fake_athena(clock, runtime=1, final_state='FAILED')
+        
+        with pytest.raises(athena.QueryFailed, match='Athena query failed: boom'):
+            athena.wait_for_query(client, 'q-1', clock=clock, sleep=clock.sleep)
+        client.stop_query_execution.assert_not_called()
+    
+    def test_deadline_stops_query(self):
+        """Test that a query past its deadline is stopped and QueryTimeout raised"""
+        clock = FakeClock()
+        client = fake_athena(clock, runtime=1000)
+        
+        with pytest.raises(athena.QueryTimeout):
+            athena.wait_for_query(client, 'q-1', timeout=10, clock=clock, sleep=clock.sleep)
+        
+        client.stop_query_execution.assert_called_once_with(QueryExecutionId='q-1')
+        assert clock.now == pytest.approx(10)
+    
+    def test_run_queries_concurrently(self):
+        """Test that the asyncio variant runs statements side by side and keeps failures per query"""
+        client = MagicMock()
+        client.start_query_execution.side_effect = lambda QueryString, **kw: {'QueryExecutionId': QueryString}
+        client.get_query_execution.side_effect = lambda QueryExecutionId: {'QueryExecution': {
+            'Status': {'State': 'FAILED' if QueryExecutionId == 'bad' else 'SUCCEEDED'}
+        }}
+        
+        results = athena.run_queries(client, ['a', 'bad', 'c'], 'stox', 's3://out/')
+        
+        assert results[0]['QueryExecutionId'] == 'a'
+        assert isinstance(results[1], athena.QueryFailed)
+        assert results[2]['QueryExecutionId'] == 'c'
+
+def result_pages(total, page_size):
+    """GetQueryResults pages for a two-column typed result of `total` rows"""
+    info = [{'Name': 'date', 'Type': 'date'}, {'Name': 'close', 'Type': 'double'}]
+    rows = [{'Data': [{'VarCharValue': 'date'}, {'VarCharValue': 'close'}]}]
+    rows += [{'Data': [{'VarCharValue': f'2024-01-{i % 28 + 1:02d}'}, {'VarCharValue': str(100 + i)}]}
+             for i in range(total)]
+    pages = []
+    for n, start in enumerate(range(0, len(rows), page_size)):
+        page = {'ResultSet': {'ResultSetMetadata': {'ColumnInfo': info}, 'Rows': rows[start:start + page_size]}}
+        if start + page_size < len(rows):
+            page['NextToken'] = f't{n + 1}'
+        pages.append(page)
+    client = MagicMock()
+    client.get_query_results.side_effect = lambda QueryExecutionId, MaxResults, NextToken='t0': pages[int(NextToken[1:])]
+    return client
+
+class TestResults:
+    
+    def test_stream_results_follows_next_token(self):
+        """Test that every page is read and cells are converted by column type"""
+        client = result_pages(2500, 1000)
+        
+        column_info, rows = athena.stream_results(client, 'q-1')
+        rows = list(rows)
+        
+        assert [c['Name'] for c in column_info] == ['date', 'close']
+        assert len(rows) == 2500
+        assert rows[0] == [date(2024, 1, 1), 100.0]
+        assert client.get_query_results.call_count == 3
+    
+    def test_stream_results_stops_early(self):
+        """Test that a limit stops fetching pages once enough rows are read"""
+        client = result_pages(2500, 1000)
+        
+        _, rows = athena.stream_results(client, 'q-1', limit=51)
+        
+        assert len(list(rows)) == 51
+        assert client.get_query_results.call_count == 1
+    
+    def test_stream_csv_results(self):
+        """Test reading typed rows, NULLs and quoted newlines from the S3 CSV output"""
+        body = io.BytesIO(b'"date","close","note"\n"2024-01-02","101.5","a\nb"\n"2024-01-03",,"x"\n')
+        s3 = MagicMock()
+        s3.get_object.return_value = {'Body': body}
+        execution = {'ResultConfiguration': {'OutputLocation': 's3://results/q-1.csv'}}
+        info = [{'Name': 'date', 'Type': 'date'}, {'Name': 'close', 'Type': 'double'}, {'Name': 'note', 'Type': 'varchar'}]
+        
+        rows = list(athena.stream_csv_results(s3, execution, info))
+        
+        s3.get_object.assert_called_once_with(Bucket='results', Key='q-1.csv')
+        assert rows == [[date(2024, 1, 2), 101.5, 'a\nb'], [date(2024, 1, 3), None, 'x']]
+
+class TestReuse:
+    
+    def test_execute_requests_result_reuse(self):
+        """Test that the reuse max age is sent and a reused result is reported"""
+        client = MagicMock()
+        client.start_query_execution.return_value = {'QueryExecutionId': 'q-1'}
+        client.get_query_execution.return_value = {'QueryExecution': {
+            'Status': {'State': 'SUCCEEDED'},
+            'Statistics': {'ResultReuseInformation': {'ReusedPreviousResult': True}}
+        }}
+        
+        execution, source = athena.execute(client, 'SELECT 1', 'stox', 's3://out/', reuse_minutes=15)
+        
+        assert source == athena.REUSED
+        reuse = client.start_query_execution.call_args[1]['ResultReuseConfiguration']
+        assert reuse == {'ResultReuseByAgeConfiguration': {'Enabled': True, 'MaxAgeInMinutes': 15}}
+    
+    def test_identical_queries_in_flight_are_coalesced(self):
+        """Test that concurrent identical statements start one Athena query"""
+        release = threading.Event()
+        client = MagicMock()
+        client.start_query_execution.return_value = {'QueryExecutionId': 'q-1'}
+        
+        def get_query_execution(QueryExecutionId):
+            release.wait(5)
+            return {'QueryExecution': {'Status': {'State': 'SUCCEEDED'}}}
+        
+        client.get_query_execution.side_effect = get_query_execution
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(athena.execute, client, sql, 'stox', 's3://out/')
+                       for sql in ['SELECT 1', 'SELECT  1;', 'SELECT 1', 'SELECT 1']]
+            time.sleep(0.2)
+            release.set()
+            sources = sorted(f.result()[1] for f in futures)
+        
+        assert client.start_query_execution.call_count == 1
+        assert sources == [athena.COALESCED] * 3 + [athena.EXECUTED]
+    
+    def test_run_queries_deduplicates_batch(self):
+        """Test that identical statements in one batch run once"""
+        client = MagicMock()
+        client.start_query_execution.side_effect = lambda QueryString, **kw: {'QueryExecutionId': QueryString}
+        client.get_query_execution.side_effect = lambda QueryExecutionId: {'QueryExecution': {
+            'Status': {'State': 'SUCCEEDED'}
+        }}
+        
+        results = athena.run_queries(client, ['SELECT 1', 'SELECT 2', 'select 2'.upper()], 'stox', 's3://out/')
+        
+        assert client.start_query_execution.call_count == 2
+        assert [r['QueryExecutionId'] for r in results] == ['SELECT 1', 'SELECT 2', 'SELECT 2']
@@ -0,0 +1,141 @@
+import pytest
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest.mock import patch
+from moto import mock_aws
+from backfill import (
+    Checkpoint, parse_args, load_tickers, run_backfill, write_rows, remove_superseded_daily_objects
+)
+from stox_common.layout import BATCH
+from stox_common.providers import MockProvider, parse_price_csv
+from stox_common.s3io import ParallelUploader, list_keys
+
+STOOQ_CSV = """Date,Open,High,Low,Close,Volume
+2024-01-31,10,11,9,10.5,1000
+2024-02-01,10.5,12,10,11,2000
+2024-02-02,11,12,10,11.5,1500
+2024-02-03,11,12,10,11.5,1500
+2024-02-05,11.5,13,11,12,
+2023-12-29,9,10,8,9.5,500
+"""
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket='test-bucket')
+        yield client
+
+class TestBackfill:
+    
+    def test_parse_stooq_csv(self):
+        """Test range filtering, weekend skipping and empty volume handling"""
+        rows = parse_price_csv(STOOQ_CSV.splitlines(), datetime(2024, 1, 1), datetime(2024, 12, 31))
+        
+        assert [r['date'] for r in rows] == ['2024-01-31', '2024-02-01', '2024-02-02', '2024-02-05']
+        assert rows[0]['adj_close'] == rows[0]['close'] == 10.5
+        assert rows[-1]['volume'] == 0
+    
+    def test_monthly_layout_writes_one_object_per_month(self, s3):
+        """Test that monthly mode groups rows into one object per ticker and month"""
+        rows = parse_price_csv(STOOQ_CSV.splitlines(), datetime(2024, 1, 1), datetime(2024, 12, 31))
+        
+        with ParallelUploader('test-bucket', workers=4, client=s3) as uploader:
+            futures = write_rows('AAPL', rows, uploader, 'monthly')
+        
+        assert sorted(futures) == [
+            'prices/ticker=AAPL/year=2024/month=01/data.csv',
+            'prices/ticker=AAPL/year=2024/month=02/data.csv'
+        ]
+        assert uploader.puts == 2
+        body = s3.get_object(Bucket='test-bucket', Key='prices/ticker=AAPL/year=2024/month=02/data.csv')['Body'].read().decode()
+        assert body.splitlines()[0] == 'date,open,high,low,close,volume,adj_close'
+        assert len(body.splitlines()) == 4
+    
+    def test_daily_layout_keeps_legacy_keys(self, s3):
+        """Test that the legacy layout still writes one object per trading day"""
+        rows = parse_price_csv(STOOQ_CSV.splitlines(), datetime(2024, 1, 1), datetime(2024, 12, 31))
+        
+        with ParallelUploader('test-bucket', workers=4, client=s3) as uploader:
+            futures = write_rows('AAPL', rows, uploader, 'daily')
+        
+        assert len(futures) == 4
+        assert 'prices/ticker=AAPL/year=2024/month=02/day=05/data.csv' in futures
+    
+    def test_remove_superseded_daily_objects(self, s3):
+        """Test that only daily objects covered by the monthly rows are deleted"""
+        for day in ('01', '06'):
+            s3.put_object(Bucket='test-bucket', Key=f'prices/ticker=AAPL/year=2024/month=02/day={day}/data.csv', Body=b'x')
+        rows = parse_price_csv(STOOQ_CSV.splitlines(), datetime(2024, 1, 1), datetime(2024, 12, 31))
+        
+        removed = remove_superseded_daily_objects('AAPL', rows, s3, 'test-bucket')
+        
+        assert removed == 1
+        assert list(list_keys(s3, 'test-bucket', 'prices/')) == ['prices/ticker=AAPL/year=2024/month=02/day=06/data.csv']
+    
+    def test_partial_backfill_keeps_batch_object(self, s3):
+        """Test that a catch-up object holding days a monthly backfill did not write is kept"""
+        rows = parse_price_csv(STOOQ_CSV.splitlines(), datetime(2024, 1, 1), datetime(2024, 12, 31))
+        feb = [row for row in rows if row['date'].startswith('2024-02')]
+        with ParallelUploader('test-bucket', client=s3) as uploader:
+            write_rows('AAPL', feb, uploader, layout=BATCH)
+        batch_key = 'prices/ticker=AAPL/year=2024/month=02/day=01/data.csv'
+        
+        partial = remove_superseded_daily_objects('AAPL', [r for r in rows if r['date'] <= '2024-02-02'], s3, 'test-bucket')
+        kept = list(list_keys(s3, 'test-bucket', 'prices/'))
+        full = remove_superseded_daily_objects('AAPL', rows, s3, 'test-bucket')
+        
+        assert (partial, kept) == (0, [batch_key])
+        assert full == 1 and list(list_keys(s3, 'test-bucket', 'prices/')) == []
+    
+    def test_rerun_only_uploads_missing_days(self, s3, tmp_path):
+        """Test that the checkpoint makes a rerun upload only months with new days"""
+        all_rows = parse_price_csv(STOOQ_CSV.splitlines(), datetime(2024, 1, 1), datetime(2024, 12, 31))
+        checkpoint_path = str(tmp_path / 'checkpoint.json')
+        
+        provider = MockProvider({'AAPL': all_rows})
+        first = run_backfill(['AAPL'], datetime(2024, 1, 1), datetime(2024, 2, 1), 'test-bucket', jobs=2,
+                             checkpoint=Checkpoint(checkpoint_path), uploader=ParallelUploader('test-bucket', client=s3),
+                             provider=provider)
+        
+        second = run_backfill(['AAPL'], datetime(2024, 1, 1), datetime(2024, 2, 5), 'test-bucket', jobs=2,
+                              checkpoint=Checkpoint(checkpoint_path), uploader=ParallelUploader('test-bucket', client=s3),
+                              provider=provider)
+        third = run_backfill(['AAPL'], datetime(2024, 1, 1), datetime(2024, 2, 5), 'test-bucket', jobs=2,
+                             checkpoint=Checkpoint(checkpoint_path), uploader=ParallelUploader('test-bucket', client=s3),
+                             provider=provider)
+        
+        assert (first['rows'], first['puts']) == (2, 2)
+        # January is complete, so only February (which gained two days) is rewritten
+        assert (second['rows'], second['puts']) == (3, 1)
+        assert third['results']['AAPL']['status'] == 'skipped'
+        assert provider.requests == 2
+        assert Checkpoint(checkpoint_path).written('AAPL') == {r['date'] for r in all_rows}
+    
+    def test_checkpoint_saved_from_many_threads(self, tmp_path):
+        """Test that concurrent saves never fail and the file ends with every recorded date"""
+        checkpoint_path = str(tmp_path / 'checkpoint.json')
+        checkpoint = Checkpoint(checkpoint_path)
+        
+        def work(worker):
+            for i in range(50):
+                checkpoint.record(f'T{worker}', [f'2024-01-{i % 28 + 1:02d}'])
+                checkpoint.save()
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(work, range(8)))
+        
+        saved = Checkpoint(checkpoint_path)
+        assert all(len(saved.written(f'T{worker}')) == 28 for worker in range(8))
+        assert list(tmp_path.iterdir()) == [tmp_path / 'checkpoint.json']
+    
+    @patch.dict('os.environ', {'WATCHLIST': 'aapl, msft'})
+    def test_load_tickers(self, tmp_path):
+        """Test ticker sources: explicit list, file, then WATCHLIST"""
+        universe = tmp_path / 'universe.txt'
+        universe.write_text('# large caps\nAAPL\nmsft  # software\n\nAAPL\n')
+        
+        assert load_tickers(parse_args(['--tickers', 'tsla', 'GOOGL'])) == ['TSLA', 'GOOGL']
+        assert load_tickers(parse_args(['--tickers-file', str(universe)])) == ['AAPL', 'MSFT']
+        assert load_tickers(parse_args([])) == ['AAPL', 'MSFT']
@@ -0,0 +1,79 @@
+import pytest
+import boto3
+from moto import mock_aws
+from stox_common.cache import (
+    FileStore, LRUCache, PipelineCache, S3Store, normalize_question, read_watermark, write_watermark
+)
+
+class FakeClock:
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+class TestPipelineCache:
+    
+    def test_normalize_question(self):
+        """Test that case, spacing and trailing punctuation share one key"""
+        assert normalize_question('  7-day SMA of  AAPL? ') == normalize_question('7-day sma of aapl')
+    
+    def test_lru_eviction_and_ttl(self):
+        """Test that the least recently used entry is evicted and entries expire"""
+        clock = FakeClock()
+        cache = LRUCache(maxsize=2, ttl=60, clock=clock)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        
+        assert cache.get('b') == (False, None)
+        assert cache.get('a') == (True, 1)
+        clock.now += 61
+        assert cache.get('a') == (False, None)
+    
+    def test_store_tier_shared_between_instances(self, tmp_path):
+        """Test that a cold instance is served from the persistent tier and counts the hit"""
+        store = FileStore(str(tmp_path))
+        calls = []
+        warm = PipelineCache(store=store)
+        cold = PipelineCache(store=store)
+        
+        assert warm['sql'].get_or_compute('q', lambda: calls.append(1) or 'SELECT 1') == ('SELECT 1', 'miss')
+        assert cold['sql'].get_or_compute('q', lambda: calls.append(1) or 'SELECT 2') == ('SELECT 1', 'store')
+        assert cold['sql'].get_or_compute('q', lambda: 'SELECT 3') == ('SELECT 1', 'memory')
+        assert len(calls) == 1
+        assert cold.stats()['sql'] == {'hits': {'memory': 1, 'store': 1}, 'misses': 0, 'entries': 1}
+    
+    def test_new_watermark_drops_results(self):
+        """Test that a new data watermark clears data-dependent stages but keeps SQL"""
+        cache = PipelineCache()
+        cache.observe_watermark('2024-01-15@t1')
+        cache['sql'].put('q', 'SELECT 1')
+        cache['results'].put('r', {'rows': []})
+        
+        cache.observe_watermark('2024-01-16@t2')
+        
+        assert len(cache['results'].memory) == 0
+        assert len(cache['sql'].memory) == 1
+    
+    def test_watermark_round_trip(self):
+        """Test that the watermark keeps the latest date and changes on every write"""
+        with mock_aws():
+            s3 = boto3.client('s3', region_name='us-east-1')
+            s3.create_bucket(Bucket='curated')
+            
+            assert read_watermark(s3, 'curated') is None
+            write_watermark(s3, 'curated', '2024-01-16')
+            first = read_watermark(s3, 'curated')
+            mark = write_watermark(s3, 'curated', '2020-05-01')
+            
+            assert mark['latest_date'] == '2024-01-16'
+            assert first.startswith('2024-01-16@')
+            assert read_watermark(s3, 'curated') != first
+            
+            store = S3Store(s3, 'curated')
+            store.put('sql/q', 'SELECT 1', 2000.0)
+            assert store.get('sql/q') == (2000.0, 'SELECT 1')
+            assert store.get('sql/missing') is None
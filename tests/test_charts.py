@@ -0,0 +1,73 @@
+import pytest
+import numpy as np
+from datetime import date, timedelta
+from stox_common.charts import infer_types, lttb, series_axis, shape
+
+def reference_lttb(x, y, points):
+    """LTTB as first published, one point at a time"""
+    n = len(x)
+    edge = lambda i: i * (n - 2) // (points - 2) + 1
+    selected, a = [0], 0
+    for i in range(points - 2):
+        start, end = edge(i), edge(i + 1)
+        next_start, next_end = end, min(edge(i + 2), n)
+        avg_x = sum(x[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(y[next_start:next_end]) / (next_end - next_start)
+        areas = [abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a])) for j in range(start, end)]
+        a = start + areas.index(max(areas))
+        selected.append(a)
+    return selected + [n - 1]
+
+def daily(closes, start=date(2021, 1, 4)):
+    return [[start + timedelta(days=i), close] for i, close in enumerate(closes)]
+
+class TestLttb:
+    
+    @pytest.mark.parametrize('n,points', [(1000, 100), (1258, 200), (10, 3), (101, 100)])
+    def test_matches_reference(self, n, points):
+        """Test that the vectorized LTTB picks the same points as the one-point-at-a-time algorithm"""
+        rng = np.random.default_rng(n)
+        x = np.sort(rng.choice(10 * n, n, replace=False)).astype(float)
+        y = np.cumsum(rng.normal(size=n))
+        
+        assert lttb(x, y, points).tolist() == reference_lttb(x.tolist(), y.tolist(), points)
+    
+    def test_short_series_kept(self):
+        """Test that a series with no more points than the target is returned whole"""
+        assert lttb(np.arange(5.0), np.arange(5.0), 5).tolist() == [0, 1, 2, 3, 4]
+        assert lttb(np.arange(5.0), np.arange(5.0), 50).tolist() == [0, 1, 2, 3, 4]
+
+class TestShape:
+    
+    def test_time_series_chart(self):
+        """Test that a daily series becomes a typed column-major chart keeping its extremes"""
+        closes = [100.0 + (i % 20) for i in range(1000)]
+        closes[321], closes[654] = 300.0, 10.0
+        rows = [[day.isoformat(), 'AAPL', close] for day, close in daily(closes)]
+        
+        chart = shape(['date', 'ticker', 'close'], rows, 100, types=['date', 'varchar', 'double'])
+        
+        assert chart['x'] == 'date' and chart['types'] == ['date', 'varchar', 'double']
+        assert (chart['rows'], chart['points'], chart['method']) == (1000, 100, 'lttb')
+        dates, tickers, values = chart['data']
+        assert dates[0] == '2021-01-04' and dates[-1] == rows[-1][0] and dates == sorted(dates)
+        assert set(tickers) == {'AAPL'} and {300.0, 10.0} <= set(values)
+    
+    def test_not_time_series(self):
+        """Test that several tickers, unordered dates or no numeric column give no chart"""
+        rows = daily([1.0, 2.0, 3.0, 4.0])
+        
+        assert shape(['date', 'close'], rows, 100)['method'] == 'none'
+        assert shape(['date', 'close'], rows[::-1], 100) is None
+        assert shape(['date', 'ticker', 'close'], [[d, t, c] for (d, c), t in zip(rows, 'ABAB')], 100) is None
+        assert shape(['date', 'ticker'], [[d, 'AAPL'] for d, _ in rows], 100) is None
+        assert series_axis(['varchar', 'double']) is None and series_axis(['double', 'timestamp']) == 1
+    
+    def test_nulls_and_inferred_types(self):
+        """Test that rows with a NULL value are left out and types are inferred without ColumnInfo"""
+        rows = daily([None, 2.0, 3.0, None, 5.0])
+        
+        chart = shape(['date', 'sma'], rows, 100)
+        
+        assert infer_types(rows, 2) == ['date', 'double']
+        assert chart['rows'] == 5 and chart['data'][1] == [2.0, 3.0, 5.0]
@@ -0,0 +1,32 @@
+from unittest.mock import patch
+from stox_common import clients
+from stox_common.s3io import pooled_s3_client
+
+class TestClients:
+    
+    @patch.dict('os.environ', {'AWS_DEFAULT_REGION': 'us-east-1', 'CLIENT_MAX_POOL_CONNECTIONS': '16'})
+    def test_client_reused_with_tuned_config(self):
+        """Test that each service/region gets one client with the pool, keep-alive and retry settings"""
+        clients.clear()
+        s3 = clients.get('s3')
+        config = s3.meta.config
+        
+        assert clients.get('s3') is s3
+        assert clients.get('s3', region_name='eu-west-1') is not s3
+        assert config.max_pool_connections == 16 and config.tcp_keepalive
+        assert config.retries['total_max_attempts'] == 3 and config.retries['mode'] == 'standard'
+        assert clients.config('bedrock-runtime').read_timeout > config.read_timeout
+        clients.clear()
+    
+    @patch.dict('os.environ', {'AWS_DEFAULT_REGION': 'us-east-1', 'CLIENT_MAX_POOL_CONNECTIONS': '16'})
+    def test_pooled_s3_client_uses_shared_clients(self):
+        """Test that upload pools get the shared S3 client, or a cached one with only the pool size overridden"""
+        clients.clear()
+        
+        assert pooled_s3_client(8) is clients.get('s3')
+        larger = pooled_s3_client(64)
+        
+        assert larger is pooled_s3_client(64) is clients.get('s3', max_pool_connections=64)
+        assert larger.meta.config.max_pool_connections == 64
+        assert larger.meta.config.retries == clients.get('s3').meta.config.retries
+        clients.clear()
@@ -0,0 +1,144 @@
+import pytest
+import boto3
+import json
+from datetime import date
+from moto import mock_aws
+from stox_common.compaction import compact, load_manifest, is_closed
+from stox_common.writers import to_csv
+
+def price_row(day, close):
+    return {'date': day, 'open': close, 'high': close, 'low': close, 'close': close, 'volume': 100, 'adj_close': close}
+
+@pytest.fixture
+def aws():
+    with mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        glue = boto3.client('glue', region_name='us-east-1')
+        s3.create_bucket(Bucket='curated')
+        glue.create_database(DatabaseInput={'Name': 'stox'})
+        glue.create_table(DatabaseName='stox', TableInput={
+            'Name': 'prices',
+            'PartitionKeys': [{'Name': 'ticker', 'Type': 'string'}, {'Name': 'year', 'Type': 'int'},
+                              {'Name': 'month', 'Type': 'int'}],
+            'StorageDescriptor': {
+                'Columns': [{'Name': 'date', 'Type': 'date'}, {'Name': 'close', 'Type': 'double'}],
+                'Location': 's3://curated/prices/',
+                'InputFormat': 'org.apache.hadoop.mapred.TextInputFormat',
+                'SerdeInfo': {'SerializationLibrary': 'org.apache.hadoop.hive.serde2.lazy.LazySimpleSerDe'}
+            }
+        })
+        yield s3, glue
+
+def put_day(s3, ticker, day, close):
+    y, m, d = day.split('-')
+    s3.put_object(Bucket='curated', Key=f'prices/ticker={ticker}/year={y}/month={m}/day={d}/data.csv',
+                  Body=to_csv([price_row(day, close)]))
+
+class RejectingGlue:
+    """Glue client that rejects location updates of one partition, like a failed BatchUpdatePartition entry"""
+    
+    def __init__(self, glue, values):
+        self.glue = glue
+        self.values = values
+    
+    def __getattr__(self, name):
+        return getattr(self.glue, name)
+    
+    def batch_update_partition(self, Entries, **kwargs):
+        accepted = [e for e in Entries if e['PartitionValueList'] != self.values]
+        response = self.glue.batch_update_partition(Entries=accepted, **kwargs) if accepted else {}
+        error = {'PartitionValueList': self.values,
+                 'ErrorDetail': {'ErrorCode': 'InternalServiceException', 'ErrorMessage': 'rejected'}}
+        return {'Errors': response.get('Errors', []) + [error]}
+
+class TestCompaction:
+    
+    def test_is_closed(self):
+        """Test the grace period after the end of a month"""
+        assert not is_closed(('AAPL', '2024', '01'), date(2024, 2, 2), grace_days=3)
+        assert is_closed(('AAPL', '2024', '01'), date(2024, 2, 4), grace_days=3)
+        assert is_closed(('AAPL', '2023', '12'), date(2024, 1, 4), grace_days=3)
+    
+    def test_compacts_closed_months_incrementally(self, aws):
+        """Test compaction, the location switch and that reruns only process new data"""
+        s3, glue = aws
+        for day, close in [('2024-01-02', 10.0), ('2024-01-03', 11.0), ('2024-01-04', 12.0)]:
+            put_day(s3, 'AAPL', day, close)
+        put_day(s3, 'AAPL', '2024-02-01', 13.0)
+        
+        first = compact(s3, glue, 'curated', 'stox', today=date(2024, 2, 10), run_id='r1')
+        
+        assert first['partitions_compacted'] == 1
+        assert first['rows'] == 3
+        partition = glue.get_partition(DatabaseName='stox', TableName='prices', PartitionValues=['AAPL', '2024', '01'])
+        assert partition['Partition']['StorageDescriptor']['Location'] == 's3://curated/compacted/ticker=AAPL/year=2024/month=01/v=r1/'
+        body = s3.get_object(Bucket='curated', Key='compacted/ticker=AAPL/year=2024/month=01/v=r1/data.csv')['Body'].read().decode()
+        assert [line.split(',')[0] for line in body.splitlines()] == ['date', '2024-01-02', '2024-01-03', '2024-01-04']
+        
+        second = compact(s3, glue, 'curated', 'stox', today=date(2024, 2, 10), run_id='r2')
+        assert second['partitions_compacted'] == 0
+        
+        # A late write into January makes it eligible again
+        put_day(s3, 'AAPL', '2024-01-05', 14.0)
+        third = compact(s3, glue, 'curated', 'stox', today=date(2024, 2, 10), run_id='r3')
+        assert third['partitions_compacted'] == 1
+        assert third['rows'] == 4
+        manifest = load_manifest(s3, 'curated')
+        assert manifest['partitions']['AAPL/2024/01']['prefix'].endswith('v=r3/')
+        assert manifest['partitions']['AAPL/2024/01']['previous_prefix'].endswith('v=r1/')
+    
+    def test_rejected_location_switch_is_retried(self, aws):
+        """Test that a partition Glue rejects keeps its files, stays pending and is not recorded as compacted"""
+        s3, glue = aws
+        put_day(s3, 'AAPL', '2024-01-02', 10.0)
+        put_day(s3, 'MSFT', '2024-01-02', 20.0)
+        compact(s3, glue, 'curated', 'stox', today=date(2024, 2, 10), run_id='r1')
+        put_day(s3, 'AAPL', '2024-01-03', 11.0)
+        put_day(s3, 'MSFT', '2024-01-03', 21.0)
+        
+        result = compact(s3, RejectingGlue(glue, ['AAPL', '2024', '01']), 'curated', 'stox',
+                         today=date(2024, 2, 10), run_id='r2')
+        
+        assert (result['partitions_compacted'], result['partitions_failed']) == (1, 1)
+        partition = glue.get_partition(DatabaseName='stox', TableName='prices', PartitionValues=['AAPL', '2024', '01'])
+        location = partition['Partition']['StorageDescriptor']['Location']
+        assert location == 's3://curated/compacted/ticker=AAPL/year=2024/month=01/v=r1/'
+        keys = [o['Key'] for o in s3.list_objects_v2(Bucket='curated', Prefix='compacted/ticker=AAPL/')['Contents']]
+        assert keys == ['compacted/ticker=AAPL/year=2024/month=01/v=r1/data.csv']
+        manifest = load_manifest(s3, 'curated')
+        assert manifest['partitions']['AAPL/2024/01']['prefix'].endswith('v=r1/')
+        assert manifest['partitions']['MSFT/2024/01']['prefix'].endswith('v=r2/')
+        
+        retry = compact(s3, glue, 'curated', 'stox', today=date(2024, 2, 10), run_id='r3')
+        assert (retry['partitions_compacted'], retry['rows']) == (1, 2)
+    
+    def test_max_partitions_defers_work(self, aws):
+        """Test that a run is bounded and the rest is left for the next run"""
+        s3, glue = aws
+        for ticker in ('AAPL', 'MSFT', 'TSLA'):
+            put_day(s3, ticker, '2024-01-02', 10.0)
+        
+        result = compact(s3, glue, 'curated', 'stox', today=date(2024, 3, 1), max_partitions=2, run_id='r1')
+        
+        assert result['partitions_compacted'] == 2
+        assert result['partitions_deferred'] == 1
+        assert compact(s3, glue, 'curated', 'stox', today=date(2024, 3, 1), run_id='r2')['partitions_compacted'] == 1
+    
+    def test_parquet_table_compacts_to_parquet(self, aws):
+        """Test that a Parquet table gets one Parquet file per partition"""
+        pq = pytest.importorskip('pyarrow.parquet')
+        s3, glue = aws
+        table = glue.get_table(DatabaseName='stox', Name='prices')['Table']
+        table['StorageDescriptor']['InputFormat'] = 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat'
+        glue.update_table(DatabaseName='stox', TableInput={
+            k: table[k] for k in ('Name', 'PartitionKeys', 'StorageDescriptor')
+        })
+        put_day(s3, 'AAPL', '2024-01-02', 10.0)
+        put_day(s3, 'AAPL', '2024-01-03', 11.0)
+        
+        result = compact(s3, glue, 'curated', 'stox', today=date(2024, 3, 1), run_id='r1')
+        
+        assert result['format'] == 'parquet'
+        body = s3.get_object(Bucket='curated', Key='compacted/ticker=AAPL/year=2024/month=01/v=r1/data.parquet')['Body'].read()
+        import io
+        assert pq.read_table(io.BytesIO(body)).column('close').to_pylist() == [10.0, 11.0]
@@ -0,0 +1,141 @@
+import pytest
+import boto3
+import json
+import numpy as np
+from datetime import date, timedelta
+from unittest.mock import patch
+from moto import mock_aws
+from stox_common.fastpath import LocalEngine, parse_question, rolling_mean, rolling_std
+from stox_common.series import from_rows, load_series, merge, update_series
+
+TODAY = date(2024, 3, 29)
+
+def make_series(closes, end=TODAY):
+    rows = []
+    for i, close in enumerate(closes):
+        day = (end - timedelta(days=len(closes) - 1 - i)).isoformat()
+        rows.append({'date': day, 'open': close, 'high': close, 'low': close, 'close': close,
+                     'volume': 100, 'adj_close': close})
+    return from_rows(rows)
+
+def engine(series):
+    return LocalEngine(series.get, watchlist=list(series), today=lambda: TODAY)
+
+class TestParseQuestion:
+    
+    def test_presets(self):
+        """Test that the web UI presets are recognized"""
+        known = ['AAPL', 'TSLA', 'GOOGL']
+        
+        assert parse_question('7-day SMA of AAPL for last 30 days', known) == \
+            {'intent': 'sma', 'tickers': ['AAPL'], 'window': 7, 'period': 30}
+        assert parse_question('Best performer YTD on my watchlist', known)['tickers'] == ['AAPL', 'GOOGL', 'TSLA']
+        assert parse_question('Max drawdown of TSLA YTD', known)['period'] == 'ytd'
+        assert parse_question('Show me GOOGL price trend for last 60 days', known)['intent'] == 'trend'
+    
+    def test_unrecognized(self):
+        """Test that other questions fall back"""
+        assert parse_question('Show me AAPL price') is None
+        assert parse_question('Correlation between AAPL and MSFT') is None
+        assert parse_question('SMA of AAPL and MSFT') is None
+    
+    @pytest.mark.parametrize('question', [
+        'Max drawdown of TSLA in 2022',
+        'AAPL drawdown since 2020',
+        'Best performer in 2023',
+        'Volatility of MSFT last quarter',
+        '7-day SMA of AAPL between January and March',
+        'GOOGL trend from March to June',
+        'Volatility of MSFT this month',
+    ])
+    def test_other_periods_fall_back(self, question):
+        """Test that a time qualifier the presets cannot express falls back instead of getting a default period"""
+        assert parse_question(question, ['AAPL', 'TSLA', 'GOOGL', 'MSFT']) is None
+    
+    def test_over_and_single_unit_periods(self):
+        """Test that 'over N units' and 'last <unit>' set the period"""
+        assert parse_question('GOOGL trend over 5 years')['period'] == 5 * 365
+        assert parse_question('GOOGL trend over the past 2 weeks')['period'] == 14
+        assert parse_question('Volatility of MSFT last month')['period'] == 30
+
+class TestLocalEngine:
+    
+    def test_rolling_windows_match_naive(self):
+        """Test the vectorized rolling mean/std against a plain loop with partial leading windows"""
+        values = np.random.default_rng(1).normal(100, 5, 40)
+        
+        mean = rolling_mean(values, 7)
+        std = rolling_std(values, 5)
+        
+        for i in range(len(values)):
+            window = values[max(0, i - 6):i + 1]
+            assert mean[i] == pytest.approx(window.mean())
+            window = values[max(0, i - 4):i + 1]
+            if len(window) > 1:
+                assert std[i] == pytest.approx(window.std(ddof=1))
+        assert np.isnan(std[0])
+    
+    def test_sma(self):
+        """Test SMA rows over the requested period using history before it"""
+        closes = [float(c) for c in range(1, 101)]
+        result = engine({'AAPL': make_series(closes)}).answer('7-day SMA of AAPL for last 30 days')
+        
+        assert result['columns'] == ['date', 'close', 'sma_7']
+        assert len(result['rows']) == 31
+        assert result['rows'][-1] == [TODAY.isoformat(), 100.0, pytest.approx(97.0)]
+    
+    def test_drawdown_and_best_performer(self):
+        """Test max drawdown and the YTD ranking"""
+        series = {
+            'TSLA': make_series([100.0, 120.0, 90.0, 110.0]),
+            'AAPL': make_series([100.0, 101.0, 102.0, 103.0]),
+        }
+        
+        drawdown = engine(series).answer('Max drawdown of TSLA YTD')
+        best = engine(series).answer('Best performer YTD on my watchlist')
+        
+        assert drawdown['rows'] == [[pytest.approx(-0.25)]]
+        assert [row[0] for row in best['rows']] == ['TSLA', 'AAPL']
+        assert best['rows'][0][1] == pytest.approx(0.10)
+    
+    def test_missing_series_falls_back(self):
+        """Test that a ticker without a series returns None"""
+        assert engine({}).answer('Max drawdown of TSLA YTD') is None
+
+class TestSeries:
+    
+    def test_update_merges_and_overwrites(self):
+        """Test that updates keep one sorted row per date, newest values winning"""
+        with mock_aws():
+            s3 = boto3.client('s3', region_name='us-east-1')
+            s3.create_bucket(Bucket='curated')
+            row = {'open': 1.0, 'high': 1.0, 'low': 1.0, 'volume': 10, 'adj_close': 1.0}
+            
+            update_series(s3, 'curated', 'AAPL', [{**row, 'date': '2024-01-03', 'close': 3.0},
+                                                  {**row, 'date': '2024-01-02', 'close': 2.0}])
+            count = update_series(s3, 'curated', 'AAPL', [{**row, 'date': '2024-01-03', 'close': 30.0},
+                                                          {**row, 'date': '2024-01-04', 'close': 4.0}])
+            series = load_series(s3, 'curated', 'AAPL')
+            
+            assert count == 3
+            assert series['close'].tolist() == [2.0, 30.0, 4.0]
+            assert load_series(s3, 'curated', 'MSFT') is None
+
+class TestAgentFastPath:
+    
+    @patch.dict('os.environ', {'CURATED_BUCKET': 'curated', 'WATCHLIST': 'TSLA'})
+    @patch('lambdas.stox_agent.lambda_function.generate_sql')
+    @patch('lambdas.stox_agent.lambda_function.load_ticker_series')
+    def test_template_question_skips_bedrock(self, mock_load, mock_generate_sql):
+        """Test that a template question is answered locally in the usual response shape"""
+        from lambdas.stox_agent.lambda_function import lambda_handler
+        mock_load.return_value = make_series([100.0, 120.0, 90.0], end=date.today())
+        
+        result = lambda_handler({'body': json.dumps({'question': 'Max drawdown of TSLA YTD'})}, {})
+        
+        body = json.loads(result['body'])
+        assert result['statusCode'] == 200
+        assert body['engine'] == 'local'
+        assert body['columns'] == ['max_drawdown']
+        assert 'sql' in body and body['answer']
+        mock_generate_sql.assert_not_called()
@@ -0,0 +1,179 @@
+import pytest
+import boto3
+import csv
+import io
+import json
+import numpy as np
+from datetime import date, timedelta
+from moto import mock_aws
+from unittest.mock import patch
+from stox_common.fastpath import rolling_mean, rolling_std
+from stox_common.indicators import (RollingState, STATE_KEY, correlations, load_state, materialize,
+                                    pairwise_corr, series_tickers)
+from stox_common.series import from_rows, to_date, update_series
+
+START = date(2024, 1, 1)
+
+def price_rows(closes, start=START):
+    return [{'date': (start + timedelta(days=i)).isoformat(), 'open': c, 'high': c, 'low': c, 'close': c,
+             'volume': 100, 'adj_close': c} for i, c in enumerate(closes)]
+
+def read_csv(s3, key):
+    return list(csv.DictReader(io.StringIO(s3.get_object(Bucket='curated', Key=key)['Body'].read().decode())))
+
+class TestRollingState:
+    
+    def test_incremental_matches_full_history_windows(self):
+        """Test that day-by-day updates, with a JSON round trip in between, match full-history windows"""
+        closes = np.random.default_rng(7).normal(100, 3, 90)
+        days = [(START + timedelta(days=i)).isoformat() for i in range(len(closes))]
+        
+        state, rows = RollingState(), []
+        for i, (day, close) in enumerate(zip(days, closes)):
+            if i % 10 == 0:
+                state = RollingState.from_dict(json.loads(json.dumps(state.to_dict())))
+            rows.append(state.update('AAPL', day, float(close)))
+        
+        returns = closes[1:] / closes[:-1] - 1
+        vol = rolling_std(returns, 20)
+        peak = np.maximum.accumulate(closes)
+        drawdown = (closes - peak) / peak
+        assert rows[0]['daily_return'] is None and rows[0]['vol_20'] is None
+        for i, row in enumerate(rows):
+            assert row['sma_7'] == pytest.approx(rolling_mean(closes, 7)[i])
+            assert row['sma_20'] == pytest.approx(rolling_mean(closes, 20)[i])
+            assert row['max_drawdown'] == pytest.approx(drawdown[:i + 1].min())
+            if i > 1:
+                assert row['daily_return'] == pytest.approx(returns[i - 1])
+                assert row['vol_20'] == pytest.approx(vol[i - 1])
+        assert len(state.closes) == 20 and len(state.returns) == 60
+    
+    def test_replayed_days_are_ignored(self):
+        """Test that a day at or before the last one seen produces no row"""
+        state = RollingState()
+        state.update('AAPL', '2024-01-02', 10.0)
+        
+        assert state.update('AAPL', '2024-01-02', 11.0) is None
+        assert state.update('AAPL', '2024-01-01', 9.0) is None
+        assert state.closes == [10.0]
+    
+    def test_advance_starts_after_last_date(self):
+        """Test that advancing over a full series computes only the days after the state's last one"""
+        series = from_rows(price_rows([10.0 + i for i in range(30)]))
+        replayed = RollingState()
+        expected = replayed.advance('AAPL', series)
+        state = RollingState()
+        state.advance('AAPL', {k: v[:25] for k, v in series.items()})
+        
+        with patch('stox_common.indicators.to_date', wraps=to_date) as converted:
+            rows = state.advance('AAPL', series)
+        
+        assert rows == expected[25:] and converted.call_count == 5
+        assert state.advance('AAPL', series) == []
+
+class TestCorrelations:
+    
+    def test_matches_numpy_with_missing_days(self):
+        """Test pairwise correlation over the days both tickers have, skipping short overlaps"""
+        rng = np.random.default_rng(3)
+        base = rng.normal(0, 0.01, 60)
+        days = [(START + timedelta(days=i)).isoformat() for i in range(60)]
+        states = {
+            'AAPL': RollingState(returns=[[d, r] for d, r in zip(days, base)]),
+            'MSFT': RollingState(returns=[[d, r + rng.normal(0, 0.005)] for d, r in zip(days, base)][5:]),
+            'NEW': RollingState(returns=[[d, 0.01 * i] for i, d in enumerate(days[-5:])]),
+        }
+        
+        pairs = correlations(states, days[-1])
+        
+        assert [(p['ticker_a'], p['ticker_b']) for p in pairs] == [('AAPL', 'MSFT')]
+        expected = np.corrcoef(base[5:], [r for _, r in states['MSFT'].returns])[0, 1]
+        assert pairs[0]['corr_60'] == pytest.approx(expected)
+        assert pairs[0]['observations'] == 55
+    
+    def test_pairwise_matches_per_pair_corrcoef(self):
+        """Test that the one-step masked matrix matches np.corrcoef pair by pair on misaligned days"""
+        rng = np.random.default_rng(11)
+        matrix = rng.normal(0, 0.01, (6, 60))
+        matrix[rng.random(matrix.shape) < 0.3] = np.nan
+        matrix[5, 2:] = np.nan
+        
+        corr, counts = pairwise_corr(matrix)
+        
+        for i in range(6):
+            for j in range(i + 1, 6):
+                both = ~np.isnan(matrix[i]) & ~np.isnan(matrix[j])
+                assert counts[i, j] == both.sum()
+                if both.sum() >= 2:
+                    assert corr[i, j] == pytest.approx(np.corrcoef(matrix[i, both], matrix[j, both])[0, 1])
+                else:
+                    assert np.isnan(corr[i, j])
+
+class TestMaterialize:
+    
+    def test_bootstrap_then_incremental(self):
+        """Test that the first run replays the series and later runs only append new days"""
+        with mock_aws():
+            s3 = boto3.client('s3', region_name='us-east-1')
+            s3.create_bucket(Bucket='curated')
+            rng = np.random.default_rng(5)
+            for ticker in ('AAPL', 'MSFT'):
+                update_series(s3, 'curated', ticker, price_rows(100 + np.cumsum(rng.normal(0, 1, 40))))
+            
+            first = materialize(s3, 'curated', ['AAPL', 'MSFT'])
+            assert first['rows'] == 80 and first['version'] == 1
+            # One pair for each of the 20 days with at least CORR_MIN_PERIODS returns
+            assert first['as_of'] == '2024-02-09' and first['correlations'] == 20
+            assert len(read_csv(s3, 'indicators/year=2024/month=01/v000001.csv')) == 62
+            
+            update_series(s3, 'curated', 'AAPL', price_rows([120.0], START + timedelta(days=40)))
+            second = materialize(s3, 'curated', ['AAPL'])
+            rows = read_csv(s3, 'indicators/year=2024/month=02/v000002.csv')
+            assert second['rows'] == 1 and rows[0]['ticker'] == 'AAPL' and rows[0]['date'] == '2024-02-10'
+            assert read_csv(s3, 'correlations/year=2024/month=02/day=10/data.csv')[0]['ticker_b'] == 'MSFT'
+            
+            assert materialize(s3, 'curated', ['AAPL', 'MSFT'])['rows'] == 0
+            assert load_state(s3, 'curated')['version'] == 2
+    
+    def test_catch_up_writes_correlations_for_every_day(self):
+        """Test that a run over several new days writes each day's corr_60 from the 60 returns up to that day"""
+        with mock_aws():
+            s3 = boto3.client('s3', region_name='us-east-1')
+            s3.create_bucket(Bucket='curated')
+            rng = np.random.default_rng(8)
+            closes = {t: 100 + np.cumsum(rng.normal(0, 1, 100)) for t in ('AAPL', 'MSFT')}
+            for ticker, values in closes.items():
+                update_series(s3, 'curated', ticker, price_rows(values[:90]))
+            materialize(s3, 'curated', ['AAPL', 'MSFT'])
+            
+            for ticker, values in closes.items():
+                update_series(s3, 'curated', ticker, price_rows(values[90:], START + timedelta(days=90)))
+            caught_up = materialize(s3, 'curated', ['AAPL', 'MSFT'])
+            
+            assert caught_up['correlations'] == 10
+            returns = {t: v[1:] / v[:-1] - 1 for t, v in closes.items()}
+            for i in range(90, 100):
+                day = START + timedelta(days=i)
+                pair = read_csv(s3, f'correlations/year={day.year}/month={day.month:02d}/day={day.day:02d}/data.csv')
+                expected = np.corrcoef(returns['AAPL'][i - 60:i], returns['MSFT'][i - 60:i])[0, 1]
+                assert float(pair[0]['corr_60']) == pytest.approx(expected, rel=1e-8)
+                assert pair[0]['observations'] == '60'
+    
+    def test_rebuild_replaces_previous_output(self):
+        """Test that a rebuild drops old objects and state and replays every series"""
+        with mock_aws():
+            s3 = boto3.client('s3', region_name='us-east-1')
+            s3.create_bucket(Bucket='curated')
+            update_series(s3, 'curated', 'AAPL', price_rows([10.0, 11.0, 12.0]))
+            materialize(s3, 'curated', ['AAPL'])
+            materialize(s3, 'curated', ['AAPL'])
+            
+            # A backfill adds history before the state's last date
+            update_series(s3, 'curated', 'AAPL', price_rows([8.0, 9.0], START - timedelta(days=2)))
+            rebuilt = materialize(s3, 'curated', series_tickers(s3, 'curated'), rebuild=True)
+            
+            keys = [o['Key'] for o in s3.list_objects_v2(Bucket='curated', Prefix='indicators/')['Contents']]
+            assert rebuilt['rows'] == 5 and keys == ['indicators/year=2023/month=12/v000001.csv',
+                                                     'indicators/year=2024/month=01/v000001.csv']
+            state = json.loads(s3.get_object(Bucket='curated', Key=STATE_KEY)['Body'].read())
+            assert state['tickers']['AAPL']['max_drawdown'] == 0.0
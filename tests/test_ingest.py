@@ -1,7 +1,23 @@
 import pytest
 import json
+import os
+import subprocess
+import sys
+import boto3
+from moto import mock_aws
 from unittest.mock import patch, MagicMock
-from lambdas.stox_ingest.lambda_function import lambda_handler, fetch_stock_data, write_to_s3
+from lambdas.stox_ingest.lambda_function import (
+    lambda_handler, fetch_with_retry, write_to_s3, RateLimitError
+)
+from stox_common.cache import write_watermark
+from stox_common.providers import MockProvider
+from stox_common.ratelimit import TokenBucket
+from stox_common.series import update_series
+
+ROW = {
+    'date': '2024-01-15', 'open': 100.0, 'high': 105.0, 'low': 99.0,
+    'close': 103.0, 'volume': 1000000, 'adj_close': 103.0
+}
 
 class TestStoxIngest:
     
@@ -10,19 +26,12 @@ class TestStoxIngest:
         'WATCHLIST': 'AAPL,MSFT',
         'ALPHAVANTAGE_API_KEY': 'test-key'
     })
+    @patch('lambdas.stox_ingest.lambda_function.get_glue_client')
     @patch('lambdas.stox_ingest.lambda_function.s3_client')
-    @patch('lambdas.stox_ingest.lambda_function.fetch_stock_data')
-    def test_lambda_handler_success(self, mock_fetch, mock_s3):
+    @patch('lambdas.stox_ingest.lambda_function.get_provider')
+    def test_lambda_handler_success(self, mock_provider, mock_s3, mock_get_glue):
         """Test successful lambda execution"""
-        mock_fetch.return_value = {
-            'date': '2024-01-15',
-            'open': 100.0,
-            'high': 105.0,
-            'low': 99.0,
-            'close': 103.0,
-            'volume': 1000000,
-            'adj_close': 103.0
-        }
+        mock_provider.return_value = MockProvider({'AAPL': [ROW], 'MSFT': [ROW]})
         
         result = lambda_handler({}, {})
         
@@ -31,43 +40,43 @@ class TestStoxIngest:
         assert 'AAPL' in body['results']
         assert 'MSFT' in body['results']
         assert body['results']['AAPL']['status'] == 'success'
+        # Both tickers land in January 2024: one batch registers both partitions
+        mock_glue = mock_get_glue.return_value
+        assert mock_glue.batch_create_partition.call_count == 1
+        partition_inputs = mock_glue.batch_create_partition.call_args[1]['PartitionInputList']
+        assert [p['Values'] for p in partition_inputs] == [['AAPL', '2024', '01'], ['MSFT', '2024', '01']]
+        assert partition_inputs[0]['StorageDescriptor']['Location'] == 's3://test-bucket/prices/ticker=AAPL/year=2024/month=01/'
     
-    @patch('lambdas.stox_ingest.lambda_function.requests.get')
-    def test_fetch_stock_data_success(self, mock_get):
-        """Test successful API data fetch"""
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
-            'Time Series (Daily)': {
-                '2024-01-15': {
-                    '1. open': '100.00',
-                    '2. high': '105.00',
-                    '3. low': '99.00',
-                    '4. close': '103.00',
-                    '5. volume': '1000000',
-                    '5. adjusted close': '103.00'
-                }
-            }
-        }
-        mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
+    @patch.dict('os.environ', {
+        'CURATED_BUCKET': 'test-bucket',
+        'WATCHLIST': 'AAPL,MSFT',
+        'ALPHAVANTAGE_API_KEY': 'test-key',
+        'PARTITION_MODE': 'projection'
+    })
+    @patch('stox_common.indicators.materialize')
+    @patch('lambdas.stox_ingest.lambda_function.s3_client')
+    @patch('lambdas.stox_ingest.lambda_function.get_provider')
+    def test_lambda_handler_materializes_indicators(self, mock_provider, mock_s3, mock_materialize):
+        """Test that indicators are updated for the tickers that were written"""
+        mock_provider.return_value = MockProvider({'AAPL': [ROW]})
+        mock_materialize.return_value = {'version': 3, 'rows': 1, 'objects': 1, 'correlations': 0,
+                                         'as_of': '2024-01-15'}
         
-        result = fetch_stock_data('AAPL', 'test-key')
+        result = lambda_handler({}, {})
         
-        assert result['date'] == '2024-01-15'
-        assert result['open'] == 100.0
-        assert result['close'] == 103.0
-        assert result['volume'] == 1000000
+        body = json.loads(result['body'])
+        mock_materialize.assert_called_once_with(mock_s3, 'test-bucket', ['AAPL'])
+        assert body['indicators']['as_of'] == '2024-01-15'
     
-    @patch('lambdas.stox_ingest.lambda_function.requests.get')
-    def test_fetch_stock_data_api_error(self, mock_get):
-        """Test API error handling"""
-        mock_response = MagicMock()
-        mock_response.json.return_value = {'Error Message': 'Invalid API call'}
-        mock_response.raise_for_status.return_value = None
-        mock_get.return_value = mock_response
-        
-        with pytest.raises(Exception, match="Alpha Vantage error"):
-            fetch_stock_data('INVALID', 'test-key')
+    def test_import_does_not_load_numpy(self):
+        """Test that importing the ingest handler leaves NumPy unloaded until indicators or series need it"""
+        code = ("import sys; sys.path.insert(0, 'layers/common/python'); "
+                "import lambdas.stox_ingest.lambda_function; print('numpy' in sys.modules)")
+        
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+        
+        assert output.strip() == 'False'
     
     @patch('lambdas.stox_ingest.lambda_function.s3_client')
     def test_write_to_s3(self, mock_s3):
@@ -82,10 +91,10 @@ class TestStoxIngest:
             'adj_close': 103.0
         }
         
-        result = write_to_s3(data, 'AAPL', 'test-bucket')
+        result = write_to_s3([data], 'AAPL', 'test-bucket')
         
         expected_key = 'prices/ticker=AAPL/year=2024/month=01/day=15/data.csv'
-        assert result == expected_key
+        assert result == [expected_key]
         
         mock_s3.put_object.assert_called_once()
         call_args = mock_s3.put_object.call_args
@@ -93,3 +102,140 @@ class TestStoxIngest:
         assert call_args[1]['Key'] == expected_key
         assert call_args[1]['ContentType'] == 'text/csv'
         assert 'date,open,high,low,close,volume,adj_close' in call_args[1]['Body']
+    
+    @patch('lambdas.stox_ingest.lambda_function.time.sleep')
+    def test_fetch_with_retry_backs_off_on_rate_limit(self, mock_sleep):
+        """Test that a throttling Note is retried after a backoff"""
+        provider = MagicMock()
+        provider.fetch.side_effect = [RateLimitError('API limit reached'), {'AAPL': [{'date': '2024-01-15'}]}]
+        limiter = TokenBucket.per_minute(600, burst=5)
+        
+        data, attempts = fetch_with_retry(provider, ['AAPL'], limiter, retries=2, backoff=1.0)
+        
+        assert data == {'AAPL': [{'date': '2024-01-15'}]}
+        assert attempts == 2
+        assert mock_sleep.call_count >= 1
+    
+    @patch('lambdas.stox_ingest.lambda_function.time.sleep')
+    def test_fetch_with_retry_gives_up(self, mock_sleep):
+        """Test that retries are bounded"""
+        provider = MagicMock()
+        provider.fetch.side_effect = RateLimitError('API limit reached')
+        limiter = TokenBucket.per_minute(600, burst=5)
+        
+        with pytest.raises(RateLimitError):
+            fetch_with_retry(provider, ['AAPL'], limiter, retries=1, backoff=0)
+        assert provider.fetch.call_count == 2
+    
+    @patch.dict('os.environ', {
+        'CURATED_BUCKET': 'test-bucket',
+        'WATCHLIST': 'AAPL, msft ,GOOGL',
+        'ALPHAVANTAGE_API_KEY': 'test-key',
+        'INGEST_CONCURRENCY': '3',
+        'ALPHAVANTAGE_CALLS_PER_MINUTE': '600'
+    })
+    @patch('lambdas.stox_ingest.lambda_function.s3_client')
+    @patch('lambdas.stox_ingest.lambda_function.get_provider')
+    def test_lambda_handler_reports_latency_stats(self, mock_provider, mock_s3):
+        """Test per-ticker latency and aggregate stats in the response"""
+        mock_provider.return_value = MockProvider({}, batch_size=2)
+        
+        result = lambda_handler({}, {})
+        
+        body = json.loads(result['body'])
+        assert set(body['results']) == {'AAPL', 'MSFT', 'GOOGL'}
+        assert all('latency_ms' in r for r in body['results'].values())
+        assert body['stats']['tickers'] == 3
+        assert body['stats']['latency']['count'] == 3
+        assert body['stats']['requests'] == 2
+        assert body['stats']['rate_limit_retries'] == 0
+    
+    @patch.dict('os.environ', {'PRICES_FORMAT': 'parquet'})
+    @patch('lambdas.stox_ingest.lambda_function.s3_client')
+    def test_write_to_s3_parquet(self, mock_s3):
+        """Test that PRICES_FORMAT switches the object to Parquet"""
+        data = {
+            'date': '2024-01-15',
+            'open': 100.0,
+            'high': 105.0,
+            'low': 99.0,
+            'close': 103.0,
+            'volume': 1000000,
+            'adj_close': 103.0
+        }
+        
+        result = write_to_s3([data], 'AAPL', 'test-bucket')
+        
+        assert result == ['prices/ticker=AAPL/year=2024/month=01/day=15/data.parquet']
+        call_args = mock_s3.put_object.call_args
+        assert call_args[1]['Body'][:4] == b'PAR1'
+    
+    @patch.dict('os.environ', {
+        'CURATED_BUCKET': 'test-bucket',
+        'WATCHLIST': 'AAPL,MSFT',
+        'ALPHAVANTAGE_API_KEY': 'test-key',
+        'PARTITION_MODE': 'projection',
+        'INDICATORS': 'off',
+        'AWS_DEFAULT_REGION': 'us-east-1'
+    })
+    @patch('lambdas.stox_ingest.lambda_function.get_provider')
+    def test_lambda_handler_catches_up_from_manifest(self, mock_provider):
+        """Test that days past each ticker's watermark are written in one object per month, once"""
+        days = ['2024-01-29', '2024-01-30', '2024-01-31', '2024-02-01', '2024-02-02']
+        rows = [{'date': d, 'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0, 'volume': 10, 'adj_close': 1.0}
+                for d in days]
+        mock_provider.return_value = MockProvider({'AAPL': rows, 'MSFT': rows})
+        with mock_aws():
+            s3 = boto3.client('s3', region_name='us-east-1')
+            s3.create_bucket(Bucket='test-bucket')
+            s3.put_object(Bucket='test-bucket', Key='manifests/ingest.json', Body=json.dumps({'tickers': {
+                'AAPL': {'last_date': '2024-01-29', 'updated_at': 'x'},
+                'MSFT': {'last_date': '2023-12-01', 'updated_at': 'x'}
+            }}))
+            with patch('lambdas.stox_ingest.lambda_function.s3_client', s3):
+                first = json.loads(lambda_handler({}, {})['body'])
+                second = json.loads(lambda_handler({}, {})['body'])
+            manifest = json.loads(s3.get_object(Bucket='test-bucket', Key='manifests/ingest.json')['Body'].read())
+            body = s3.get_object(Bucket='test-bucket',
+                                 Key='prices/ticker=AAPL/year=2024/month=01/day=30/data.csv')['Body'].read().decode()
+        
+        aapl, msft = first['results']['AAPL'], first['results']['MSFT']
+        assert aapl['s3_keys'] == ['prices/ticker=AAPL/year=2024/month=01/day=30/data.csv',
+                                   'prices/ticker=AAPL/year=2024/month=02/day=01/data.csv']
+        assert aapl['days'] == 4 and 'gap' not in aapl
+        assert body.count('2024-01-3') == 2
+        assert msft['days'] == 5
+        assert msft['gap'] == {'from': '2023-12-04', 'to': '2024-01-28', 'weekdays': 40}
+        assert first['stats']['gaps'] == ['MSFT'] and first['watermark']['latest_date'] == '2024-02-02'
+        assert manifest['tickers']['AAPL']['last_date'] == '2024-02-02'
+        assert {r['status'] for r in second['results'].values()} == {'up_to_date'}
+        assert second['stats']['days_written'] == 0
+    
+    @patch.dict('os.environ', {
+        'CURATED_BUCKET': 'test-bucket',
+        'WATCHLIST': 'AAPL,MSFT,TSLA',
+        'ALPHAVANTAGE_API_KEY': 'test-key',
+        'PARTITION_MODE': 'projection',
+        'INDICATORS': 'off',
+        'AWS_DEFAULT_REGION': 'us-east-1'
+    })
+    @patch('lambdas.stox_ingest.lambda_function.get_provider')
+    def test_unrecorded_ticker_starts_from_its_own_series(self, mock_provider):
+        """Test that a ticker missing from the manifest resumes after its own last stored day, not the watermark"""
+        days = ['2024-01-29', '2024-01-30', '2024-01-31', '2024-02-01', '2024-02-02']
+        rows = [{'date': d, 'open': 1.0, 'high': 1.0, 'low': 1.0, 'close': 1.0, 'volume': 10, 'adj_close': 1.0}
+                for d in days]
+        mock_provider.return_value = MockProvider({'AAPL': rows, 'MSFT': rows, 'TSLA': rows})
+        with mock_aws():
+            s3 = boto3.client('s3', region_name='us-east-1')
+            s3.create_bucket(Bucket='test-bucket')
+            # AAPL is current, which moves the data watermark; MSFT lags behind and TSLA has nothing stored
+            write_watermark(s3, 'test-bucket', '2024-02-02')
+            update_series(s3, 'test-bucket', 'AAPL', rows)
+            update_series(s3, 'test-bucket', 'MSFT', rows[:2])
+            with patch('lambdas.stox_ingest.lambda_function.s3_client', s3):
+                results = json.loads(lambda_handler({}, {})['body'])['results']
+        
+        assert results['AAPL']['status'] == 'up_to_date'
+        assert results['MSFT']['days'] == 3 and results['MSFT']['s3_keys'][0].endswith('day=31/data.csv')
+        assert results['TSLA']['days'] == 1 and results['TSLA']['latest'] == '2024-02-02'
@@ -0,0 +1,101 @@
+import pytest
+import os
+from datetime import date
+from unittest.mock import patch
+from lambdas.stox_agent.lambda_function import execute_athena_query
+from stox_common import athena
+from stox_common.layout import DAILY, MONTHLY, group_rows
+from stox_common.localathena import LocalAthena, cell
+from stox_common.providers import synthetic_rows
+from stox_common.writers import CsvWriter, ParquetWriter
+
+def write_prices(root, ticker, start, end, layout, writer=CsvWriter()):
+    for key, rows in group_rows(ticker, synthetic_rows(ticker, start, end), layout, writer.filename).items():
+        path = os.path.join(root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        body = writer.serialize(rows)
+        with open(path, 'wb') as f:
+            f.write(body.encode() if isinstance(body, str) else body)
+
+def query(client, sql, page_size=1000):
+    execution = athena.run_query(client, sql, 'stox', 's3://local/')
+    column_info, rows = athena.stream_results(client, execution['QueryExecutionId'], page_size=page_size)
+    return [col['Name'] for col in column_info], list(rows)
+
+class TestLocalAthena:
+    
+    def test_reads_daily_and_monthly_objects(self, tmp_path):
+        """Test that daily and monthly CSV objects and Parquet files form one typed stox.prices"""
+        write_prices(str(tmp_path), 'AAPL', date(2024, 1, 1), date(2024, 2, 29), MONTHLY)
+        write_prices(str(tmp_path), 'AAPL', date(2024, 3, 1), date(2024, 3, 15), DAILY)
+        write_prices(str(tmp_path), 'MSFT', date(2024, 1, 1), date(2024, 3, 15), MONTHLY, ParquetWriter())
+        client = LocalAthena(str(tmp_path))
+        
+        columns, rows = query(client, "SELECT ticker, count(*), min(date), max(date), sum(volume) FROM stox.prices "
+                                      "GROUP BY ticker ORDER BY ticker", page_size=2)
+        
+        expected = synthetic_rows('AAPL', date(2024, 1, 1), date(2024, 2, 29)) + \
+            synthetic_rows('AAPL', date(2024, 3, 1), date(2024, 3, 15))
+        assert columns == ['ticker', 'count_star()', 'min(date)', 'max(date)', 'sum(volume)']
+        assert rows[0] == ['AAPL', len(expected), date(2024, 1, 1), date(2024, 3, 15),
+                           sum(r['volume'] for r in expected)]
+        assert rows[1][:2] == ['MSFT', len(expected)]
+        latest = "SELECT close FROM stox.prices WHERE ticker = 'AAPL' AND date = DATE '2024-03-15'"
+        assert query(client, latest)[1] == [[expected[-1]['close']]]
+    
+    def test_views_and_catalog_statements(self, tmp_path):
+        """Test that sql/views.sql runs on the local tables and MSCK REPAIR picks up a new layout"""
+        client = LocalAthena(str(tmp_path))
+        assert query(client, "SELECT count(*) FROM stox.v_returns")[1] == [[0]]
+        
+        write_prices(str(tmp_path), 'AAPL', date(2024, 1, 1), date(2024, 1, 31), MONTHLY)
+        execution = athena.run_query(client, 'MSCK REPAIR TABLE stox.prices', 'stox', 's3://local/')
+        _, rows = query(client, "SELECT date, daily_return FROM stox.v_returns ORDER BY date")
+        
+        closes = [r['close'] for r in synthetic_rows('AAPL', date(2024, 1, 1), date(2024, 1, 31))]
+        assert execution['Status']['State'] == 'SUCCEEDED'
+        assert len(rows) == len(closes) - 1
+        assert rows[0][1] == pytest.approx(closes[1] / closes[0] - 1)
+    
+    def test_failed_query_and_cells(self, tmp_path):
+        """Test that SQL DuckDB rejects fails like an Athena query and values become Athena strings"""
+        client = LocalAthena(str(tmp_path), views='')
+        
+        with pytest.raises(athena.QueryFailed, match='approx_percentile'):
+            athena.run_query(client, "SELECT approx_percentile(close, 0.5) FROM stox.prices", 'stox', 's3://local/')
+        assert query(client, "SELECT true, NULL, 1.5::DECIMAL(4, 2), TIMESTAMP '2024-01-02 03:04:05'")[1] == [
+            [True, None, pytest.approx(1.5), athena._timestamp('2024-01-02 03:04:05')]
+        ]
+        assert cell(date(2024, 1, 2)) == {'VarCharValue': '2024-01-02'} and cell(None) == {}
+    
+    @patch('stox_common.athena._client', None)
+    def test_selected_by_environment(self, tmp_path):
+        """Test that ATHENA_BACKEND=duckdb routes the agent's queries to the local directory"""
+        write_prices(str(tmp_path), 'AAPL', date(2024, 1, 1), date(2024, 1, 31), MONTHLY)
+        env = {'ATHENA_BACKEND': 'duckdb', 'ATHENA_LOCAL_DIR': str(tmp_path), 'ATHENA_DB': 'stox',
+               'ATHENA_OUTPUT': 's3://local/'}
+        
+        with patch.dict('os.environ', env):
+            details = {}
+            sql = "SELECT date, close FROM stox.prices WHERE ticker = 'AAPL' ORDER BY date"
+            columns, rows = execute_athena_query(sql, max_rows=3, details=details)
+            assert isinstance(athena.get_client(), LocalAthena)
+        
+        assert columns == ['date', 'close'] and len(rows) == 3
+        assert rows[0][0] == date(2024, 1, 1)
+        assert details['source'] == athena.EXECUTED and details['queue_ms'] == 0
+    
+    def test_series_read_past_max_rows(self, tmp_path):
+        """Test that a time-series result is read up to series_rows and any other result up to max_rows"""
+        write_prices(str(tmp_path), 'AAPL', date(2024, 1, 1), date(2024, 3, 31), MONTHLY)
+        env = {'ATHENA_BACKEND': 'duckdb', 'ATHENA_LOCAL_DIR': str(tmp_path), 'ATHENA_DB': 'stox',
+               'ATHENA_OUTPUT': 's3://local/'}
+        
+        with patch.dict('os.environ', env), patch('stox_common.athena._client', None):
+            details = {}
+            series = execute_athena_query("SELECT date, close FROM stox.prices ORDER BY date", max_rows=3,
+                                          details=details, series_rows=40)[1]
+            table = execute_athena_query("SELECT ticker, close FROM stox.prices", max_rows=3, series_rows=40)[1]
+        
+        assert len(series) == 40 and len(table) == 3
+        assert details['types'] == ['date', 'double']
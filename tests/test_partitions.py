@@ -0,0 +1,53 @@
+import pytest
+import boto3
+from moto import mock_aws
+from stox_common.partitions import GlueCatalog, partitions_of_keys
+
+@pytest.fixture
+def glue():
+    with mock_aws():
+        client = boto3.client('glue', region_name='us-east-1')
+        client.create_database(DatabaseInput={'Name': 'stox'})
+        client.create_table(DatabaseName='stox', TableInput={
+            'Name': 'prices',
+            'PartitionKeys': [{'Name': 'ticker', 'Type': 'string'}, {'Name': 'year', 'Type': 'int'},
+                              {'Name': 'month', 'Type': 'int'}],
+            'StorageDescriptor': {'Columns': [{'Name': 'close', 'Type': 'double'}], 'Location': 's3://curated/prices/'}
+        })
+        yield client
+
+class TestPartitions:
+    
+    def test_partitions_of_keys(self):
+        """Test partition extraction from daily and monthly keys"""
+        keys = [
+            'prices/ticker=AAPL/year=2024/month=01/day=15/data.csv',
+            'prices/ticker=AAPL/year=2024/month=01/day=16/data.csv',
+            'prices/ticker=MSFT/year=2023/month=12/data.parquet',
+            'manifests/compaction.json'
+        ]
+        
+        assert partitions_of_keys(keys) == {('AAPL', '2024', '01'), ('MSFT', '2023', '12')}
+    
+    def test_register_batches_and_is_idempotent(self, glue):
+        """Test batching into 100-entry calls and that reruns only report existing partitions"""
+        catalog = GlueCatalog(glue, 'stox')
+        partitions = [(f'T{i:03d}', '2024', '01') for i in range(150)]
+        
+        first = catalog.register('curated', partitions)
+        second = catalog.register('curated', partitions[:10] + [('NEW', '2024', '02')])
+        
+        assert first == {'created': 150, 'existing': 0, 'calls': 2}
+        assert second == {'created': 1, 'existing': 10, 'calls': 1}
+        partition = glue.get_partition(DatabaseName='stox', TableName='prices', PartitionValues=['NEW', '2024', '02'])
+        assert partition['Partition']['StorageDescriptor']['Location'] == 's3://curated/prices/ticker=NEW/year=2024/month=02/'
+    
+    def test_register_keeps_compacted_location(self, glue):
+        """Test that registering never overwrites a partition repointed by compaction"""
+        catalog = GlueCatalog(glue, 'stox')
+        catalog.switch_locations({('AAPL', '2024', '01'): 's3://curated/compacted/ticker=AAPL/year=2024/month=01/v=r1/'})
+        
+        catalog.register('curated', [('AAPL', '2024', '01')])
+        
+        partition = glue.get_partition(DatabaseName='stox', TableName='prices', PartitionValues=['AAPL', '2024', '01'])
+        assert '/compacted/' in partition['Partition']['StorageDescriptor']['Location']
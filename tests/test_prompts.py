@@ -0,0 +1,29 @@
+from stox_common import prompts
+from stox_common.prompts import ExampleIndex, sql_prompt, terms
+
+class TestPrompts:
+    
+    def test_terms_use_placeholders(self):
+        """Test that tickers and numbers become placeholders while finance acronyms stay words"""
+        assert terms('Max drawdown of TSLA YTD over 30 days') == ['max', 'drawdown', '<ticker>', 'ytd', '<n>', 'day']
+    
+    def test_select_nearest_examples_closest_last(self):
+        """Test that the most similar examples are selected, the closest one last"""
+        index = ExampleIndex(prompts.EXAMPLES)
+        
+        selected = [q for q, _ in index.select('Which stocks correlate with TSLA?', 2)]
+        volatility = [q for q, _ in index.select("What's the 20-day volatility of AMZN?", 3)]
+        
+        assert selected[-1] == 'Which stocks move most like NVDA?'
+        assert volatility[-1] == '20-day volatility of MSFT'
+        assert len(volatility) == 3 and len(set(volatility)) == 3
+    
+    def test_prompt_is_static_prefix_plus_short_message(self):
+        """Test that the system prefix is the same for every question and the message carries only k examples"""
+        system_a, message_a = sql_prompt('Show me AAPL price trend for last 60 days', k=3)
+        system_b, message_b = sql_prompt('Average volume of GOOGL', k=1)
+        
+        assert system_a == system_b == prompts.SYSTEM
+        assert message_a.count('<SQL>') == 3 and message_b.count('<SQL>') == 1
+        assert message_a.endswith('Question: Show me AAPL price trend for last 60 days\n\nSQL:')
+        assert 'Table stox.prices' not in message_a
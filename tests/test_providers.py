@@ -0,0 +1,84 @@
+import pytest
+from datetime import date
+from unittest.mock import MagicMock
+from stox_common.providers import (
+    AlphaVantageProvider, MockProvider, ProviderError, RateLimitError, StooqQuotesProvider, get_provider
+)
+
+def streamed_session(*lines):
+    """Session whose response can only be read line by line"""
+    response = MagicMock(encoding=None)
+    response.iter_lines.return_value = iter(lines)
+    type(response).text = property(lambda self: pytest.fail('the body must be streamed'))
+    session = MagicMock()
+    session.get.return_value = response
+    return session
+
+class TestProviders:
+    
+    def test_alphavantage_csv_is_streamed_oldest_first(self):
+        """Test that the CSV response is parsed from the stream and sorted oldest first"""
+        session = streamed_session(
+            'timestamp,open,high,low,close,volume',
+            '2024-01-16,103.00,106.00,102.00,105.00,1200000',
+            '2024-01-15,100.00,105.00,99.00,103.00,1000000',
+        )
+        provider = AlphaVantageProvider('test-key', 'https://av.test/query', session)
+        
+        rows = provider.fetch(['AAPL'])['AAPL']
+        
+        assert [r['date'] for r in rows] == ['2024-01-15', '2024-01-16']
+        assert rows[0] == {'date': '2024-01-15', 'open': 100.0, 'high': 105.0, 'low': 99.0,
+                           'close': 103.0, 'volume': 1000000, 'adj_close': 103.0}
+        params = session.get.call_args[1]['params']
+        assert (params['symbol'], params['datatype'], session.get.call_args[1]['stream']) == ('AAPL', 'csv', True)
+        session.get.return_value.close.assert_called_once()
+    
+    def test_alphavantage_json_errors(self):
+        """Test that throttling notes and error messages sent as JSON become exceptions"""
+        throttled = AlphaVantageProvider('test-key', session=streamed_session('{', '"Note": "Thank you"', '}'))
+        invalid = AlphaVantageProvider('test-key', session=streamed_session('{"Error Message": "Invalid API call"}'))
+        
+        with pytest.raises(RateLimitError):
+            throttled.fetch(['AAPL'])
+        with pytest.raises(ProviderError, match='Alpha Vantage error'):
+            invalid.fetch(['INVALID'])
+    
+    def test_stooq_quotes_fetch_many_symbols_per_request(self):
+        """Test that one request returns the latest bar of every symbol in the batch"""
+        session = streamed_session(
+            'Symbol,Date,Open,High,Low,Close,Volume',
+            'AAPL.US,2024-01-16,103,106,102,105,1200000',
+            'NOPE.US,N/D,N/D,N/D,N/D,N/D,N/D',
+            '',
+            'MSFT.US,2024-01-16,390,392,388,391,900000',
+        )
+        provider = StooqQuotesProvider('https://stooq.test/q/l/', '.us', session=session)
+        
+        result = provider.fetch(['AAPL', 'MSFT', 'NOPE'])
+        
+        assert session.get.call_count == 1 and provider.requests == 1
+        assert session.get.call_args[1]['params']['s'] == 'aapl.us msft.us nope.us'
+        assert [r['close'] for r in result['AAPL']] == [105.0]
+        assert result['MSFT'][0]['date'] == '2024-01-16'
+        assert result['NOPE'] == []
+    
+    def test_mock_provider_batches_and_ranges(self):
+        """Test that the mock provider batches tickers and generates rows for the requested range"""
+        provider = MockProvider(batch_size=100)
+        tickers = [f'T{i:03d}' for i in range(250)]
+        
+        batches = provider.batches(tickers)
+        rows = provider.fetch(batches[0][:2], date(2024, 1, 1), date(2024, 1, 31))
+        
+        assert [len(b) for b in batches] == [100, 100, 50]
+        assert len(rows['T000']) == 23 and rows['T000'][0]['date'] == '2024-01-01'
+        assert rows['T000'] == MockProvider().fetch(['T000'], date(2024, 1, 1), date(2024, 1, 31))['T000']
+        assert provider.calls == [['T000', 'T001']]
+    
+    def test_get_provider(self):
+        """Test provider selection by name"""
+        assert get_provider('stooq-quotes').batch_size == 100
+        assert get_provider('alphavantage', api_key='k').batch_size == 1
+        with pytest.raises(ValueError, match='unknown price provider'):
+            get_provider('yahoo')
@@ -0,0 +1,53 @@
+import pytest
+from stox_common.ratelimit import TokenBucket
+from stox_common.stats import percentile, summarize_latencies
+
+class FakeClock:
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.now += seconds
+
+class TestTokenBucket:
+    
+    def test_burst_then_steady_rate(self):
+        """Test that the bucket allows a burst and then paces calls"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1.0, capacity=2, clock=clock, sleep=clock.sleep)
+        
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == pytest.approx(1.0)
+        assert clock.now == pytest.approx(1.0)
+    
+    def test_drain(self):
+        """Test that draining forces the next caller to wait"""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2.0, capacity=4, clock=clock, sleep=clock.sleep)
+        
+        bucket.drain()
+        
+        assert bucket.try_acquire() == pytest.approx(0.5)
+    
+    def test_invalid_rate(self):
+        """Test that a non-positive rate is rejected"""
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0, capacity=1)
+
+class TestStats:
+    
+    def test_percentiles(self):
+        """Test nearest-rank percentiles and the summary dict"""
+        values = list(range(1, 101))
+        
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile([], 50) == 0.0
+        summary = summarize_latencies(values)
+        assert summary['count'] == 100
+        assert summary['max_ms'] == 100
@@ -0,0 +1,87 @@
+import pytest
+import duckdb
+from datetime import date, timedelta
+from stox_common.sqlrewrite import RejectedQuery, rewrite
+
+TODAY = date(2024, 3, 15)
+
+class TestSqlRewrite:
+    
+    def test_adds_partition_predicates(self):
+        """Test year/month predicates for relative, literal and BETWEEN bounds, qualified by alias"""
+        result = rewrite("SELECT date, close, sma_7 FROM stox.indicators WHERE ticker='AAPL' "
+                         "AND date >= current_date - interval '30' day ORDER BY date;", today=TODAY)
+        
+        assert result['sql'] == (
+            "SELECT date, close, sma_7 FROM stox.indicators WHERE ticker='AAPL' "
+            "AND (date >= current_date - interval '30' day AND (year > 2024 OR (year = 2024 AND month >= 2))) "
+            "ORDER BY date LIMIT 200")
+        
+        result = rewrite("SELECT p.close, i.sma_7 FROM stox.prices p JOIN stox.indicators AS i "
+                         "ON p.ticker = i.ticker AND p.date = i.date "
+                         "WHERE p.date BETWEEN DATE '2024-01-10' AND DATE '2024-02-20' "
+                         "AND i.date >= date_trunc('year', current_date)", today=TODAY)
+        
+        assert "AND p.year = 2024 AND p.month BETWEEN 1 AND 2)" in result['sql']
+        assert "(i.year > 2024 OR (i.year = 2024 AND i.month >= 1))" in result['sql']
+        assert result['predicates'] == 2
+    
+    def test_leaves_unknown_bounds_alone(self):
+        """Test that column arithmetic, ambiguous columns and non-partitioned tables are not rewritten"""
+        for sql in ("SELECT * FROM stox.prices WHERE date >= current_date - interval '30' day + 1",
+                    "SELECT * FROM stox.prices WHERE date >= (SELECT max(date) FROM stox.correlations)",
+                    "SELECT * FROM stox.prices a JOIN stox.indicators b ON a.date = b.date "
+                    "WHERE date > DATE '2024-01-01'",
+                    "WITH r AS (SELECT * FROM stox.v_returns) SELECT * FROM r WHERE date > DATE '2024-01-01'"):
+            assert rewrite(sql, today=TODAY)['predicates'] == 0
+    
+    def test_enforces_select_and_limit(self):
+        """Test that only one SELECT statement passes and the outer LIMIT is capped or added"""
+        for sql in ("DROP TABLE stox.prices", "SELECT 1; DELETE FROM stox.prices", "SELECT 'a",
+                    "WITH x AS (SELECT 1) INSERT INTO t SELECT * FROM x", "SELECT (1", "  ",
+                    "UNLOAD (SELECT * FROM stox.prices) TO 's3://b/'"):
+            with pytest.raises(RejectedQuery):
+                rewrite(sql)
+        
+        assert rewrite("SELECT * FROM stox.prices LIMIT 5000", max_limit=100)['sql'] == \
+            "SELECT * FROM stox.prices LIMIT 100"
+        assert rewrite("SELECT * FROM stox.prices LIMIT ALL")['limit'] == 200
+        assert rewrite("SELECT * FROM (SELECT * FROM stox.prices LIMIT 10000) t LIMIT 3 -- done")['sql'] == \
+            "SELECT * FROM (SELECT * FROM stox.prices LIMIT 10000) t LIMIT 3"
+        
+        series = "SELECT date, close FROM stox.prices WHERE ticker = 'AAPL' ORDER BY date"
+        assert rewrite(series, series_limit=5000)['sql'] == f"{series} LIMIT 5000"
+        assert rewrite(f"{series} LIMIT 2000", series_limit=5000)['limit'] == 2000
+        assert rewrite(f"{series} DESC LIMIT 2000", series_limit=5000)['limit'] == 200
+        assert rewrite("SELECT ticker, close FROM stox.prices ORDER BY close LIMIT 2000",
+                       series_limit=5000)['limit'] == 200
+    
+    def test_estimates_partitions_pruned(self):
+        """Test that pruned months are multiplied by the tickers a stox.prices query covers"""
+        result = rewrite("SELECT * FROM stox.prices WHERE ticker IN ('AAPL', 'MSFT') "
+                         "AND date >= DATE '2024-01-01'", today=TODAY, history_start=date(2023, 1, 1), tickers=5)
+        
+        assert result['pruning'] == [{'table': 'stox.prices', 'from': '2024-01-01', 'to': None,
+                                      'months_total': 15, 'months_scanned': 3, 'partitions_pruned': 24}]
+        assert rewrite("SELECT * FROM stox.prices WHERE date >= DATE '2024-01-01'", today=TODAY,
+                       history_start=date(2023, 1, 1), tickers=5)['partitions_pruned'] == 60
+    
+    def test_rewritten_sql_returns_same_rows(self):
+        """Test on DuckDB that the rewritten queries return what the originals return"""
+        con = duckdb.connect()
+        con.execute("CREATE SCHEMA stox")
+        con.execute("CREATE TABLE stox.prices AS SELECT 'AAPL' AS ticker, d AS date, 100.0 + i AS close, "
+                    "year(d) AS year, month(d) AS month "
+                    "FROM (SELECT CAST(current_date - INTERVAL (i) DAY AS DATE) AS d, i FROM range(400) r(i))")
+        today = con.execute("SELECT current_date").fetchone()[0]
+        queries = [
+            "SELECT date, close FROM stox.prices WHERE date >= current_date - interval '45' day",
+            "SELECT count(*) FROM stox.prices p WHERE p.date BETWEEN date_trunc('month', current_date) "
+            "- interval '2' month AND current_date",
+            "SELECT max(close) FROM stox.prices WHERE NOT date < date_trunc('year', current_date)",
+            f"SELECT * FROM stox.prices WHERE date = DATE '{today - timedelta(days=3)}' OR close < 110",
+        ]
+        for sql in queries:
+            result = rewrite(sql, today=today)
+            assert result['predicates'] == 1
+            assert sorted(con.execute(result['sql']).fetchall()) == sorted(con.execute(sql).fetchall())
@@ -0,0 +1,77 @@
+import json
+import pytest
+from unittest.mock import patch
+from stox_common import telemetry
+
+class TestTelemetry:
+    
+    def test_spans_nest_and_counters_add(self):
+        """Test that nested spans record their parent and counters accumulate"""
+        telemetry.reset('stox-test')
+        with telemetry.span('outer') as outer:
+            with telemetry.span('inner', ticker='AAPL'):
+                pass
+            outer['source'] = 'miss'
+        telemetry.count('hits')
+        telemetry.count('hits', 2)
+        
+        record = telemetry.snapshot()
+        inner, outer = record['spans']
+        
+        assert (inner['name'], inner['parent'], inner['ticker']) == ('inner', 'outer', 'AAPL')
+        assert (outer['parent'], outer['source']) == (None, 'miss')
+        assert outer['duration_ms'] >= inner['duration_ms'] >= 0
+        assert record['counters'] == {'hits': 3}
+    
+    def test_span_records_error(self):
+        """Test that a failing block is still recorded, with the exception type"""
+        telemetry.reset()
+        with pytest.raises(ValueError):
+            with telemetry.span('athena'):
+                raise ValueError('boom')
+        
+        assert telemetry.snapshot()['spans'][0]['error'] == 'ValueError'
+    
+    @patch.dict('os.environ', {'METRICS': 'emf'})
+    def test_emf_line(self, capsys):
+        """Test that the handler decorator prints one EMF document with a metric per span name"""
+        @telemetry.instrumented('stox-test')
+        def handler(event, context):
+            for _ in range(2):
+                with telemetry.span('fetch'):
+                    pass
+            telemetry.count('tickers_success', 2)
+            return 'ok'
+        
+        assert handler({}, None) == 'ok'
+        document = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+        metrics = document['_aws']['CloudWatchMetrics'][0]
+        
+        assert metrics['Namespace'] == 'Stox' and metrics['Dimensions'] == [['Function']]
+        assert {m['Name']: m['Unit'] for m in metrics['Metrics']} == {
+            'total_ms': 'Milliseconds', 'fetch_ms': 'Milliseconds', 'tickers_success': 'Count'
+        }
+        assert document['Function'] == 'stox-test'
+        assert len(document['fetch_ms']) == 2 and document['tickers_success'] == 2
+    
+    def test_file_mode_and_debug_level(self, tmp_path, capsys):
+        """Test that METRICS=file appends loadable records and debug prints only at LOG_LEVEL=debug"""
+        path = str(tmp_path / 'metrics.jsonl')
+        
+        @telemetry.instrumented('stox-test')
+        def handler():
+            telemetry.debug("expensive %s", 'detail')
+            with telemetry.span('s3_put'):
+                pass
+        
+        with patch.dict('os.environ', {'METRICS': 'file', 'METRICS_FILE': path, 'LOG_LEVEL': 'info'}):
+            handler()
+        with patch.dict('os.environ', {'METRICS': 'file', 'METRICS_FILE': path, 'LOG_LEVEL': 'debug'}):
+            handler()
+        
+        records = telemetry.load(path)
+        durations = telemetry.span_durations(records)
+        
+        assert [r['function'] for r in records] == ['stox-test', 'stox-test']
+        assert len(durations['s3_put']) == 2 and len(durations['total']) == 2
+        assert capsys.readouterr().out == 'DEBUG: expensive detail\n'
@@ -0,0 +1,76 @@
+import pytest
+import os
+import re
+import duckdb
+import numpy as np
+from datetime import date, timedelta
+from stox_common.views import corr_sql, lookback_days, partition_filter, returns_sql, ticker_filter
+
+VIEWS_SQL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sql', 'views.sql')
+END = date(2024, 3, 29)
+
+@pytest.fixture(scope='module')
+def con():
+    """DuckDB with a small stox.prices (MSFT misses a day) and every view from sql/views.sql"""
+    rng = np.random.default_rng(11)
+    days = [d for d in (date(2023, 6, 1) + timedelta(days=i) for i in range(303)) if d.weekday() < 5]
+    con = duckdb.connect()
+    con.execute('CREATE SCHEMA stox')
+    con.execute('CREATE TABLE stox.prices (ticker VARCHAR, date DATE, close DOUBLE, year INTEGER, month INTEGER)')
+    for ticker in ('AAPL', 'MSFT', 'TSLA'):
+        closes = 100 * np.cumprod(1 + rng.normal(0, 0.02, len(days)))
+        rows = [(ticker, d, float(c), d.year, d.month) for d, c in zip(days, closes)
+                if not (ticker == 'MSFT' and d == date(2024, 2, 14))]
+        con.executemany('INSERT INTO stox.prices VALUES (?, ?, ?, ?, ?)', rows)
+    with open(VIEWS_SQL) as f:
+        for statement in f.read().split(';'):
+            if re.search(r'CREATE\s+OR\s+REPLACE\s+VIEW', statement):
+                con.execute(statement)
+    return con
+
+def fetch(con, sql):
+    return sorted(con.execute(sql).fetchall())
+
+class TestViews:
+    
+    def test_returns_match_numpy(self, con):
+        """Test that v_returns computes each ticker's return once and drops its first day"""
+        closes = np.array([c for c, in con.execute(
+            "SELECT close FROM stox.prices WHERE ticker = 'AAPL' ORDER BY date").fetchall()])
+        returns = [r for r, in con.execute(
+            "SELECT daily_return FROM stox.v_returns WHERE ticker = 'AAPL' ORDER BY date").fetchall()]
+        
+        assert np.allclose(returns, closes[1:] / closes[:-1] - 1)
+    
+    def test_ranged_queries_match_views(self, con):
+        """Test that returns_sql and corr_sql return the view rows for their date range"""
+        start = date(2024, 2, 1)
+        
+        assert fetch(con, returns_sql(start, END)) == fetch(
+            con, f"SELECT ticker, date, close, prev_close, daily_return FROM stox.v_returns "
+                 f"WHERE date BETWEEN DATE '{start}' AND DATE '{END}'")
+        ranged = fetch(con, corr_sql(start, END))
+        full = fetch(con, f"SELECT * FROM stox.v_corr WHERE date BETWEEN DATE '{start}' AND DATE '{END}'")
+        assert [r[:3] for r in ranged] == [r[:3] for r in full]
+        assert np.allclose([r[3] for r in ranged], [r[3] for r in full])
+    
+    def test_corr_over_common_days(self, con):
+        """Test correlation_60d against NumPy over the days both tickers traded"""
+        rows = con.execute("SELECT a.daily_return, b.daily_return FROM stox.v_returns a JOIN stox.v_returns b "
+                           "ON a.date = b.date WHERE a.ticker = 'AAPL' AND b.ticker = 'MSFT' "
+                           "ORDER BY a.date DESC LIMIT 60").fetchall()
+        
+        value, = con.execute(f"SELECT correlation_60d FROM ({corr_sql(END, END, ['aapl', 'MSFT'])})").fetchone()
+        
+        assert value == pytest.approx(np.corrcoef(np.array(rows).T)[0, 1])
+    
+    def test_partition_and_ticker_filters(self):
+        """Test the year/month predicate across years and that tickers are validated"""
+        assert partition_filter(date(2024, 2, 1), date(2024, 3, 29)) == 'year = 2024 AND month BETWEEN 2 AND 3'
+        assert partition_filter(date(2022, 11, 5), date(2024, 1, 2)) == \
+            '((year = 2022 AND month >= 11) OR year BETWEEN 2023 AND 2023 OR (year = 2024 AND month <= 1))'
+        assert 'year = 2024' in returns_sql(date(2024, 3, 1), END)
+        assert lookback_days(60) >= 60 * 7 / 5
+        assert ticker_filter(['brk.b']) == " AND ticker IN ('BRK.B')"
+        with pytest.raises(ValueError):
+            ticker_filter(["AAPL') OR 1=1 --"])
@@ -0,0 +1,44 @@
+import io
+import pytest
+from unittest.mock import patch
+from stox_common.writers import CsvWriter, ParquetWriter, get_writer
+
+ROWS = [
+    {'date': '2024-01-15', 'open': 100.0, 'high': 105.0, 'low': 99.0, 'close': 103.0, 'volume': 1000000, 'adj_close': 103.0},
+    {'date': '2024-01-16', 'open': 103.0, 'high': 104.5, 'low': 101.0, 'close': 102.25, 'volume': 750000, 'adj_close': 102.25}
+]
+
+class TestWriters:
+    
+    @pytest.mark.parametrize('use_pyarrow', [True, False])
+    def test_parquet_round_trip(self, use_pyarrow):
+        """Test that both Parquet paths produce typed, readable files"""
+        pq = pytest.importorskip('pyarrow.parquet')
+        
+        body = ParquetWriter(use_pyarrow=use_pyarrow).serialize(ROWS)
+        table = pq.read_table(io.BytesIO(body))
+        
+        assert body[:4] == b'PAR1' and body[-4:] == b'PAR1'
+        assert [str(t) for t in table.schema.types] == ['date32[day]', 'double', 'double', 'double', 'double', 'int64', 'double']
+        assert table.column('date')[1].as_py().isoformat() == '2024-01-16'
+        assert table.column('close').to_pylist() == [103.0, 102.25]
+        assert table.column('volume').to_pylist() == [1000000, 750000]
+    
+    def test_pure_python_parquet_uses_gzip(self):
+        """Test that the fallback writer compresses with the stdlib codec"""
+        pq = pytest.importorskip('pyarrow.parquet')
+        
+        body = ParquetWriter(use_pyarrow=False).serialize(ROWS * 100)
+        metadata = pq.ParquetFile(io.BytesIO(body)).metadata
+        
+        assert metadata.num_rows == 200
+        assert metadata.row_group(0).column(0).compression == 'GZIP'
+        assert metadata.row_group(0).column(0).statistics.min.isoformat() == '2024-01-15'
+    
+    def test_get_writer(self):
+        """Test format selection from the argument and PRICES_FORMAT"""
+        assert isinstance(get_writer(), CsvWriter)
+        with patch.dict('os.environ', {'PRICES_FORMAT': 'parquet'}):
+            assert get_writer().filename == 'data.parquet'
+        with pytest.raises(ValueError):
+            get_writer('orc')